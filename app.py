@@ -1,26 +1,83 @@
 import json
+import logging
 import os
-from collections.abc import Callable
+import time
+from collections.abc import AsyncIterator, Callable, Iterator
+from contextlib import asynccontextmanager
 from pathlib import Path
+from typing import Any
 
 import structlog.stdlib
 import uvicorn
 from asgi_correlation_id import CorrelationIdMiddleware
 from dotenv import load_dotenv
-from fastapi import FastAPI, HTTPException, Request
+from fastapi import FastAPI, HTTPException, Query, Request
 from fastapi.exceptions import RequestValidationError
 from fastapi.responses import FileResponse, HTMLResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from pydantic import ValidationError
 from samgis_core.utilities import create_folders_if_not_exists
-from samgis_web.utilities import frontend_builder
 from samgis_core.utilities.session_logger import setup_logging
-from samgis_web.prediction_api.predictors import samexporter_predict
-from samgis_web.utilities.type_hints import ApiRequestBody
-from starlette.responses import JSONResponse, Response
+from starlette.responses import JSONResponse, Response, StreamingResponse
 
+from samgis.io_package.artifact_writer import get_artifact_writer
+from samgis.io_package.tms2geotiff import MosaicTooLargeError
+from samgis.prediction_api.predictors import (
+    get_embedding,
+    preload_model,
+    samexporter_decode_features,
+    samexporter_predict,
+    samexporter_predict_batch,
+    samexporter_predict_features,
+    session_pool,
+)
+from samgis.prediction_api.session_loader import get_session_errors
+from samgis.utilities.constants import (
+    BATCH_MAX_ITEMS,
+    DEFAULT_MODEL_VARIANT,
+    FRONTEND_BUILD_MODE,
+    GEOJSON_SEQ_MEDIA_TYPE,
+    LOG_QUEUE_SIZE,
+    MODEL_HEALTH_CHECK_INTERVAL,
+    NDJSON_MEDIA_TYPE,
+    VIS_OUTPUT_PAGE_SIZE,
+)
+from samgis.utilities.metrics import (
+    PhaseTimer,
+    Sample,
+    collect_timings,
+    record_stage,
+    stage_timer,
+    registry as metrics_registry,
+    variant_durations,
+)
+from samgis.utilities.serialization import dumps_bytes
+from samgis.utilities.session_logger import (
+    get_queue_handler,
+    log_payload,
+    setup_async_logging,
+    truncate_payload,
+)
+from samgis.utilities.type_hints import (
+    EmbeddingDecodeRequestBody,
+    EmbeddingRequestBody,
+    SamgisApiRequestBody,
+)
+from samgis.web import prefork
+from samgis.web.embedding_sessions import (
+    EmbeddingSessionNotFoundError,
+    embedding_sessions,
+)
+from samgis.web.frontend_manifest import ensure_frontend
+from samgis.web.inference_scheduler import InferenceRejectedError, inference_scheduler
+from samgis.web.model_health import ModelHealth
+from samgis.web.request_coalescer import get_request_key, request_coalescer
+from samgis.web.response_cache import get_etag, response_cache
 
+
+# import-to-ready durations of the startup phases
+startup_timer = PhaseTimer()
 load_dotenv()
 project_root_folder = Path(globals().get("__file__", "./_")).absolute().parent
 workdir = os.getenv("WORKDIR", project_root_folder)
@@ -38,13 +95,25 @@ def resolve_model_folder() -> Path:
 
 
 model_folder = resolve_model_folder()
+# variants preloaded (and never evicted from the session pool) together with the default one
+model_hot_set = [
+    variant.strip()
+    for variant in os.getenv("MODEL_HOT_SET", "").split(",")
+    if variant.strip()
+]
+startup_timer.mark("env")
 
 log_level = os.getenv("LOG_LEVEL", "INFO")
 setup_logging(log_level=log_level)
+if os.getenv("LOG_ASYNC", "1").lower() not in ("", "0", "false"):
+    # format and write the log records in a background thread, off the request path
+    setup_async_logging(queue_size=int(os.getenv("LOG_QUEUE_SIZE", LOG_QUEUE_SIZE)))
 app_logger = structlog.stdlib.get_logger()
+startup_timer.mark("logging")
 app_logger.info(f"PROJECT_ROOT_FOLDER:{project_root_folder}, WORKDIR:{workdir}.")
 app_logger.info(f"model_folder resolved to: '{model_folder}'.")
 
+batch_max_items = int(os.getenv("BATCH_MAX_ITEMS", BATCH_MAX_ITEMS))
 folders_map = os.getenv("FOLDERS_MAP", "{}")
 markdown_text = os.getenv("MARKDOWN_TEXT", "")
 examples_text_list = os.getenv("EXAMPLES_TEXT_LIST", "").split("\n")
@@ -54,27 +123,83 @@ static_dist_folder = Path(project_root_folder) / "static" / "dist"
 input_css_path = os.getenv("INPUT_CSS_PATH", "src/input.css")
 vite_index_url = os.getenv("VITE_INDEX_URL", "/")
 vite_samgis_url = os.getenv("VITE_SAMGIS_URL", "/samgis")
+model_preload = os.getenv("MODEL_PRELOAD", "1").lower() not in ("", "0", "false")
+frontend_build_mode = os.getenv("FRONTEND_BUILD_MODE", FRONTEND_BUILD_MODE)
+model_health = ModelHealth(
+    variant=os.getenv("MODEL_VARIANT", DEFAULT_MODEL_VARIANT),
+    model_dir=model_folder,
+    interval=float(
+        os.getenv("MODEL_HEALTH_CHECK_INTERVAL", MODEL_HEALTH_CHECK_INTERVAL)
+    ),
+)
 fastapi_title = "samgis"
-app = FastAPI(title=fastapi_title, version="1.0")
+
+
+def get_model_folder(model_variant: str | None) -> Path:
+    """Return the folder of the requested model variant, the default one for None"""
+    from samgis_core.prediction_api.model_registry import get_model_dir
+
+    if model_variant is None or model_variant == model_folder.name:
+        return model_folder
+    return get_model_dir(model_variant)
+
+
+def preload_models() -> None:
+    """Build the ONNX sessions of the default model variant and of the hot set ones, warming them up"""
+    # missing or corrupted model files, failing warm-up runs: the requests load the model again
+    preload_errors = (OSError, ValueError, *get_session_errors())
+    try:
+        durations = preload_model(model_folder=model_folder)
+        app_logger.info(f"model preload ok, durations:{durations}.")
+        model_health.mark_warm()
+    except preload_errors as e_preload:
+        app_logger.error(
+            f"model preload failed: {e_preload}, the model will be loaded on the first request."
+        )
+    for variant in model_hot_set:
+        try:
+            durations = preload_model(model_folder=get_model_folder(variant))
+            app_logger.info(f"model {variant} preload ok, durations:{durations}.")
+        except preload_errors as e_preload:
+            app_logger.error(f"model {variant} preload failed: {e_preload}.")
+
+
+@asynccontextmanager
+async def lifespan(_app: FastAPI) -> AsyncIterator[None]:
+    # the checksums are verified in background, the readiness probe reads the cached result
+    model_health.start()
+    # the pre-fork server workers inherit the sessions already warmed up by the parent process
+    if model_preload and not model_health.warm:
+        # build the ONNX sessions and warm them up before accepting the first request
+        preload_models()
+    startup_timer.mark("model_preload")
+    app_logger.info(
+        f"startup completed in {startup_timer.total:.3f}s, phases:{startup_timer.phases}."
+    )
+    yield
+    model_health.stop()
+
+
+app = FastAPI(title=fastapi_title, version="1.0", lifespan=lifespan)
 
 
 @app.middleware("http")
 async def request_middleware(request: Request, call_next: Callable) -> Response:
     from samgis_web.web.middlewares import logging_middleware
 
+    prefork.record_request()
     return await logging_middleware(request, call_next)
 
 
 @app.get("/health")
-async def health() -> JSONResponse:
+def health() -> JSONResponse:
     from onnxruntime import __version__ as ort_version
     from samgis_web.__version__ import __version__ as version_web
     from samgis_core.__version__ import __version__ as version_core
-    from samgis_core.prediction_api.model_registry import verify_download
 
-    variant = os.getenv("MODEL_VARIANT", "sam2.1_hiera_base_plus_uint8")
     try:
-        failures = verify_download(variant, model_dir=model_folder)
+        # hashes the model files only on the first call or if their size/mtime changed
+        failures = model_health.verify()
         if failures:
             msg = (
                 f"health_check: SHA-256 verification failed for: {', '.join(failures)}"
@@ -90,8 +215,27 @@ async def health() -> JSONResponse:
         raise HTTPException(500, detail="Internal Server Error")
 
 
-def infer_samgis_fn(request_input: ApiRequestBody | str) -> str:
-    from samgis_web.web.web_helpers import get_parsed_bbox_points_with_dictlist_prompt
+@app.get("/health/live")
+async def health_live() -> JSONResponse:
+    return JSONResponse(status_code=200, content={"msg": "still alive..."})
+
+
+@app.get("/health/ready")
+async def health_ready() -> JSONResponse:
+    status = model_health.status()
+    # without the preload the model is loaded (and warmed up) by the first request
+    ready = status["verified"] and (status["warm"] or not model_preload)
+    if not ready:
+        app_logger.warning(f"not ready, model health status:{status}.")
+    return JSONResponse(
+        status_code=200 if ready else 503, content={"ready": ready, **status}
+    )
+
+
+def infer_samgis_fn(
+    request_input: SamgisApiRequestBody | str, timings: bool = False
+) -> str:
+    from samgis.web.web_helpers import get_parsed_bbox_points_with_dictlist_prompt
 
     app_logger.info("starting inference request...")
     try:
@@ -99,42 +243,864 @@ def infer_samgis_fn(request_input: ApiRequestBody | str) -> str:
 
         time_start_run = time.time()
         body_request = get_parsed_bbox_points_with_dictlist_prompt(request_input)
-        app_logger.info(f"body_request:{body_request}.")
+        log_payload(
+            app_logger, "/infer_samgis", "body_request", body_request, logging.INFO
+        )
         try:
             app_logger.info(f"source_name = {body_request['source_name']}.")
-            output = samexporter_predict(
-                bbox=body_request["bbox"],
-                prompt=body_request["prompt"],
-                zoom=body_request["zoom"],
-                source=body_request["source"],
-                source_name=body_request["source_name"],
-                model_folder=model_folder,
-            )
+
+            request_model_folder = get_model_folder(body_request["model_variant"])
+
+            def _run_inference() -> dict:
+                with inference_scheduler.slot() as wait_seconds:
+                    app_logger.info(f"inference slot wait time:{wait_seconds}.")
+                    record_stage("queue", wait_seconds)
+                    with variant_durations.time(request_model_folder.name):
+                        return samexporter_predict(
+                            bbox=body_request["bbox"],
+                            prompt=body_request["prompt"],
+                            zoom=body_request["zoom"],
+                            source=body_request["source"],
+                            source_name=body_request["source_name"],
+                            model_folder=request_model_folder,
+                            polygonize=body_request["polygonize"],
+                            windowed=body_request["windowed"],
+                        )
+
+            # identical concurrent requests wait for the first one and share its output
+            with collect_timings() as stage_timings:
+                output = request_coalescer.run(
+                    get_request_key(body_request, "v1", request_model_folder),
+                    _run_inference,
+                )
             duration_run = time.time() - time_start_run
-            app_logger.info(f"duration_run:{duration_run}.")
+            app_logger.info(f"duration_run:{duration_run}, timings:{stage_timings}.")
             body = {"duration_run": duration_run, "output": output}
-            dumped = json.dumps(body)
-            app_logger.info(f"json.dumps(body) type:{type(dumped)}, len:{len(dumped)}.")
-            app_logger.debug(f"complete json.dumps(body):{dumped}.")
+            if timings:
+                body["timings"] = stage_timings
+            with stage_timer("serialize"):
+                dumped = json.dumps(body)
+            app_logger.info(f"json.dumps(body) len:{len(dumped)}.")
+            log_payload(
+                app_logger, "/infer_samgis", "complete json.dumps(body)", dumped
+            )
             return dumped
+        except InferenceRejectedError as rejected:
+            app_logger.warning(
+                f"inference request rejected: {rejected.msg}, stats:{inference_scheduler.stats()}."
+            )
+            raise
+        except MosaicTooLargeError as too_large:
+            app_logger.warning(f"inference request rejected: {too_large}.")
+            raise
         except Exception as inference_exception:
             app_logger.error(f"inference_exception:{inference_exception}.")
-            app_logger.error(f"inference_exception, request_input:{request_input}.")
+            app_logger.error(
+                f"inference_exception, request_input:{truncate_payload(request_input)}."
+            )
             raise HTTPException(status_code=500, detail="Internal Server Error")
     except ValidationError as va1:
         app_logger.error(f"validation error: {str(va1)}.")
-        app_logger.error(f"ValidationError, request_input:{request_input}.")
+        app_logger.error(
+            f"ValidationError, request_input:{truncate_payload(request_input)}."
+        )
+        raise RequestValidationError("Unprocessable Entity")
+
+
+def _get_stream_media_type(accept: str, stream: bool) -> str | None:
+    if GEOJSON_SEQ_MEDIA_TYPE in accept:
+        return GEOJSON_SEQ_MEDIA_TYPE
+    if stream or NDJSON_MEDIA_TYPE in accept:
+        return NDJSON_MEDIA_TYPE
+    return None
+
+
+def _iter_stream_records(
+    n_predictions: int,
+    features: Iterator[dict],
+    time_start_run: float,
+    stage_timings: dict[str, float],
+    media_type: str,
+) -> Iterator[str]:
+    # RFC 8142: every GeoJSON text sequence record starts with the record separator
+    record_separator = "\x1e" if media_type == GEOJSON_SEQ_MEDIA_TYPE else ""
+
+    def _dump_record(record: dict) -> str:
+        return f"{record_separator}{json.dumps(record)}\n"
+
+    duration_run = time.time() - time_start_run
+    yield _dump_record(
+        {"type": "header", "n_predictions": n_predictions, "duration_run": duration_run}
+    )
+    n_shapes_geojson = 0
+    duration_polygonize = 0.0
+    duration_serialize = 0.0
+    while True:
+        time_start_polygonize = time.perf_counter()
+        try:
+            feature = next(features, None)
+            time_start_serialize = time.perf_counter()
+            duration_polygonize += time_start_serialize - time_start_polygonize
+            if feature is None:
+                break
+            line = _dump_record(feature)
+            duration_serialize += time.perf_counter() - time_start_serialize
+        except (ValueError, TypeError, OSError) as e_stream:
+            # the polygonize and serialize errors, after the response headers: close the stream
+            # with an error record
+            app_logger.error(
+                f"stream error after {n_shapes_geojson} shapes: {e_stream}."
+            )
+            yield _dump_record(
+                {"type": "error", "msg": "Error - Internal Server Error"}
+            )
+            return
+        n_shapes_geojson += 1
+        yield line
+    record_stage("polygonize", duration_polygonize)
+    record_stage("serialize", duration_serialize)
+    stage_timings.update(polygonize=duration_polygonize, serialize=duration_serialize)
+    duration_run = time.time() - time_start_run
+    app_logger.info(
+        f"streamed {n_shapes_geojson} shapes, duration_run:{duration_run}, timings:{stage_timings}."
+    )
+    yield _dump_record(
+        {
+            "type": "trailer",
+            "n_shapes_geojson": n_shapes_geojson,
+            "duration_run": duration_run,
+            "timings": stage_timings,
+        }
+    )
+
+
+def infer_samgis_stream_fn(
+    request_input: SamgisApiRequestBody, media_type: str
+) -> Iterator[str]:
+    from samgis.web.web_helpers import get_parsed_bbox_points_with_dictlist_prompt
+
+    app_logger.info(f"starting streaming inference request, {media_type}...")
+    time_start_run = time.time()
+    try:
+        body_request = get_parsed_bbox_points_with_dictlist_prompt(request_input)
+    except ValidationError as va1:
+        app_logger.error(f"validation error: {va1}.")
         raise RequestValidationError("Unprocessable Entity")
+    try:
+        # the tiles download, the encoder and the decoder run before the first byte of the
+        # response, the polygonization while streaming it (outside the inference slot)
+        request_model_folder = get_model_folder(body_request["model_variant"])
+        with (
+            collect_timings() as stage_timings,
+            inference_scheduler.slot() as wait_seconds,
+            variant_durations.time(request_model_folder.name),
+        ):
+            record_stage("queue", wait_seconds)
+            n_predictions, features = samexporter_predict_features(
+                bbox=body_request["bbox"],
+                prompt=body_request["prompt"],
+                zoom=body_request["zoom"],
+                source=body_request["source"],
+                source_name=body_request["source_name"],
+                model_folder=request_model_folder,
+                polygonize=body_request["polygonize"],
+                windowed=body_request["windowed"],
+            )
+    except InferenceRejectedError as rejected:
+        app_logger.warning(f"inference request rejected: {rejected.msg}.")
+        raise
+    except MosaicTooLargeError as too_large:
+        app_logger.warning(f"inference request rejected: {too_large}.")
+        raise
+    except Exception as inference_exception:
+        app_logger.error(f"inference_exception:{inference_exception}.")
+        raise HTTPException(
+            status_code=500, detail="Internal Server Error"
+        ) from inference_exception
+    return _iter_stream_records(
+        n_predictions, features, time_start_run, stage_timings, media_type
+    )
 
 
 @app.post("/infer_samgis")
-def infer_samgis(request_input: ApiRequestBody) -> JSONResponse:
-    dumped = infer_samgis_fn(request_input=request_input)
-    app_logger.info(f"json.dumps(body) type:{type(dumped)}, len:{len(dumped)}.")
-    app_logger.debug(f"complete json.dumps(body):{dumped}.")
+def infer_samgis(
+    request: Request,
+    request_input: SamgisApiRequestBody,
+    timings: bool = False,
+    stream: bool = False,
+) -> Response:
+    media_type = _get_stream_media_type(request.headers.get("accept", ""), stream)
+    if media_type is not None:
+        return StreamingResponse(
+            infer_samgis_stream_fn(request_input, media_type), media_type=media_type
+        )
+
+    def _get_content() -> bytes:
+        dumped = infer_samgis_fn(request_input=request_input, timings=timings)
+        return bytes(JSONResponse(status_code=200, content={"body": dumped}).body)
+
+    key = _get_response_cache_key(request_input, "v1", timings)
+    return _get_cached_response(request, key, _get_content)
+
+
+def _get_response_cache_key(request_input: SamgisApiRequestBody, *extra: Any) -> str:
+    # the request id doesn't change the output, the model variant does
+    normalized = request_input.model_dump(mode="json", exclude={"id"})
+    return get_request_key(normalized, *extra, model_folder)
+
+
+def _get_cached_response(
+    request: Request, key: str, get_content: Callable[[], bytes]
+) -> Response:
+    """
+    Return the cached response for the key, computing and caching it on miss. The responses carry
+    a weak ETag derived from the key: while the response is cached (not expired nor evicted), a
+    matching If-None-Match request header gets a 304 Not Modified without body. The cache hits
+    carry an Age header, since their duration_run (and timings) are the ones of the cached run.
+
+    Args:
+        request: incoming request
+        key: response cache key
+        get_content: callable returning the json response content
+
+    Returns:
+        the json response, or the 304 one
+
+    """
+    headers = {"ETag": get_etag(key), "Cache-Control": "no-cache", "X-Cache": "hit"}
+    cached = response_cache.get(key)
+    if cached is None:
+        cached = response_cache.put(key, get_content())
+        headers["X-Cache"] = "miss"
+    else:
+        headers["Age"] = str(max(0, int(time.time() - cached.created)))
+        if_none_match = request.headers.get("if-none-match", "")
+        if if_none_match and response_cache.is_not_modified(if_none_match, cached.etag):
+            return Response(status_code=304, headers=headers)
+    return Response(
+        content=cached.content, media_type="application/json", headers=headers
+    )
+
+
+def infer_samgis_v2_fn(
+    request_input: SamgisApiRequestBody, timings: bool = False
+) -> bytes:
+    from samgis.web.web_helpers import get_parsed_bbox_points_with_dictlist_prompt
+
+    app_logger.info("starting v2 inference request...")
+    time_start_run = time.time()
+    try:
+        body_request = get_parsed_bbox_points_with_dictlist_prompt(request_input)
+    except ValidationError as va1:
+        app_logger.error(f"validation error: {va1}.")
+        raise RequestValidationError("Unprocessable Entity")
+
+    request_model_folder = get_model_folder(body_request["model_variant"])
+
+    def _run_inference() -> tuple[int, list[dict]]:
+        with inference_scheduler.slot() as wait_seconds:
+            record_stage("queue", wait_seconds)
+            with variant_durations.time(request_model_folder.name):
+                n_predictions, features = samexporter_predict_features(
+                    bbox=body_request["bbox"],
+                    prompt=body_request["prompt"],
+                    zoom=body_request["zoom"],
+                    source=body_request["source"],
+                    source_name=body_request["source_name"],
+                    model_folder=request_model_folder,
+                    polygonize=body_request["polygonize"],
+                    windowed=body_request["windowed"],
+                )
+            with stage_timer("polygonize"):
+                return n_predictions, list(features)
+
+    try:
+        with collect_timings() as stage_timings:
+            n_predictions, features_list = request_coalescer.run(
+                get_request_key(body_request, "v2", request_model_folder),
+                _run_inference,
+            )
+        duration_run = time.time() - time_start_run
+        app_logger.info(f"duration_run:{duration_run}, timings:{stage_timings}.")
+        body = {
+            "duration_run": duration_run,
+            "output": {
+                "n_predictions": n_predictions,
+                "geojson": {"type": "FeatureCollection", "features": features_list},
+                "n_shapes_geojson": len(features_list),
+            },
+        }
+        if timings:
+            body["timings"] = stage_timings
+        with stage_timer("serialize"):
+            dumped = dumps_bytes(body)
+        app_logger.info(f"v2 response body len:{len(dumped)}.")
+        log_payload(app_logger, "/v2/infer_samgis", "v2 response body", dumped)
+        return dumped
+    except InferenceRejectedError as rejected:
+        app_logger.warning(f"inference request rejected: {rejected.msg}.")
+        raise
+    except MosaicTooLargeError as too_large:
+        app_logger.warning(f"inference request rejected: {too_large}.")
+        raise
+    except Exception as inference_exception:
+        app_logger.error(f"inference_exception:{inference_exception}.")
+        app_logger.error(
+            f"inference_exception, request_input:{truncate_payload(request_input)}."
+        )
+        raise HTTPException(
+            status_code=500, detail="Internal Server Error"
+        ) from inference_exception
+
+
+@app.post("/v2/infer_samgis")
+def infer_samgis_v2(
+    request: Request, request_input: SamgisApiRequestBody, timings: bool = False
+) -> Response:
+    key = _get_response_cache_key(request_input, "v2", timings)
+    return _get_cached_response(
+        request,
+        key,
+        lambda: infer_samgis_v2_fn(request_input=request_input, timings=timings),
+    )
+
+
+def _get_batch_item_result(item_id: str, output: dict | Exception) -> dict:
+    if isinstance(output, MosaicTooLargeError):
+        return {
+            "id": item_id,
+            "status_code": 422,
+            "msg": "Error - Unprocessable Entity",
+            "detail": str(output),
+        }
+    if isinstance(output, InferenceRejectedError):
+        return {
+            "id": item_id,
+            "status_code": output.status_code,
+            "msg": f"Error - {output.msg}",
+            "retry_after": output.retry_after,
+        }
+    if isinstance(output, Exception):
+        return {
+            "id": item_id,
+            "status_code": 500,
+            "msg": "Error - Internal Server Error",
+        }
+    return {"id": item_id, "status_code": 200, "output": output}
+
+
+def infer_samgis_batch_fn(request_input: list[Any], timings: bool = False) -> str:
+    from samgis.prediction_api.embedding_cache import get_embedding_cache_key
+    from samgis.web.web_helpers import get_parsed_bbox_points_with_dictlist_prompt
+
+    time_start_run = time.time()
+    app_logger.info(f"starting batch inference request, {len(request_input)} items...")
+    if len(request_input) > batch_max_items:
+        app_logger.error(
+            f"batch with {len(request_input)} items, max allowed: {batch_max_items}."
+        )
+        raise RequestValidationError("Unprocessable Entity")
+    items_id = [
+        str(item.get("id", "")) if isinstance(item, dict) else ""
+        for item in request_input
+    ]
+    results: list[dict] = [{} for _ in request_input]
+    # items on the same bbox, zoom, tile source, model variant and windowed mode share the tiles
+    # download and the image encoder
+    groups: dict[str, list[tuple[int, dict]]] = {}
+    for n, item in enumerate(request_input):
+        try:
+            body_request = get_parsed_bbox_points_with_dictlist_prompt(
+                SamgisApiRequestBody.model_validate(item)
+            )
+        except (ValidationError, TypeError, ValueError) as e_item:
+            app_logger.error(f"batch item #{n}, validation error: {e_item}.")
+            results[n] = {
+                "id": items_id[n],
+                "status_code": 422,
+                "msg": "Error - Unprocessable Entity",
+            }
+            continue
+        group_key = get_embedding_cache_key(
+            body_request["source"],
+            body_request["zoom"],
+            body_request["bbox"],
+            f"{body_request['model_variant'] or ''}/{'windowed' if body_request['windowed'] else ''}",
+        )
+        groups.setdefault(group_key, []).append((n, body_request))
+    app_logger.info(f"batch request: {len(groups)} groups of items.")
+
+    with collect_timings() as stage_timings:
+        for group in groups.values():
+            _, body_request = group[0]
+            outputs: list[dict | Exception]
+            try:
+                request_model_folder = get_model_folder(body_request["model_variant"])
+                with (
+                    inference_scheduler.slot() as wait_seconds,
+                    variant_durations.time(request_model_folder.name),
+                ):
+                    app_logger.info(f"inference slot wait time:{wait_seconds}.")
+                    record_stage("queue", wait_seconds)
+                    outputs = samexporter_predict_batch(
+                        bbox=body_request["bbox"],
+                        prompts=[group_body["prompt"] for _, group_body in group],
+                        zoom=body_request["zoom"],
+                        source=body_request["source"],
+                        source_name=body_request["source_name"],
+                        model_folder=request_model_folder,
+                        polygonize=[
+                            group_body["polygonize"] for _, group_body in group
+                        ],
+                        windowed=body_request["windowed"],
+                    )
+            except (InferenceRejectedError, MosaicTooLargeError, OSError) as e_group:
+                # a rejected group, a too large mosaic or a failed tiles download (the requests
+                # errors are OSError) fail only the group items: any other error is a bug
+                app_logger.error(f"batch group inference error: {e_group}.")
+                outputs = [e_group] * len(group)
+            for (n, _), output in zip(group, outputs):
+                results[n] = _get_batch_item_result(items_id[n], output)
+
+    duration_run = time.time() - time_start_run
+    app_logger.info(f"batch duration_run:{duration_run}, timings:{stage_timings}.")
+    body = {"duration_run": duration_run, "n_groups": len(groups), "results": results}
+    if timings:
+        body["timings"] = stage_timings
+    with stage_timer("serialize"):
+        return json.dumps(body)
+
+
+@app.post("/infer_samgis/batch")
+def infer_samgis_batch(request_input: list[Any], timings: bool = False) -> JSONResponse:
+    dumped = infer_samgis_batch_fn(request_input=request_input, timings=timings)
+    app_logger.info(f"json.dumps(body) len:{len(dumped)}.")
     return JSONResponse(status_code=200, content={"body": dumped})
 
 
+def create_embedding_session_fn(
+    request_input: EmbeddingRequestBody, timings: bool = False
+) -> bytes:
+    from samgis.web.web_helpers import get_parsed_embedding_request
+
+    app_logger.info("starting embedding session request...")
+    time_start_run = time.time()
+    try:
+        body_request = get_parsed_embedding_request(request_input)
+    except ValidationError as va1:
+        app_logger.error(f"validation error: {va1}.")
+        raise RequestValidationError("Unprocessable Entity")
+    request_model_folder = get_model_folder(body_request["model_variant"])
+    try:
+        with (
+            collect_timings() as stage_timings,
+            inference_scheduler.slot() as wait_seconds,
+            variant_durations.time(request_model_folder.name),
+        ):
+            record_stage("queue", wait_seconds)
+            cached = get_embedding(
+                bbox=body_request["bbox"],
+                zoom=body_request["zoom"],
+                source=body_request["source"],
+                source_name=body_request["source_name"],
+                model_folder=request_model_folder,
+            )
+    except InferenceRejectedError as rejected:
+        app_logger.warning(f"embedding session request rejected: {rejected.msg}.")
+        raise
+    except MosaicTooLargeError as too_large:
+        app_logger.warning(f"embedding session request rejected: {too_large}.")
+        raise
+    except Exception as inference_exception:
+        app_logger.error(f"inference_exception:{inference_exception}.")
+        raise HTTPException(
+            status_code=500, detail="Internal Server Error"
+        ) from inference_exception
+    session = embedding_sessions.create(
+        cached,
+        request_model_folder,
+        body_request["pixel_transform"],
+        body_request["source_name"],
+    )
+    height, width = cached.embedding.orig_hw
+    duration_run = time.time() - time_start_run
+    app_logger.info(
+        f"embedding session {session.id} created, duration_run:{duration_run}, timings:{stage_timings}."
+    )
+    body = {
+        "id": session.id,
+        "expires_in": embedding_sessions.expires_in(session),
+        "model_variant": request_model_folder.name,
+        "image": {
+            "width": width,
+            "height": height,
+            "crs": "EPSG:3857",
+            # GDAL order: x origin, pixel width, row rotation, y origin, column rotation, pixel height
+            "geotransform": list(cached.transform.to_gdal()),
+        },
+        "duration_run": duration_run,
+    }
+    if timings:
+        body["timings"] = stage_timings
+    return dumps_bytes(body)
+
+
+@app.post("/embeddings", status_code=201)
+def create_embedding_session(
+    request_input: EmbeddingRequestBody, timings: bool = False
+) -> Response:
+    if prefork.get_worker_count() > 1:
+        # the session lives within this worker memory: its decodes could reach another worker
+        return JSONResponse(
+            status_code=501,
+            content={
+                "msg": "Error - Not Implemented",
+                "detail": "embedding sessions need a single worker or a sticky routing",
+            },
+        )
+    return Response(
+        status_code=201,
+        content=create_embedding_session_fn(request_input, timings=timings),
+        media_type="application/json",
+    )
+
+
+def decode_embedding_session_fn(
+    session_id: str, request_input: EmbeddingDecodeRequestBody, timings: bool = False
+) -> bytes:
+    from samgis.web.web_helpers import get_parsed_prompt_list
+
+    time_start_run = time.time()
+    session = embedding_sessions.get(session_id)
+    prompt = get_parsed_prompt_list(session.pixel_transform, request_input.prompt)
+    try:
+        # only the decoder runs here, but within an inference slot as the other inference routes:
+        # the decodes can't flood the worker threads bypassing the queue limits
+        with (
+            collect_timings() as stage_timings,
+            inference_scheduler.slot() as wait_seconds,
+        ):
+            record_stage("queue", wait_seconds)
+            n_predictions, features = samexporter_decode_features(
+                cached=session.cached,
+                prompt=prompt,
+                model_folder=session.model_folder,
+                polygonize=request_input.polygonize,
+            )
+            with stage_timer("polygonize"):
+                features_list = list(features)
+    except InferenceRejectedError as rejected:
+        app_logger.warning(
+            f"embedding session {session_id} decode rejected: {rejected.msg}."
+        )
+        raise
+    except Exception as inference_exception:
+        app_logger.error(
+            f"embedding session {session_id}, inference_exception:{inference_exception}."
+        )
+        raise HTTPException(
+            status_code=500, detail="Internal Server Error"
+        ) from inference_exception
+    duration_run = time.time() - time_start_run
+    app_logger.info(
+        f"embedding session {session_id} decoded, duration_run:{duration_run}, timings:{stage_timings}."
+    )
+    body = {
+        "duration_run": duration_run,
+        "expires_in": embedding_sessions.expires_in(session),
+        "output": {
+            "n_predictions": n_predictions,
+            "geojson": {"type": "FeatureCollection", "features": features_list},
+            "n_shapes_geojson": len(features_list),
+        },
+    }
+    if timings:
+        body["timings"] = stage_timings
+    with stage_timer("serialize"):
+        return dumps_bytes(body)
+
+
+@app.post("/embeddings/{session_id}/decode")
+def decode_embedding_session(
+    session_id: str, request_input: EmbeddingDecodeRequestBody, timings: bool = False
+) -> Response:
+    return Response(
+        content=decode_embedding_session_fn(session_id, request_input, timings),
+        media_type="application/json",
+    )
+
+
+@app.delete("/embeddings/{session_id}", status_code=204)
+def delete_embedding_session(session_id: str) -> Response:
+    embedding_sessions.delete(session_id)
+    return Response(status_code=204)
+
+
+def _get_metrics_samples() -> list[Sample]:
+    from samgis.io_package.tms2geotiff import get_tile_fetcher
+    from samgis.prediction_api.predictors import embedding_cache
+
+    samples: list[Sample] = []
+    scheduler_stats = inference_scheduler.stats()
+    samples.append(
+        (
+            "samgis_inference_in_flight",
+            "gauge",
+            "Inference runs in progress.",
+            scheduler_stats["in_flight"],
+        )
+    )
+    samples.append(
+        (
+            "samgis_inference_queue_depth",
+            "gauge",
+            "Requests waiting for an inference slot.",
+            scheduler_stats["queue_depth"],
+        )
+    )
+    for key in ("completed", "rejected_queue_full", "rejected_timeout"):
+        samples.append(
+            (
+                f"samgis_inference_{key}_total",
+                "counter",
+                f"Inference requests {key.replace('_', ' ')}.",
+                scheduler_stats[key],
+            )
+        )
+    cache_stats = embedding_cache.stats()
+    for key in ("hits", "disk_hits", "misses", "evictions"):
+        samples.append(
+            (
+                f"samgis_embedding_cache_{key}_total",
+                "counter",
+                f"Embedding cache {key.replace('_', ' ')}.",
+                cache_stats[key],
+            )
+        )
+    samples.append(
+        (
+            "samgis_embedding_cache_bytes",
+            "gauge",
+            "Embedding cache memory usage in bytes.",
+            cache_stats["bytes"],
+        )
+    )
+    coalescer_stats = request_coalescer.stats()
+    samples.append(
+        (
+            "samgis_coalesced_requests_total",
+            "counter",
+            "Inference requests sharing the output of an identical in-flight one.",
+            coalescer_stats["coalesced"],
+        )
+    )
+    response_cache_stats = response_cache.stats()
+    for key in ("hits", "disk_hits", "misses", "expired", "evictions", "not_modified"):
+        samples.append(
+            (
+                f"samgis_response_cache_{key}_total",
+                "counter",
+                f"Response cache {key.replace('_', ' ')}.",
+                response_cache_stats[key],
+            )
+        )
+    samples.append(
+        (
+            "samgis_response_cache_bytes",
+            "gauge",
+            "Response cache memory usage in bytes.",
+            response_cache_stats["bytes"],
+        )
+    )
+    sessions_stats = embedding_sessions.stats()
+    for key in ("created", "hits", "not_found", "expired", "evictions", "deleted"):
+        samples.append(
+            (
+                f"samgis_embedding_sessions_{key}_total",
+                "counter",
+                f"Embedding sessions {key.replace('_', ' ')}.",
+                sessions_stats[key],
+            )
+        )
+    for key, help_text in (
+        ("entries", "Embedding sessions alive."),
+        ("bytes", "Embedding sessions memory usage in bytes."),
+    ):
+        samples.append(
+            (
+                f"samgis_embedding_sessions_{key}",
+                "gauge",
+                help_text,
+                sessions_stats[key],
+            )
+        )
+    pool_stats = session_pool.counters()
+    for key in ("hits", "loads", "load_failures", "evictions"):
+        samples.append(
+            (
+                f"samgis_model_pool_{key}_total",
+                "counter",
+                f"Model session pool {key.replace('_', ' ')}.",
+                pool_stats[key],
+            )
+        )
+    samples.append(
+        (
+            "samgis_model_pool_load_seconds_total",
+            "counter",
+            "Model session pool total loading time in seconds.",
+            pool_stats["load_seconds"],
+        )
+    )
+    samples.append(
+        (
+            "samgis_model_pool_entries",
+            "gauge",
+            "Model variants loaded in the session pool.",
+            pool_stats["entries"],
+        )
+    )
+    samples.append(
+        (
+            "samgis_model_pool_bytes",
+            "gauge",
+            "Estimated memory usage in bytes of the model variants loaded in the session pool.",
+            pool_stats["bytes"],
+        )
+    )
+    for phase, seconds in startup_timer.phases.items():
+        samples.append(
+            (
+                f"samgis_startup_{phase}_seconds",
+                "gauge",
+                f"Application startup {phase.replace('_', ' ')} phase duration in seconds.",
+                seconds,
+            )
+        )
+    model_status = model_health.status()
+    samples.append(
+        (
+            "samgis_model_verified",
+            "gauge",
+            "1 if the model files passed the checksum verification.",
+            int(model_status["verified"]),
+        )
+    )
+    samples.append(
+        (
+            "samgis_model_warm",
+            "gauge",
+            "1 if the model sessions are built and warmed up.",
+            int(model_status["warm"]),
+        )
+    )
+    queue_handler = get_queue_handler()
+    if queue_handler is not None:
+        samples.append(
+            (
+                "samgis_log_records_dropped_total",
+                "counter",
+                "Log records dropped because the log queue was full.",
+                queue_handler.dropped,
+            )
+        )
+    tile_cache = get_tile_fetcher().cache
+    if tile_cache is not None:
+        tile_cache_stats = tile_cache.stats()
+        for key in ("hits", "misses", "expired", "evictions"):
+            samples.append(
+                (
+                    f"samgis_tile_cache_{key}_total",
+                    "counter",
+                    f"Tile cache {key}.",
+                    tile_cache_stats[key],
+                )
+            )
+        samples.append(
+            (
+                "samgis_tile_cache_bytes",
+                "gauge",
+                "Tile cache disk usage in bytes.",
+                tile_cache_stats["bytes"],
+            )
+        )
+    if bool(write_tmp_on_disk):
+        artifacts_stats = get_artifact_writer(write_tmp_on_disk).stats()
+        for key in ("written", "dropped", "failures", "removed"):
+            samples.append(
+                (
+                    f"samgis_vis_output_{key}_total",
+                    "counter",
+                    f"Visualization output artifacts {key}.",
+                    artifacts_stats[key],
+                )
+            )
+        for key in ("files", "bytes"):
+            samples.append(
+                (
+                    f"samgis_vis_output_{key}",
+                    "gauge",
+                    f"Visualization output folder {key}.",
+                    artifacts_stats[key],
+                )
+            )
+    samples.extend(prefork.get_worker_samples())
+    return samples
+
+
+metrics_registry.register_collector(_get_metrics_samples)
+
+
+@app.get("/metrics")
+async def metrics() -> Response:
+    return Response(
+        content=metrics_registry.render(),
+        media_type="text/plain; version=0.0.4; charset=utf-8",
+    )
+
+
+@app.get("/infer_samgis/scheduler")
+async def infer_samgis_scheduler() -> JSONResponse:
+    return JSONResponse(
+        status_code=200,
+        content={
+            **inference_scheduler.stats(),
+            "coalescing": request_coalescer.stats(),
+            "model_pool": session_pool.stats(),
+        },
+    )
+
+
+@app.exception_handler(InferenceRejectedError)
+def inference_rejected_exception_handler(
+    request: Request, exc: InferenceRejectedError
+) -> JSONResponse:
+    return JSONResponse(
+        status_code=exc.status_code,
+        content={"msg": f"Error - {exc.msg}"},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+
+@app.exception_handler(MosaicTooLargeError)
+def mosaic_too_large_exception_handler(
+    request: Request, exc: MosaicTooLargeError
+) -> JSONResponse:
+    return JSONResponse(
+        status_code=422,
+        content={"msg": "Error - Unprocessable Entity", "detail": str(exc)},
+    )
+
+
+@app.exception_handler(EmbeddingSessionNotFoundError)
+def embedding_session_not_found_exception_handler(
+    request: Request, exc: EmbeddingSessionNotFoundError
+) -> JSONResponse:
+    return JSONResponse(
+        status_code=404, content={"msg": "Error - Not Found", "detail": str(exc)}
+    )
+
+
 @app.exception_handler(RequestValidationError)
 def request_validation_exception_handler(
     request: Request, exc: RequestValidationError
@@ -164,14 +1130,38 @@ if bool(write_tmp_on_disk):
             "/vis_output", StaticFiles(directory=write_tmp_on_disk), name="vis_output"
         )
         templates = Jinja2Templates(directory=str(project_root_folder / "static"))
+        # scan the folder once, then the background writer keeps the index updated
+        artifact_writer = get_artifact_writer(write_tmp_on_disk)
 
         @app.get("/vis_output", response_class=HTMLResponse)
-        def list_files(request: Request) -> Response:
-            files = os.listdir(write_tmp_on_disk)
-            files_paths = sorted([f"{request.url._url}/{f}" for f in files])
-            app_logger.info(f"files_paths: '{files_paths}'")
+        def list_files(
+            request: Request,
+            offset: int = Query(default=0, ge=0),
+            limit: int = Query(default=VIS_OUTPUT_PAGE_SIZE, ge=1, le=1000),
+        ) -> Response:
+            # a page of the indexed artifacts, the newest first
+            total, artifacts = artifact_writer.list_artifacts(offset, limit)
+            base_url = request.url.replace(query="")
+            files_paths = [f"{base_url}/{artifact.name}" for artifact in artifacts]
+            app_logger.debug(f"files_paths: '{files_paths}'")
+            next_url, previous_url = None, None
+            if offset + limit < total:
+                next_url = f"{base_url}?offset={offset + limit}&limit={limit}"
+            if offset > 0:
+                previous_url = (
+                    f"{base_url}?offset={max(offset - limit, 0)}&limit={limit}"
+                )
             return templates.TemplateResponse(
-                "list_files.html", {"request": request, "files": files_paths}
+                request,
+                "list_files.html",
+                {
+                    "files": files_paths,
+                    "total": total,
+                    "first": offset + 1 if artifacts else 0,
+                    "last": offset + len(artifacts),
+                    "next_url": next_url,
+                    "previous_url": previous_url,
+                },
             )
     except (AssertionError, RuntimeError) as rerr:
         app_logger.error(
@@ -179,12 +1169,17 @@ if bool(write_tmp_on_disk):
         )
         raise rerr
 
-frontend_builder.build_frontend(
+startup_timer.mark("folders")
+frontend_built = ensure_frontend(
     project_root_folder=workdir,
     input_css_path=input_css_path,
     output_dist_folder=static_dist_folder,
+    mode=frontend_build_mode,
 )
-app_logger.info("build_frontend ok!")
+app_logger.info(
+    f"build_frontend ok (mode {frontend_build_mode}, built:{frontend_built})!"
+)
+startup_timer.mark("frontend")
 
 # eventually needed for tailwindcss output.css
 app.mount(
@@ -205,6 +1200,10 @@ app_logger.info(f"Mounted index on url path {vite_index_url} .")
 
 # add the CorrelationIdMiddleware AFTER the @app.middleware("http") decorated function to avoid missing request id
 app.add_middleware(CorrelationIdMiddleware)
+startup_timer.mark("mounts")
+app_logger.info(
+    f"app ready in {startup_timer.total:.3f}s, phases:{startup_timer.phases}."
+)
 
 
 if __name__ == "__main__":
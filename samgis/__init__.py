@@ -0,0 +1 @@
+"""Get machine learning predictions from geodata raster images (backend package)"""
@@ -0,0 +1 @@
+"""input/output helpers for raster and vector geodata"""
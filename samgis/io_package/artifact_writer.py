@@ -0,0 +1,272 @@
+"""background writer of the debug/visualization artifacts (WRITE_TMP_ON_DISK), with retention and an index"""
+
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Callable
+from dataclasses import dataclass
+from itertools import islice
+from pathlib import Path
+
+from samgis_core import app_logger
+
+from samgis.utilities.constants import (
+    VIS_OUTPUT_MAX_AGE,
+    VIS_OUTPUT_MAX_BYTES,
+    VIS_OUTPUT_MAX_FILES,
+    VIS_OUTPUT_QUEUE_SIZE,
+)
+
+__all__ = [
+    "Artifact",
+    "ArtifactWriter",
+    "get_artifact_writer",
+]
+
+# the write callables receive the output folder (a str, as the samgis_web raster_helpers writers)
+# and return the written file(s)
+type WriteArtifact = Callable[[str], Path | tuple[Path, ...]]
+
+_artifact_writers: dict[str, "ArtifactWriter"] = {}
+_artifact_writers_lock = threading.Lock()
+
+
+@dataclass(frozen=True)
+class Artifact:
+    """File written within the artifacts folder, with its size and modification time"""
+
+    name: str
+    size: int
+    mtime: float
+
+
+class ArtifactWriter:
+    """
+    Write the artifacts of the requests within a background thread, off the inference path.
+
+    submit() never blocks: with a full queue the artifact is dropped (and counted). The writer
+    keeps an index of the files within the folder (built scanning it once, then updated by every
+    write) ordered by modification time; after every write, and periodically, the oldest files are
+    removed until the folder is within max_files, max_bytes and max_age.
+
+    Args:
+        folder: artifacts folder
+        queue_size: max number of artifacts waiting to be written
+        max_files: max number of files (0 means no limit)
+        max_bytes: max total size of the files (0 means no limit)
+        max_age: max age of the files in seconds (0 means no limit)
+
+    """
+
+    def __init__(
+        self,
+        folder: str | Path,
+        queue_size: int,
+        max_files: int = 0,
+        max_bytes: int = 0,
+        max_age: float = 0,
+    ) -> None:
+        self.folder = Path(folder)
+        self.max_files = max_files
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self._queue: queue.Queue[tuple[str, WriteArtifact] | None] = queue.Queue(
+            maxsize=queue_size
+        )
+        self._entries: OrderedDict[str, Artifact] = OrderedDict()
+        self._current_bytes = 0
+        self._lock = threading.Lock()
+        self.written = 0
+        self.dropped = 0
+        self.failures = 0
+        self.removed = 0
+        self._scan_folder()
+        self._apply_retention()
+        self._thread = threading.Thread(
+            target=self._run, name="samgis-artifact-writer", daemon=True
+        )
+        self._thread.start()
+
+    def _scan_folder(self) -> None:
+        artifacts = []
+        with os.scandir(self.folder) as entries:
+            for entry in entries:
+                if entry.is_file():
+                    st = entry.stat()
+                    artifacts.append(Artifact(entry.name, st.st_size, st.st_mtime))
+        with self._lock:
+            for artifact in sorted(artifacts, key=lambda artifact: artifact.mtime):
+                self._add(artifact)
+        app_logger.info(f"artifacts folder {self.folder}: {len(artifacts)} files.")
+
+    def _add(self, artifact: Artifact) -> None:
+        # called holding self._lock, an overwritten file becomes the newest one
+        previous = self._entries.pop(artifact.name, None)
+        if previous is not None:
+            self._current_bytes -= previous.size
+        self._entries[artifact.name] = artifact
+        self._current_bytes += artifact.size
+
+    def _is_over_limits(self, oldest: Artifact, now: float) -> bool:
+        return (
+            (self.max_files > 0 and len(self._entries) > self.max_files)
+            or (self.max_bytes > 0 and self._current_bytes > self.max_bytes)
+            or (self.max_age > 0 and now - oldest.mtime > self.max_age)
+        )
+
+    def _apply_retention(self) -> None:
+        now = time.time()
+        removed = []
+        with self._lock:
+            while self._entries:
+                oldest = next(iter(self._entries.values()))
+                if not self._is_over_limits(oldest, now):
+                    break
+                del self._entries[oldest.name]
+                self._current_bytes -= oldest.size
+                removed.append(oldest.name)
+            self.removed += len(removed)
+        for name in removed:
+            (self.folder / name).unlink(missing_ok=True)
+        if removed:
+            app_logger.debug(f"artifacts retention: removed {len(removed)} files.")
+
+    def _write(self, name: str, write: WriteArtifact) -> None:
+        try:
+            written = write(str(self.folder))
+        except (OSError, ValueError) as e_write:
+            # e.g. a full disk, a removed folder, an image PIL/rasterio can't encode
+            with self._lock:
+                self.failures += 1
+            app_logger.error(f"failed writing artifact {name}: {e_write}.")
+            return
+        paths = (written,) if isinstance(written, Path) else written
+        artifacts = []
+        for path in paths:
+            try:
+                st = path.stat()
+            except FileNotFoundError:
+                continue
+            artifacts.append(Artifact(path.name, st.st_size, st.st_mtime))
+        with self._lock:
+            for artifact in artifacts:
+                self._add(artifact)
+            self.written += 1
+
+    def _run(self) -> None:
+        # wake up periodically to remove the files older than max_age, even without new writes
+        interval = min(self.max_age, 60.0) if self.max_age > 0 else None
+        while True:
+            try:
+                item = self._queue.get(timeout=interval)
+            except queue.Empty:
+                self._apply_retention()
+                continue
+            if item is None:
+                self._queue.task_done()
+                return
+            name, write = item
+            try:
+                self._write(name, write)
+                self._apply_retention()
+            except Exception:
+                # a bug of a write callable: keep the thread alive, or the next artifacts would be
+                # dropped with a full queue and flush() would wait forever
+                with self._lock:
+                    self.failures += 1
+                app_logger.exception(f"artifact writer error on {name}.")
+            finally:
+                self._queue.task_done()
+
+    def submit(self, name: str, write: WriteArtifact) -> bool:
+        """
+        Queue an artifact to be written in background, without waiting.
+
+        Args:
+            name: artifact name, for the logs
+            write: callable writing the artifact within the folder passed as argument, returning
+                the written file path(s); it must bind its data (e.g. with functools.partial)
+                since it runs later
+
+        Returns:
+            False if the artifact was dropped because the queue is full
+
+        """
+        try:
+            self._queue.put_nowait((name, write))
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            app_logger.warning(f"artifacts queue full, dropped artifact {name}.")
+            return False
+        return True
+
+    def flush(self) -> None:
+        """Wait until all the queued artifacts are written"""
+        self._queue.join()
+
+    def stop(self) -> None:
+        """Write the queued artifacts, then stop the background thread"""
+        self._queue.put(None)
+        self._thread.join()
+
+    def list_artifacts(
+        self, offset: int = 0, limit: int = 0
+    ) -> tuple[int, list[Artifact]]:
+        """
+        Return a page of the indexed artifacts, the newest first, without reading the folder.
+
+        Args:
+            offset: artifacts to skip
+            limit: max number of artifacts (0 means all)
+
+        Returns:
+            the total number of artifacts and the page ones
+
+        """
+        with self._lock:
+            newest_first = reversed(self._entries.values())
+            stop = offset + limit if limit > 0 else None
+            return len(self._entries), list(islice(newest_first, offset, stop))
+
+    def stats(self) -> dict[str, int]:
+        """Return the writer counters"""
+        with self._lock:
+            return {
+                "queued": self._queue.qsize(),
+                "written": self.written,
+                "dropped": self.dropped,
+                "failures": self.failures,
+                "removed": self.removed,
+                "files": len(self._entries),
+                "bytes": self._current_bytes,
+            }
+
+
+def get_artifact_writer(folder: str | Path) -> ArtifactWriter:
+    """
+    Return the process-wide ArtifactWriter of the folder, configured by these env variables:
+
+    - VIS_OUTPUT_QUEUE_SIZE: max number of artifacts waiting to be written
+    - VIS_OUTPUT_MAX_FILES: max number of files within the folder
+    - VIS_OUTPUT_MAX_BYTES: max total size of the files within the folder
+    - VIS_OUTPUT_MAX_AGE: max age of the files in seconds
+
+    """
+    key = str(folder)
+    with _artifact_writers_lock:
+        writer = _artifact_writers.get(key)
+        if writer is None:
+            writer = ArtifactWriter(
+                folder,
+                queue_size=int(
+                    os.getenv("VIS_OUTPUT_QUEUE_SIZE", VIS_OUTPUT_QUEUE_SIZE)
+                ),
+                max_files=int(os.getenv("VIS_OUTPUT_MAX_FILES", VIS_OUTPUT_MAX_FILES)),
+                max_bytes=int(os.getenv("VIS_OUTPUT_MAX_BYTES", VIS_OUTPUT_MAX_BYTES)),
+                max_age=float(os.getenv("VIS_OUTPUT_MAX_AGE", VIS_OUTPUT_MAX_AGE)),
+            )
+            _artifact_writers[key] = writer
+        return writer
@@ -0,0 +1,117 @@
+"""vectorized conversions between latitude-longitude, world/image pixel and web mercator coordinates"""
+
+import numpy as np
+from numpy import ndarray
+from numpy.typing import ArrayLike
+from samgis_web.utilities.constants import EARTH_EQUATORIAL_RADIUS, TILE_SIZE
+
+__all__ = [
+    "LatLngPixelTransform",
+    "get_3857_to_4326",
+    "get_4326_to_3857",
+    "get_latlng_to_world_pixels",
+]
+
+# same sin(lat) clipping of samgis_web, avoiding an infinite y at the poles
+_MAX_SIN_LAT = 0.9999
+
+
+def get_latlng_to_world_pixels(
+    lat: ArrayLike, lng: ArrayLike, zoom: float
+) -> tuple[ndarray, ndarray]:
+    """
+    Project latitude-longitude points to world pixel coordinates at the given zoom: same output of
+    samgis_web.io_package.coordinates_pixel_conversion._get_point_latlng_to_pixel_coordinates(),
+    computed on all the points at once.
+
+    Args:
+        lat: latitudes
+        lng: longitudes
+        zoom: Level of detail
+
+    Returns:
+        world pixel x and y (int64 arrays, same shape of the inputs)
+
+    """
+    lat, lng = np.asarray(lat, dtype=np.float64), np.asarray(lng, dtype=np.float64)
+    sin_y = np.clip(np.sin(lat * np.pi / 180), -_MAX_SIN_LAT, _MAX_SIN_LAT)
+    x = TILE_SIZE * (0.5 + lng / 360)
+    y = TILE_SIZE * (0.5 - np.log((1 + sin_y) / (1 - sin_y)) / (4 * np.pi))
+    scale = 2**zoom
+    return np.floor(x * scale).astype(np.int64), np.floor(y * scale).astype(np.int64)
+
+
+class LatLngPixelTransform:
+    """
+    Conversion between latitude-longitude points and the pixels of the image of a request bbox,
+    with the bbox origin (the world pixels of its west and north edges) computed once. The pixel
+    coordinates are the same of samgis_web get_latlng_to_pixel_coordinates().
+
+    Args:
+        ne_lat: bbox north-east corner latitude
+        ne_lng: bbox north-east corner longitude
+        sw_lat: bbox south-west corner latitude
+        sw_lng: bbox south-west corner longitude
+        zoom: Level of detail
+
+    """
+
+    def __init__(
+        self,
+        ne_lat: float,
+        ne_lng: float,
+        sw_lat: float,
+        sw_lng: float,
+        zoom: float,
+    ) -> None:
+        self.zoom = zoom
+        (origin_x, _), (_, origin_y) = (
+            get_latlng_to_world_pixels(sw_lat, sw_lng, zoom),
+            get_latlng_to_world_pixels(ne_lat, ne_lng, zoom),
+        )
+        self.origin_x, self.origin_y = int(origin_x), int(origin_y)
+
+    def to_pixels(self, lat: ArrayLike, lng: ArrayLike) -> tuple[ndarray, ndarray]:
+        """Return the image pixel x and y (int64 arrays) of the latitude-longitude points"""
+        x, y = get_latlng_to_world_pixels(lat, lng, self.zoom)
+        return np.abs(self.origin_x - x), np.abs(self.origin_y - y)
+
+
+def get_4326_to_3857(lat: ArrayLike, lng: ArrayLike) -> tuple[ndarray, ndarray]:
+    """
+    Project latitude-longitude points to web mercator (EPSG:3857): same output of
+    samgis_web.io_package.coordinates_pixel_conversion._from4326_to3857(), on arrays.
+
+    Args:
+        lat: latitudes
+        lng: longitudes
+
+    Returns:
+        web mercator x and y arrays
+
+    """
+    lat, lng = np.asarray(lat, dtype=np.float64), np.asarray(lng, dtype=np.float64)
+    x = np.radians(lng) * EARTH_EQUATORIAL_RADIUS
+    y = np.log(np.tan(np.radians(45 + lat / 2.0))) * EARTH_EQUATORIAL_RADIUS
+    return x, y
+
+
+def get_3857_to_4326(coordinates: ndarray, precision: int | None = None) -> ndarray:
+    """
+    Closed-form inverse of the spherical (web) mercator projection, on all the points at once.
+
+    Args:
+        coordinates: (N, 2) array of web mercator x, y
+        precision: decimal digits of the output coordinates, None for full precision
+
+    Returns:
+        (N, 2) array of longitude, latitude
+
+    """
+    xy = coordinates / EARTH_EQUATORIAL_RADIUS
+    lng = np.degrees(xy[:, 0])
+    lat = np.degrees(np.pi / 2 - 2 * np.arctan(np.exp(-xy[:, 1])))
+    lnglat = np.column_stack((lng, lat))
+    if precision is not None:
+        lnglat = np.round(lnglat, precision)
+    return lnglat
@@ -0,0 +1,168 @@
+"""polygonize the prediction masks one geojson feature at a time"""
+
+import json
+from collections.abc import Iterable, Iterator
+from itertools import batched, chain
+from typing import Any
+
+import numpy as np
+from affine import Affine
+from numpy import ndarray
+from samgis_core import app_logger
+
+from samgis.io_package.coordinates_pixel_conversion import get_3857_to_4326
+from samgis.utilities.type_hints import PolygonizeOptions
+
+__all__ = [
+    "get_vectorized_raster_as_geojson",
+    "iter_vectorized_raster_as_geojson_features",
+]
+
+# the shapes are reprojected in batches, keeping the streaming memory bounded
+POLYGONIZE_BATCH_SIZE = 256
+
+
+def _get_batch_coordinates(
+    geometries: list[dict[str, Any]],
+) -> tuple[ndarray, list[int], list[int]]:
+    # return the coordinates of all the rings of the polygons batch, the ring sizes and the rings
+    # number of every polygon
+    rings = [ring for geometry in geometries for ring in geometry["coordinates"]]
+    coordinates = np.asarray(list(chain.from_iterable(rings)), dtype=np.float64)
+    return (
+        coordinates,
+        [len(ring) for ring in rings],
+        [len(geometry["coordinates"]) for geometry in geometries],
+    )
+
+
+def _get_simplified_coordinates(
+    geometries: list[dict[str, Any]], tolerance: float
+) -> Iterator[tuple[ndarray, list[int], list[int]]]:
+    # the polygons of a mask tile its whole extent: the coverage is simplified with a single
+    # shapely call, so that every edge shared by two polygons (and the holes matching the polygons
+    # within them) is simplified once and the polygons keep tiling without gaps or overlaps
+    import shapely
+
+    polygons = shapely.coverage_simplify(
+        [
+            shapely.polygons(
+                shapely.linearrings(geometry["coordinates"][0]),
+                holes=[
+                    shapely.linearrings(ring) for ring in geometry["coordinates"][1:]
+                ]
+                or None,
+            )
+            for geometry in geometries
+        ],
+        tolerance,
+    )
+    for start in range(0, len(polygons), POLYGONIZE_BATCH_SIZE):
+        batch = polygons[start : start + POLYGONIZE_BATCH_SIZE]
+        rings, polygon_index = shapely.get_rings(batch, return_index=True)
+        coordinates, ring_index = shapely.get_coordinates(rings, return_index=True)
+        yield (
+            coordinates,
+            np.bincount(ring_index, minlength=len(rings)).tolist(),
+            np.bincount(polygon_index, minlength=len(batch)).tolist(),
+        )
+
+
+def _iter_batches(
+    mask_shapes: Iterable[tuple[dict[str, Any], float]], tolerance: float
+) -> Iterator[tuple[tuple, tuple[ndarray, list[int], list[int]]]]:
+    # yield the batches of the mask shapes together with their rings coordinates
+    if tolerance <= 0:
+        for batch in batched(mask_shapes, POLYGONIZE_BATCH_SIZE):
+            yield batch, _get_batch_coordinates([geometry for geometry, _ in batch])
+        return
+    all_shapes = list(mask_shapes)
+    yield from zip(
+        batched(all_shapes, POLYGONIZE_BATCH_SIZE),
+        _get_simplified_coordinates(
+            [geometry for geometry, _ in all_shapes], tolerance
+        ),
+    )
+
+
+def iter_vectorized_raster_as_geojson_features(
+    mask: ndarray, transform: Affine, options: PolygonizeOptions | None = None
+) -> Iterator[dict[str, Any]]:
+    """
+    Lazily yield the shapes of the connected regions within the mask as geojson features in
+    EPSG:4326 (same features of samgis_web.io_package.geo_helpers.get_vectorized_raster_as_geojson()),
+    without building the whole feature collection in memory.
+
+    With the polygonization options, before polygonizing the regions smaller than min_area pixels
+    are merged into the surrounding ones (GDAL sieve filter), then the polygons are simplified as a
+    coverage with a tolerance of simplify_tolerance pixels (the adjacent polygons keep sharing
+    their edges, this needs all the shapes of the mask at once) and their coordinates are rounded
+    to precision decimal digits.
+
+    Args:
+        mask: numpy mask
+        transform: Affine transform (EPSG:3857) of the mask
+        options: optional polygonization options
+
+    Returns:
+        iterator of geojson features
+
+    """
+    from rasterio.features import shapes, sieve
+
+    options = options or PolygonizeOptions()
+    app_logger.debug(
+        f"streaming the mask shapes with transform {transform}, options {options}."
+    )
+    if options.min_area > 1:
+        mask = sieve(mask, size=options.min_area)
+    # the transform pixel size converts the tolerance to EPSG:3857 units
+    tolerance = options.simplify_tolerance * abs(transform.a)
+    n = 0
+    for batch, (coordinates, ring_sizes, polygon_sizes) in _iter_batches(
+        shapes(mask, mask=None, transform=transform), tolerance
+    ):
+        lnglat = get_3857_to_4326(coordinates, options.precision).tolist()
+        ring_ends = np.cumsum(ring_sizes).tolist()
+        ring_starts = [0, *ring_ends[:-1]]
+        n_ring = 0
+        for (geometry, value), n_polygon_rings in zip(batch, polygon_sizes):
+            yield {
+                "id": str(n),
+                "type": "Feature",
+                "properties": {"raster_val": value},
+                "geometry": {
+                    "type": geometry["type"],
+                    "coordinates": [
+                        lnglat[ring_starts[r] : ring_ends[r]]
+                        for r in range(n_ring, n_ring + n_polygon_rings)
+                    ],
+                },
+            }
+            n += 1
+            n_ring += n_polygon_rings
+    app_logger.info(f"streamed {n} polygons.")
+
+
+def get_vectorized_raster_as_geojson(
+    mask: ndarray, transform: Affine, options: PolygonizeOptions | None = None
+) -> dict[str, str | int]:
+    """
+    Same contract of samgis_web.io_package.geo_helpers.get_vectorized_raster_as_geojson() (a geojson
+    FeatureCollection string in EPSG:4326 and its shapes number), without the GeoDataFrame creation
+    and the pyproj reprojection, supporting the polygonization options.
+
+    Args:
+        mask: numpy mask
+        transform: Affine transform (EPSG:3857) of the mask
+        options: optional polygonization options
+
+    Returns:
+        dict containing the output geojson and the geojson shapes number
+
+    """
+    features = list(
+        iter_vectorized_raster_as_geojson_features(mask, transform, options)
+    )
+    geojson = json.dumps({"type": "FeatureCollection", "features": features})
+    return {"geojson": geojson, "n_shapes_geojson": len(features)}
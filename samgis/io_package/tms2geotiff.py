@@ -0,0 +1,646 @@
+"""Download, merge and crop XYZ tiles with a concurrent, connection pooled fetcher and an on-disk tile cache"""
+
+import hashlib
+import io
+import json
+import math
+import os
+import tempfile
+import threading
+import time
+from collections.abc import Callable
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+from affine import Affine
+from numpy import ndarray
+from samgis_core import app_logger
+from samgis_web.utilities.constants import N_CONNECTION, N_MAX_RETRIES, N_WAIT
+from samgis_web.utilities.type_hints import tuple_ndarray_transform
+from xyzservices import TileProvider
+
+from samgis.io_package.coordinates_pixel_conversion import get_4326_to_3857
+from samgis.utilities.constants import (
+    MOSAIC_MAX_PIXELS,
+    TILE_CACHE_DEFAULT_TTL,
+    TILE_CACHE_MAX_BYTES,
+    TILE_FETCH_TIMEOUT,
+    TILE_FETCH_USER_AGENT,
+)
+from samgis.utilities.metrics import record_stage, stage_timer
+
+__all__ = [
+    "MosaicGeometry",
+    "MosaicTooLargeError",
+    "TileCache",
+    "TileFetcher",
+    "download_extent",
+    "get_mosaic_geometry",
+    "get_tile_fetcher",
+]
+
+n_connection = int(os.getenv("N_CONNECTION", N_CONNECTION))
+n_max_retries = int(os.getenv("N_MAX_RETRIES", N_MAX_RETRIES))
+n_wait = int(os.getenv("N_WAIT", N_WAIT))
+mosaic_max_pixels = int(os.getenv("MOSAIC_MAX_PIXELS", MOSAIC_MAX_PIXELS))
+mosaic_mmap_folder = os.getenv("MOSAIC_MMAP_FOLDER", "") or None
+# size of the tiles of almost every XYZ source, to check the pixels budget before any download
+_NOMINAL_TILE_SIZE = 256
+_tile_fetcher: "TileFetcher | None" = None
+_tile_fetcher_lock = threading.Lock()
+
+
+def _sha256(content: bytes) -> str:
+    return hashlib.sha256(content).hexdigest()
+
+
+class TileCache:
+    """
+    Content-addressed on-disk cache of the raw tiles.
+
+    Each tile body is stored once under objects/ using the sha256 of its content (identical tiles,
+    e.g. sea or empty tiles, share the same file); refs/ maps the sha256 of every tile url to its
+    object and download time. Refs older than the TTL of their tile source are considered expired;
+    the objects are evicted starting from the least recently used when exceeding max_bytes.
+
+    Args:
+        folder: cache root folder
+        max_bytes: size budget for the cached tiles objects (0 means no limit)
+        default_ttl: time to live in seconds for the cached tiles
+        ttl_by_source: time to live in seconds keyed by tile source name, overriding default_ttl
+
+    """
+
+    def __init__(
+        self,
+        folder: str | Path,
+        max_bytes: int = TILE_CACHE_MAX_BYTES,
+        default_ttl: int = TILE_CACHE_DEFAULT_TTL,
+        ttl_by_source: dict[str, int] | None = None,
+    ) -> None:
+        self.folder = Path(folder)
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self.ttl_by_source = ttl_by_source or {}
+        self._objects_folder = self.folder / "objects"
+        self._refs_folder = self.folder / "refs"
+        self._objects_folder.mkdir(parents=True, exist_ok=True)
+        self._refs_folder.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._current_bytes = sum(p.stat().st_size for p in self._iter_objects())
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+
+    def get_ttl(self, source_name: str) -> int:
+        return self.ttl_by_source.get(source_name, self.default_ttl)
+
+    def _ref_path(self, url: str) -> Path:
+        url_hash = _sha256(url.encode("utf-8"))
+        return self._refs_folder / url_hash[:2] / f"{url_hash}.json"
+
+    def _object_path(self, content_hash: str) -> Path:
+        return self._objects_folder / content_hash[:2] / content_hash
+
+    def get(self, url: str, source_name: str) -> bytes | None:
+        """Return the cached tile content for the url, None if missing or expired"""
+        ref_path = self._ref_path(url)
+        try:
+            ref = json.loads(ref_path.read_text())
+            if time.time() - ref["fetched_at"] > self.get_ttl(source_name):
+                with self._lock:
+                    self.expired += 1
+                    self.misses += 1
+                return None
+            object_path = self._object_path(ref["sha256"])
+            content = object_path.read_bytes()
+            os.utime(object_path)
+        except (OSError, ValueError, KeyError):
+            with self._lock:
+                self.misses += 1
+            return None
+        if _sha256(content) != ref["sha256"]:
+            app_logger.error(f"tile cache: corrupted object for url {url}, dropping.")
+            object_path.unlink(missing_ok=True)
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return content
+
+    def put(self, url: str, content: bytes) -> None:
+        """Store the tile content and the reference from its url"""
+        content_hash = _sha256(content)
+        object_path = self._object_path(content_hash)
+        ref_path = self._ref_path(url)
+        try:
+            if not object_path.is_file():
+                self._atomic_write(object_path, content)
+                with self._lock:
+                    self._current_bytes += len(content)
+            self._atomic_write(
+                ref_path,
+                json.dumps(
+                    {"url": url, "sha256": content_hash, "fetched_at": time.time()}
+                ).encode("utf-8"),
+            )
+        except OSError as e_put:
+            app_logger.error(f"tile cache: failed to store tile {url}: {e_put}.")
+            return
+        if 0 < self.max_bytes < self._current_bytes:
+            self._evict()
+
+    def stats(self) -> dict[str, int]:
+        """Return the cache counters"""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "expired": self.expired,
+                "evictions": self.evictions,
+                "bytes": self._current_bytes,
+            }
+
+    def _iter_objects(self):
+        # skip the temporary files written by _atomic_write()
+        return (
+            p for p in self._objects_folder.glob("*/*") if not p.name.startswith(".")
+        )
+
+    @staticmethod
+    def _atomic_write(path: Path, content: bytes) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f".{path.name}.{threading.get_ident()}.tmp")
+        tmp_path.write_bytes(content)
+        os.replace(tmp_path, path)
+
+    def _evict(self) -> None:
+        with self._lock:
+            objects = []
+            for path in self._iter_objects():
+                try:
+                    objects.append((path, path.stat()))
+                except FileNotFoundError:
+                    continue
+            total = sum(st.st_size for _, st in objects)
+            # keep a 10% margin to avoid evicting again on the next put()
+            target = int(self.max_bytes * 0.9)
+            for path, st in sorted(objects, key=lambda obj: obj[1].st_mtime):
+                if total <= target:
+                    break
+                # refs pointing to a removed object become cache misses
+                path.unlink(missing_ok=True)
+                total -= st.st_size
+                self.evictions += 1
+            self._current_bytes = total
+
+
+class TileFetcher:
+    """
+    Download the XYZ tiles in parallel using a bounded thread pool and a keep-alive
+    requests.Session (with its own connection pool) for every tile source.
+
+    Args:
+        max_workers: max number of concurrent tile downloads
+        cache: optional TileCache instance
+        wait: seconds to wait between a failed request and the next try
+        max_retries: total number of retries for a failing tile before raising an error
+        timeout: timeout in seconds of every tile request
+
+    """
+
+    def __init__(
+        self,
+        max_workers: int = n_connection,
+        cache: TileCache | None = None,
+        wait: int = n_wait,
+        max_retries: int = n_max_retries,
+        timeout: float = TILE_FETCH_TIMEOUT,
+    ) -> None:
+        if max_workers < 1:
+            raise ValueError("max_workers must be a positive integer value.")
+        self.max_workers = max_workers
+        self.cache = cache
+        self.wait = wait
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="tile_fetcher"
+        )
+        self._sessions: dict[str, Any] = {}
+        self._sessions_lock = threading.Lock()
+
+    def _get_session(self, source_name: str) -> Any:
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        with self._sessions_lock:
+            session = self._sessions.get(source_name)
+            if session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_workers)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                session.headers.update({"user-agent": TILE_FETCH_USER_AGENT})
+                self._sessions[source_name] = session
+            return session
+
+    def _download(self, url: str, source_name: str) -> bytes:
+        import requests
+
+        session = self._get_session(source_name)
+        retries = self.max_retries
+        while True:
+            try:
+                response = session.get(url, timeout=self.timeout)
+            except requests.RequestException as e_request:
+                error: Exception = e_request
+            else:
+                if response.status_code == 404:
+                    raise requests.HTTPError(
+                        f"Tile URL resulted in a 404 error. Double-check your tile url: {url}"
+                    )
+                if response.ok:
+                    return response.content
+                error = requests.HTTPError(
+                    f"{response.status_code} Error: {response.reason} for url: {url}"
+                )
+            if retries <= 0:
+                raise error
+            retries -= 1
+            app_logger.warning(f"tile download error for {url}: {error}, retrying...")
+            time.sleep(self.wait)
+
+    def fetch(self, url: str, source_name: str) -> ndarray:
+        """Return the RGBA tile at the given url, reading it from the cache when possible"""
+        from PIL import Image
+
+        content = self.cache.get(url, source_name) if self.cache else None
+        if content is None:
+            content = self._download(url, source_name)
+            if self.cache is not None:
+                self.cache.put(url, content)
+        with io.BytesIO(content) as image_stream, Image.open(image_stream) as image:
+            return np.asarray(image.convert("RGBA"))
+
+    def fetch_each(
+        self,
+        urls: list[str],
+        source_name: str,
+        consume: Callable[[int, ndarray], None],
+    ) -> None:
+        """
+        Fetch the tiles at the given urls in parallel, passing every RGBA tile with its index to
+        consume() within the worker thread as soon as it's ready, so that no more than max_workers
+        tiles are kept in memory. On the first error the pending tiles are cancelled.
+
+        Args:
+            urls: tile urls
+            source_name: tile source name
+            consume: callable receiving the index of the tile url and the tile
+
+        """
+        futures = [
+            self._executor.submit(
+                lambda n, url: consume(n, self.fetch(url, source_name)), n, url
+            )
+            for n, url in enumerate(urls)
+        ]
+        done, not_done = wait(futures, return_when=FIRST_EXCEPTION)
+        for future in not_done:
+            future.cancel()
+        for future in done:
+            future.result()
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True)
+        with self._sessions_lock:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions.clear()
+
+
+def get_tile_fetcher() -> TileFetcher:
+    """
+    Return the process-wide TileFetcher, configured by these env variables:
+
+    - N_CONNECTION, N_MAX_RETRIES, N_WAIT: same meaning of the samgis_web ones
+    - TILE_CACHE_FOLDER: tile cache folder (on-disk tile cache disabled if empty)
+    - TILE_CACHE_MAX_BYTES: tile cache size budget
+    - TILE_CACHE_DEFAULT_TTL: default time to live in seconds of the cached tiles
+    - TILE_CACHE_TTL_BY_SOURCE: json object with the time to live in seconds keyed by tile source name
+
+    """
+    global _tile_fetcher
+    with _tile_fetcher_lock:
+        if _tile_fetcher is None:
+            cache_folder = os.getenv("TILE_CACHE_FOLDER", "")
+            cache = None
+            if cache_folder:
+                cache = TileCache(
+                    cache_folder,
+                    max_bytes=int(
+                        os.getenv("TILE_CACHE_MAX_BYTES", TILE_CACHE_MAX_BYTES)
+                    ),
+                    default_ttl=int(
+                        os.getenv("TILE_CACHE_DEFAULT_TTL", TILE_CACHE_DEFAULT_TTL)
+                    ),
+                    ttl_by_source=json.loads(
+                        os.getenv("TILE_CACHE_TTL_BY_SOURCE", "{}")
+                    ),
+                )
+            _tile_fetcher = TileFetcher(max_workers=n_connection, cache=cache)
+            app_logger.info(
+                f"tile fetcher ready, max_workers:{n_connection}, cache folder:'{cache_folder}'."
+            )
+        return _tile_fetcher
+
+
+class MosaicTooLargeError(ValueError):
+    """The cropped tiles mosaic of a request exceeds the pixels budget"""
+
+
+@dataclass(frozen=True)
+class MosaicGeometry:
+    """
+    Placement of the tiles within the cropped mosaic: the crop window is relative to the (never
+    allocated) full mosaic of the tiles; the pixels of the window whose centers fall outside the
+    requested bbox (only on its edges) are left to 0.
+    """
+
+    tile_height: int
+    tile_width: int
+    min_tile_x: int
+    min_tile_y: int
+    row_off: int
+    col_off: int
+    height: int
+    width: int
+    valid_rows: slice
+    valid_cols: slice
+    transform: Affine
+
+    @property
+    def n_pixels(self) -> int:
+        return self.height * self.width
+
+
+def get_mosaic_geometry(
+    tiles: list,
+    tile_height: int,
+    tile_width: int,
+    w: float,
+    s: float,
+    e: float,
+    n: float,
+) -> MosaicGeometry:
+    """
+    Compute the crop window of the bbox within the mosaic of the tiles and its Affine transform,
+    with the same output of contextily.tile._merge_tiles() followed by samgis_web.io_package.tms2geotiff.crop_raster()
+    (same transform, same window rounding, same masking of the edge pixels) without the mosaic.
+
+    Args:
+        tiles: list of mercantile.Tile objects, covering the bbox
+        tile_height: tiles height in pixels
+        tile_width: tiles width in pixels
+        w: West edge
+        s: South edge
+        e: East edge
+        n: North edge
+
+    Returns:
+        MosaicGeometry instance
+
+    """
+    import mercantile
+    from rasterio import windows
+
+    min_tile_x, max_tile_x = min(t.x for t in tiles), max(t.x for t in tiles)
+    min_tile_y, max_tile_y = min(t.y for t in tiles), max(t.y for t in tiles)
+    zoom = tiles[0].z
+    mosaic_height = (max_tile_y - min_tile_y + 1) * tile_height
+    mosaic_width = (max_tile_x - min_tile_x + 1) * tile_width
+    bounds_nw = mercantile.bounds(mercantile.Tile(min_tile_x, min_tile_y, zoom))
+    bounds_se = mercantile.bounds(mercantile.Tile(max_tile_x, max_tile_y, zoom))
+    left, top = mercantile.xy(bounds_nw.west, bounds_nw.north)
+    right, bottom = mercantile.xy(bounds_se.east, bounds_se.south)
+    # same half pixel shifted transform of samgis_web.io_package.tms2geotiff.get_transform_raster()
+    res_x = (right - left) / mosaic_width
+    res_y = (top - bottom) / mosaic_height
+    # as rasterio.transform.from_origin(), typed as an Affine
+    mosaic_transform = Affine(
+        res_x, 0.0, left - res_x / 2, 0.0, -res_y, top + res_y / 2
+    )
+
+    # the south-west and north-east bbox corners projected with a single call
+    (xp1, xp0), (yp1, yp0) = (
+        values.tolist() for values in get_4326_to_3857([s, n], [w, e])
+    )
+    # same outermost pixels window of rasterio.features.geometry_window(), within the mosaic
+    bbox_window = windows.from_bounds(xp1, yp1, xp0, yp0, transform=mosaic_transform)
+    col_off = max(math.floor(bbox_window.col_off), 0)
+    row_off = max(math.floor(bbox_window.row_off), 0)
+    col_stop = min(math.ceil(bbox_window.col_off + bbox_window.width), mosaic_width)
+    row_stop = min(math.ceil(bbox_window.row_off + bbox_window.height), mosaic_height)
+    height, width = max(row_stop - row_off, 0), max(col_stop - col_off, 0)
+    # as rasterio.windows.transform() of the window
+    transform = Affine(
+        res_x,
+        0.0,
+        mosaic_transform.c + col_off * res_x,
+        0.0,
+        -res_y,
+        mosaic_transform.f - row_off * res_y,
+    )
+
+    # rasterio.mask.mask() keeps the pixels with the center within the bbox (all_touched=False)
+    cols_center = transform.c + (np.arange(width) + 0.5) * transform.a
+    rows_center = transform.f + (np.arange(height) + 0.5) * transform.e
+    valid_cols = np.flatnonzero((cols_center >= xp1) & (cols_center <= xp0))
+    valid_rows = np.flatnonzero((rows_center >= yp1) & (rows_center <= yp0))
+    return MosaicGeometry(
+        tile_height=tile_height,
+        tile_width=tile_width,
+        min_tile_x=min_tile_x,
+        min_tile_y=min_tile_y,
+        row_off=row_off,
+        col_off=col_off,
+        height=height,
+        width=width,
+        valid_rows=slice(valid_rows[0], valid_rows[-1] + 1)
+        if valid_rows.size
+        else slice(0, 0),
+        valid_cols=slice(valid_cols[0], valid_cols[-1] + 1)
+        if valid_cols.size
+        else slice(0, 0),
+        transform=transform,
+    )
+
+
+def _check_pixels_budget(geometry: MosaicGeometry, max_pixels: int) -> None:
+    if 0 < max_pixels < geometry.n_pixels:
+        raise MosaicTooLargeError(
+            f"requested image of {geometry.height}x{geometry.width} pixels, over the budget of {max_pixels} pixels: use a smaller bbox or a lower zoom"
+        )
+
+
+def _allocate_image(height: int, width: int, mmap_folder: str | Path | None) -> ndarray:
+    if mmap_folder is None:
+        # untouched zero pages aren't resident: the memory grows while the tiles are written
+        return np.zeros((height, width, 3), dtype=np.uint8)
+    # file-backed pages can be written back to disk under memory pressure; the file has no name
+    # and is removed by the OS when the array (and its views) are released
+    Path(mmap_folder).mkdir(parents=True, exist_ok=True)
+    with tempfile.TemporaryFile(dir=mmap_folder) as mmap_file:
+        return np.memmap(mmap_file, dtype=np.uint8, mode="w+", shape=(height, width, 3))
+
+
+class _MosaicWriter:
+    """
+    Write every tile (as soon as it's downloaded) straight into the preallocated cropped image,
+    RGB only: neither the full mosaic nor the list of the tiles is ever kept in memory.
+    """
+
+    def __init__(
+        self,
+        tiles: list,
+        bbox: tuple[float, float, float, float],
+        max_pixels: int,
+        mmap_folder: str | Path | None,
+    ) -> None:
+        self.tiles = tiles
+        self.bbox = bbox
+        self.max_pixels = max_pixels
+        self.mmap_folder = mmap_folder
+        self.geometry: MosaicGeometry | None = None
+        self.image: ndarray | None = None
+        self.write_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def _get_mosaic(
+        self, tile_shape: tuple[int, ...]
+    ) -> tuple[MosaicGeometry, ndarray]:
+        with self._lock:
+            if self.geometry is None or self.image is None:
+                # the tiles size is known with the first downloaded tile
+                geometry = get_mosaic_geometry(
+                    self.tiles, tile_shape[0], tile_shape[1], *self.bbox
+                )
+                _check_pixels_budget(geometry, self.max_pixels)
+                self.image = _allocate_image(
+                    geometry.height, geometry.width, self.mmap_folder
+                )
+                self.geometry = geometry
+            return self.geometry, self.image
+
+    def get_result(self) -> tuple_ndarray_transform:
+        """Return the cropped image with its Affine transform, once all the tiles are written"""
+        if self.geometry is None or self.image is None:
+            raise ValueError("no tile written within the mosaic")
+        return self.image, self.geometry.transform
+
+    def write(self, n: int, tile: ndarray) -> None:
+        geometry, image = self._get_mosaic(tile.shape)
+        time_start = time.perf_counter()
+        if tile.shape[:2] != (geometry.tile_height, geometry.tile_width):
+            raise ValueError(
+                f"tile #{n} with shape {tile.shape}, expected {geometry.tile_height}x{geometry.tile_width}"
+            )
+        # tile rows/cols within the cropped image, clipped to the valid ones
+        row_start = (
+            self.tiles[n].y - geometry.min_tile_y
+        ) * geometry.tile_height - geometry.row_off
+        col_start = (
+            self.tiles[n].x - geometry.min_tile_x
+        ) * geometry.tile_width - geometry.col_off
+        rows = range(
+            max(row_start, geometry.valid_rows.start),
+            min(row_start + geometry.tile_height, geometry.valid_rows.stop),
+        )
+        cols = range(
+            max(col_start, geometry.valid_cols.start),
+            min(col_start + geometry.tile_width, geometry.valid_cols.stop),
+        )
+        if rows and cols:
+            # writes of different tiles never overlap: no lock needed
+            image[rows.start : rows.stop, cols.start : cols.stop] = tile[
+                rows.start - row_start : rows.stop - row_start,
+                cols.start - col_start : cols.stop - col_start,
+                :3,
+            ]
+        with self._lock:
+            self.write_seconds += time.perf_counter() - time_start
+
+
+def download_extent(
+    w: float,
+    s: float,
+    e: float,
+    n: float,
+    zoom: int,
+    source: TileProvider | str,
+    fetcher: TileFetcher | None = None,
+    max_pixels: int | None = None,
+    mmap_folder: str | Path | None = None,
+) -> tuple_ndarray_transform:
+    """
+    Download, merge and crop a list of tiles into a single geo-referenced image.
+    Drop-in replacement of samgis_web.io_package.tms2geotiff.download_extent() using a TileFetcher:
+    the RGB image is allocated once with the size of the cropped bbox and the tiles are written
+    into it while downloading, without the merged mosaic and the in-memory GeoTIFF copies of
+    samgis_web crop_raster(). The peak memory is the output image plus a few tiles.
+
+    Args:
+        w: West edge
+        s: South edge
+        e: East edge
+        n: North edge
+        zoom: Level of detail
+        source: The tile source, a :class:`xyzservices.TileProvider` object or an url template with
+            `{x}`, `{y}`, `{z}` placeholders
+        fetcher: TileFetcher instance, default to the one returned by get_tile_fetcher()
+        max_pixels: pixels budget of the output image (0 means no limit), default MOSAIC_MAX_PIXELS
+        mmap_folder: folder for a memory-mapped output image, default MOSAIC_MMAP_FOLDER (None
+            allocates it in memory)
+
+    Returns:
+        cropped raster (a numpy.memmap with mmap_folder) with its Affine transform
+
+    """
+    import mercantile
+
+    max_pixels = mosaic_max_pixels if max_pixels is None else max_pixels
+    mmap_folder = mosaic_mmap_folder if mmap_folder is None else mmap_folder
+    try:
+        if isinstance(source, str):
+            source = TileProvider(url=source, attribution="", name="url")
+        fetcher = fetcher or get_tile_fetcher()
+        tiles = list(mercantile.tiles(w, s, e, n, [int(zoom)]))
+        bbox = (w, s, e, n)
+        # reject the too large requests before downloading any tile
+        _check_pixels_budget(
+            get_mosaic_geometry(tiles, _NOMINAL_TILE_SIZE, _NOMINAL_TILE_SIZE, *bbox),
+            max_pixels,
+        )
+        tile_urls = [source.build_url(x=t.x, y=t.y, z=t.z) for t in tiles]
+        app_logger.info(
+            f"downloading {len(tile_urls)} tiles from source {source.name}, zoom {zoom}."
+        )
+        writer = _MosaicWriter(tiles, bbox, max_pixels, mmap_folder)
+        with stage_timer("tiles"):
+            fetcher.fetch_each(tile_urls, source.name, writer.write)
+        record_stage("mosaic", writer.write_seconds)
+        image, transform = writer.get_result()
+        app_logger.info(f"cropped image::{image.shape}.")
+        return image, transform
+    except MosaicTooLargeError as e_too_large:
+        app_logger.error(f"e_download_extent:{e_too_large}.")
+        raise
+    except Exception as e_download_extent:
+        app_logger.exception(f"e_download_extent:{e_download_extent}.", exc_info=True)
+        raise
@@ -0,0 +1 @@
+"""functions and classes using machine learning instance model(s)"""
@@ -0,0 +1,228 @@
+"""LRU cache of SAM2 image embeddings with a memory budget and an optional on-disk tier"""
+
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+from affine import Affine
+from samgis_core import app_logger
+from samgis_core.utilities.type_hints import ListDict
+
+from samgis.prediction_api.sam2_adapter import ImageEmbedding
+
+__all__ = [
+    "CachedEmbedding",
+    "EmbeddingCache",
+    "get_embedding_cache_key",
+]
+
+_FEATURE_PREFIX = "feature__"
+
+
+@dataclass(frozen=True)
+class CachedEmbedding:
+    """Image embedding together with the Affine transform of the raster used to compute it"""
+
+    embedding: ImageEmbedding
+    transform: Affine
+
+    @property
+    def nbytes(self) -> int:
+        return self.embedding.nbytes
+
+
+def get_embedding_cache_key(
+    source: Any, zoom: float, bbox: ListDict | list, model_variant: str
+) -> str:
+    """
+    Build a stable cache key for the image embedding of a request.
+
+    Args:
+        source: xyz tile provider object or tile url template
+        zoom: Level of detail
+        bbox: coordinates bounding box, as parsed by get_parsed_bbox_points_with_dictlist_prompt()
+        model_variant: machine learning model variant name
+
+    Returns:
+        sha256 hex digest of the canonical json representation of the arguments
+
+    """
+    source_url = getattr(source, "url", None) or str(source)
+    canonical = json.dumps(
+        {
+            "source": source_url,
+            "zoom": int(zoom),
+            "bbox": bbox,
+            "model_variant": model_variant,
+        },
+        sort_keys=True,
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Thread-safe LRU cache for image embeddings.
+
+    The memory tier keeps at most max_bytes of embeddings, evicting the least recently used ones.
+    If disk_folder is set every embedding is also written there as a .npz file, so it's possible
+    to reload it after a restart or after an eviction from the memory tier; the disk tier is kept
+    under disk_max_bytes removing the files with the oldest modification time.
+
+    Args:
+        max_bytes: memory budget for the cached embeddings (0 disables the memory tier)
+        disk_folder: optional folder for the on-disk tier
+        disk_max_bytes: disk budget for the on-disk tier (0 means no limit)
+
+    """
+
+    def __init__(
+        self,
+        max_bytes: int,
+        disk_folder: str | Path | None = None,
+        disk_max_bytes: int = 0,
+    ) -> None:
+        self.max_bytes = max_bytes
+        self.disk_folder = Path(disk_folder) if disk_folder else None
+        self.disk_max_bytes = disk_max_bytes
+        self._entries: OrderedDict[str, CachedEmbedding] = OrderedDict()
+        self._current_bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if self.disk_folder is not None:
+            self.disk_folder.mkdir(parents=True, exist_ok=True)
+
+    def get(self, key: str) -> CachedEmbedding | None:
+        """Return the cached embedding for the key (promoting disk hits to memory), None on miss"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+        entry = self._read_from_disk(key)
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._put_in_memory(key, entry)
+        return entry
+
+    def put(self, key: str, entry: CachedEmbedding) -> None:
+        """Store an embedding in the memory tier and, if enabled, in the disk tier"""
+        with self._lock:
+            self._put_in_memory(key, entry)
+        self._write_on_disk(key, entry)
+
+    def clear(self) -> None:
+        """Empty the memory tier (the disk tier is left untouched)"""
+        with self._lock:
+            self._entries.clear()
+            self._current_bytes = 0
+
+    def stats(self) -> dict[str, int]:
+        """Return the cache counters"""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._current_bytes,
+            }
+
+    def _put_in_memory(self, key: str, entry: CachedEmbedding) -> None:
+        if entry.nbytes > self.max_bytes:
+            app_logger.debug(
+                f"embedding {key} ({entry.nbytes} bytes) exceeds the memory budget."
+            )
+            return
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self._current_bytes -= previous.nbytes
+        self._entries[key] = entry
+        self._current_bytes += entry.nbytes
+        while self._current_bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._current_bytes -= evicted.nbytes
+            self.evictions += 1
+
+    def _disk_path(self, key: str) -> Path:
+        if self.disk_folder is None:
+            raise ValueError("disk tier not enabled")
+        return self.disk_folder / f"{key}.npz"
+
+    def _read_from_disk(self, key: str) -> CachedEmbedding | None:
+        if self.disk_folder is None:
+            return None
+        path = self._disk_path(key)
+        if not path.is_file():
+            return None
+        try:
+            with np.load(path) as npz:
+                features = {
+                    name.removeprefix(_FEATURE_PREFIX): npz[name]
+                    for name in npz.files
+                    if name.startswith(_FEATURE_PREFIX)
+                }
+                orig_h, orig_w = (int(v) for v in npz["orig_hw"])
+                transform = Affine(*(float(v) for v in npz["transform"]))
+            os.utime(path)
+        except (OSError, KeyError, ValueError) as e_read:
+            app_logger.error(
+                f"discarding unreadable cached embedding {path}: {e_read}."
+            )
+            path.unlink(missing_ok=True)
+            return None
+        return CachedEmbedding(
+            embedding=ImageEmbedding(features=features, orig_hw=(orig_h, orig_w)),
+            transform=transform,
+        )
+
+    def _write_on_disk(self, key: str, entry: CachedEmbedding) -> None:
+        if self.disk_folder is None:
+            return
+        path = self._disk_path(key)
+        tmp_path = path.with_suffix(f".{threading.get_ident()}.tmp")
+        arrays: dict[str, np.ndarray] = {
+            "orig_hw": np.array(entry.embedding.orig_hw, dtype=np.int64),
+            "transform": np.array(entry.transform[:6], dtype=np.float64),
+        }
+        for name, value in entry.embedding.features.items():
+            arrays[f"{_FEATURE_PREFIX}{name}"] = value
+        try:
+            with open(tmp_path, "wb") as dst:
+                np.savez(dst, allow_pickle=False, **arrays)
+            os.replace(tmp_path, path)
+        except OSError as e_write:
+            app_logger.error(f"failed writing cached embedding {path}: {e_write}.")
+            tmp_path.unlink(missing_ok=True)
+            return
+        self._evict_from_disk()
+
+    def _evict_from_disk(self) -> None:
+        if self.disk_folder is None or self.disk_max_bytes <= 0:
+            return
+        files = []
+        for path in self.disk_folder.glob("*.npz"):
+            try:
+                files.append((path, path.stat()))
+            except FileNotFoundError:
+                continue  # removed by a concurrent eviction
+        total = sum(st.st_size for _, st in files)
+        for path, st in sorted(files, key=lambda f: f[1].st_mtime):
+            if total <= self.disk_max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= st.st_size
@@ -0,0 +1,502 @@
+"""concurrent, resumable model files download with streaming SHA-256 and a verified-files manifest"""
+
+import hashlib
+import json
+import math
+import os
+import re
+import threading
+import time
+import urllib.request
+from collections.abc import Callable
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from functools import partial
+from pathlib import Path
+
+from samgis_core import app_logger
+from samgis_core.prediction_api import model_registry
+
+from samgis.utilities.constants import (
+    MODEL_DOWNLOAD_CHUNK_SIZE,
+    MODEL_DOWNLOAD_RETRIES,
+    MODEL_DOWNLOAD_TIMEOUT,
+    MODEL_DOWNLOAD_WORKERS,
+    MODEL_VERIFIED_MANIFEST,
+)
+
+__all__ = [
+    "download_model",
+    "get_verified_files",
+    "verify_download",
+    "write_verified_manifest",
+]
+
+_CONTENT_RANGE_PATTERN = re.compile(r"bytes\s+(\d+)-(\d+)/(\d+)")
+_STREAM_BLOCK_SIZE = 1024**2
+
+
+def _read_json(path: Path) -> dict | None:
+    try:
+        with open(path) as src:
+            content = json.load(src)
+    except (OSError, ValueError):
+        return None
+    return content if isinstance(content, dict) else None
+
+
+def _write_json(path: Path, content: dict) -> None:
+    # write then rename, a crash never leaves a truncated json
+    tmp_path = path.with_name(f"{path.name}.tmp")
+    with open(tmp_path, "w") as dst:
+        json.dump(content, dst)
+    os.replace(tmp_path, path)
+
+
+def _stat_signature(path: Path) -> tuple[int, int] | None:
+    try:
+        st = path.stat()
+    except FileNotFoundError:
+        return None
+    return st.st_size, st.st_mtime_ns
+
+
+def get_verified_files(variant: str, model_dir: str | Path) -> set[str]:
+    """
+    Return the model files verified by a previous download or verification: the ones with a
+    manifest entry matching both their current size and modification time and the registry SHA-256.
+
+    Args:
+        variant: model variant, see samgis_core.prediction_api.model_registry.MODELS
+        model_dir: folder containing the model files
+
+    Returns:
+        set of the verified file names, the other files must be hashed
+
+    """
+    model_dir = Path(model_dir)
+    manifest = _read_json(model_dir / MODEL_VERIFIED_MANIFEST) or {}
+    entries = manifest.get("files", {}) if manifest.get("variant") == variant else {}
+    verified = set()
+    for filename, expected_hash in model_registry.MODELS[variant]["sha256"].items():
+        entry = entries.get(filename)
+        if not isinstance(entry, dict) or entry.get("sha256") != expected_hash:
+            continue
+        if _stat_signature(model_dir / filename) == (
+            entry.get("size"),
+            entry.get("mtime_ns"),
+        ):
+            verified.add(filename)
+    return verified
+
+
+def write_verified_manifest(
+    variant: str, model_dir: str | Path, hashes: dict[str, str]
+) -> None:
+    """
+    Record the verified SHA-256 of the model files together with their size and modification time,
+    merged with the still valid manifest entries. The missing files are skipped.
+
+    Args:
+        variant: model variant
+        model_dir: folder containing the model files
+        hashes: file name => verified SHA-256
+
+    """
+    model_dir = Path(model_dir)
+    manifest = _read_json(model_dir / MODEL_VERIFIED_MANIFEST) or {}
+    entries = manifest.get("files", {}) if manifest.get("variant") == variant else {}
+    entries = {
+        filename: entries[filename]
+        for filename in get_verified_files(variant, model_dir)
+        if filename in entries
+    }
+    for filename, sha256 in hashes.items():
+        signature = _stat_signature(model_dir / filename)
+        if signature is not None:
+            size, mtime_ns = signature
+            entries[filename] = {"sha256": sha256, "size": size, "mtime_ns": mtime_ns}
+    _write_json(
+        model_dir / MODEL_VERIFIED_MANIFEST, {"variant": variant, "files": entries}
+    )
+
+
+def verify_download(variant: str, model_dir: str | Path | None = None) -> list[str]:
+    """
+    Same as samgis_core model_registry.verify_download(), but the files recorded within the
+    verified manifest (unchanged since their last verification) aren't hashed again.
+
+    Args:
+        variant: model variant
+        model_dir: folder containing the model files, default model_registry.get_model_dir()
+
+    Returns:
+        list of the files failing the verification (empty = OK)
+
+    """
+    model_dir = Path(model_dir or model_registry.get_model_dir(variant))
+    expected = model_registry.MODELS[variant]["sha256"]
+    if get_verified_files(variant, model_dir) >= set(expected):
+        app_logger.debug(f"model {variant} files verified by the manifest.")
+        return []
+    failures = model_registry.verify_download(variant, model_dir=model_dir)
+    if not failures:
+        try:
+            write_verified_manifest(variant, model_dir, expected)
+        except OSError as e_manifest:
+            app_logger.warning(f"failed writing the verified manifest: {e_manifest}.")
+    return failures
+
+
+class _FileDownload:
+    """
+    Download state of a model file: the chunks are written at their offset within the ".part" file
+    and recorded within the ".part.json" state file, the download resumes from the missing ones.
+    The SHA-256 is computed while the chunks arrive: the out of order chunks wait in memory until
+    the previous ones are hashed, the chunks of a previous run are read back from the ".part" file.
+    """
+
+    def __init__(
+        self,
+        filename: str,
+        url: str,
+        path: Path,
+        size: int,
+        chunk_size: int,
+        expected_sha256: str | None,
+    ) -> None:
+        self.filename = filename
+        self.url = url
+        self.path = path
+        self.size = size
+        self.chunk_size = chunk_size
+        self.expected_sha256 = expected_sha256
+        self.n_chunks = math.ceil(size / chunk_size)
+        self.part_path = path.with_name(f"{path.name}.part")
+        self.state_path = path.with_name(f"{path.name}.part.json")
+        self._state = {"url": url, "size": size, "chunk_size": chunk_size}
+        self._hasher = hashlib.sha256()
+        self._next_hash = 0
+        self._pending: dict[int, bytes] = {}
+        self._lock = threading.Lock()
+        state = _read_json(self.state_path) or {}
+        resumable = self.part_path.is_file() and all(
+            state.get(key) == value for key, value in self._state.items()
+        )
+        self.done: set[int] = set(state.get("done", [])) if resumable else set()
+        self._resumed = frozenset(self.done)
+        if not resumable:
+            with open(self.part_path, "wb") as dst:
+                dst.truncate(size)
+        with self._lock:
+            self._advance_hash()
+        if self._resumed:
+            app_logger.info(
+                f"resuming {filename}: {len(self._resumed)}/{self.n_chunks} chunks already downloaded."
+            )
+
+    @property
+    def hashed_chunks(self) -> int:
+        return self._next_hash
+
+    @property
+    def downloaded_bytes(self) -> int:
+        return min(len(self.done) * self.chunk_size, self.size)
+
+    def get_range(self, index: int) -> tuple[int, int]:
+        """Return the first and the last byte (inclusive, as the HTTP Range header) of a chunk"""
+        start = index * self.chunk_size
+        return start, min(start + self.chunk_size, self.size) - 1
+
+    def missing_chunks(self) -> list[int]:
+        return [index for index in range(self.n_chunks) if index not in self.done]
+
+    def _advance_hash(self) -> None:
+        # called holding self._lock
+        while self._next_hash < self.n_chunks:
+            index = self._next_hash
+            data = self._pending.pop(index, None)
+            if data is None:
+                if index not in self._resumed:
+                    return
+                start, end = self.get_range(index)
+                with open(self.part_path, "rb") as src:
+                    src.seek(start)
+                    data = src.read(end - start + 1)
+            self._hasher.update(data)
+            self._next_hash += 1
+
+    def add_chunk(self, index: int, data: bytes) -> None:
+        """Write a downloaded chunk, record it within the state file and hash it when possible"""
+        with self._lock:
+            # the part file is opened for every chunk: no file handle outlives a failed download
+            with open(self.part_path, "r+b") as dst:
+                dst.seek(index * self.chunk_size)
+                dst.write(data)
+            self.done.add(index)
+            _write_json(self.state_path, {**self._state, "done": sorted(self.done)})
+            if index >= self._next_hash:
+                self._pending[index] = data
+            self._advance_hash()
+
+    def discard(self) -> None:
+        self.part_path.unlink(missing_ok=True)
+        self.state_path.unlink(missing_ok=True)
+
+    def finish(self) -> str:
+        """
+        Check the SHA-256 of the complete file, then move it to its final path.
+
+        Returns:
+            the SHA-256 hex digest
+
+        Raises:
+            OSError: SHA-256 mismatch, the partial download is discarded
+
+        """
+        sha256 = self._hasher.hexdigest()
+        if self.expected_sha256 is not None and sha256 != self.expected_sha256:
+            self.discard()
+            raise OSError(f"SHA-256 mismatch for: {self.filename}")
+        os.replace(self.part_path, self.path)
+        self.state_path.unlink(missing_ok=True)
+        return sha256
+
+
+def _open_url(url: str, timeout: float, byte_range: tuple[int, int] | None = None):
+    headers = {"Range": f"bytes={byte_range[0]}-{byte_range[1]}"} if byte_range else {}
+    request = urllib.request.Request(url, headers=headers)
+    # URL from the model registry, SHA-256 verified while downloading  # nosec: B310
+    return urllib.request.urlopen(request, timeout=timeout)
+
+
+def _probe(url: str, timeout: float) -> tuple[int | None, bool]:
+    """
+    Return the size of the remote file and if the server supports the range requests, asking its
+    first byte.
+    """
+    with _open_url(url, timeout, (0, 0)) as response:
+        content_range = _CONTENT_RANGE_PATTERN.match(
+            response.headers.get("Content-Range", "")
+        )
+        if response.status == 206 and content_range is not None:
+            return int(content_range.group(3)), True
+        content_length = response.headers.get("Content-Length")
+        return (int(content_length) if content_length is not None else None), False
+
+
+def _with_retries(function: Callable[[], bytes], retries: int, name: str) -> bytes:
+    attempt = 0
+    while True:
+        try:
+            return function()
+        except OSError as e_download:
+            if attempt >= retries:
+                raise
+            attempt += 1
+            app_logger.warning(
+                f"download of {name} failed ({e_download}), retry {attempt}/{retries}."
+            )
+            time.sleep(0.5 * attempt)
+
+
+def _fetch_chunk(download: _FileDownload, index: int, timeout: float) -> bytes:
+    start, end = download.get_range(index)
+    with _open_url(download.url, timeout, (start, end)) as response:
+        data = response.read()
+        if response.status != 206 or len(data) != end - start + 1:
+            raise OSError(
+                f"bad range response for {download.filename} bytes {start}-{end}: status {response.status}, {len(data)} bytes"
+            )
+    return data
+
+
+def _stream_file(
+    filename: str, url: str, path: Path, expected_sha256: str | None, timeout: float
+) -> str:
+    # fallback for the servers without range requests: a single stream, hashed while written
+    part_path = path.with_name(f"{path.name}.part")
+    hasher = hashlib.sha256()
+    with _open_url(url, timeout) as response, open(part_path, "wb") as dst:
+        while block := response.read(_STREAM_BLOCK_SIZE):
+            hasher.update(block)
+            dst.write(block)
+    sha256 = hasher.hexdigest()
+    if expected_sha256 is not None and sha256 != expected_sha256:
+        part_path.unlink(missing_ok=True)
+        raise OSError(f"SHA-256 mismatch for: {filename}")
+    os.replace(part_path, path)
+    return sha256
+
+
+def _download_chunks(
+    downloads: list[_FileDownload],
+    max_workers: int,
+    retries: int,
+    timeout: float,
+    on_chunk: Callable[[int], None],
+) -> None:
+    # a chunk is scheduled only within a window past the hashed ones of its file: the out of order
+    # chunks waiting to be hashed take at most window * chunk_size bytes of memory per file
+    window = 2 * max_workers
+    queued = [
+        (download, index)
+        for download in downloads
+        for index in download.missing_chunks()
+    ]
+    in_flight: dict[Future, tuple[_FileDownload, int]] = {}
+
+    def submit_eligible() -> None:
+        for item in list(queued):
+            if len(in_flight) >= max_workers:
+                return
+            download, index = item
+            if index < download.hashed_chunks + window:
+                queued.remove(item)
+                future = executor.submit(
+                    _with_retries,
+                    partial(_fetch_chunk, download, index, timeout),
+                    retries,
+                    f"{download.filename} chunk {index}",
+                )
+                in_flight[future] = item
+
+    with ThreadPoolExecutor(
+        max_workers=max_workers, thread_name_prefix="samgis-model-download"
+    ) as executor:
+        try:
+            submit_eligible()
+            while in_flight:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    download, index = in_flight.pop(future)
+                    data = future.result()
+                    download.add_chunk(index, data)
+                    on_chunk(len(data))
+                submit_eligible()
+        except BaseException:
+            # the completed chunks stay recorded within the state files, for the next run
+            for future in in_flight:
+                future.cancel()
+            raise
+
+
+def download_model(
+    variant: str = model_registry.DEFAULT_MODEL,
+    *,
+    target_dir: Path | None = None,
+    on_progress: Callable[[int, str], None] | None = None,
+    max_workers: int | None = None,
+    chunk_size: int | None = None,
+    retries: int | None = None,
+    timeout: float | None = None,
+) -> Path:
+    """
+    Download the model weights of a variant, same contract of samgis_core
+    model_downloader.download_model() but with parallel HTTP range requests of chunk_size bytes
+    (across all the files), resumed after an interruption from the ".part" files and with the
+    SHA-256 computed while the data streams in. The existing files are skipped. The verified files
+    are recorded within the manifest, later verifications skip them while unchanged (see
+    verify_download()). Servers without range requests support are downloaded as a single stream.
+
+    Args:
+        variant: model variant key (must be in model_registry.MODELS)
+        target_dir: override directory, default model_registry.get_model_dir(variant)
+        on_progress: optional callback(percent, message) for progress updates
+        max_workers: parallel range requests, default MODEL_DOWNLOAD_WORKERS env variable
+        chunk_size: bytes of every range request, default MODEL_DOWNLOAD_CHUNK_SIZE env variable
+        retries: retries of a failed range request, default MODEL_DOWNLOAD_RETRIES env variable
+        timeout: seconds of the HTTP requests timeout, default MODEL_DOWNLOAD_TIMEOUT env variable
+
+    Returns:
+        Path to the model directory
+
+    Raises:
+        KeyError: unknown variant
+        urllib.error.URLError / OSError: download failure or SHA-256 mismatch
+
+    """
+    max_workers = max_workers or int(
+        os.getenv("MODEL_DOWNLOAD_WORKERS", MODEL_DOWNLOAD_WORKERS)
+    )
+    chunk_size = chunk_size or int(
+        os.getenv("MODEL_DOWNLOAD_CHUNK_SIZE", MODEL_DOWNLOAD_CHUNK_SIZE)
+    )
+    if retries is None:
+        retries = int(os.getenv("MODEL_DOWNLOAD_RETRIES", MODEL_DOWNLOAD_RETRIES))
+    timeout = timeout or float(
+        os.getenv("MODEL_DOWNLOAD_TIMEOUT", MODEL_DOWNLOAD_TIMEOUT)
+    )
+    model_info = model_registry.MODELS[variant]
+    model_dir = Path(target_dir or model_registry.get_model_dir(variant))
+    model_dir.mkdir(parents=True, exist_ok=True)
+    time_start = time.perf_counter()
+
+    downloads: list[_FileDownload] = []
+    hashes: dict[str, str] = {}
+    for remote, filename in model_info["files"].items():
+        path = model_dir / filename
+        if path.is_file():
+            app_logger.debug(f"skipping existing file {filename}.")
+            continue
+        url = model_info["urls"][remote]
+        expected_sha256 = model_info["sha256"].get(filename)
+        size, accepts_ranges = _probe(url, timeout)
+        if accepts_ranges and size is not None:
+            downloads.append(
+                _FileDownload(filename, url, path, size, chunk_size, expected_sha256)
+            )
+            continue
+        app_logger.info(f"no range requests support for {url}, single stream download.")
+        if on_progress:
+            on_progress(0, f"Downloading {filename}...")
+        hashes[filename] = _stream_file(filename, url, path, expected_sha256, timeout)
+
+    total_bytes = sum(download.size for download in downloads)
+    done_bytes = sum(download.downloaded_bytes for download in downloads)
+
+    def on_chunk(nbytes: int) -> None:
+        # called by the scheduling thread only
+        nonlocal done_bytes
+        done_bytes += nbytes
+        if on_progress and total_bytes:
+            on_progress(min(done_bytes * 100 // total_bytes, 99), "")
+
+    if downloads:
+        n_chunks = sum(len(download.missing_chunks()) for download in downloads)
+        app_logger.info(
+            f"downloading {len(downloads)} files of model {variant}: {n_chunks} chunks, {max_workers} workers."
+        )
+        if on_progress:
+            on_progress(
+                done_bytes * 100 // total_bytes if total_bytes else 0,
+                f"Downloading {len(downloads)} files...",
+            )
+        _download_chunks(downloads, max_workers, retries, timeout, on_chunk)
+        failures = []
+        for download in downloads:
+            try:
+                hashes[download.filename] = download.finish()
+            except OSError as e_finish:
+                app_logger.error(f"{e_finish}.")
+                failures.append(download.filename)
+        if failures:
+            # the verified files are recorded anyway, the next run downloads only the failed ones
+            write_verified_manifest(variant, model_dir, hashes)
+            raise OSError(f"SHA-256 mismatch for: {', '.join(failures)}")
+    if hashes:
+        write_verified_manifest(variant, model_dir, hashes)
+
+    if on_progress:
+        on_progress(100, "Verifying checksums...")
+    # the downloaded files are within the manifest: the files are hashed again only when some of
+    # them were already present, without a manifest entry
+    failures = verify_download(variant, model_dir=model_dir)
+    if failures:
+        app_logger.error(f"model {variant} checksum verification failed: {failures}.")
+        raise OSError(f"SHA-256 mismatch for: {', '.join(failures)}")
+    if on_progress:
+        on_progress(100, "Done")
+    app_logger.info(
+        f"model {variant} ready in {model_dir}, {time.perf_counter() - time_start:.3f}s."
+    )
+    return model_dir
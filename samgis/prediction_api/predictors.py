@@ -0,0 +1,653 @@
+"""functions using machine learning instance model(s), with a cache for the image embeddings"""
+
+import os
+import time
+from collections.abc import Callable, Iterator
+from datetime import datetime
+from functools import partial
+from pathlib import Path
+from typing import Any
+
+from affine import Affine
+from samgis_core import app_logger
+from samgis_core.utilities.type_hints import ListDict
+from samgis_web import MODEL_FOLDER
+from samgis_web.io_package import raster_helpers
+from samgis_web.utilities.constants import (
+    DEFAULT_INPUT_WIDTH,
+    DEFAULT_URL_TILES,
+    MODEL_NAME,
+    SLOPE_CELLSIZE,
+)
+from samgis_web.web.web_helpers import check_source_type_is_terrain
+
+from samgis.io_package.artifact_writer import get_artifact_writer
+from samgis.io_package.geo_helpers import (
+    get_vectorized_raster_as_geojson,
+    iter_vectorized_raster_as_geojson_features,
+)
+from samgis.io_package.tms2geotiff import download_extent
+from samgis.prediction_api.embedding_cache import (
+    CachedEmbedding,
+    EmbeddingCache,
+    get_embedding_cache_key,
+)
+from samgis.prediction_api.sam2_adapter import ImageEmbedding, Sam2EmbeddingPredictor
+from samgis.prediction_api.session_loader import (
+    get_optimized_model_dir,
+    get_warm_up_image,
+    get_warm_up_prompt,
+)
+from samgis.prediction_api.session_pool import SessionPool
+from samgis.prediction_api.windowed import Window, predict_windowed_mask
+from samgis.utilities.constants import (
+    EMBEDDING_CACHE_DISK_MAX_BYTES,
+    EMBEDDING_CACHE_MAX_BYTES,
+    MODEL_POOL_MAX_BYTES,
+    WINDOW_MAX_WORKERS,
+    WINDOW_OVERLAP,
+    WINDOW_SIZE,
+)
+from samgis.utilities.metrics import stage_timer
+from samgis.utilities.type_hints import PolygonizeOptions
+
+type LlistFloat = list[list[float]]
+type DictStrInt = dict[str, str | int]
+
+__all__ = [
+    "embedding_cache",
+    "get_embedding",
+    "preload_model",
+    "samexporter_decode_features",
+    "samexporter_predict",
+    "samexporter_predict_batch",
+    "samexporter_predict_features",
+    "session_pool",
+]
+
+embedding_cache = EmbeddingCache(
+    max_bytes=int(os.getenv("EMBEDDING_CACHE_MAX_BYTES", EMBEDDING_CACHE_MAX_BYTES)),
+    disk_folder=os.getenv("EMBEDDING_CACHE_FOLDER", "") or None,
+    disk_max_bytes=int(
+        os.getenv("EMBEDDING_CACHE_DISK_MAX_BYTES", EMBEDDING_CACHE_DISK_MAX_BYTES)
+    ),
+)
+ort_optimized_model_cache = os.getenv("ORT_OPTIMIZED_MODEL_CACHE", "1").lower() not in (
+    "",
+    "0",
+    "false",
+)
+window_size = int(os.getenv("WINDOW_SIZE", WINDOW_SIZE))
+window_overlap = int(os.getenv("WINDOW_OVERLAP", WINDOW_OVERLAP))
+window_max_workers = int(os.getenv("WINDOW_MAX_WORKERS", WINDOW_MAX_WORKERS))
+
+
+def _load_model_instance(model_folder: Path) -> Sam2EmbeddingPredictor:
+    optimized_model_dir = (
+        get_optimized_model_dir(model_folder) if ort_optimized_model_cache else None
+    )
+    return Sam2EmbeddingPredictor(
+        model_dir=model_folder, optimized_model_dir=optimized_model_dir
+    )
+
+
+session_pool = SessionPool(
+    max_bytes=int(os.getenv("MODEL_POOL_MAX_BYTES", MODEL_POOL_MAX_BYTES)),
+    loader=_load_model_instance,
+)
+
+
+def _get_model_instance(
+    model_name: str, model_folder: str | Path, pinned: bool = False
+) -> Sam2EmbeddingPredictor:
+    # the pool is keyed by model variant (the model folder name), loading it on first use
+    app_logger.debug(f"using a {model_name} instance model from {model_folder}...")
+    return session_pool.get(model_folder, pinned=pinned)
+
+
+def preload_model(
+    model_name: str = MODEL_NAME,
+    model_folder: str | Path = MODEL_FOLDER,
+    warm_up: bool = True,
+    pinned: bool = True,
+) -> dict[str, float]:
+    """
+    Build the encoder/decoder sessions of the model instance used by the inference requests and
+    run a warm-up inference on a synthetic image, so that the first request doesn't pay for the
+    sessions creation, the graph optimization and the first run memory allocations.
+
+    Args:
+        model_name: machine learning model name
+        model_folder: ML models folder
+        warm_up: run a warm-up inference after building the sessions
+        pinned: keep the model instance loaded, never evicting it from the session pool
+
+    Returns:
+        dict with the sessions creation and warm-up durations in seconds
+
+    """
+    time_start = time.perf_counter()
+    models_instance = _get_model_instance(model_name, model_folder, pinned=pinned)
+    durations = {"sessions": time.perf_counter() - time_start}
+    if warm_up:
+        time_start_warm_up = time.perf_counter()
+        embedding = models_instance.encode(get_warm_up_image())
+        models_instance.decode(embedding, get_warm_up_prompt())
+        durations["warm_up"] = time.perf_counter() - time_start_warm_up
+    app_logger.info(
+        f"model {model_name} ({Path(model_folder).name}) preloaded, durations: {durations}."
+    )
+    return durations
+
+
+def _download_prediction_image(
+    bbox: LlistFloat,
+    zoom: float,
+    source: Any,
+    source_name: str | None,
+    folder_write_tmp_on_disk: str,
+    prefix: str,
+) -> tuple[Any, Any]:
+    import numpy as np
+
+    pt0, pt1 = bbox
+    app_logger.info(
+        f"tile_source: {source}: downloading geo-referenced raster with bbox {bbox}, zoom {zoom}."
+    )
+    img, transform = download_extent(
+        w=pt1[1], s=pt1[0], e=pt0[1], n=pt0[0], zoom=int(zoom), source=source
+    )
+    if bool(folder_write_tmp_on_disk):
+        if not (img.shape and len(img.shape) == 3 and img.shape[2] == 3):
+            raise ValueError(f"wrong image shape: '{img.shape}'")
+        get_artifact_writer(folder_write_tmp_on_disk).submit(
+            f"{prefix}_raw1.png",
+            partial(raster_helpers.write_raster_png, img, transform, prefix, "raw1"),
+        )
+
+    if check_source_type_is_terrain(source):
+        app_logger.info("terrain-rgb like raster: transforms it into a DEM")
+        dem = raster_helpers.get_raster_terrain_rgb_like(img, source.name)
+        # set a slope cell size proportional to the image width
+        slope_cellsize = int(img.shape[1] * SLOPE_CELLSIZE / DEFAULT_INPUT_WIDTH)
+        app_logger.info(
+            f"terrain-rgb like raster: compute slope, curvature using {slope_cellsize} as cell size."
+        )
+        img = raster_helpers.get_rgb_prediction_image(dem, slope_cellsize)
+        if bool(folder_write_tmp_on_disk):
+            if not (img.shape and len(img.shape) == 3 and img.shape[2] == 3):
+                raise ValueError(f"wrong image shape: '{img.shape}'")
+            get_artifact_writer(folder_write_tmp_on_disk).submit(
+                f"{prefix}_rgb2.png",
+                partial(
+                    raster_helpers.write_raster_png, img, transform, prefix, "rgb2"
+                ),
+            )
+        if not (dem.shape and len(dem.shape) == 2):
+            raise ValueError(f"wrong img (DEM) shape: '{dem.shape}'")
+        if bool(folder_write_tmp_on_disk):
+            dem = np.nan_to_num(dem, nan=0).astype(np.int16)
+            get_artifact_writer(folder_write_tmp_on_disk).submit(
+                f"{prefix}_raw3.tiff",
+                partial(
+                    raster_helpers.write_raster_tiff, dem, transform, prefix, "raw3"
+                ),
+            )
+    app_logger.info(
+        f"img type {type(img)} with shape/size:{img.size}, transform type: {type(transform)}, transform:{transform}."
+    )
+    app_logger.info(f"source_name:{source_name}, source_name type:{type(source_name)}.")
+    return img, transform
+
+
+def get_embedding(
+    bbox: LlistFloat,
+    zoom: float,
+    model_name: str = MODEL_NAME,
+    source: Any = DEFAULT_URL_TILES,
+    source_name: str | None = None,
+    model_folder: str | Path = MODEL_FOLDER,
+    prefix: str = "",
+) -> CachedEmbedding:
+    """
+    Return the image embedding (and its Affine transform) for the given bbox, zoom and tile source.
+    On a cache miss download the geo-referenced raster and run the SAM2 encoder, otherwise
+    skip both the tiles download and the encoder.
+
+    Args:
+        bbox: coordinates bounding box
+        zoom: Level of detail
+        model_name: machine learning model name
+        source: xyz tile provider object
+        source_name: name of tile provider
+        model_folder: ML models folder
+        prefix: filename prefix used when writing debug images on disk
+
+    Returns:
+        CachedEmbedding instance
+
+    """
+    models_instance = _get_model_instance(model_name, model_folder)
+    cache_key = get_embedding_cache_key(source, zoom, bbox, Path(model_folder).name)
+    cached = embedding_cache.get(cache_key)
+    if cached is not None:
+        app_logger.info(
+            f"embedding cache hit for {cache_key}, skipping tiles download and encoder."
+        )
+        return cached
+    app_logger.info(f"embedding cache miss for {cache_key}.")
+    folder_write_tmp_on_disk = os.getenv("WRITE_TMP_ON_DISK", "")
+    img, transform = _download_prediction_image(
+        bbox, zoom, source, source_name, folder_write_tmp_on_disk, prefix
+    )
+    with stage_timer("encoder"):
+        embedding = models_instance.encode(img)
+    cached = CachedEmbedding(embedding=embedding, transform=transform)
+    embedding_cache.put(cache_key, cached)
+    app_logger.debug(f"embedding_cache stats: {embedding_cache.stats()}.")
+    return cached
+
+
+def _write_mask_png(mask: Any, prefix: str, folder: str) -> Path:
+    from PIL.Image import fromarray as pil_fromarray
+
+    output_path = Path(folder) / f"{prefix}_mask_row.png"
+    pil_fromarray(mask).save(output_path)
+    return output_path
+
+
+def _get_best_mask(
+    models_instance: Sam2EmbeddingPredictor,
+    cached: CachedEmbedding,
+    prompt: ListDict,
+    prefix: str,
+    folder_write_tmp_on_disk: str,
+) -> tuple[Any, int]:
+    import numpy as np
+
+    with stage_timer("decoder"):
+        masks, ious = models_instance.decode(cached.embedding, prompt)
+    best = int(np.argmax(ious))
+    mask = masks[best]
+    n_predictions = len(masks)
+
+    if bool(folder_write_tmp_on_disk):
+        get_artifact_writer(folder_write_tmp_on_disk).submit(
+            f"{prefix}_mask_row.png", partial(_write_mask_png, mask, prefix)
+        )
+
+    app_logger.info(
+        f"created {n_predictions} masks, type {type(mask)}, size {mask.size}: preparing geojson conversion"
+    )
+    app_logger.info(f"mask shape:{mask.shape}.")
+    return mask, n_predictions
+
+
+def _get_prediction_output(
+    models_instance: Sam2EmbeddingPredictor,
+    cached: CachedEmbedding,
+    prompt: ListDict,
+    prefix: str,
+    folder_write_tmp_on_disk: str,
+    polygonize: PolygonizeOptions | None = None,
+) -> DictStrInt:
+    mask, n_predictions = _get_best_mask(
+        models_instance, cached, prompt, prefix, folder_write_tmp_on_disk
+    )
+    return _get_geojson_output(
+        mask,
+        n_predictions,
+        cached.transform,
+        prefix,
+        folder_write_tmp_on_disk,
+        polygonize,
+    )
+
+
+def _get_geojson_output(
+    mask: Any,
+    n_predictions: int,
+    transform: Affine,
+    prefix: str,
+    folder_write_tmp_on_disk: str,
+    polygonize: PolygonizeOptions | None = None,
+) -> DictStrInt:
+    with stage_timer("polygonize"):
+        geojson_content = get_vectorized_raster_as_geojson(
+            mask, transform, options=polygonize
+        )
+    if bool(folder_write_tmp_on_disk):
+        geojson = str(geojson_content["geojson"])
+        get_artifact_writer(folder_write_tmp_on_disk).submit(
+            f"{prefix}_geojson.json",
+            partial(raster_helpers.write_geojson_on_disk, geojson, prefix, "geojson"),
+        )
+    return {"n_predictions": n_predictions, **geojson_content}
+
+
+def _get_prefix(bbox: LlistFloat, source_name: str | None) -> str:
+    pt0, pt1 = bbox
+    now = datetime.now().strftime("%Y%m%d_%H%M%S")
+    return f"{source_name}_w{pt1[1]},s{pt1[0]},e{pt0[1]},n{pt0[0]}__{now}_"
+
+
+def _get_windowed_predictor(
+    bbox: LlistFloat,
+    zoom: float,
+    model_name: str,
+    source: Any,
+    source_name: str | None,
+    model_folder: str | Path,
+    prefix: str,
+) -> tuple[Affine, Callable[[ListDict], tuple[Any, int]]]:
+    # download the image once and return its transform together with a function predicting the
+    # windowed mask of a prompt; the window embeddings are kept in the embedding cache
+    import numpy as np
+
+    models_instance = _get_model_instance(model_name, model_folder)
+    folder_write_tmp_on_disk = os.getenv("WRITE_TMP_ON_DISK", "")
+    img, transform = _download_prediction_image(
+        bbox, zoom, source, source_name, folder_write_tmp_on_disk, prefix
+    )
+    model_variant = Path(model_folder).name
+
+    def _encode(window: Window) -> ImageEmbedding:
+        cache_key = get_embedding_cache_key(
+            source, zoom, bbox, f"{model_variant}/{window.name}"
+        )
+        cached = embedding_cache.get(cache_key)
+        if cached is None:
+            with stage_timer("encoder"):
+                embedding = models_instance.encode(
+                    np.ascontiguousarray(img[window.rows, window.cols])
+                )
+            cached = CachedEmbedding(
+                embedding=embedding,
+                transform=transform
+                * Affine.translation(window.cols.start, window.rows.start),
+            )
+            embedding_cache.put(cache_key, cached)
+        return cached.embedding
+
+    def _decode(embedding: ImageEmbedding, window_prompt: ListDict) -> tuple[Any, Any]:
+        with stage_timer("decoder"):
+            return models_instance.decode(embedding, window_prompt)
+
+    def _predict_mask(prompt: ListDict) -> tuple[Any, int]:
+        return predict_windowed_mask(
+            img.shape[:2],
+            prompt,
+            _encode,
+            _decode,
+            window_size,
+            window_overlap,
+            window_max_workers,
+        )
+
+    return transform, _predict_mask
+
+
+def samexporter_predict(
+    bbox: LlistFloat,
+    prompt: ListDict,
+    zoom: float,
+    model_name: str = MODEL_NAME,
+    source: Any = DEFAULT_URL_TILES,
+    source_name: str | None = None,
+    model_folder: str | Path = MODEL_FOLDER,
+    polygonize: PolygonizeOptions | None = None,
+    windowed: bool = False,
+) -> DictStrInt:
+    """
+    Return predictions as a geojson from a geo-referenced image using the given input prompt.
+    Same contract of samgis_web.prediction_api.predictors.samexporter_predict(), but the image
+    embeddings are kept in an LRU cache: repeated prompts on the same map view run only the mask decoder.
+
+    1. if necessary instantiate a segment anything machine learning instance model
+    2. get the image embedding from the cache or download a geo-referenced raster image delimited by
+       the coordinates bounding box (bbox) and encode it
+    3. get a prediction image from the segment anything instance model using the input prompt
+    4. get a geo-referenced geojson from the prediction image
+
+    Args:
+        bbox: coordinates bounding box
+        prompt: machine learning input prompt
+        zoom: Level of detail
+        model_name: machine learning model name
+        source: xyz tile provider object
+        source_name: name of tile provider,
+        model_folder: ML models folder
+        polygonize: optional mask polygonization options (simplification, precision, min area)
+        windowed: segment the image in overlapping windows as big as the encoder input, useful
+            when the image is much bigger than it
+
+    Returns:
+        dict containing the output geojson, the prediction masks number and the geojson shapes number
+
+    """
+    folder_write_tmp_on_disk = os.getenv("WRITE_TMP_ON_DISK", "")
+    app_logger.info(f"folder_write_tmp_on_disk:{folder_write_tmp_on_disk}.")
+    prefix = _get_prefix(bbox, source_name)
+    if windowed:
+        transform, predict_mask = _get_windowed_predictor(
+            bbox, zoom, model_name, source, source_name, model_folder, prefix
+        )
+        mask, n_predictions = predict_mask(prompt)
+        return _get_geojson_output(
+            mask, n_predictions, transform, prefix, folder_write_tmp_on_disk, polygonize
+        )
+    cached = get_embedding(
+        bbox=bbox,
+        zoom=zoom,
+        model_name=model_name,
+        source=source,
+        source_name=source_name,
+        model_folder=model_folder,
+        prefix=prefix,
+    )
+    models_instance = _get_model_instance(model_name, model_folder)
+    return _get_prediction_output(
+        models_instance, cached, prompt, prefix, folder_write_tmp_on_disk, polygonize
+    )
+
+
+def samexporter_predict_features(
+    bbox: LlistFloat,
+    prompt: ListDict,
+    zoom: float,
+    model_name: str = MODEL_NAME,
+    source: Any = DEFAULT_URL_TILES,
+    source_name: str | None = None,
+    model_folder: str | Path = MODEL_FOLDER,
+    polygonize: PolygonizeOptions | None = None,
+    windowed: bool = False,
+) -> tuple[int, Iterator[dict[str, Any]]]:
+    """
+    Same steps of samexporter_predict(), but the prediction geojson features are produced lazily:
+    the image embedding and the mask decoder run immediately, the mask polygonization runs while
+    consuming the returned iterator (e.g. while streaming the response).
+
+    Args:
+        bbox: coordinates bounding box
+        prompt: machine learning input prompt
+        zoom: Level of detail
+        model_name: machine learning model name
+        source: xyz tile provider object
+        source_name: name of tile provider,
+        model_folder: ML models folder
+        polygonize: optional mask polygonization options (simplification, precision, min area)
+        windowed: segment the image in overlapping windows as big as the encoder input
+
+    Returns:
+        the prediction masks number and an iterator of the geojson features (EPSG:4326)
+
+    """
+    folder_write_tmp_on_disk = os.getenv("WRITE_TMP_ON_DISK", "")
+    prefix = _get_prefix(bbox, source_name)
+    if windowed:
+        transform, predict_mask = _get_windowed_predictor(
+            bbox, zoom, model_name, source, source_name, model_folder, prefix
+        )
+        mask, n_predictions = predict_mask(prompt)
+        return n_predictions, iter_vectorized_raster_as_geojson_features(
+            mask, transform, options=polygonize
+        )
+    cached = get_embedding(
+        bbox=bbox,
+        zoom=zoom,
+        model_name=model_name,
+        source=source,
+        source_name=source_name,
+        model_folder=model_folder,
+        prefix=prefix,
+    )
+    models_instance = _get_model_instance(model_name, model_folder)
+    mask, n_predictions = _get_best_mask(
+        models_instance, cached, prompt, prefix, folder_write_tmp_on_disk
+    )
+    return n_predictions, iter_vectorized_raster_as_geojson_features(
+        mask, cached.transform, options=polygonize
+    )
+
+
+def samexporter_decode_features(
+    cached: CachedEmbedding,
+    prompt: ListDict,
+    model_name: str = MODEL_NAME,
+    model_folder: str | Path = MODEL_FOLDER,
+    polygonize: PolygonizeOptions | None = None,
+) -> tuple[int, Iterator[dict[str, Any]]]:
+    """
+    Run only the mask decoder on an already computed image embedding (e.g. kept by an embedding
+    session), without the tiles download and the encoder. The prediction geojson features are
+    produced lazily, as in samexporter_predict_features().
+
+    Args:
+        cached: image embedding with the Affine transform of its raster
+        prompt: machine learning input prompt, in image pixel coordinates
+        model_name: machine learning model name
+        model_folder: folder of the model variant that computed the embedding
+        polygonize: optional mask polygonization options (simplification, precision, min area)
+
+    Returns:
+        the prediction masks number and an iterator of the geojson features (EPSG:4326)
+
+    """
+    folder_write_tmp_on_disk = os.getenv("WRITE_TMP_ON_DISK", "")
+    models_instance = _get_model_instance(model_name, model_folder)
+    mask, n_predictions = _get_best_mask(
+        models_instance, cached, prompt, "embedding_session_", folder_write_tmp_on_disk
+    )
+    return n_predictions, iter_vectorized_raster_as_geojson_features(
+        mask, cached.transform, options=polygonize
+    )
+
+
+def _get_prompt_errors() -> tuple[type[Exception], ...]:
+    # a malformed prompt (wrong values, missing keys) or a mask decoder run failing on it: the
+    # other prompts of the batch can still succeed
+    import onnxruntime.capi.onnxruntime_pybind11_state as ort_state
+
+    return (
+        ValueError,
+        KeyError,
+        IndexError,
+        ort_state.Fail,
+        ort_state.InvalidArgument,
+        ort_state.RuntimeException,
+    )
+
+
+def samexporter_predict_batch(
+    bbox: LlistFloat,
+    prompts: list[ListDict],
+    zoom: float,
+    model_name: str = MODEL_NAME,
+    source: Any = DEFAULT_URL_TILES,
+    source_name: str | None = None,
+    model_folder: str | Path = MODEL_FOLDER,
+    polygonize: list[PolygonizeOptions | None] | None = None,
+    windowed: bool = False,
+) -> list[DictStrInt | Exception]:
+    """
+    Return one geojson prediction for every input prompt on the same geo-referenced image: the tiles
+    download and the image encoder run at most once, then the mask decoder runs for every prompt
+    using the shared image embedding. A prompt failing with a prompt or decoder error doesn't stop
+    the others.
+
+    Args:
+        bbox: coordinates bounding box
+        prompts: list of machine learning input prompts
+        zoom: Level of detail
+        model_name: machine learning model name
+        source: xyz tile provider object
+        source_name: name of tile provider,
+        model_folder: ML models folder
+        polygonize: optional mask polygonization options for every prompt (same length of prompts)
+        windowed: segment the image in overlapping windows as big as the encoder input, the window
+            embeddings are shared by all the prompts
+
+    Returns:
+        list with the same length and order of prompts, containing the output dict (same of
+        samexporter_predict()) or the exception raised by the failing prompt
+
+    """
+    folder_write_tmp_on_disk = os.getenv("WRITE_TMP_ON_DISK", "")
+    prefix = _get_prefix(bbox, source_name)
+    prompts_polygonize: list[PolygonizeOptions | None] = polygonize or [
+        None for _ in prompts
+    ]
+    if windowed:
+        transform, predict_mask = _get_windowed_predictor(
+            bbox, zoom, model_name, source, source_name, model_folder, prefix
+        )
+
+        def _predict_prompt(
+            prompt: ListDict,
+            prompt_prefix: str,
+            prompt_polygonize: PolygonizeOptions | None,
+        ) -> DictStrInt:
+            mask, n_predictions = predict_mask(prompt)
+            return _get_geojson_output(
+                mask,
+                n_predictions,
+                transform,
+                prompt_prefix,
+                folder_write_tmp_on_disk,
+                prompt_polygonize,
+            )
+    else:
+        cached = get_embedding(
+            bbox=bbox,
+            zoom=zoom,
+            model_name=model_name,
+            source=source,
+            source_name=source_name,
+            model_folder=model_folder,
+            prefix=prefix,
+        )
+        models_instance = _get_model_instance(model_name, model_folder)
+
+        def _predict_prompt(
+            prompt: ListDict,
+            prompt_prefix: str,
+            prompt_polygonize: PolygonizeOptions | None,
+        ) -> DictStrInt:
+            return _get_prediction_output(
+                models_instance,
+                cached,
+                prompt,
+                prompt_prefix,
+                folder_write_tmp_on_disk,
+                prompt_polygonize,
+            )
+
+    app_logger.info(f"decoding {len(prompts)} prompts with the same image embedding.")
+    outputs: list[DictStrInt | Exception] = []
+    for n, (prompt, prompt_polygonize) in enumerate(zip(prompts, prompts_polygonize)):
+        try:
+            outputs.append(_predict_prompt(prompt, f"{prefix}{n}_", prompt_polygonize))
+        except _get_prompt_errors() as e_prompt:
+            app_logger.error(f"batch prompt #{n} failed: {e_prompt}.")
+            outputs.append(e_prompt)
+    return outputs
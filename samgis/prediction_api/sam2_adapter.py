@@ -0,0 +1,117 @@
+"""Sam2EmbeddingPredictor -- PredictorPort adapter exposing the encoder and the decoder as separate steps."""
+
+from dataclasses import dataclass
+from pathlib import Path
+from typing import override
+
+import numpy as np
+from numpy import ndarray
+from PIL.Image import Image
+from samgis_core.prediction_api.ports import PredictorPort
+from samgis_core.prediction_api.prompt_adapter import prompt_to_sam2_inputs
+from samgis_core.utilities.type_hints import ListDict
+
+__all__ = [
+    "ImageEmbedding",
+    "Sam2EmbeddingPredictor",
+]
+
+# same clamp applied by sam2_onnx.OnnxImagePredictor on the low resolution logits
+_LOGIT_CLAMP = 32.0
+
+
+@dataclass(frozen=True)
+class ImageEmbedding:
+    """Encoder output for a single image, enough to run the decoder without encoding it again.
+
+    Args:
+        features: encoder outputs (image_embed, high_res_feat_0, high_res_feat_1)
+        orig_hw: original image (height, width), needed to upscale the decoder masks
+    """
+
+    features: dict[str, ndarray]
+    orig_hw: tuple[int, int]
+
+    @property
+    def nbytes(self) -> int:
+        return sum(feature.nbytes for feature in self.features.values())
+
+
+class Sam2EmbeddingPredictor(PredictorPort):
+    """Adapter that implements PredictorPort using a sam2_onnx session, without hidden image state.
+
+    Unlike samgis_core.prediction_api.sam2_adapter.Sam2OnnxPredictor the embedding is returned
+    by encode() and passed explicitly to decode(): this permits to keep it in a cache and to
+    run only the mask decoder when the same image is requested again.
+
+    Args:
+        model_dir: Path to directory containing encoder.onnx,
+            decoder.onnx, and metadata.json.
+        optimized_model_dir: Path to directory for the ORT-optimized
+            encoder and decoder, None to load the models from model_dir.
+    """
+
+    def __init__(
+        self, model_dir: str | Path, optimized_model_dir: str | Path | None = None
+    ) -> None:
+        from samgis.prediction_api.session_loader import create_session
+
+        self._session = create_session(model_dir, optimized_model_dir)
+        self._embedding: ImageEmbedding | None = None
+
+    def encode(self, image: ndarray | Image) -> ImageEmbedding:
+        """Preprocess the image and run the SAM2 image encoder on it."""
+        from sam2_onnx.preprocessing import preprocess_image  # type: ignore[import-untyped]
+
+        input_tensor, orig_hw = preprocess_image(
+            image, self._session.metadata.image_size
+        )
+        features = self._session.encode(input_tensor)
+        return ImageEmbedding(features=features, orig_hw=orig_hw)
+
+    def decode(
+        self, embedding: ImageEmbedding, prompt: ListDict
+    ) -> tuple[ndarray, ndarray]:
+        """Run only the SAM2 mask decoder using an already computed image embedding.
+
+        Returns:
+            masks: (N, H, W) uint8 ndarray, values {0, 255}.
+            ious: (N,) float32 ndarray of IoU confidence scores.
+        """
+        from sam2_onnx.postprocessing import postprocess_masks  # type: ignore[import-untyped]
+        from sam2_onnx.prompt_utils import concat_points  # type: ignore[import-untyped]
+
+        meta = self._session.metadata
+        point_coords, point_labels, box = prompt_to_sam2_inputs(prompt)
+        coords, labels = concat_points(
+            point_coords, point_labels, box, embedding.orig_hw, meta.image_size
+        )
+        mask_size = meta.mask_input_size
+        low_res_masks, ious = self._session.decode(
+            image_embed=embedding.features["image_embed"],
+            high_res_feat_0=embedding.features["high_res_feat_0"],
+            high_res_feat_1=embedding.features["high_res_feat_1"],
+            point_coords=coords.astype(np.float32),
+            point_labels=labels.astype(np.int64),
+            mask_input=np.zeros((1, 1, mask_size, mask_size), dtype=np.float32),
+            has_mask_input=np.zeros((1, 1), dtype=np.float32),
+        )
+        low_res_masks = np.clip(low_res_masks, -_LOGIT_CLAMP, _LOGIT_CLAMP)
+        masks = postprocess_masks(
+            low_res_masks, embedding.orig_hw, threshold=meta.mask_threshold
+        )
+        # masks: (1, 3, H, W) float32 [0.0/1.0] -> (3, H, W) uint8 {0, 255}
+        masks_uint8 = (masks[0] > 0.0).astype(np.uint8) * 255
+        return masks_uint8, ious[0]
+
+    @override
+    def set_image(self, image: ndarray | Image) -> None:
+        self._embedding = self.encode(image)
+
+    @override
+    def predict(self, prompt: ListDict) -> tuple[ndarray, ndarray]:
+        if self._embedding is None:
+            raise RuntimeError(
+                "An image must be set with .set_image(...) before mask prediction."
+            )
+        return self.decode(self._embedding, prompt)
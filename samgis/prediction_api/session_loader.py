@@ -0,0 +1,181 @@
+"""build the SAM2 ONNX Runtime sessions from a cached, pre-optimized graph and warm them up"""
+
+import os
+from pathlib import Path
+
+import numpy as np
+from numpy import ndarray
+from samgis_core import app_logger
+
+from samgis.utilities.constants import ORT_INTRA_OP_NUM_THREADS
+
+__all__ = [
+    "create_session",
+    "get_optimized_model_dir",
+    "get_session_errors",
+    "get_warm_up_image",
+    "get_warm_up_prompt",
+]
+
+_MODEL_FILENAMES = ("encoder.onnx", "decoder.onnx")
+
+
+def get_optimized_model_dir(model_dir: str | Path) -> Path:
+    """
+    Return the folder for the ORT-optimized models, next to the model variant folder. The optimized
+    graph depends on the onnxruntime version, so the folder name contains it.
+
+    Args:
+        model_dir: model variant folder (containing encoder.onnx, decoder.onnx, metadata.json)
+
+    Returns:
+        optimized models folder path
+
+    """
+    import onnxruntime as ort
+
+    model_dir = Path(model_dir)
+    return model_dir.parent / f"{model_dir.name}.ort-{ort.__version__}"
+
+
+def _get_intra_op_num_threads() -> int:
+    # 0 means one thread per core; with 1 thread onnxruntime doesn't create a thread pool, so the
+    # sessions keep working in forked processes (see samgis.web.prefork)
+    return int(os.getenv("ORT_INTRA_OP_NUM_THREADS", ORT_INTRA_OP_NUM_THREADS))
+
+
+def _create_source_session(model_dir: Path):
+    import onnxruntime as ort
+    from sam2_onnx import Sam2OnnxSession  # type: ignore[import-untyped]
+
+    if _get_intra_op_num_threads() == ORT_INTRA_OP_NUM_THREADS:
+        return Sam2OnnxSession(model_dir=model_dir)
+    return Sam2OnnxSession(
+        model_dir=model_dir,
+        session_options=_get_session_options(ort.GraphOptimizationLevel.ORT_ENABLE_ALL),
+    )
+
+
+def _get_session_options(graph_optimization_level):
+    import onnxruntime as ort
+
+    # same defaults of sam2_onnx.Sam2OnnxSession, unless ORT_INTRA_OP_NUM_THREADS is set
+    session_options = ort.SessionOptions()
+    session_options.inter_op_num_threads = 1
+    session_options.intra_op_num_threads = _get_intra_op_num_threads()
+    session_options.graph_optimization_level = graph_optimization_level
+    return session_options
+
+
+def _is_fresh(optimized_path: Path, source_path: Path) -> bool:
+    try:
+        return optimized_path.stat().st_mtime >= source_path.stat().st_mtime
+    except FileNotFoundError:
+        return False
+
+
+def _save_optimized_models(model_dir: Path, optimized_model_dir: Path) -> None:
+    import onnxruntime as ort
+
+    optimized_model_dir.mkdir(parents=True, exist_ok=True)
+    for filename in _MODEL_FILENAMES:
+        tmp_path = optimized_model_dir / f".{filename}.{os.getpid()}.tmp"
+        # the extended level contains only hardware independent optimizations: the saved graph
+        # stays valid on a different cpu, the layout optimizations run on every load
+        session_options = _get_session_options(
+            ort.GraphOptimizationLevel.ORT_ENABLE_EXTENDED
+        )
+        session_options.optimized_model_filepath = str(tmp_path)
+        ort.InferenceSession(
+            str(model_dir / filename),
+            providers=["CPUExecutionProvider"],
+            sess_options=session_options,
+        )
+        os.replace(tmp_path, optimized_model_dir / filename)
+        app_logger.info(
+            f"saved ORT-optimized model '{optimized_model_dir / filename}'."
+        )
+
+
+def get_session_errors() -> tuple[type[Exception], ...]:
+    """Return the onnxruntime errors raised creating or running a session (e.g. a corrupted model)"""
+    import onnxruntime.capi.onnxruntime_pybind11_state as ort_state
+
+    return (
+        ort_state.Fail,
+        ort_state.InvalidArgument,
+        ort_state.InvalidGraph,
+        ort_state.InvalidProtobuf,
+        ort_state.NoSuchFile,
+        ort_state.RuntimeException,
+    )
+
+
+def _get_fallback_errors() -> tuple[type[Exception], ...]:
+    # the I/O errors saving the optimized models and the onnxruntime errors loading them (e.g. a
+    # truncated or corrupted optimized graph): the source models could still load fine
+    return OSError, *get_session_errors()
+
+
+def create_session(model_dir: str | Path, optimized_model_dir: str | Path | None):
+    """
+    Create a sam2_onnx.Sam2OnnxSession. When optimized_model_dir is given, load the ORT-optimized
+    encoder and decoder from it, saving them first if missing or older than the source models.
+    An I/O or onnxruntime error on saving or loading the optimized models falls back to the source
+    models.
+
+    Args:
+        model_dir: model variant folder (containing encoder.onnx, decoder.onnx, metadata.json)
+        optimized_model_dir: folder for the ORT-optimized models, None to disable it
+
+    Returns:
+        Sam2OnnxSession instance
+
+    """
+    import onnxruntime as ort
+    from sam2_onnx import Sam2OnnxSession  # type: ignore[import-untyped]
+
+    model_dir = Path(model_dir)
+    if optimized_model_dir is None:
+        return _create_source_session(model_dir)
+
+    optimized_model_dir = Path(optimized_model_dir)
+    try:
+        if not all(
+            _is_fresh(optimized_model_dir / filename, model_dir / filename)
+            for filename in _MODEL_FILENAMES
+        ):
+            app_logger.info(
+                f"missing or stale ORT-optimized models in '{optimized_model_dir}', saving them..."
+            )
+            _save_optimized_models(model_dir, optimized_model_dir)
+        return Sam2OnnxSession(
+            encoder_path=optimized_model_dir / "encoder.onnx",
+            decoder_path=optimized_model_dir / "decoder.onnx",
+            metadata_path=model_dir / "metadata.json",
+            session_options=_get_session_options(
+                ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+            ),
+        )
+    except _get_fallback_errors() as e_optimized:
+        app_logger.warning(
+            f"failed using the ORT-optimized models from '{optimized_model_dir}': {e_optimized}, "
+            "loading the source models..."
+        )
+        return _create_source_session(model_dir)
+
+
+def get_warm_up_image(size: int = 512) -> ndarray:
+    """Return a deterministic synthetic RGB image (gradients and a square) used to warm up the encoder"""
+    gradient = np.linspace(0, 255, size, dtype=np.float32)
+    img = np.empty((size, size, 3), dtype=np.uint8)
+    img[..., 0] = gradient[np.newaxis, :]
+    img[..., 1] = gradient[:, np.newaxis]
+    img[..., 2] = 128
+    img[size // 4 : 3 * size // 4, size // 4 : 3 * size // 4] = 255
+    return img
+
+
+def get_warm_up_prompt(size: int = 512) -> list[dict]:
+    """Return a single point prompt in the middle of the warm up image"""
+    return [{"type": "point", "label": 1, "data": [size // 2, size // 2]}]
@@ -0,0 +1,198 @@
+"""LRU pool of the loaded model variants, with a memory budget: one process serving several variants"""
+
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Callable
+from dataclasses import dataclass
+from pathlib import Path
+
+from samgis_core import app_logger
+
+from samgis.prediction_api.sam2_adapter import Sam2EmbeddingPredictor
+
+__all__ = [
+    "PooledModel",
+    "SessionPool",
+    "get_model_nbytes",
+]
+
+
+def get_model_nbytes(model_folder: str | Path) -> int:
+    """
+    Estimate the memory used by the sessions of a model variant as the size of its ONNX files
+    (including the external weights files), 0 if the folder doesn't exist.
+
+    Args:
+        model_folder: model variant folder
+
+    Returns:
+        estimated size in bytes
+
+    """
+    return sum(
+        path.stat().st_size
+        for path in Path(model_folder).glob("*.onnx*")
+        if path.is_file()
+    )
+
+
+@dataclass
+class PooledModel:
+    """Model instance loaded in the pool, with its estimated size"""
+
+    instance: Sam2EmbeddingPredictor
+    model_folder: Path
+    nbytes: int
+    pinned: bool = False
+
+
+class SessionPool:
+    """
+    Thread-safe pool of model instances keyed by variant (the model folder name).
+
+    The instances are loaded on first use; before loading a new one the least recently used
+    instances are evicted until the estimated size of the loaded ones (see get_model_nbytes())
+    fits within max_bytes. The pinned instances (e.g. the preloaded hot set) are never evicted:
+    if they alone exceed the budget the new instance is loaded anyway, logging a warning. An
+    evicted instance is released when the in-flight requests using it complete.
+
+    Args:
+        max_bytes: memory budget of the loaded instances (0 means no limit)
+        loader: callable building the model instance from the model folder
+
+    """
+
+    def __init__(
+        self,
+        max_bytes: int,
+        loader: Callable[[Path], Sam2EmbeddingPredictor],
+    ) -> None:
+        self.max_bytes = max_bytes
+        self.loader = loader
+        self._entries: OrderedDict[str, PooledModel] = OrderedDict()
+        self._current_bytes = 0
+        self._lock = threading.Lock()
+        # a single load at a time: concurrent requests for a missing variant load it once
+        self._load_lock = threading.Lock()
+        self.hits = 0
+        self.loads = 0
+        self.load_failures = 0
+        self.load_seconds = 0.0
+        self.evictions = 0
+
+    def _get_entry(self, variant: str, pinned: bool) -> PooledModel | None:
+        with self._lock:
+            entry = self._entries.get(variant)
+            if entry is not None:
+                self._entries.move_to_end(variant)
+                entry.pinned = entry.pinned or pinned
+                self.hits += 1
+            return entry
+
+    def _evict_for(self, nbytes: int) -> None:
+        # called holding self._lock
+        if self.max_bytes <= 0:
+            return
+        for variant in list(self._entries):
+            if self._current_bytes + nbytes <= self.max_bytes:
+                return
+            entry = self._entries[variant]
+            if entry.pinned:
+                continue
+            del self._entries[variant]
+            self._current_bytes -= entry.nbytes
+            self.evictions += 1
+            app_logger.info(f"model pool: evicted {variant} ({entry.nbytes} bytes).")
+        if self._current_bytes + nbytes > self.max_bytes:
+            app_logger.warning(
+                f"model pool: {self._current_bytes + nbytes} bytes of pinned models, over the {self.max_bytes} bytes budget."
+            )
+
+    def get(
+        self, model_folder: str | Path, pinned: bool = False
+    ) -> Sam2EmbeddingPredictor:
+        """
+        Return the model instance of the variant within model_folder, loading it on miss.
+
+        Args:
+            model_folder: model variant folder, its name is the pool key
+            pinned: never evict this variant (also pins an already loaded one)
+
+        Returns:
+            the model instance
+
+        """
+        model_folder = Path(model_folder)
+        variant = model_folder.name
+        entry = self._get_entry(variant, pinned)
+        if entry is not None:
+            return entry.instance
+        with self._load_lock:
+            # loaded by a concurrent request while waiting for the load lock
+            entry = self._get_entry(variant, pinned)
+            if entry is not None:
+                return entry.instance
+            nbytes = get_model_nbytes(model_folder)
+            with self._lock:
+                # evict before loading, keeping the peak memory within the budget
+                self._evict_for(nbytes)
+            time_start = time.perf_counter()
+            try:
+                instance = self.loader(model_folder)
+            except Exception:
+                with self._lock:
+                    self.load_failures += 1
+                raise
+            duration = time.perf_counter() - time_start
+            with self._lock:
+                self._entries[variant] = PooledModel(
+                    instance=instance,
+                    model_folder=model_folder,
+                    nbytes=nbytes,
+                    pinned=pinned,
+                )
+                self._current_bytes += nbytes
+                self.loads += 1
+                self.load_seconds += duration
+            app_logger.info(
+                f"model pool: loaded {variant} ({nbytes} bytes) in {duration:.3f}s."
+            )
+            return instance
+
+    def variants(self) -> list[str]:
+        """Return the loaded variants, from the least to the most recently used"""
+        with self._lock:
+            return list(self._entries)
+
+    def clear(self) -> None:
+        """Release all the loaded instances, pinned ones included"""
+        with self._lock:
+            self._entries.clear()
+            self._current_bytes = 0
+
+    def counters(self) -> dict[str, int | float]:
+        """Return the pool numeric counters, e.g. for the metrics samples"""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "loads": self.loads,
+                "load_failures": self.load_failures,
+                "load_seconds": self.load_seconds,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._current_bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+    def stats(self) -> dict[str, int | float | list[str]]:
+        """Return the pool counters together with the loaded and pinned variants"""
+        counters = self.counters()
+        with self._lock:
+            return {
+                **counters,
+                "variants": list(self._entries),
+                "pinned": [
+                    variant for variant, entry in self._entries.items() if entry.pinned
+                ],
+            }
@@ -0,0 +1,231 @@
+"""sliding-window inference: segment images bigger than the SAM2 encoder input one window at a time"""
+
+import math
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from itertools import pairwise
+from typing import Any
+
+import numpy as np
+from numpy import ndarray
+from samgis_core import app_logger
+from samgis_core.utilities.type_hints import ListDict
+
+from samgis.utilities.metrics import add_timings, collect_timings
+
+__all__ = [
+    "Window",
+    "get_window_prompt",
+    "get_windows",
+    "predict_windowed_mask",
+]
+
+
+@dataclass(frozen=True)
+class Window:
+    """
+    Image window run through the encoder, with its core: the part of the window closer to its
+    center than to the ones of the overlapping windows. The cores of all the windows partition the
+    image, so every pixel of the merged mask comes from the window where it's farthest from the seams.
+
+    Args:
+        rows: window rows within the image
+        cols: window columns within the image
+        core_rows: core rows within the image
+        core_cols: core columns within the image
+    """
+
+    rows: slice
+    cols: slice
+    core_rows: slice
+    core_cols: slice
+
+    @property
+    def name(self) -> str:
+        return f"window_{self.rows.start}_{self.cols.start}_{self.rows.stop}_{self.cols.stop}"
+
+
+def _get_axis_windows(
+    size: int, window_size: int, overlap: int
+) -> list[tuple[slice, slice]]:
+    # evenly spaced windows overlapping at least by overlap pixels, with the seams in the middle
+    if size <= window_size:
+        return [(slice(0, size), slice(0, size))]
+    n_windows = math.ceil((size - overlap) / (window_size - overlap))
+    starts = [
+        round(n * (size - window_size) / (n_windows - 1)) for n in range(n_windows)
+    ]
+    seams = [
+        (next_start + start + window_size) // 2
+        for start, next_start in pairwise(starts)
+    ]
+    return [
+        (slice(start, start + window_size), slice(core_start, core_stop))
+        for start, core_start, core_stop in zip(starts, [0, *seams], [*seams, size])
+    ]
+
+
+def get_windows(
+    height: int, width: int, window_size: int, overlap: int
+) -> list[Window]:
+    """
+    Split an image into overlapping windows of at most window_size x window_size pixels.
+
+    Args:
+        height: image height
+        width: image width
+        window_size: window side in pixels (e.g. the SAM2 encoder input size)
+        overlap: minimum overlap in pixels between adjacent windows
+
+    Returns:
+        list of windows, row by row
+
+    """
+    if not 0 <= overlap < window_size:
+        raise ValueError(
+            f"overlap must be within 0 and window_size ({window_size}), got {overlap}"
+        )
+    return [
+        Window(rows=rows, cols=cols, core_rows=core_rows, core_cols=core_cols)
+        for rows, core_rows in _get_axis_windows(height, window_size, overlap)
+        for cols, core_cols in _get_axis_windows(width, window_size, overlap)
+    ]
+
+
+def get_window_prompt(prompt: ListDict, window: Window) -> ListDict:
+    """
+    Route the prompt to the window: keep the points within it and clip the rectangle to it, in
+    window pixel coordinates.
+
+    Args:
+        prompt: machine learning input prompt, in image pixel coordinates
+        window: image window
+
+    Returns:
+        the window prompt, empty if the window doesn't contain any include point or rectangle
+
+    """
+    window_prompt = []
+    for entry in prompt:
+        if entry["type"] == "point":
+            x, y = entry["data"]
+            if (
+                window.cols.start <= x < window.cols.stop
+                and window.rows.start <= y < window.rows.stop
+            ):
+                window_prompt.append(
+                    {
+                        **entry,
+                        "data": [x - window.cols.start, y - window.rows.start],
+                    }
+                )
+        elif entry["type"] == "rectangle":
+            x0, y0, x1, y1 = entry["data"]
+            x0, x1 = max(x0, window.cols.start), min(x1, window.cols.stop)
+            y0, y1 = max(y0, window.rows.start), min(y1, window.rows.stop)
+            if x0 < x1 and y0 < y1:
+                window_prompt.append(
+                    {
+                        **entry,
+                        "data": [
+                            x0 - window.cols.start,
+                            y0 - window.rows.start,
+                            x1 - window.cols.start,
+                            y1 - window.rows.start,
+                        ],
+                    }
+                )
+    # exclude points alone don't select anything
+    if not any(
+        entry["type"] == "rectangle" or entry.get("label") == 1
+        for entry in window_prompt
+    ):
+        return []
+    return window_prompt
+
+
+def predict_windowed_mask(
+    image_hw: tuple[int, int],
+    prompt: ListDict,
+    encode: Callable[[Window], Any],
+    decode: Callable[[Any, ListDict], tuple[ndarray, ndarray]],
+    window_size: int,
+    overlap: int,
+    max_workers: int = 1,
+) -> tuple[ndarray, int]:
+    """
+    Run the encoder and the decoder on every window containing part of the prompt (in parallel
+    using max_workers threads), then merge the best mask of every window within a single mask as
+    big as the image, taking every pixel from the core of its window (or, if that window has no
+    prompt, from the union of the overlapping windows). The polygons crossing the seams are merged
+    by polygonizing the merged mask.
+
+    Args:
+        image_hw: image (height, width)
+        prompt: machine learning input prompt, in image pixel coordinates
+        encode: callable returning the image embedding of a window
+        decode: callable returning the masks (N, H, W) uint8 and their ious (N,) for an image
+            embedding and a window prompt
+        window_size: window side in pixels
+        overlap: minimum overlap in pixels between adjacent windows
+        max_workers: number of windows processed at the same time
+
+    Returns:
+        the merged mask (uint8, values {0, 255}) and the number of the predicted masks
+
+    """
+    height, width = image_hw
+    windows = get_windows(height, width, window_size, overlap)
+    windows_prompt = [
+        (window, window_prompt)
+        for window in windows
+        if (window_prompt := get_window_prompt(prompt, window))
+    ]
+    app_logger.info(
+        f"windowed inference on a {width}x{height} image: {len(windows_prompt)}/{len(windows)} windows with a prompt."
+    )
+    if not windows_prompt:
+        raise ValueError("the prompt doesn't select any window of the image")
+
+    def _predict_window(
+        window: Window, window_prompt: ListDict
+    ) -> tuple[ndarray, int, dict[str, float]]:
+        # every window collects its own stage timings: the request ones aren't thread-safe
+        with collect_timings() as window_timings:
+            masks, ious = decode(encode(window), window_prompt)
+        return masks[int(np.argmax(ious))], len(masks), window_timings
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [
+            executor.submit(_predict_window, window, window_prompt)
+            for window, window_prompt in windows_prompt
+        ]
+        results = [future.result() for future in futures]
+    for *_, window_timings in results:
+        add_timings(window_timings)
+
+    mask = np.zeros((height, width), dtype=np.uint8)
+    # the overlaps with the windows without a prompt keep the union of the predicted masks...
+    for (window, _), (window_mask, *_) in zip(windows_prompt, results):
+        np.maximum(
+            mask[window.rows, window.cols],
+            window_mask,
+            out=mask[window.rows, window.cols],
+        )
+    # ...the window cores only their own window mask
+    n_predictions = 0
+    for (window, _), (window_mask, window_n_predictions, _) in zip(
+        windows_prompt, results
+    ):
+        core_rows = slice(
+            window.core_rows.start - window.rows.start,
+            window.core_rows.stop - window.rows.start,
+        )
+        core_cols = slice(
+            window.core_cols.start - window.cols.start,
+            window.core_cols.stop - window.cols.start,
+        )
+        mask[window.core_rows, window.core_cols] = window_mask[core_rows, core_cols]
+        n_predictions += window_n_predictions
+    return mask, n_predictions
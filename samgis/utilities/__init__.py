@@ -0,0 +1 @@
+"""utilities shared by the samgis backend modules"""
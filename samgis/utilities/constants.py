@@ -0,0 +1,136 @@
+"""Project constants"""
+
+__all__ = [
+    "BATCH_MAX_ITEMS",
+    "DEFAULT_MODEL_VARIANT",
+    "EMBEDDING_CACHE_DISK_MAX_BYTES",
+    "EMBEDDING_CACHE_MAX_BYTES",
+    "EMBEDDING_SESSION_MAX_BYTES",
+    "EMBEDDING_SESSION_MAX_ENTRIES",
+    "EMBEDDING_SESSION_TTL",
+    "FRONTEND_BUILD_MODE",
+    "FRONTEND_MANIFEST_FILENAME",
+    "FRONTEND_SOURCES_EXCLUDED_FOLDERS",
+    "GEOJSON_SEQ_MEDIA_TYPE",
+    "INFERENCE_MAX_CONCURRENCY",
+    "INFERENCE_MAX_QUEUE_SIZE",
+    "INFERENCE_QUEUE_TIMEOUT",
+    "LOG_PAYLOAD_MAX_CHARS",
+    "LOG_PAYLOAD_SAMPLE_RATE",
+    "LOG_QUEUE_SIZE",
+    "MODEL_DOWNLOAD_CHUNK_SIZE",
+    "MODEL_DOWNLOAD_RETRIES",
+    "MODEL_DOWNLOAD_TIMEOUT",
+    "MODEL_DOWNLOAD_WORKERS",
+    "MODEL_HEALTH_CHECK_INTERVAL",
+    "MODEL_POOL_MAX_BYTES",
+    "MODEL_VERIFIED_MANIFEST",
+    "MOSAIC_MAX_PIXELS",
+    "NDJSON_MEDIA_TYPE",
+    "ORT_INTRA_OP_NUM_THREADS",
+    "PREFORK_GRACEFUL_TIMEOUT",
+    "PREFORK_MAX_REQUESTS",
+    "PREFORK_MAX_REQUESTS_JITTER",
+    "PREFORK_MAX_WORKER_AGE",
+    "PREFORK_MAX_WORKER_MEMORY",
+    "PREFORK_MONITOR_INTERVAL",
+    "PREFORK_WORKERS",
+    "RESPONSE_CACHE_DISK_MAX_BYTES",
+    "RESPONSE_CACHE_MAX_BYTES",
+    "RESPONSE_CACHE_TTL",
+    "TILE_CACHE_DEFAULT_TTL",
+    "TILE_CACHE_MAX_BYTES",
+    "TILE_FETCH_TIMEOUT",
+    "TILE_FETCH_USER_AGENT",
+    "VIS_OUTPUT_MAX_AGE",
+    "VIS_OUTPUT_MAX_BYTES",
+    "VIS_OUTPUT_MAX_FILES",
+    "VIS_OUTPUT_PAGE_SIZE",
+    "VIS_OUTPUT_QUEUE_SIZE",
+    "WINDOW_MAX_WORKERS",
+    "WINDOW_OVERLAP",
+    "WINDOW_SIZE",
+]
+
+DEFAULT_MODEL_VARIANT = "sam2.1_hiera_base_plus_uint8"
+# a sam2.1 hiera embedding (image_embed + high_res_feat_0 + high_res_feat_1) is ~16 MB
+EMBEDDING_CACHE_MAX_BYTES = 256 * 1024**2
+EMBEDDING_CACHE_DISK_MAX_BYTES = 2 * 1024**3
+TILE_CACHE_MAX_BYTES = 1024**3
+# seconds, overridden per tile source by the TILE_CACHE_TTL_BY_SOURCE env variable
+TILE_CACHE_DEFAULT_TTL = 7 * 24 * 3600
+TILE_FETCH_TIMEOUT = 30
+TILE_FETCH_USER_AGENT = "samgis-be"
+# the ONNX runtime already uses all the cores for a single inference run
+INFERENCE_MAX_CONCURRENCY = 1
+INFERENCE_MAX_QUEUE_SIZE = 8
+INFERENCE_QUEUE_TIMEOUT = 30.0
+BATCH_MAX_ITEMS = 64
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+# RFC 8142, GeoJSON text sequences
+GEOJSON_SEQ_MEDIA_TYPE = "application/geo+json-seq"
+# sliding-window inference: the window side matches the SAM2 encoder input size
+WINDOW_SIZE = 1024
+WINDOW_OVERLAP = 128
+WINDOW_MAX_WORKERS = 2
+# the inference responses are a few KB of GeoJSON
+RESPONSE_CACHE_MAX_BYTES = 64 * 1024**2
+RESPONSE_CACHE_DISK_MAX_BYTES = 512 * 1024**2
+# seconds
+RESPONSE_CACHE_TTL = 24 * 3600
+# "manifest" rebuilds the frontend only on sources change, "prebuilt" never runs the toolchain
+FRONTEND_BUILD_MODE = "manifest"
+FRONTEND_MANIFEST_FILENAME = "build_manifest.json"
+# static/ sub folders not part of the frontend bundle (dependencies, build outputs, tests)
+FRONTEND_SOURCES_EXCLUDED_FOLDERS = (
+    "coverage",
+    "dist",
+    "e2e",
+    "node_modules",
+    "playwright-report",
+    "reports",
+    "test-results",
+    "tests",
+)
+# seconds between the model files size/mtime checks, the checksums are verified only on change
+MODEL_HEALTH_CHECK_INTERVAL = 60.0
+# records waiting for the background log writer thread, the new ones are dropped when full
+LOG_QUEUE_SIZE = 10000
+LOG_PAYLOAD_MAX_CHARS = 1000
+LOG_PAYLOAD_SAMPLE_RATE = 1.0
+# memory budget of the loaded model variants sessions, estimated from the model files size
+MODEL_POOL_MAX_BYTES = 2 * 1024**3
+# pixels budget of the cropped tiles mosaic of a request (0 means no limit), ~192 MiB as RGB
+MOSAIC_MAX_PIXELS = 64 * 1024**2
+# embedding sessions of the interactive API: ~32 sam2.1 hiera embeddings, expiring when idle
+EMBEDDING_SESSION_MAX_BYTES = 512 * 1024**2
+EMBEDDING_SESSION_MAX_ENTRIES = 64
+# seconds
+EMBEDDING_SESSION_TTL = 600.0
+# debug/visualization artifacts (WRITE_TMP_ON_DISK): the new ones are dropped with a full queue
+VIS_OUTPUT_QUEUE_SIZE = 32
+VIS_OUTPUT_MAX_FILES = 1000
+VIS_OUTPUT_MAX_BYTES = 1024**3
+# seconds
+VIS_OUTPUT_MAX_AGE = 7 * 24 * 3600
+VIS_OUTPUT_PAGE_SIZE = 100
+# model files download: parallel HTTP range requests, resumed from the ".part" files
+MODEL_DOWNLOAD_WORKERS = 4
+MODEL_DOWNLOAD_CHUNK_SIZE = 8 * 1024**2
+MODEL_DOWNLOAD_RETRIES = 3
+# seconds
+MODEL_DOWNLOAD_TIMEOUT = 60.0
+# written within the model folder after a verification, the unchanged files aren't hashed again
+MODEL_VERIFIED_MANIFEST = "verified_manifest.json"
+# threads of every ONNX Runtime inference run, 0 means one per core
+ORT_INTRA_OP_NUM_THREADS = 0
+# pre-fork server: 0 workers means one per core, the 0 recycling limits mean no limit
+PREFORK_WORKERS = 0
+PREFORK_MAX_REQUESTS = 0
+PREFORK_MAX_REQUESTS_JITTER = 0
+# bytes of memory not shared with the other processes
+PREFORK_MAX_WORKER_MEMORY = 0
+# seconds
+PREFORK_MAX_WORKER_AGE = 0
+PREFORK_GRACEFUL_TIMEOUT = 30.0
+PREFORK_MONITOR_INTERVAL = 1.0
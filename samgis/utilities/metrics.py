@@ -0,0 +1,228 @@
+"""Per-stage latency histograms and counters exported in the Prometheus text format"""
+
+import threading
+import time
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+__all__ = [
+    "Histogram",
+    "MetricsRegistry",
+    "PhaseTimer",
+    "Sample",
+    "add_timings",
+    "collect_timings",
+    "record_stage",
+    "registry",
+    "stage_durations",
+    "stage_timer",
+    "variant_durations",
+]
+
+# seconds, from a decoder run on a small image to a slow tiles download
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# (metric name, metric type - "counter" or "gauge", help text, value)
+type Sample = tuple[str, str, str, int | float]
+
+_request_timings: ContextVar[dict[str, float] | None] = ContextVar(
+    "request_timings", default=None
+)
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+
+class Histogram:
+    """
+    Prometheus histogram with a single label (e.g. the pipeline stage).
+
+    Args:
+        name: metric name
+        documentation: help text
+        label_name: name of the label distinguishing the observations
+        buckets: upper bounds of the buckets, in increasing order
+
+    """
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        label_name: str,
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.label_name = label_name
+        self.buckets = tuple(buckets) + (float("inf"),)
+        self._lock = threading.Lock()
+        # label value => (bucket counts, sum)
+        self._values: dict[str, tuple[list[int], float]] = {}
+
+    def observe(self, label_value: str, value: float) -> None:
+        with self._lock:
+            counts, total = self._values.get(
+                label_value, ([0] * len(self.buckets), 0.0)
+            )
+            for n, upper_bound in enumerate(self.buckets):
+                if value <= upper_bound:
+                    counts[n] += 1
+            self._values[label_value] = counts, total + value
+
+    @contextmanager
+    def time(self, label_value: str) -> Iterator[None]:
+        """Context manager observing the duration of its block"""
+        time_start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(label_value, time.perf_counter() - time_start)
+
+    def render(self) -> list[str]:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} histogram",
+        ]
+        with self._lock:
+            for label_value, (counts, total) in sorted(self._values.items()):
+                label = f'{self.label_name}="{label_value}"'
+                for upper_bound, count in zip(self.buckets, counts):
+                    lines.append(
+                        f'{self.name}_bucket{{{label},le="{_format_value(upper_bound)}"}} {count}'
+                    )
+                lines.append(f"{self.name}_sum{{{label}}} {_format_value(total)}")
+                lines.append(f"{self.name}_count{{{label}}} {counts[-1]}")
+        return lines
+
+
+class PhaseTimer:
+    """
+    Durations of consecutive phases (e.g. the application startup ones): every mark() closes the
+    current phase, started at the previous mark() or at the timer start.
+
+    Args:
+        start: time.perf_counter() value of the first phase start, default now
+
+    """
+
+    def __init__(self, start: float | None = None) -> None:
+        self.start = time.perf_counter() if start is None else start
+        self._last = self.start
+        self.phases: dict[str, float] = {}
+
+    def mark(self, phase: str) -> float:
+        """Close the current phase, returning its duration in seconds"""
+        now = time.perf_counter()
+        self.phases[phase] = now - self._last
+        self._last = now
+        return self.phases[phase]
+
+    @property
+    def total(self) -> float:
+        return self._last - self.start
+
+
+class MetricsRegistry:
+    """Collection of histograms and of callables returning counters/gauges samples"""
+
+    def __init__(self) -> None:
+        self._histograms: list[Histogram] = []
+        self._collectors: list[Callable[[], list[Sample]]] = []
+
+    def register_histogram(self, histogram: Histogram) -> Histogram:
+        self._histograms.append(histogram)
+        return histogram
+
+    def register_collector(self, collector: Callable[[], list[Sample]]) -> None:
+        """Register a callable invoked on every render(), returning a list of Sample"""
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        """
+        Return all the metrics in the Prometheus text exposition format. A sample name can carry
+        its labels (e.g. 'name{worker="0"}'): the HELP and TYPE lines are written once per metric.
+        """
+        lines = []
+        for histogram in self._histograms:
+            lines.extend(histogram.render())
+        documented = set()
+        for collector in self._collectors:
+            for name, metric_type, documentation, value in collector():
+                metric_name = name.split("{", 1)[0]
+                if metric_name not in documented:
+                    documented.add(metric_name)
+                    lines.append(f"# HELP {metric_name} {documentation}")
+                    lines.append(f"# TYPE {metric_name} {metric_type}")
+                lines.append(f"{name} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+stage_durations = registry.register_histogram(
+    Histogram(
+        "samgis_stage_duration_seconds",
+        "Duration of the inference pipeline stages in seconds.",
+        "stage",
+    )
+)
+variant_durations = registry.register_histogram(
+    Histogram(
+        "samgis_model_variant_inference_seconds",
+        "Duration of the inference runs (tiles download, encoder and decoder) by model variant in seconds.",
+        "variant",
+    )
+)
+
+
+def record_stage(stage: str, seconds: float) -> None:
+    """Observe the stage duration, also adding it to the current request timings (if collected)"""
+    stage_durations.observe(stage, seconds)
+    timings = _request_timings.get()
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + seconds
+
+
+def add_timings(timings: dict[str, float]) -> None:
+    """
+    Add the stage durations collected by collect_timings() (e.g. within a worker thread) to the
+    current request timings (if collected), without observing them again.
+
+    Args:
+        timings: durations in seconds keyed by stage name
+    """
+    request_timings = _request_timings.get()
+    if request_timings is not None:
+        for stage, seconds in timings.items():
+            request_timings[stage] = request_timings.get(stage, 0.0) + seconds
+
+
+@contextmanager
+def stage_timer(stage: str) -> Iterator[None]:
+    """Context manager recording the duration of a pipeline stage"""
+    time_start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - time_start)
+
+
+@contextmanager
+def collect_timings() -> Iterator[dict[str, float]]:
+    """
+    Context manager collecting the durations of the pipeline stages run within it (in the same
+    thread); repeated stages (e.g. the decoder in a batch request) are summed.
+
+    Returns:
+        dict with the durations in seconds keyed by stage name, filled while running
+    """
+    timings: dict[str, float] = {}
+    token = _request_timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _request_timings.reset(token)
@@ -0,0 +1,41 @@
+"""JSON serialization straight to bytes, using orjson when installed"""
+
+import json
+from typing import Any
+
+import numpy as np
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depends on the installed packages
+    orjson = None
+
+__all__ = [
+    "dumps_bytes",
+]
+
+
+def _default_numpy(obj: Any) -> Any:
+    # the numpy arrays and scalars serialized by orjson.OPT_SERIALIZE_NUMPY, as python values
+    if isinstance(obj, (np.ndarray, np.generic)):
+        return obj.tolist()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps_bytes(obj: Any) -> bytes:
+    """
+    Serialize the object to compact JSON bytes. orjson (optional, not a declared dependency) is
+    several times faster than the json module; both serialize also the numpy arrays and scalars.
+
+    Args:
+        obj: object to serialize
+
+    Returns:
+        utf-8 encoded JSON
+
+    """
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(
+        obj, separators=(",", ":"), ensure_ascii=False, default=_default_numpy
+    ).encode("utf-8")
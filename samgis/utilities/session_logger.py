@@ -0,0 +1,242 @@
+"""Non-blocking log sink and lazy, truncated, sampled payload logging, on top of samgis_core.utilities.session_logger"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import reprlib
+import threading
+from typing import Any
+
+import structlog
+
+from samgis.utilities.constants import (
+    LOG_PAYLOAD_MAX_CHARS,
+    LOG_PAYLOAD_SAMPLE_RATE,
+    LOG_QUEUE_SIZE,
+)
+
+__all__ = [
+    "LazyPayload",
+    "NonBlockingQueueHandler",
+    "PayloadSampler",
+    "get_queue_handler",
+    "log_payload",
+    "payload_sampler",
+    "setup_async_logging",
+    "truncate_payload",
+]
+
+payload_max_chars = int(os.getenv("LOG_PAYLOAD_MAX_CHARS", LOG_PAYLOAD_MAX_CHARS))
+
+
+class LazyPayload:
+    """
+    Log argument rendering a payload only when (and if) the log record gets formatted, truncated
+    to max_chars: str and bytes are sliced, the other objects use a size-limited repr, so the cost
+    doesn't depend on the payload size.
+
+    Args:
+        payload: value to log (e.g. a request body or a serialized response)
+        max_chars: max length of the rendered payload
+
+    """
+
+    __slots__ = ("max_chars", "payload")
+
+    def __init__(self, payload: Any, max_chars: int) -> None:
+        self.payload = payload
+        self.max_chars = max_chars
+
+    def __str__(self) -> str:
+        payload = self.payload
+        if isinstance(payload, (bytes, bytearray, memoryview)):
+            size = len(payload)
+            text = bytes(payload[: self.max_chars]).decode("utf-8", errors="replace")
+        elif isinstance(payload, str):
+            size = len(payload)
+            text = payload[: self.max_chars]
+        else:
+            limited_repr = reprlib.Repr(
+                maxlevel=4,
+                maxdict=32,
+                maxlist=32,
+                maxtuple=32,
+                maxstring=self.max_chars,
+                maxother=self.max_chars,
+            )
+            text = limited_repr.repr(payload)
+            size = len(text)
+        if size > self.max_chars:
+            return f"{text[: self.max_chars]}...[truncated, {size} chars]"
+        return text
+
+    __repr__ = __str__
+
+
+def truncate_payload(payload: Any, max_chars: int | None = None) -> LazyPayload:
+    """Wrap a payload to log it lazily, truncated at max_chars (default LOG_PAYLOAD_MAX_CHARS)"""
+    return LazyPayload(payload, payload_max_chars if max_chars is None else max_chars)
+
+
+class PayloadSampler:
+    """
+    Thread-safe deterministic sampler: for a route with a sample rate r logs one payload every
+    round(1 / r) requests (r = 0 disables the payload logs of that route).
+
+    Args:
+        default_rate: sample rate of the routes without a specific one
+        rates: sample rates by route
+
+    """
+
+    def __init__(
+        self, default_rate: float = 1.0, rates: dict[str, float] | None = None
+    ) -> None:
+        self.default_rate = default_rate
+        self.rates = rates or {}
+        self._counters: dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def should_log(self, route: str) -> bool:
+        rate = self.rates.get(route, self.default_rate)
+        if rate <= 0:
+            return False
+        if rate >= 1:
+            return True
+        with self._lock:
+            counter = self._counters.get(route, 0)
+            self._counters[route] = counter + 1
+        return counter % round(1 / rate) == 0
+
+
+payload_sampler = PayloadSampler(
+    default_rate=float(os.getenv("LOG_PAYLOAD_SAMPLE_RATE", LOG_PAYLOAD_SAMPLE_RATE)),
+    rates=json.loads(os.getenv("LOG_PAYLOAD_SAMPLE_RATES", "{}")),
+)
+
+
+def log_payload(
+    logger: Any,
+    route: str,
+    msg: str,
+    payload: Any,
+    level: int = logging.DEBUG,
+) -> None:
+    """
+    Log a payload-sized value, skipping any work if the level is disabled or the route sampler
+    drops it; the payload is rendered lazily and truncated, see LazyPayload.
+
+    Args:
+        logger: structlog or stdlib logger
+        route: route name, used to pick the sample rate
+        msg: message preceding the payload
+        payload: value to log
+        level: log level
+
+    """
+    # the structlog loggers (not filtering by level) proxy the stdlib ones, ruled by the root level
+    is_enabled_for = getattr(logger, "isEnabledFor", logging.getLogger().isEnabledFor)
+    if not is_enabled_for(level) or not payload_sampler.should_log(route):
+        return
+    logger.log(level, f"{msg}:%s.", truncate_payload(payload))
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler never blocking the caller: the records are enqueued as they are (the formatting
+    runs in the QueueListener thread) and dropped, counting them, when the queue is full.
+    """
+
+    def __init__(self, log_queue: queue.Queue) -> None:
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # unlike QueueHandler.prepare(), don't format the record within the caller thread
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+_queue_handler: NonBlockingQueueHandler | None = None
+_listener: logging.handlers.QueueListener | None = None
+# the configured queue size, for the new queue of a forked process
+_queue_size = LOG_QUEUE_SIZE
+
+
+def get_queue_handler() -> NonBlockingQueueHandler | None:
+    """Return the root logger queue handler, None if setup_async_logging() wasn't called"""
+    return _queue_handler
+
+
+def setup_async_logging(
+    queue_size: int = LOG_QUEUE_SIZE,
+) -> NonBlockingQueueHandler | None:
+    """
+    Move the root logger structlog handlers (the samgis_core.utilities.session_logger.setup_logging()
+    one, also used by the samgis_web logging_middleware) behind a bounded queue, so that the records
+    formatting and the stdout/stderr writes happen in a background thread; the other handlers are
+    left untouched. Handlers added twice on the same stream (setup_logging() called more than once)
+    are kept only once. The records from the stdlib loggers (e.g. uvicorn) are formatted in the
+    background thread too, so they don't get the structlog context variables (e.g. the request id).
+
+    Args:
+        queue_size: max number of records waiting for the background thread
+
+    Returns:
+        the queue handler added to the root logger, None without structlog handlers
+
+    """
+    global _queue_handler, _listener, _queue_size
+    root_logger = logging.getLogger()
+    if _queue_handler is not None:
+        return _queue_handler
+    structlog_handlers = [
+        handler
+        for handler in root_logger.handlers
+        if isinstance(handler.formatter, structlog.stdlib.ProcessorFormatter)
+    ]
+    if not structlog_handlers:
+        return None
+    handlers: dict[tuple, logging.Handler] = {}
+    for handler in structlog_handlers:
+        key = (type(handler), getattr(handler, "stream", id(handler)))
+        handlers.setdefault(key, handler)
+        root_logger.removeHandler(handler)
+    _queue_size = queue_size
+    log_queue: queue.Queue = queue.Queue(maxsize=queue_size)
+    _queue_handler = NonBlockingQueueHandler(log_queue)
+    _listener = logging.handlers.QueueListener(
+        log_queue, *handlers.values(), respect_handler_level=True
+    )
+    _listener.start()
+    atexit.register(_stop_listener)
+    os.register_at_fork(after_in_child=_restart_listener)
+    root_logger.addHandler(_queue_handler)
+    return _queue_handler
+
+
+def _stop_listener() -> None:
+    if _listener is not None:
+        _listener.stop()
+
+
+def _restart_listener() -> None:
+    # the listener thread doesn't survive a fork (e.g. the pre-fork server workers): the child
+    # process gets a new queue, the parent one could be locked, and its own listener thread
+    global _listener
+    if _queue_handler is None or _listener is None:
+        return
+    log_queue: queue.Queue = queue.Queue(maxsize=_queue_size)
+    _queue_handler.queue = log_queue
+    _listener = logging.handlers.QueueListener(
+        log_queue, *_listener.handlers, respect_handler_level=True
+    )
+    _listener.start()
@@ -0,0 +1,92 @@
+"""custom type hints, extending the samgis_web request body"""
+
+from pydantic import BaseModel, Field, field_validator
+from samgis_core.prediction_api.model_registry import MODELS
+from samgis_web.utilities.type_hints import (
+    ApiRequestBody,
+    RawBBox,
+    RawPromptPoint,
+    RawPromptRectangle,
+)
+
+__all__ = [
+    "EmbeddingDecodeRequestBody",
+    "EmbeddingRequestBody",
+    "PolygonizeOptions",
+    "SamgisApiRequestBody",
+]
+
+
+def _check_model_variant(model_variant: str | None) -> str | None:
+    if model_variant is not None and model_variant not in MODELS:
+        raise ValueError(
+            f"unknown model variant '{model_variant}', available: {', '.join(MODELS)}"
+        )
+    return model_variant
+
+
+class PolygonizeOptions(BaseModel):
+    """
+    Mask polygonization options. The sizes are in pixels of the prediction image, so their ground
+    size follows the requested zoom; the defaults keep every vertex at full precision.
+    """
+
+    simplify_tolerance: float = Field(
+        default=0.0,
+        ge=0.0,
+        description="coverage simplification tolerance in pixels (the adjacent shapes keep sharing their edges), 0 disables it",
+    )
+    precision: int | None = Field(
+        default=None,
+        ge=0,
+        le=15,
+        description="decimal digits of the output coordinates (degrees), null for full precision",
+    )
+    min_area: int = Field(
+        default=0,
+        ge=0,
+        description="regions (and holes) smaller than this pixels number are merged into the surrounding one",
+    )
+
+
+class SamgisApiRequestBody(ApiRequestBody):
+    """Input request validator type (not yet parsed), with the optional polygonization, windowed and model variant options"""
+
+    polygonize: PolygonizeOptions = Field(default_factory=PolygonizeOptions)
+    windowed: bool = Field(
+        default=False,
+        description="segment the image in overlapping windows as big as the encoder input",
+    )
+    model_variant: str | None = Field(
+        default=None,
+        description="model variant from the registry (e.g. a faster or a more accurate one), null for the server default",
+    )
+
+    @field_validator("model_variant")
+    @classmethod
+    def check_model_variant(cls, model_variant: str | None) -> str | None:
+        return _check_model_variant(model_variant)
+
+
+class EmbeddingRequestBody(BaseModel):
+    """Embedding session request validator type: the image to encode, without prompts"""
+
+    bbox: RawBBox
+    zoom: int | float
+    source_type: str = "OpenStreetMap.Mapnik"
+    model_variant: str | None = Field(
+        default=None,
+        description="model variant from the registry, null for the server default",
+    )
+
+    @field_validator("model_variant")
+    @classmethod
+    def check_model_variant(cls, model_variant: str | None) -> str | None:
+        return _check_model_variant(model_variant)
+
+
+class EmbeddingDecodeRequestBody(BaseModel):
+    """Embedding session decode request validator type: new prompts on the session image"""
+
+    prompt: list[RawPromptPoint | RawPromptRectangle] = Field(min_length=1)
+    polygonize: PolygonizeOptions = Field(default_factory=PolygonizeOptions)
@@ -0,0 +1 @@
+"""fastapi web helpers"""
@@ -0,0 +1,238 @@
+"""embedding sessions of the two-phase interactive API: encode an image once, decode many prompts"""
+
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+
+from samgis_core import app_logger
+
+from samgis.io_package.coordinates_pixel_conversion import LatLngPixelTransform
+from samgis.prediction_api.embedding_cache import CachedEmbedding
+from samgis.utilities.constants import (
+    EMBEDDING_SESSION_MAX_BYTES,
+    EMBEDDING_SESSION_MAX_ENTRIES,
+    EMBEDDING_SESSION_TTL,
+)
+
+__all__ = [
+    "EmbeddingSession",
+    "EmbeddingSessionNotFoundError",
+    "EmbeddingSessionStore",
+    "embedding_sessions",
+]
+
+
+class EmbeddingSessionNotFoundError(KeyError):
+    """The embedding session handle is unknown, expired or evicted"""
+
+    def __init__(self, session_id: str) -> None:
+        super().__init__(session_id)
+        self.session_id = session_id
+
+    def __str__(self) -> str:
+        return f"embedding session '{self.session_id}' not found or expired"
+
+
+@dataclass
+class EmbeddingSession:
+    """
+    Image embedding of a request bbox, together with everything needed to decode new prompts on it:
+    the model variant folder and the latitude-longitude to image pixels transform.
+    """
+
+    id: str
+    cached: CachedEmbedding
+    model_folder: Path
+    pixel_transform: LatLngPixelTransform
+    created: float
+    last_used: float
+    source_name: str | None = None
+
+    @property
+    def nbytes(self) -> int:
+        return self.cached.nbytes
+
+
+class EmbeddingSessionStore:
+    """
+    Thread-safe store of the embedding sessions, keyed by a random handle.
+
+    A session expires ttl seconds after its last use (every decode extends it). Before adding a new
+    session the expired ones are removed, then the least recently used ones are evicted until the
+    store fits within max_bytes and max_entries; a session bigger than the whole budget is kept
+    anyway (alone), logging a warning. The embeddings are shared with the embedding cache, an
+    eviction from one doesn't release the memory held by the other.
+
+    Args:
+        max_bytes: memory budget of the session embeddings (0 means no limit)
+        ttl: idle time to live of the sessions in seconds (0 means no expiration)
+        max_entries: max number of sessions (0 means no limit)
+
+    """
+
+    def __init__(self, max_bytes: int, ttl: float = 0, max_entries: int = 0) -> None:
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, EmbeddingSession] = OrderedDict()
+        self._current_bytes = 0
+        self._lock = threading.Lock()
+        self.created = 0
+        self.hits = 0
+        self.not_found = 0
+        self.expired = 0
+        self.evictions = 0
+        self.deleted = 0
+
+    def _is_expired(self, session: EmbeddingSession, now: float) -> bool:
+        return self.ttl > 0 and now - session.last_used > self.ttl
+
+    def _pop(self, session_id: str) -> EmbeddingSession | None:
+        session = self._entries.pop(session_id, None)
+        if session is not None:
+            self._current_bytes -= session.nbytes
+        return session
+
+    def _purge_expired(self, now: float) -> None:
+        # the entries are ordered by last use: the expired ones are at the front
+        while self._entries:
+            session = next(iter(self._entries.values()))
+            if not self._is_expired(session, now):
+                return
+            self._pop(session.id)
+            self.expired += 1
+
+    def _is_over_budget(self, nbytes: int) -> bool:
+        return (
+            self.max_bytes > 0 and self._current_bytes + nbytes > self.max_bytes
+        ) or (self.max_entries > 0 and len(self._entries) >= self.max_entries)
+
+    def create(
+        self,
+        cached: CachedEmbedding,
+        model_folder: str | Path,
+        pixel_transform: LatLngPixelTransform,
+        source_name: str | None = None,
+    ) -> EmbeddingSession:
+        """
+        Store a new embedding session, evicting the expired and the least recently used ones.
+
+        Args:
+            cached: image embedding with its Affine transform
+            model_folder: folder of the model variant that computed the embedding
+            pixel_transform: latitude-longitude to image pixels transform of the request bbox
+            source_name: name of the tile provider
+
+        Returns:
+            the new session, its id is the handle to decode the prompts
+
+        """
+        now = time.time()
+        session = EmbeddingSession(
+            id=secrets.token_urlsafe(16),
+            cached=cached,
+            model_folder=Path(model_folder),
+            pixel_transform=pixel_transform,
+            source_name=source_name,
+            created=now,
+            last_used=now,
+        )
+        with self._lock:
+            self._purge_expired(now)
+            while self._entries and self._is_over_budget(session.nbytes):
+                _, evicted = self._entries.popitem(last=False)
+                self._current_bytes -= evicted.nbytes
+                self.evictions += 1
+                app_logger.info(f"embedding session {evicted.id} evicted.")
+            if self.max_bytes > 0 and session.nbytes > self.max_bytes:
+                app_logger.warning(
+                    f"embedding session {session.id} ({session.nbytes} bytes) exceeds the {self.max_bytes} bytes budget."
+                )
+            self._entries[session.id] = session
+            self._current_bytes += session.nbytes
+            self.created += 1
+        return session
+
+    def get(self, session_id: str) -> EmbeddingSession:
+        """
+        Return the session and extend its time to live.
+
+        Args:
+            session_id: session handle
+
+        Returns:
+            the embedding session
+
+        Raises:
+            EmbeddingSessionNotFoundError: unknown, expired or evicted session
+
+        """
+        now = time.time()
+        with self._lock:
+            session = self._entries.get(session_id)
+            if session is not None and self._is_expired(session, now):
+                self._pop(session_id)
+                self.expired += 1
+                session = None
+            if session is None:
+                self.not_found += 1
+                raise EmbeddingSessionNotFoundError(session_id)
+            session.last_used = now
+            self._entries.move_to_end(session_id)
+            self.hits += 1
+            return session
+
+    def delete(self, session_id: str) -> None:
+        """
+        Release a session before its expiration.
+
+        Raises:
+            EmbeddingSessionNotFoundError: unknown, expired or evicted session
+
+        """
+        with self._lock:
+            if self._pop(session_id) is None:
+                self.not_found += 1
+                raise EmbeddingSessionNotFoundError(session_id)
+            self.deleted += 1
+
+    def expires_in(self, session: EmbeddingSession) -> float | None:
+        """Return the seconds before the session expiration if not used, None without TTL"""
+        if self.ttl <= 0:
+            return None
+        return max(0.0, session.last_used + self.ttl - time.time())
+
+    def clear(self) -> None:
+        """Release all the sessions"""
+        with self._lock:
+            self._entries.clear()
+            self._current_bytes = 0
+
+    def stats(self) -> dict[str, int]:
+        """Return the store counters"""
+        with self._lock:
+            return {
+                "created": self.created,
+                "hits": self.hits,
+                "not_found": self.not_found,
+                "expired": self.expired,
+                "evictions": self.evictions,
+                "deleted": self.deleted,
+                "entries": len(self._entries),
+                "bytes": self._current_bytes,
+            }
+
+
+embedding_sessions = EmbeddingSessionStore(
+    max_bytes=int(
+        os.getenv("EMBEDDING_SESSION_MAX_BYTES", EMBEDDING_SESSION_MAX_BYTES)
+    ),
+    ttl=float(os.getenv("EMBEDDING_SESSION_TTL", EMBEDDING_SESSION_TTL)),
+    max_entries=int(
+        os.getenv("EMBEDDING_SESSION_MAX_ENTRIES", EMBEDDING_SESSION_MAX_ENTRIES)
+    ),
+)
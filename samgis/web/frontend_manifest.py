@@ -0,0 +1,152 @@
+"""Content-hashed frontend build: run the frontend toolchain only when the static sources change"""
+
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+
+from samgis_core import app_logger
+from samgis_web.utilities import frontend_builder
+
+from samgis.utilities.constants import (
+    FRONTEND_MANIFEST_FILENAME,
+    FRONTEND_SOURCES_EXCLUDED_FOLDERS,
+)
+
+__all__ = [
+    "FRONTEND_BUILD_MODES",
+    "ensure_frontend",
+    "get_frontend_sources_hash",
+    "read_build_manifest",
+    "write_build_manifest",
+]
+
+FRONTEND_BUILD_MODES = ("manifest", "prebuilt", "force")
+
+
+def get_frontend_sources_hash(static_folder: Path, input_css_path: str | Path) -> str:
+    """
+    Hash the frontend sources: every file within static_folder (relative path and content) but
+    the excluded and the hidden folders, plus the input css path and content.
+
+    Args:
+        static_folder: frontend project folder
+        input_css_path: tailwindcss input file path, relative to static_folder or absolute
+
+    Returns:
+        sha256 hex digest of the frontend sources
+    """
+    sources_hash = hashlib.sha256()
+    for root, folders, files in os.walk(static_folder):
+        # sorted in place, so os.walk visits the folders in a stable order
+        folders[:] = sorted(
+            folder
+            for folder in folders
+            if folder not in FRONTEND_SOURCES_EXCLUDED_FOLDERS
+            and not folder.startswith(".")
+        )
+        for filename in sorted(files):
+            path = Path(root) / filename
+            sources_hash.update(path.relative_to(static_folder).as_posix().encode())
+            with open(path, "rb") as f:
+                sources_hash.update(hashlib.file_digest(f, "sha256").digest())
+    sources_hash.update(str(input_css_path).encode())
+    input_css_pathfile = Path(static_folder) / input_css_path
+    if input_css_pathfile.is_file():
+        sources_hash.update(input_css_pathfile.read_bytes())
+    return sources_hash.hexdigest()
+
+
+def read_build_manifest(output_dist_folder: Path) -> dict | None:
+    """Read the build manifest within the dist folder, None if missing or unreadable"""
+    manifest_path = Path(output_dist_folder) / FRONTEND_MANIFEST_FILENAME
+    try:
+        return json.loads(manifest_path.read_text())
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e_read:
+        app_logger.warning(
+            f"unreadable frontend build manifest {manifest_path}: {e_read}."
+        )
+        return None
+
+
+def write_build_manifest(
+    output_dist_folder: Path, sources_hash: str, input_css_path: str | Path
+) -> None:
+    """Write the build manifest within the dist folder"""
+    manifest = {
+        "sources_hash": sources_hash,
+        "input_css_path": str(input_css_path),
+        "built_at": time.time(),
+    }
+    manifest_path = Path(output_dist_folder) / FRONTEND_MANIFEST_FILENAME
+    manifest_path.write_text(json.dumps(manifest))
+
+
+def _is_dist_complete(output_dist_folder: Path) -> bool:
+    return (output_dist_folder / "index.html").is_file() and (
+        output_dist_folder / "output.css"
+    ).is_file()
+
+
+def ensure_frontend(
+    project_root_folder: str | Path,
+    input_css_path: str | Path,
+    output_dist_folder: Path,
+    mode: str = "manifest",
+) -> bool:
+    """
+    Make the frontend dist folder ready, building it only if necessary.
+
+    - "manifest": reuse the dist folder if its build manifest matches the hash of the current
+      sources, otherwise build the frontend and write the manifest
+    - "prebuilt": never run the frontend toolchain (e.g. within the docker image, where the dist
+      folder comes from a build stage), failing if the dist folder isn't complete
+    - "force": always build the frontend and write the manifest
+
+    Args:
+        project_root_folder: project folder containing the static frontend folder
+        input_css_path: tailwindcss input file path
+        output_dist_folder: frontend dist folder
+        mode: one of FRONTEND_BUILD_MODES
+
+    Returns:
+        True if the frontend was built, False if the existing dist folder was reused
+
+    """
+    if mode not in FRONTEND_BUILD_MODES:
+        raise ValueError(
+            f"frontend build mode must be one of {FRONTEND_BUILD_MODES}, got '{mode}'"
+        )
+    output_dist_folder = Path(output_dist_folder)
+    if mode == "prebuilt":
+        if not _is_dist_complete(output_dist_folder):
+            raise FileNotFoundError(
+                f"prebuilt frontend not found within '{output_dist_folder}'"
+            )
+        app_logger.info(f"using the prebuilt frontend within {output_dist_folder}.")
+        return False
+
+    static_folder = Path(project_root_folder) / "static"
+    sources_hash = get_frontend_sources_hash(static_folder, input_css_path)
+    manifest = read_build_manifest(output_dist_folder)
+    if (
+        mode == "manifest"
+        and manifest is not None
+        and manifest.get("sources_hash") == sources_hash
+        and _is_dist_complete(output_dist_folder)
+    ):
+        app_logger.info(f"frontend sources unchanged ({sources_hash}), build skipped.")
+        return False
+
+    app_logger.info(f"building the frontend, sources hash {sources_hash}...")
+    frontend_builder.build_frontend(
+        project_root_folder=project_root_folder,
+        input_css_path=input_css_path,
+        output_dist_folder=output_dist_folder,
+        force_build=True,
+    )
+    write_build_manifest(output_dist_folder, sources_hash, input_css_path)
+    return True
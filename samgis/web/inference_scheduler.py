@@ -0,0 +1,189 @@
+"""Bounded scheduler for the inference requests, with a wait queue and fast rejection (backpressure)"""
+
+import math
+import os
+import threading
+import time
+from collections import deque
+from collections.abc import Iterator
+from contextlib import contextmanager
+
+from samgis_core import app_logger
+
+from samgis.utilities.constants import (
+    INFERENCE_MAX_CONCURRENCY,
+    INFERENCE_MAX_QUEUE_SIZE,
+    INFERENCE_QUEUE_TIMEOUT,
+)
+
+__all__ = [
+    "InferenceRejectedError",
+    "InferenceScheduler",
+    "inference_scheduler",
+]
+
+
+class InferenceRejectedError(Exception):
+    """
+    Raised when an inference request can't get an inference slot.
+
+    Args:
+        msg: error message
+        status_code: http status code for the rejected request (429 queue full, 503 queue timeout)
+        retry_after: suggested number of seconds before retrying the request
+
+    """
+
+    def __init__(self, msg: str, status_code: int, retry_after: int) -> None:
+        super().__init__(msg)
+        self.msg = msg
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class InferenceScheduler:
+    """
+    Limit the number of concurrent inference runs to max_concurrency. Requests exceeding it wait
+    in a FIFO queue of at most max_queue_size entries for up to queue_timeout seconds; a request
+    arriving with a full queue is rejected immediately (429), one waiting too long is rejected
+    with a 503. Both carry a Retry-After estimate based on the average inference duration.
+
+    Args:
+        max_concurrency: number of inference slots
+        max_queue_size: max number of requests waiting for a slot
+        queue_timeout: max seconds waiting for a slot
+
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = INFERENCE_MAX_CONCURRENCY,
+        max_queue_size: int = INFERENCE_MAX_QUEUE_SIZE,
+        queue_timeout: float = INFERENCE_QUEUE_TIMEOUT,
+    ) -> None:
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency must be a positive integer value.")
+        if max_queue_size < 0:
+            raise ValueError("max_queue_size must be a non-negative integer value.")
+        self.max_concurrency = max_concurrency
+        self.max_queue_size = max_queue_size
+        self.queue_timeout = queue_timeout
+        self._condition = threading.Condition()
+        self._waiters: deque[object] = deque()
+        self._in_flight = 0
+        self.completed = 0
+        self.rejected_queue_full = 0
+        self.rejected_timeout = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+        self.wait_seconds_last = 0.0
+        self.service_seconds_total = 0.0
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._waiters)
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def _get_retry_after(self) -> int:
+        # condition lock already held by the caller
+        avg_service = (
+            self.service_seconds_total / self.completed if self.completed else 1.0
+        )
+        queued_runs = (len(self._waiters) + self._in_flight) / self.max_concurrency
+        return max(1, math.ceil(avg_service * queued_runs))
+
+    def _acquire(self) -> float:
+        time_start = time.monotonic()
+        with self._condition:
+            if self._in_flight < self.max_concurrency and not self._waiters:
+                self._in_flight += 1
+                return 0.0
+            if len(self._waiters) >= self.max_queue_size:
+                self.rejected_queue_full += 1
+                raise InferenceRejectedError(
+                    "Too Many Requests", 429, self._get_retry_after()
+                )
+            token = object()
+            self._waiters.append(token)
+            try:
+                deadline = time_start + self.queue_timeout
+                while (
+                    self._waiters[0] is not token
+                    or self._in_flight >= self.max_concurrency
+                ):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.rejected_timeout += 1
+                        raise InferenceRejectedError(
+                            "Service Unavailable", 503, self._get_retry_after()
+                        )
+                    self._condition.wait(remaining)
+                self._in_flight += 1
+            finally:
+                self._waiters.remove(token)
+                # the next waiter in the queue could be the new head
+                self._condition.notify_all()
+            return time.monotonic() - time_start
+
+    def _release(self, wait_seconds: float, service_seconds: float) -> None:
+        with self._condition:
+            self._in_flight -= 1
+            self.completed += 1
+            self.wait_seconds_total += wait_seconds
+            self.wait_seconds_max = max(self.wait_seconds_max, wait_seconds)
+            self.wait_seconds_last = wait_seconds
+            self.service_seconds_total += service_seconds
+            self._condition.notify_all()
+
+    @contextmanager
+    def slot(self) -> Iterator[float]:
+        """
+        Context manager holding an inference slot, raising InferenceRejectedError when the
+        queue is full or the wait exceeds queue_timeout.
+
+        Returns:
+            seconds spent waiting for the slot
+
+        """
+        wait_seconds = self._acquire()
+        app_logger.debug(f"inference slot acquired after {wait_seconds:.3f}s.")
+        time_start = time.monotonic()
+        try:
+            yield wait_seconds
+        finally:
+            self._release(wait_seconds, time.monotonic() - time_start)
+
+    def stats(self) -> dict[str, int | float]:
+        """Return the queue depth, the in-flight inferences and the wait time counters"""
+        with self._condition:
+            return {
+                "max_concurrency": self.max_concurrency,
+                "max_queue_size": self.max_queue_size,
+                "in_flight": self._in_flight,
+                "queue_depth": len(self._waiters),
+                "completed": self.completed,
+                "rejected_queue_full": self.rejected_queue_full,
+                "rejected_timeout": self.rejected_timeout,
+                "wait_seconds_avg": (
+                    self.wait_seconds_total / self.completed if self.completed else 0.0
+                ),
+                "wait_seconds_max": self.wait_seconds_max,
+                "wait_seconds_last": self.wait_seconds_last,
+                "service_seconds_avg": (
+                    self.service_seconds_total / self.completed
+                    if self.completed
+                    else 0.0
+                ),
+            }
+
+
+inference_scheduler = InferenceScheduler(
+    max_concurrency=int(
+        os.getenv("INFERENCE_MAX_CONCURRENCY", INFERENCE_MAX_CONCURRENCY)
+    ),
+    max_queue_size=int(os.getenv("INFERENCE_MAX_QUEUE_SIZE", INFERENCE_MAX_QUEUE_SIZE)),
+    queue_timeout=float(os.getenv("INFERENCE_QUEUE_TIMEOUT", INFERENCE_QUEUE_TIMEOUT)),
+)
@@ -0,0 +1,140 @@
+"""Model files checksum verification computed in background, for cheap liveness/readiness probes"""
+
+import threading
+import time
+from pathlib import Path
+
+from samgis_core import app_logger
+from samgis_core.prediction_api import model_registry
+
+from samgis.prediction_api import model_downloader
+from samgis.utilities.constants import MODEL_HEALTH_CHECK_INTERVAL
+
+__all__ = [
+    "ModelHealth",
+]
+
+# file name => (size, mtime in ns), None for missing files
+type FilesSignature = dict[str, tuple[int, int] | None]
+
+
+class ModelHealth:
+    """
+    Verify the SHA-256 of the model files once, then again only when their size or modification
+    time change: the probes read the cached result instead of hashing hundreds of MB every time.
+    The files recorded within the verified manifest written by the download (or by a previous
+    verification) aren't hashed, not even at the first verification after a restart.
+
+    The background thread started by start() runs the first verification and then checks the files
+    signature (a stat() call per file) every interval seconds.
+
+    Args:
+        variant: model variant, see samgis_core.prediction_api.model_registry.MODELS
+        model_dir: folder containing the model files
+        interval: seconds between the files signature checks of the background thread
+
+    """
+
+    def __init__(
+        self,
+        variant: str,
+        model_dir: str | Path,
+        interval: float = MODEL_HEALTH_CHECK_INTERVAL,
+    ) -> None:
+        self.variant = variant
+        self.model_dir = Path(model_dir)
+        self.interval = interval
+        self.failures: list[str] | None = None
+        self.verified_at: float | None = None
+        self.verifications = 0
+        self.warm = False
+        self._signature: FilesSignature | None = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def _get_files_signature(self) -> FilesSignature:
+        signature: FilesSignature = {}
+        for filename in model_registry.MODELS[self.variant]["sha256"]:
+            try:
+                st = (self.model_dir / filename).stat()
+                signature[filename] = (st.st_size, st.st_mtime_ns)
+            except FileNotFoundError:
+                signature[filename] = None
+        return signature
+
+    def verify(self, force: bool = False) -> list[str]:
+        """
+        Verify the model files checksums if they changed since the last verification (or if forced).
+
+        Args:
+            force: verify the checksums even if the files signature didn't change
+
+        Returns:
+            list of the files failing the verification (empty = OK)
+
+        """
+        with self._lock:
+            signature = self._get_files_signature()
+            if force or self.failures is None or signature != self._signature:
+                time_start = time.perf_counter()
+                failures = model_downloader.verify_download(
+                    self.variant, model_dir=self.model_dir
+                )
+                self.failures, self._signature = failures, signature
+                self.verified_at = time.time()
+                self.verifications += 1
+                app_logger.info(
+                    f"model {self.variant} verified in {time.perf_counter() - time_start:.3f}s, failures:{failures}."
+                )
+            return self.failures
+
+    def invalidate(self) -> None:
+        """Forget the cached verification result: the next verify() hashes the files again"""
+        with self._lock:
+            self.failures, self._signature, self.verified_at = None, None, None
+
+    def mark_warm(self) -> None:
+        """Record the model sessions are built and warmed up"""
+        self.warm = True
+
+    def is_verified(self) -> bool:
+        """True if the last verification completed without failures (never hashes)"""
+        return self.failures is not None and not self.failures
+
+    def status(self) -> dict:
+        """Return the cached verification result and the model warm state"""
+        return {
+            "variant": self.variant,
+            "verified": self.is_verified(),
+            "verification_pending": self.failures is None,
+            "failures": self.failures or [],
+            "verified_at": self.verified_at,
+            "warm": self.warm,
+        }
+
+    def _run(self) -> None:
+        while True:
+            try:
+                self.verify()
+            except (OSError, KeyError) as e_verify:
+                app_logger.error(f"model verification failed: {e_verify}.")
+            if self._stop.wait(self.interval):
+                return
+
+    def start(self) -> None:
+        """Start the background verification thread"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="model_health", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop the background verification thread"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
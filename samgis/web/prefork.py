@@ -0,0 +1,550 @@
+"""pre-fork server: the workers share the model sessions built by the parent process copy-on-write"""
+
+import argparse
+import gc
+import mmap
+import os
+import random
+import signal
+import socket
+import time
+from collections.abc import Callable
+from typing import Any
+
+import numpy as np
+from samgis_core import app_logger
+
+from samgis.utilities.constants import (
+    PREFORK_GRACEFUL_TIMEOUT,
+    PREFORK_MAX_REQUESTS,
+    PREFORK_MAX_REQUESTS_JITTER,
+    PREFORK_MAX_WORKER_AGE,
+    PREFORK_MAX_WORKER_MEMORY,
+    PREFORK_MONITOR_INTERVAL,
+    PREFORK_WORKERS,
+)
+from samgis.utilities.metrics import Sample
+
+__all__ = [
+    "PreforkServer",
+    "WorkerTable",
+    "get_process_memory",
+    "get_uvicorn_worker",
+    "get_worker_count",
+    "get_worker_samples",
+    "is_worker",
+    "main",
+    "record_request",
+]
+
+# the memory fields are in bytes, the times are unix timestamps
+WORKER_FIELDS = (
+    "pid",
+    "started",
+    "requests",
+    "recycled",
+    "restarts",
+    "rss",
+    "pss",
+    "shared",
+    "private",
+)
+_MEMORY_FIELDS = ("rss", "pss", "shared", "private")
+# /proc/<pid>/smaps_rollup lines (values in kB) summed into every memory field
+_SMAPS_FIELDS = {
+    "rss": ("Rss",),
+    "pss": ("Pss",),
+    "shared": ("Shared_Clean", "Shared_Dirty"),
+    "private": ("Private_Clean", "Private_Dirty"),
+}
+
+# set within the worker processes only
+_worker_table: "WorkerTable | None" = None
+_worker_slot: int | None = None
+_worker_pid: int | None = None
+
+
+class WorkerTable:
+    """
+    Workers stats within an anonymous shared memory map created before forking, so that the parent
+    and all the workers read and write the same values without any IPC. Every field has a single
+    writer: the worker counts its requests, the parent process updates the others. The last row
+    contains the parent process stats.
+
+    Args:
+        n_workers: number of worker slots
+
+    """
+
+    def __init__(self, n_workers: int) -> None:
+        self.n_workers = n_workers
+        shape = (n_workers + 1, len(WORKER_FIELDS))
+        self._mmap = mmap.mmap(-1, int(np.prod(shape)) * 8)
+        self._values = np.ndarray(shape, dtype=np.float64, buffer=self._mmap)
+        self._values[:] = 0
+
+    @property
+    def parent_slot(self) -> int:
+        return self.n_workers
+
+    def get(self, slot: int, field: str) -> float:
+        return float(self._values[slot, WORKER_FIELDS.index(field)])
+
+    def set(self, slot: int, field: str, value: float) -> None:
+        self._values[slot, WORKER_FIELDS.index(field)] = value
+
+    def add(self, slot: int, field: str, value: float = 1) -> None:
+        self._values[slot, WORKER_FIELDS.index(field)] += value
+
+    def snapshot(self) -> list[dict[str, float]]:
+        """Return the stats of every worker slot, followed by the parent process ones"""
+        values = self._values.copy()
+        return [dict(zip(WORKER_FIELDS, row.tolist())) for row in values]
+
+
+def get_process_memory(pid: int) -> dict[str, int]:
+    """
+    Return the memory of a process in bytes: rss (resident), pss (proportional set size: every
+    shared page divided by the number of processes sharing it), shared and private. The sum of the
+    workers pss is the actual memory used by the whole server. Read from /proc (linux only): the
+    values are 0 elsewhere or for a process already exited.
+
+    Args:
+        pid: process id
+
+    Returns:
+        dict with rss, pss, shared and private bytes
+
+    """
+    memory: dict[str, int] = dict.fromkeys(_MEMORY_FIELDS, 0)
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as src:
+            values_kb = {}
+            for line in src:
+                key, _, value = line.partition(":")
+                if value.strip().endswith("kB"):
+                    values_kb[key] = int(value.split()[0])
+    except OSError:
+        return memory
+    for field, keys in _SMAPS_FIELDS.items():
+        memory[field] = sum(values_kb.get(key, 0) for key in keys) * 1024
+    return memory
+
+
+def is_worker() -> bool:
+    """True within a pre-fork server worker process"""
+    return _worker_table is not None
+
+
+def get_worker_count() -> int:
+    """Return the number of workers of the pre-fork server, 0 outside its workers"""
+    return 0 if _worker_table is None else _worker_table.n_workers
+
+
+def record_request() -> None:
+    """Count a request of the current worker, no-op outside the pre-fork server workers"""
+    if _worker_table is None:
+        return
+    assert _worker_slot is not None
+    if _worker_table.get(_worker_slot, "pid") == _worker_pid:
+        # a recycled worker still draining its requests doesn't count them on the new one
+        _worker_table.add(_worker_slot, "requests")
+
+
+def get_worker_samples() -> list[Sample]:
+    """Return the metrics samples of every worker and of the parent process, none outside the workers"""
+    if _worker_table is None:
+        return []
+    assert _worker_slot is not None
+    samples: list[Sample] = [
+        (
+            "samgis_prefork_worker_id",
+            "gauge",
+            "Slot of the pre-fork worker answering this request, the other metrics are per worker.",
+            _worker_slot,
+        )
+    ]
+    now = time.time()
+    rows = _worker_table.snapshot()
+    for slot, row in enumerate(rows):
+        label = "parent" if slot == _worker_table.parent_slot else str(slot)
+        for field in _MEMORY_FIELDS:
+            samples.append(
+                (
+                    f'samgis_prefork_{field}_bytes{{worker="{label}"}}',
+                    "gauge",
+                    f"Pre-fork server processes memory: {field}.",
+                    row[field],
+                )
+            )
+        if slot == _worker_table.parent_slot:
+            continue
+        for field in ("requests", "recycled", "restarts"):
+            samples.append(
+                (
+                    f'samgis_prefork_worker_{field}_total{{worker="{label}"}}',
+                    "counter",
+                    f"Pre-fork worker {field} (requests of the current process).",
+                    row[field],
+                )
+            )
+        samples.append(
+            (
+                f'samgis_prefork_worker_uptime_seconds{{worker="{label}"}}',
+                "gauge",
+                "Pre-fork worker process uptime.",
+                now - row["started"] if row["pid"] else 0,
+            )
+        )
+    return samples
+
+
+def get_uvicorn_worker(
+    app: Any, **config_kwargs: Any
+) -> Callable[[socket.socket], None]:
+    """Return the worker function serving the ASGI app with uvicorn on the inherited socket"""
+
+    def serve(sock: socket.socket) -> None:
+        import uvicorn
+
+        config = uvicorn.Config(app, lifespan="on", **config_kwargs)
+        uvicorn.Server(config).run(sockets=[sock])
+
+    return serve
+
+
+class PreforkServer:
+    """
+    Bind the listening socket, then fork the workers: everything the parent process loaded before
+    (the model sessions, the frontend, the imported modules) is shared with the workers
+    copy-on-write, a new worker starts in milliseconds without loading anything.
+
+    The parent process monitors the workers every monitor_interval seconds: a dead worker is
+    replaced (counted as a restart if it crashed), a worker over a recycling limit is replaced too, first forking
+    the new one, then stopping the old one gracefully (SIGTERM, SIGKILL after graceful_timeout).
+    SIGHUP recycles all the workers, SIGTERM and SIGINT stop the server.
+
+    Args:
+        worker: function serving the requests on the listening socket, see get_uvicorn_worker()
+        host: bind address
+        port: bind port
+        workers: number of worker processes
+        max_requests: recycle a worker after these requests, plus a random jitter (0 means no limit)
+        max_requests_jitter: max random requests added to max_requests, so that the workers
+            aren't recycled all together
+        max_worker_memory: recycle a worker with more private memory bytes (0 means no limit)
+        max_worker_age: recycle a worker after these seconds (0 means no limit)
+        graceful_timeout: seconds given to a stopping worker to complete its requests
+        monitor_interval: seconds between the workers checks
+
+    """
+
+    def __init__(
+        self,
+        worker: Callable[[socket.socket], None],
+        host: str,
+        port: int,
+        workers: int,
+        max_requests: int = 0,
+        max_requests_jitter: int = 0,
+        max_worker_memory: int = 0,
+        max_worker_age: float = 0,
+        graceful_timeout: float = PREFORK_GRACEFUL_TIMEOUT,
+        monitor_interval: float = PREFORK_MONITOR_INTERVAL,
+    ) -> None:
+        if workers < 1:
+            raise ValueError("workers must be a positive integer value.")
+        self.worker = worker
+        self.host = host
+        self.port = port
+        self.workers = workers
+        self.max_requests = max_requests
+        self.max_requests_jitter = max_requests_jitter
+        self.max_worker_memory = max_worker_memory
+        self.max_worker_age = max_worker_age
+        self.graceful_timeout = graceful_timeout
+        self.monitor_interval = monitor_interval
+        self.table = WorkerTable(workers)
+        self.socket: socket.socket | None = None
+        self._pids: list[int | None] = [None] * workers
+        self._request_limits = [0] * workers
+        self._respawn_at = [0.0] * workers
+        # pid => SIGKILL deadline of the recycled workers completing their requests
+        self._retiring: dict[int, float] = {}
+        self._stopping = False
+        # set by the SIGHUP handler, the workers are forked from the run() loop
+        self._recycle_all_reason: str | None = None
+
+    @property
+    def pids(self) -> list[int | None]:
+        return list(self._pids)
+
+    def _bind(self) -> socket.socket:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind((self.host, self.port))
+        sock.listen(2048)
+        sock.set_inheritable(True)
+        return sock
+
+    def _run_worker(self, slot: int) -> None:
+        global _worker_table, _worker_slot, _worker_pid
+        # the forked worker never returns to the caller of _spawn(): it always ends with os._exit()
+        exit_code = 1
+        try:
+            for signum in (signal.SIGTERM, signal.SIGINT, signal.SIGHUP):
+                signal.signal(signum, signal.SIG_DFL)
+            _worker_table, _worker_slot, _worker_pid = self.table, slot, os.getpid()
+            assert self.socket is not None
+            self.worker(self.socket)
+            exit_code = 0
+        except SystemExit as e_exit:
+            # e.g. uvicorn's own shutdown or its startup failure, keeping their exit code
+            exit_code = _get_exit_code(e_exit)
+        except Exception as e_worker:
+            app_logger.error(f"prefork worker {slot} failed: {e_worker}.")
+            raise
+        finally:
+            # never unwind into the parent process code: os._exit() ends the worker with exit_code
+            os._exit(exit_code)
+
+    def _spawn(self, slot: int) -> int:
+        self.table.set(slot, "requests", 0)
+        for field in _MEMORY_FIELDS:
+            self.table.set(slot, field, 0)
+        self.table.set(slot, "started", time.time())
+        self._request_limits[slot] = self.max_requests + random.randint(
+            0, self.max_requests_jitter
+        )
+        pid = os.fork()
+        if pid == 0:
+            self._run_worker(slot)
+        self.table.set(slot, "pid", pid)
+        self._pids[slot] = pid
+        app_logger.info(f"prefork worker {slot} started, pid {pid}.")
+        return pid
+
+    def start(self) -> None:
+        """Bind the socket and fork all the workers"""
+        self.socket = self._bind()
+        self.port = self.socket.getsockname()[1]
+        # move the objects created so far out of the garbage collector: its reference scans
+        # would otherwise write (and copy) the shared pages within every worker
+        gc.collect()
+        gc.freeze()
+        self.table.set(self.table.parent_slot, "pid", os.getpid())
+        self.table.set(self.table.parent_slot, "started", time.time())
+        for slot in range(self.workers):
+            self._spawn(slot)
+        app_logger.info(
+            f"prefork server listening on {self.host}:{self.port} with {self.workers} workers."
+        )
+
+    def recycle(self, slot: int, reason: str) -> None:
+        """Replace the worker with a new one, then stop the old one gracefully"""
+        old_pid = self._pids[slot]
+        self._spawn(slot)
+        self.table.add(slot, "recycled")
+        if old_pid is not None:
+            app_logger.info(
+                f"prefork worker {slot} (pid {old_pid}) recycled: {reason}."
+            )
+            self._retiring[old_pid] = time.monotonic() + self.graceful_timeout
+            _kill(old_pid, signal.SIGTERM)
+
+    def recycle_all(self, reason: str) -> None:
+        for slot in range(self.workers):
+            self.recycle(slot, reason)
+
+    def _reap(self) -> None:
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            if self._retiring.pop(pid, None) is not None or pid not in self._pids:
+                continue
+            slot = self._pids.index(pid)
+            self._pids[slot] = None
+            if self._stopping:
+                continue
+            uptime = time.time() - self.table.get(slot, "started")
+            exit_code = os.waitstatus_to_exitcode(status)
+            if exit_code == 0:
+                # e.g. a SIGTERM sent to the worker, not by the parent: replaced, not a crash
+                app_logger.info(
+                    f"prefork worker {slot} (pid {pid}) exited after {uptime:.1f}s."
+                )
+            else:
+                app_logger.warning(
+                    f"prefork worker {slot} (pid {pid}) exited with code {exit_code} after {uptime:.1f}s."
+                )
+                self.table.add(slot, "restarts")
+            # a worker dying at startup is restarted once per second at most
+            self._respawn_at[slot] = time.monotonic() + (1.0 if uptime < 1.0 else 0.0)
+
+    def _get_recycle_reason(self, slot: int, now: float) -> str | None:
+        requests = self.table.get(slot, "requests")
+        if self.max_requests > 0 and requests >= self._request_limits[slot]:
+            return f"{requests:.0f} requests"
+        private = self.table.get(slot, "private")
+        if self.max_worker_memory > 0 and private > self.max_worker_memory:
+            return f"{private:.0f} bytes of private memory"
+        age = now - self.table.get(slot, "started")
+        if self.max_worker_age > 0 and age > self.max_worker_age:
+            return f"{age:.0f}s old"
+        return None
+
+    def poll(self) -> None:
+        """Replace the dead workers, update the memory stats and apply the recycling limits"""
+        self._reap()
+        now, now_monotonic = time.time(), time.monotonic()
+        for pid, deadline in list(self._retiring.items()):
+            if now_monotonic > deadline:
+                app_logger.warning(
+                    f"prefork worker pid {pid} killed after the graceful timeout."
+                )
+                _kill(pid, signal.SIGKILL)
+        for slot in (*range(self.workers), self.table.parent_slot):
+            pid = os.getpid() if slot == self.table.parent_slot else self._pids[slot]
+            if pid is None:
+                continue
+            for field, value in get_process_memory(pid).items():
+                self.table.set(slot, field, value)
+        if self._stopping:
+            return
+        for slot, pid in enumerate(self._pids):
+            if pid is None:
+                if now_monotonic >= self._respawn_at[slot]:
+                    self._spawn(slot)
+                continue
+            reason = self._get_recycle_reason(slot, now)
+            if reason is not None:
+                self.recycle(slot, reason)
+
+    def stop(self) -> None:
+        """Stop all the workers gracefully, killing the ones still running after graceful_timeout"""
+        self._stopping = True
+        pids = [pid for pid in (*self._pids, *self._retiring) if pid is not None]
+        for pid in pids:
+            _kill(pid, signal.SIGTERM)
+        deadline = time.monotonic() + self.graceful_timeout
+        while time.monotonic() < deadline and (
+            any(pid is not None for pid in self._pids) or self._retiring
+        ):
+            self._reap()
+            time.sleep(0.05)
+        for pid in (*self._pids, *self._retiring):
+            if pid is not None:
+                _kill(pid, signal.SIGKILL)
+                _wait(pid)
+        self._pids = [None] * self.workers
+        self._retiring.clear()
+        if self.socket is not None:
+            self.socket.close()
+        app_logger.info("prefork server stopped.")
+
+    def run(self) -> None:
+        """Start the workers and monitor them until SIGTERM or SIGINT"""
+
+        def on_stop(signum: int, _frame: Any) -> None:
+            self._stopping = True
+
+        def on_recycle(signum: int, _frame: Any) -> None:
+            # forking within a signal handler could copy locks held by the interrupted code
+            self._recycle_all_reason = "SIGHUP"
+
+        signal.signal(signal.SIGTERM, on_stop)
+        signal.signal(signal.SIGINT, on_stop)
+        signal.signal(signal.SIGHUP, on_recycle)
+        self.start()
+        try:
+            while not self._stopping:
+                if self._recycle_all_reason is not None:
+                    reason, self._recycle_all_reason = self._recycle_all_reason, None
+                    self.recycle_all(reason)
+                self.poll()
+                time.sleep(self.monitor_interval)
+        finally:
+            self.stop()
+
+
+def _get_exit_code(e_exit: SystemExit) -> int:
+    # same conversion of the interpreter: None is a success, any other non integer value a failure
+    if e_exit.code is None:
+        return 0
+    return e_exit.code if isinstance(e_exit.code, int) else 1
+
+
+def _kill(pid: int, signum: int) -> None:
+    try:
+        os.kill(pid, signum)
+    except ProcessLookupError:
+        pass
+
+
+def _wait(pid: int) -> None:
+    try:
+        os.waitpid(pid, 0)
+    except ChildProcessError:
+        pass
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Run the samgis app with pre-forked workers sharing the model sessions."
+    )
+    parser.add_argument("--host", default="0.0.0.0", help="bind address")  # nosec: B104
+    parser.add_argument("--port", type=int, default=7860, help="bind port")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=int(os.getenv("PREFORK_WORKERS", PREFORK_WORKERS)),
+        help="worker processes, 0 means one per core",
+    )
+    args = parser.parse_args()
+    # the onnxruntime thread pools don't survive a fork: single threaded sessions, a worker per core
+    intra_op_num_threads = os.environ.setdefault("ORT_INTRA_OP_NUM_THREADS", "1")
+    if intra_op_num_threads != "1":
+        app_logger.warning(
+            f"ORT_INTRA_OP_NUM_THREADS={intra_op_num_threads}: the inference could hang within the workers."
+        )
+
+    import app
+
+    app.model_health.verify()
+    if app.model_preload:
+        app.preload_models()
+    app.startup_timer.mark("model_preload")
+    server = PreforkServer(
+        get_uvicorn_worker(app.app),
+        host=args.host,
+        port=args.port,
+        workers=args.workers or os.cpu_count() or 1,
+        max_requests=int(os.getenv("PREFORK_MAX_REQUESTS", PREFORK_MAX_REQUESTS)),
+        max_requests_jitter=int(
+            os.getenv("PREFORK_MAX_REQUESTS_JITTER", PREFORK_MAX_REQUESTS_JITTER)
+        ),
+        max_worker_memory=int(
+            os.getenv("PREFORK_MAX_WORKER_MEMORY", PREFORK_MAX_WORKER_MEMORY)
+        ),
+        max_worker_age=float(
+            os.getenv("PREFORK_MAX_WORKER_AGE", PREFORK_MAX_WORKER_AGE)
+        ),
+        graceful_timeout=float(
+            os.getenv("PREFORK_GRACEFUL_TIMEOUT", PREFORK_GRACEFUL_TIMEOUT)
+        ),
+        monitor_interval=float(
+            os.getenv("PREFORK_MONITOR_INTERVAL", PREFORK_MONITOR_INTERVAL)
+        ),
+    )
+    app_logger.info(
+        f"prefork parent ready in {app.startup_timer.total:.3f}s, phases:{app.startup_timer.phases}."
+    )
+    server.run()
+
+
+if __name__ == "__main__":
+    main()
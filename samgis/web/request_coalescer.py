@@ -0,0 +1,140 @@
+"""Single-flight coalescing of identical in-flight inference requests"""
+
+import hashlib
+import json
+import os
+import threading
+from collections.abc import Callable
+from typing import Any
+
+from pydantic import BaseModel
+from samgis_core import app_logger
+
+from samgis.utilities.metrics import add_timings, collect_timings
+
+__all__ = [
+    "RequestCoalescer",
+    "get_request_key",
+    "request_coalescer",
+]
+
+
+def _get_canonical_value(value: Any) -> Any:
+    # json-friendly representation of the parsed request values (tile providers, pydantic models)
+    if isinstance(value, BaseModel):
+        return value.model_dump()
+    if isinstance(value, dict):
+        return {str(k): _get_canonical_value(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_get_canonical_value(v) for v in value]
+    if isinstance(value, (str, int, float, bool)) or value is None:
+        return value
+    return getattr(value, "url", None) or str(value)
+
+
+def get_request_key(body_request: dict, *extra: Any) -> str:
+    """
+    Build the coalescing key of a request.
+
+    Args:
+        body_request: request as parsed by get_parsed_bbox_points_with_dictlist_prompt()
+        extra: other values distinguishing the requests (e.g. the endpoint version, the model)
+
+    Returns:
+        sha256 hex digest of the canonical json representation of the arguments
+
+    """
+    canonical = json.dumps(_get_canonical_value([body_request, *extra]), sort_keys=True)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class _Call:
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: BaseException | None = None
+        self.timings: dict[str, float] = {}
+
+
+def _copy_error(error: BaseException) -> BaseException:
+    # a new exception of the same type and attributes (e.g. the status code handled by the app) for
+    # every waiter, without calling an __init__ that could need other arguments than error.args
+    error_copy = type(error).__new__(type(error), *error.args)
+    error_copy.__dict__.update(vars(error))
+    return error_copy
+
+
+class RequestCoalescer:
+    """
+    Thread-safe single-flight: while a computation for a key is running, the callers with the
+    same key wait for it and share its result instead of running it again. Its stage timings are
+    added to the timings collected by every caller; on failure every waiter raises a copy of the
+    exception, chained to the original one.
+
+    Args:
+        enabled: when False every call runs its own computation
+
+    """
+
+    def __init__(self, enabled: bool = True) -> None:
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._calls: dict[str, _Call] = {}
+        self.leaders = 0
+        self.coalesced = 0
+
+    def run[T](self, key: str, fn: Callable[[], T]) -> T:
+        """
+        Run fn, or wait for the in-flight computation with the same key and return its result.
+
+        Args:
+            key: request key, see get_request_key()
+            fn: computation to run
+
+        Returns:
+            the result of fn, shared by all the callers with the same key
+
+        """
+        if not self.enabled:
+            return fn()
+        with self._lock:
+            call = self._calls.get(key)
+            is_leader = call is None
+            if call is None:
+                call = self._calls[key] = _Call()
+                self.leaders += 1
+            else:
+                self.coalesced += 1
+        if not is_leader:
+            app_logger.info(f"request {key} coalesced with an in-flight one.")
+            call.done.wait()
+            add_timings(call.timings)
+            if call.error is not None:
+                raise _copy_error(call.error) from call.error
+            return call.result
+        try:
+            with collect_timings() as call.timings:
+                call.result = fn()
+            return call.result
+        except BaseException as e_call:
+            call.error = e_call
+            raise
+        finally:
+            add_timings(call.timings)
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def stats(self) -> dict[str, int]:
+        """Return the in-flight computations, the computations run and the coalesced requests"""
+        with self._lock:
+            return {
+                "in_flight": len(self._calls),
+                "leaders": self.leaders,
+                "coalesced": self.coalesced,
+            }
+
+
+request_coalescer = RequestCoalescer(
+    enabled=os.getenv("REQUEST_COALESCING", "1").lower() not in ("", "0", "false")
+)
@@ -0,0 +1,246 @@
+"""LRU cache of the inference responses with a memory budget, a TTL and an optional on-disk tier"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+
+from samgis_core import app_logger
+
+from samgis.utilities.constants import (
+    RESPONSE_CACHE_DISK_MAX_BYTES,
+    RESPONSE_CACHE_MAX_BYTES,
+    RESPONSE_CACHE_TTL,
+)
+
+__all__ = [
+    "CachedResponse",
+    "ResponseCache",
+    "get_etag",
+    "response_cache",
+]
+
+
+def get_etag(key: str) -> str:
+    """
+    Return the weak ETag of the response cached with the key (the sha256 of the normalized request
+    and of the model variant). It's weak since the response body changes from run to run (its
+    duration and optionally its timings) while it stays semantically equivalent.
+    """
+    return f'W/"{key}"'
+
+
+@dataclass(frozen=True)
+class CachedResponse:
+    """Response content together with its weak ETag and its creation time (epoch seconds)"""
+
+    content: bytes
+    etag: str
+    created: float
+
+    @property
+    def nbytes(self) -> int:
+        return len(self.content)
+
+
+class ResponseCache:
+    """
+    Thread-safe LRU cache for the serialized inference responses.
+
+    The memory tier keeps at most max_bytes of responses, evicting the least recently used ones.
+    If disk_folder is set every response is also written there, so it's possible to reload it
+    after a restart or after an eviction from the memory tier; the disk tier is kept under
+    disk_max_bytes removing the oldest files. Entries older than ttl seconds are discarded.
+
+    Args:
+        max_bytes: memory budget for the cached responses (0 disables the memory tier)
+        ttl: time to live of the cached responses in seconds (0 means no expiration)
+        disk_folder: optional folder for the on-disk tier
+        disk_max_bytes: disk budget for the on-disk tier (0 means no limit)
+
+    """
+
+    def __init__(
+        self,
+        max_bytes: int,
+        ttl: float = 0,
+        disk_folder: str | Path | None = None,
+        disk_max_bytes: int = 0,
+    ) -> None:
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.disk_folder = Path(disk_folder) if disk_folder else None
+        self.disk_max_bytes = disk_max_bytes
+        self._entries: OrderedDict[str, CachedResponse] = OrderedDict()
+        self._current_bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+        self.not_modified = 0
+        if self.disk_folder is not None:
+            self.disk_folder.mkdir(parents=True, exist_ok=True)
+
+    def _is_expired(self, entry: CachedResponse) -> bool:
+        return self.ttl > 0 and time.time() - entry.created > self.ttl
+
+    def get(self, key: str) -> CachedResponse | None:
+        """Return the cached response for the key (promoting disk hits to memory), None on miss"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._is_expired(entry):
+                self._pop(key)
+                self.expired += 1
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+        entry = self._read_from_disk(key)
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._put_in_memory(key, entry)
+        return entry
+
+    def put(self, key: str, content: bytes) -> CachedResponse:
+        """Store the response content in the memory tier and, if enabled, in the disk tier"""
+        entry = CachedResponse(content=content, etag=get_etag(key), created=time.time())
+        with self._lock:
+            self._put_in_memory(key, entry)
+        self._write_on_disk(key, entry)
+        return entry
+
+    def is_not_modified(self, if_none_match: str, etag: str) -> bool:
+        """
+        Check an If-None-Match request header against the ETag of a cached response (weak
+        comparison, as required by RFC 9110 for If-None-Match). A "*" doesn't match: the caller
+        already checked the cached response exists.
+
+        Args:
+            if_none_match: If-None-Match header value, empty if missing
+            etag: cached response ETag, see get_etag()
+
+        Returns:
+            True if the client representation is still valid (304 Not Modified)
+
+        """
+        opaque_tag = etag.removeprefix("W/")
+        etags = {etag.strip().removeprefix("W/") for etag in if_none_match.split(",")}
+        not_modified = opaque_tag in etags
+        if not_modified:
+            with self._lock:
+                self.not_modified += 1
+        return not_modified
+
+    def clear(self) -> None:
+        """Empty the memory tier (the disk tier is left untouched)"""
+        with self._lock:
+            self._entries.clear()
+            self._current_bytes = 0
+
+    def stats(self) -> dict[str, int]:
+        """Return the cache counters"""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "expired": self.expired,
+                "evictions": self.evictions,
+                "not_modified": self.not_modified,
+                "entries": len(self._entries),
+                "bytes": self._current_bytes,
+            }
+
+    def _pop(self, key: str) -> None:
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self._current_bytes -= previous.nbytes
+
+    def _put_in_memory(self, key: str, entry: CachedResponse) -> None:
+        if entry.nbytes > self.max_bytes:
+            app_logger.debug(
+                f"response {key} ({entry.nbytes} bytes) exceeds the memory budget."
+            )
+            return
+        self._pop(key)
+        self._entries[key] = entry
+        self._current_bytes += entry.nbytes
+        while self._current_bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._current_bytes -= evicted.nbytes
+            self.evictions += 1
+
+    def _disk_path(self, key: str) -> Path:
+        if self.disk_folder is None:
+            raise ValueError("disk tier not enabled")
+        return self.disk_folder / f"{key}.json"
+
+    def _read_from_disk(self, key: str) -> CachedResponse | None:
+        if self.disk_folder is None:
+            return None
+        path = self._disk_path(key)
+        try:
+            # the file modification time is the response creation time
+            created = path.stat().st_mtime
+            if self.ttl > 0 and time.time() - created > self.ttl:
+                path.unlink(missing_ok=True)
+                with self._lock:
+                    self.expired += 1
+                return None
+            content = path.read_bytes()
+        except FileNotFoundError:
+            return None
+        except OSError as e_read:
+            app_logger.error(f"discarding unreadable cached response {path}: {e_read}.")
+            path.unlink(missing_ok=True)
+            return None
+        return CachedResponse(content=content, etag=get_etag(key), created=created)
+
+    def _write_on_disk(self, key: str, entry: CachedResponse) -> None:
+        if self.disk_folder is None:
+            return
+        path = self._disk_path(key)
+        tmp_path = path.with_suffix(f".{threading.get_ident()}.tmp")
+        try:
+            tmp_path.write_bytes(entry.content)
+            os.utime(tmp_path, (entry.created, entry.created))
+            os.replace(tmp_path, path)
+        except OSError as e_write:
+            app_logger.error(f"failed writing cached response {path}: {e_write}.")
+            tmp_path.unlink(missing_ok=True)
+            return
+        self._evict_from_disk()
+
+    def _evict_from_disk(self) -> None:
+        if self.disk_folder is None or self.disk_max_bytes <= 0:
+            return
+        files = []
+        for path in self.disk_folder.glob("*.json"):
+            try:
+                files.append((path, path.stat()))
+            except FileNotFoundError:
+                continue  # removed by a concurrent eviction
+        total = sum(st.st_size for _, st in files)
+        for path, st in sorted(files, key=lambda f: f[1].st_mtime):
+            if total <= self.disk_max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= st.st_size
+
+
+response_cache = ResponseCache(
+    max_bytes=int(os.getenv("RESPONSE_CACHE_MAX_BYTES", RESPONSE_CACHE_MAX_BYTES)),
+    ttl=float(os.getenv("RESPONSE_CACHE_TTL", RESPONSE_CACHE_TTL)),
+    disk_folder=os.getenv("RESPONSE_CACHE_FOLDER", "") or None,
+    disk_max_bytes=int(
+        os.getenv("RESPONSE_CACHE_DISK_MAX_BYTES", RESPONSE_CACHE_DISK_MAX_BYTES)
+    ),
+)
@@ -0,0 +1,130 @@
+"""parse the inference requests, including the samgis request options"""
+
+import numpy as np
+from samgis_core import app_logger
+from samgis_web.utilities.type_hints import ApiRequestBody
+from samgis_web.web import web_helpers
+
+from samgis.io_package.coordinates_pixel_conversion import LatLngPixelTransform
+from samgis.utilities.type_hints import (
+    EmbeddingRequestBody,
+    PolygonizeOptions,
+    SamgisApiRequestBody,
+)
+
+__all__ = [
+    "get_parsed_bbox_points_with_dictlist_prompt",
+    "get_parsed_embedding_request",
+    "get_parsed_prompt_list",
+]
+
+
+def get_parsed_prompt_list(
+    transform: LatLngPixelTransform, prompt_list: list
+) -> list[dict]:
+    """
+    Convert the latitude-longitude prompts to image pixel prompts, same output of the samgis_web
+    prompt parsing but with a single vectorized conversion of all the prompt points.
+
+    Args:
+        transform: latitude-longitude to image pixels transform of the request bbox
+        prompt_list: request prompts (points and rectangles)
+
+    Returns:
+        list of prompt dicts with the "data" in image pixel coordinates
+
+    """
+    latlng = []
+    for prompt in prompt_list:
+        if prompt.type == "point":
+            latlng.append((prompt.data.lat, prompt.data.lng))
+        elif prompt.type == "rectangle":
+            latlng.append((prompt.data.ne.lat, prompt.data.ne.lng))
+            latlng.append((prompt.data.sw.lat, prompt.data.sw.lng))
+        else:
+            msg = "Valid prompt type: 'point' or 'rectangle', not '{}'. Check ApiRequestBody parsing/validation."
+            raise TypeError(msg.format(prompt.type))
+    points = np.asarray(latlng, dtype=np.float64).reshape(-1, 2)
+    x, y = transform.to_pixels(points[:, 0], points[:, 1])
+    x, y = x.tolist(), y.tolist()
+
+    new_prompt_list = []
+    n = 0
+    for prompt in prompt_list:
+        new_prompt = {"type": prompt.type.value}
+        if prompt.type == "point":
+            new_prompt["label"] = prompt.label.value
+            new_prompt["data"] = [x[n], y[n]]
+            n += 1
+        else:
+            # correct order for rectangle prompt: sw x, ne y, ne x, sw y
+            new_prompt["data"] = [x[n + 1], y[n], x[n], y[n + 1]]
+            n += 2
+        new_prompt_list.append(new_prompt)
+    return new_prompt_list
+
+
+def get_parsed_bbox_points_with_dictlist_prompt(
+    request_input: SamgisApiRequestBody | ApiRequestBody | str,
+) -> dict:
+    """
+    Parse the raw input request into bbox, prompt, zoom, tile source and the samgis options.
+    Same output of samgis_web.web.web_helpers.get_parsed_bbox_points_with_dictlist_prompt(), plus
+    the "polygonize", "windowed" and "model_variant" keys (default values for an ApiRequestBody
+    input). The prompt points are converted to image pixels all at once, see
+    get_parsed_prompt_list().
+
+    Args:
+        request_input: input request body
+
+    Returns:
+        dict with bounding box, prompt, zoom, tile source, polygonization, windowed and model variant
+        options
+
+    """
+    if isinstance(request_input, str):
+        request_input = SamgisApiRequestBody.model_validate_json(request_input)
+    ne, sw = request_input.bbox.ne, request_input.bbox.sw
+    zoom = int(request_input.zoom)
+    transform = LatLngPixelTransform(ne.lat, ne.lng, sw.lat, sw.lng, zoom)
+    body_request = {
+        "bbox": [[float(ne.lat), float(ne.lng)], [float(sw.lat), float(sw.lng)]],
+        "prompt": get_parsed_prompt_list(transform, request_input.prompt),
+        "zoom": zoom,
+        # through the samgis_web module, so that patching its tile sources works
+        "source": web_helpers.get_source_tile(request_input.source_type),
+        "source_name": web_helpers.get_source_name(request_input.source_type),
+        "polygonize": getattr(request_input, "polygonize", None) or PolygonizeOptions(),
+        "windowed": getattr(request_input, "windowed", False),
+        "model_variant": getattr(request_input, "model_variant", None),
+    }
+    app_logger.debug(
+        f"polygonize options: {body_request['polygonize']}, windowed: {body_request['windowed']}, model_variant: {body_request['model_variant']}."
+    )
+    return body_request
+
+
+def get_parsed_embedding_request(request_input: EmbeddingRequestBody) -> dict:
+    """
+    Parse an embedding session request into bbox, zoom, tile source and model variant, same keys of
+    get_parsed_bbox_points_with_dictlist_prompt() without the prompt. The "pixel_transform" key
+    contains the latitude-longitude to image pixels transform, used to parse the prompts decoded
+    later on the session image (see get_parsed_prompt_list()).
+
+    Args:
+        request_input: embedding session request body
+
+    Returns:
+        dict with bounding box, zoom, tile source, model variant and pixel transform
+
+    """
+    ne, sw = request_input.bbox.ne, request_input.bbox.sw
+    zoom = int(request_input.zoom)
+    return {
+        "bbox": [[float(ne.lat), float(ne.lng)], [float(sw.lat), float(sw.lng)]],
+        "zoom": zoom,
+        "source": web_helpers.get_source_tile(request_input.source_type),
+        "source_name": web_helpers.get_source_name(request_input.source_type),
+        "model_variant": request_input.model_variant,
+        "pixel_transform": LatLngPixelTransform(ne.lat, ne.lng, sw.lat, sw.lng, zoom),
+    }
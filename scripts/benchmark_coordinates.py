@@ -0,0 +1,158 @@
+"""Compare the per-point and the vectorized coordinate conversions of the prompt parsing and the output georeferencing.
+
+The benchmark runs offline on synthetic data (no model, no tiles):
+
+- prompt parsing: samgis_web get_parsed_bbox_points_with_dictlist_prompt() (every point and
+  rectangle converted to image pixels one at a time) against the samgis one (a single
+  LatLngPixelTransform conversion of all the prompt points), on a request with --n-prompts prompts
+- georeferencing: EPSG:3857 to EPSG:4326 conversion of --n-coordinates output polygon vertices,
+  one at a time with pyproj against the vectorized get_3857_to_4326()
+"""
+
+import argparse
+import json
+import statistics
+import time
+from collections.abc import Callable
+
+import numpy as np
+from pyproj import Transformer
+from samgis_web.web import web_helpers as samgis_web_helpers
+
+from samgis.io_package.coordinates_pixel_conversion import (
+    get_3857_to_4326,
+    get_4326_to_3857,
+)
+from samgis.web.web_helpers import get_parsed_bbox_points_with_dictlist_prompt
+
+# bbox of the lambda_handler_multi_prompt.json test payload
+BBOX = {
+    "ne": {"lat": 46.28788479194308, "lng": 9.475707775999172},
+    "sw": {"lat": 46.12536667198419, "lng": 9.124145275999172},
+}
+
+
+def get_synthetic_request(n_prompts: int, seed: int = 0) -> str:
+    """Return a JSON request body with n_prompts random prompts, 1 rectangle every 3 prompts"""
+    rng = np.random.default_rng(seed)
+    ne, sw = BBOX["ne"], BBOX["sw"]
+    prompt_list = []
+    for n in range(n_prompts):
+        lat = rng.uniform(sw["lat"], ne["lat"], 2).tolist()
+        lng = rng.uniform(sw["lng"], ne["lng"], 2).tolist()
+        if n % 3:
+            prompt_list.append(
+                {
+                    "id": n,
+                    "type": "point",
+                    "data": {"lat": lat[0], "lng": lng[0]},
+                    "label": 1,
+                }
+            )
+        else:
+            prompt_list.append(
+                {
+                    "id": n,
+                    "type": "rectangle",
+                    "data": {
+                        "ne": {"lat": max(lat), "lng": max(lng)},
+                        "sw": {"lat": min(lat), "lng": min(lng)},
+                    },
+                }
+            )
+    return json.dumps(
+        {
+            "bbox": BBOX,
+            "prompt": prompt_list,
+            "zoom": 13,
+            "source_type": "OpenStreetMap",
+        }
+    )
+
+
+def get_synthetic_coordinates(n_coordinates: int, seed: int = 0) -> np.ndarray:
+    """Return a (n_coordinates, 2) array of web mercator points within the bbox"""
+    rng = np.random.default_rng(seed)
+    ne, sw = BBOX["ne"], BBOX["sw"]
+    x, y = get_4326_to_3857(
+        rng.uniform(sw["lat"], ne["lat"], n_coordinates),
+        rng.uniform(sw["lng"], ne["lng"], n_coordinates),
+    )
+    return np.column_stack((x, y))
+
+
+def get_cpu_stats(function: Callable[[], object], repeat: int) -> dict[str, float]:
+    """Return the median and min CPU time of repeat function calls"""
+    cpu_times = []
+    for _ in range(repeat):
+        time_start = time.process_time()
+        function()
+        cpu_times.append(time.process_time() - time_start)
+    return {
+        "cpu_seconds_median": statistics.median(cpu_times),
+        "cpu_seconds_min": min(cpu_times),
+    }
+
+
+def run_benchmark(n_prompts: int, n_coordinates: int, repeat: int) -> dict:
+    request_body = get_synthetic_request(n_prompts)
+    coordinates = get_synthetic_coordinates(n_coordinates)
+    transformer = Transformer.from_crs("EPSG:3857", "EPSG:4326", always_xy=True)
+
+    def get_per_point_lnglat() -> list:
+        return [transformer.transform(x, y) for x, y in coordinates.tolist()]
+
+    results = {
+        "n_prompts": n_prompts,
+        "n_coordinates": n_coordinates,
+        "repeat": repeat,
+        "prompt_parsing": {
+            "per_point": get_cpu_stats(
+                lambda: samgis_web_helpers.get_parsed_bbox_points_with_dictlist_prompt(
+                    request_body
+                ),
+                repeat,
+            ),
+            "vectorized": get_cpu_stats(
+                lambda: get_parsed_bbox_points_with_dictlist_prompt(request_body),
+                repeat,
+            ),
+        },
+        "georeferencing": {
+            "per_point": get_cpu_stats(get_per_point_lnglat, repeat),
+            "vectorized": get_cpu_stats(
+                lambda: get_3857_to_4326(coordinates).tolist(), repeat
+            ),
+        },
+    }
+    for name in ("prompt_parsing", "georeferencing"):
+        stage = results[name]
+        stage["speedup"] = (
+            stage["per_point"]["cpu_seconds_median"]
+            / stage["vectorized"]["cpu_seconds_median"]
+        )
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=(__doc__ or "").partition("\n")[0])
+    parser.add_argument(
+        "--n-prompts", type=int, default=500, help="prompts of the request"
+    )
+    parser.add_argument(
+        "--n-coordinates",
+        type=int,
+        default=100_000,
+        help="output polygon vertices to georeference",
+    )
+    parser.add_argument("--repeat", type=int, default=5, help="runs for every version")
+    args = parser.parse_args()
+    print(
+        json.dumps(
+            run_benchmark(args.n_prompts, args.n_coordinates, args.repeat), indent=2
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
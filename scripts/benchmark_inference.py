@@ -0,0 +1,240 @@
+"""Replay the bundled request payloads through the whole inference pipeline, fully offline.
+
+The fixture tiles are served by a LocalTilesHttpServer and every payload (single point, multi-prompt,
+rectangle) runs through app.infer_samgis_fn(), reporting for every payload and stage
+(queue, tiles, mosaic, encoder, decoder, polygonize, serialize, total) the p50/p95/max latency,
+the throughput and the process RSS high-water mark. The results are saved as JSON: pass a previous
+results file to --compare to fail (exit code 1) on p95 latency regressions.
+
+Note: the fixture tiles within tests/events/lambda_handler are stored with git LFS (run
+`git lfs pull` first) and the model files must be already downloaded (scripts/download_models.py).
+"""
+
+import argparse
+import json
+import platform
+import resource
+import sys
+import time
+from pathlib import Path
+from typing import Any
+from unittest.mock import patch
+
+import numpy as np
+
+PROJECT_ROOT_FOLDER = Path(__file__).absolute().parent.parent
+TEST_EVENTS_FOLDER = PROJECT_ROOT_FOLDER / "tests" / "events"
+LOCAL_URL_TILE = "http://localhost:{port}/lambda_handler/{{z}}/{{x}}/{{y}}.png"
+PAYLOADS = {
+    "single_point": "lambda_handler_single_point.json",
+    "multi_prompt": "lambda_handler_multi_prompt.json",
+    "single_rectangle": "lambda_handler_single_rectangle.json",
+}
+TOTAL_STAGE = "total"
+
+
+def load_payloads(events_folder: Path, names: list[str]) -> dict[str, dict]:
+    """Load the request bodies of the bundled lambda_handler events, keyed by payload name"""
+    payloads = {}
+    for name in names:
+        with open(events_folder / PAYLOADS[name]) as src:
+            event = json.load(src)
+        payloads[name] = json.loads(event["input"]["body"])
+    return payloads
+
+
+def get_stage_stats(durations: list[float]) -> dict[str, float]:
+    """Return count, p50, p95 and max (seconds) of the stage durations"""
+    values = np.asarray(durations, dtype=np.float64)
+    return {
+        "count": int(values.size),
+        "p50": float(np.percentile(values, 50)),
+        "p95": float(np.percentile(values, 95)),
+        "max": float(values.max()),
+    }
+
+
+def get_max_rss_bytes() -> int:
+    """Return the RSS high-water mark of the current process (ru_maxrss is in KiB on linux)"""
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss if sys.platform == "darwin" else max_rss * 1024
+
+
+def run_payload(payload: dict, iterations: int, warm_cache: bool) -> dict[str, Any]:
+    """
+    Run the payload through app.infer_samgis_fn() for the given iterations.
+
+    Args:
+        payload: request body
+        iterations: number of timed runs
+        warm_cache: keep the image embeddings cache between the runs (only the first one is cold)
+
+    Returns:
+        dict with the stats of every stage, the throughput and the number of predicted shapes
+    """
+    import app
+    from samgis.prediction_api import predictors
+    from samgis.utilities.metrics import collect_timings
+    from samgis.utilities.type_hints import SamgisApiRequestBody
+
+    request_input = SamgisApiRequestBody.model_validate(payload)
+    stage_durations: dict[str, list[float]] = {}
+    n_shapes_geojson = None
+    time_start = time.perf_counter()
+    for _ in range(iterations):
+        if not warm_cache:
+            predictors.embedding_cache.clear()
+        time_start_run = time.perf_counter()
+        # the serialize stage runs after the body timings have been dumped
+        with collect_timings() as outer_timings:
+            body = json.loads(app.infer_samgis_fn(request_input, timings=True))
+        run_timings = {
+            **body["timings"],
+            **outer_timings,
+            TOTAL_STAGE: time.perf_counter() - time_start_run,
+        }
+        for stage, seconds in run_timings.items():
+            stage_durations.setdefault(stage, []).append(seconds)
+        n_shapes_geojson = body["output"]["n_shapes_geojson"]
+    duration = time.perf_counter() - time_start
+    return {
+        "iterations": iterations,
+        "n_shapes_geojson": n_shapes_geojson,
+        "throughput_rps": iterations / duration,
+        "stages": {
+            stage: get_stage_stats(durations)
+            for stage, durations in sorted(stage_durations.items())
+        },
+    }
+
+
+def run_benchmark(
+    names: list[str],
+    iterations: int,
+    warmup: int,
+    warm_cache: bool,
+    port: int,
+    tiles_folder: Path,
+) -> dict[str, Any]:
+    """Serve the fixture tiles and run every payload, returning the JSON serializable results"""
+    import xyzservices
+    from samgis_web.utilities.local_tiles_http_server import LocalTilesHttpServer
+    from samgis_web.web import web_helpers
+
+    local_tile_provider = xyzservices.TileProvider(
+        name="local_tile_provider",
+        url=LOCAL_URL_TILE.format(port=port),
+        attribution="",
+    )
+    payloads = load_payloads(TEST_EVENTS_FOLDER, names)
+    results = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "iterations": iterations,
+        "warmup": warmup,
+        "warm_cache": warm_cache,
+        "payloads": {},
+    }
+    with (
+        patch.object(web_helpers, "get_source_tile", return_value=local_tile_provider),
+        LocalTilesHttpServer.http_server("localhost", port, directory=tiles_folder),
+    ):
+        for name, payload in payloads.items():
+            if warmup > 0:
+                # load the model and fill the tiles cache outside the timed runs
+                run_payload(payload, warmup, warm_cache)
+            results["payloads"][name] = run_payload(payload, iterations, warm_cache)
+    results["max_rss_bytes"] = get_max_rss_bytes()
+    return results
+
+
+def compare_results(
+    baseline: dict[str, Any], current: dict[str, Any], max_regression: float
+) -> list[str]:
+    """
+    Compare the p95 latency of every payload stage present in both the results.
+
+    Args:
+        baseline: results of the reference run
+        current: results of the new run
+        max_regression: allowed relative p95 increase (e.g. 0.1 for 10%)
+
+    Returns:
+        list of messages describing the regressions, empty if there is none
+    """
+    regressions = []
+    for name, payload_results in current["payloads"].items():
+        baseline_stages = baseline["payloads"].get(name, {}).get("stages", {})
+        for stage, stats in payload_results["stages"].items():
+            if stage not in baseline_stages:
+                continue
+            baseline_p95 = baseline_stages[stage]["p95"]
+            if stats["p95"] > baseline_p95 * (1 + max_regression):
+                regressions.append(
+                    f"{name}/{stage}: p95 {stats['p95']:.4f}s > baseline {baseline_p95:.4f}s"
+                )
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=(__doc__ or "").partition("\n")[0])
+    parser.add_argument(
+        "--payload",
+        action="append",
+        choices=list(PAYLOADS),
+        help="payload to run (repeatable), default all",
+    )
+    parser.add_argument("--iterations", type=int, default=10, help="timed runs")
+    parser.add_argument(
+        "--warmup", type=int, default=1, help="untimed runs before every payload"
+    )
+    parser.add_argument(
+        "--warm-cache",
+        action="store_true",
+        help="keep the embeddings cache between the runs (default: cold encoder runs)",
+    )
+    parser.add_argument(
+        "--port", type=int, default=8000, help="port of the local tiles server"
+    )
+    parser.add_argument(
+        "--tiles-folder",
+        type=Path,
+        default=TEST_EVENTS_FOLDER,
+        help="folder containing the lambda_handler/{z}/{x}/{y}.png tiles",
+    )
+    parser.add_argument("--output", type=Path, help="save the results to this file")
+    parser.add_argument(
+        "--compare", type=Path, help="results of a previous run to compare with"
+    )
+    parser.add_argument(
+        "--max-regression",
+        type=float,
+        default=0.1,
+        help="allowed relative p95 increase when comparing",
+    )
+    args = parser.parse_args()
+
+    results = run_benchmark(
+        args.payload or list(PAYLOADS),
+        args.iterations,
+        args.warmup,
+        args.warm_cache,
+        args.port,
+        args.tiles_folder,
+    )
+    dumped = json.dumps(results, indent=2)
+    print(dumped)
+    if args.output is not None:
+        args.output.write_text(dumped)
+    if args.compare is not None:
+        baseline = json.loads(args.compare.read_text())
+        regressions = compare_results(baseline, results, args.max_regression)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,311 @@
+"""Benchmark the downloaded SAM2 model variants on the bundled payloads and recommend a MODEL_VARIANT.
+
+The fixture tiles are served by a LocalTilesHttpServer, the images and the prompts of the bundled
+payloads (single point, multi-prompt, rectangle) are prepared once, then every downloaded variant
+runs in its own process (so the RSS high-water mark belongs to that variant only), reporting the
+sessions creation time, the encoder/decoder p50/p95/max latency and the mask IoU against the
+reference variant (default the biggest downloaded one). The recommended variant is the fastest
+(encoder + decoder p50 sum) with every payload mask IoU of at least --min-iou.
+
+Run it from the project root folder (the model files must be already downloaded with
+scripts/download_models.py, the fixture tiles within tests/events/lambda_handler are stored with
+git LFS):
+
+    python -m scripts.benchmark_model_variants --iterations 5 --output variants.json
+"""
+
+import argparse
+import json
+import multiprocessing
+import platform
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any
+from unittest.mock import patch
+
+import numpy as np
+from numpy import ndarray
+
+from scripts.benchmark_inference import (
+    LOCAL_URL_TILE,
+    PAYLOADS,
+    TEST_EVENTS_FOLDER,
+    get_max_rss_bytes,
+    get_stage_stats,
+    load_payloads,
+)
+
+# payload name => (image, prompt in image pixel coordinates)
+type PreparedPayloads = dict[str, tuple[ndarray, list[dict]]]
+
+
+def get_downloaded_variants() -> list[str]:
+    """Return the registry variants with all the model files downloaded, smallest first"""
+    from samgis_core.prediction_api.model_registry import MODELS, is_model_downloaded
+
+    return sorted(
+        (variant for variant in MODELS if is_model_downloaded(variant)),
+        key=lambda variant: MODELS[variant]["size_mb"],
+    )
+
+
+def get_default_reference(variants: list[str]) -> str:
+    """Return the biggest variant, assumed the most accurate one"""
+    from samgis_core.prediction_api.model_registry import MODELS
+
+    return max(variants, key=lambda variant: MODELS[variant]["size_mb"])
+
+
+def prepare_payloads(
+    names: list[str], port: int, tiles_folder: Path
+) -> PreparedPayloads:
+    """Download the payload images from the local tiles server and parse their prompts"""
+    import xyzservices
+    from samgis_web.utilities.local_tiles_http_server import LocalTilesHttpServer
+    from samgis_web.web import web_helpers
+
+    from samgis.io_package.tms2geotiff import download_extent
+    from samgis.utilities.type_hints import SamgisApiRequestBody
+    from samgis.web.web_helpers import get_parsed_bbox_points_with_dictlist_prompt
+
+    local_tile_provider = xyzservices.TileProvider(
+        name="local_tile_provider",
+        url=LOCAL_URL_TILE.format(port=port),
+        attribution="",
+    )
+    prepared = {}
+    with (
+        patch.object(web_helpers, "get_source_tile", return_value=local_tile_provider),
+        LocalTilesHttpServer.http_server("localhost", port, directory=tiles_folder),
+    ):
+        for name, payload in load_payloads(TEST_EVENTS_FOLDER, names).items():
+            body_request = get_parsed_bbox_points_with_dictlist_prompt(
+                SamgisApiRequestBody.model_validate(payload)
+            )
+            pt0, pt1 = body_request["bbox"]
+            img, _ = download_extent(
+                w=pt1[1],
+                s=pt1[0],
+                e=pt0[1],
+                n=pt0[0],
+                zoom=int(body_request["zoom"]),
+                source=body_request["source"],
+            )
+            prepared[name] = img, body_request["prompt"]
+    return prepared
+
+
+def run_variant(
+    variant: str, prepared: PreparedPayloads, iterations: int, warmup: int
+) -> dict[str, Any]:
+    """
+    Run the encoder and the decoder of a variant on every prepared payload (to be called within a
+    dedicated process, the RSS high-water mark is the process one).
+
+    Args:
+        variant: model variant
+        prepared: payload images and prompts
+        iterations: timed encoder and decoder runs for every payload
+        warmup: untimed runs before every payload
+
+    Returns:
+        dict with the sessions creation time, the encoder/decoder stats and the packed best mask of
+        every payload, the RSS high-water mark
+
+    """
+    from samgis_core.prediction_api.model_registry import get_model_dir
+
+    from samgis.prediction_api.sam2_adapter import Sam2EmbeddingPredictor
+
+    time_start = time.perf_counter()
+    predictor = Sam2EmbeddingPredictor(model_dir=get_model_dir(variant))
+    results: dict[str, Any] = {
+        "sessions_seconds": time.perf_counter() - time_start,
+        "payloads": {},
+    }
+    for name, (img, prompt) in prepared.items():
+        for _ in range(warmup):
+            predictor.decode(predictor.encode(img), prompt)
+        encoder_durations, decoder_durations = [], []
+        masks = ious = None
+        for _ in range(iterations):
+            time_start = time.perf_counter()
+            embedding = predictor.encode(img)
+            encoder_durations.append(time.perf_counter() - time_start)
+            time_start = time.perf_counter()
+            masks, ious = predictor.decode(embedding, prompt)
+            decoder_durations.append(time.perf_counter() - time_start)
+        if masks is None or ious is None:
+            raise ValueError("iterations must be a positive integer value.")
+        mask = masks[int(np.argmax(ious))] > 0
+        results["payloads"][name] = {
+            "encoder": get_stage_stats(encoder_durations),
+            "decoder": get_stage_stats(decoder_durations),
+            "mask_shape": list(mask.shape),
+            "mask": np.packbits(mask).tobytes(),
+        }
+    results["max_rss_bytes"] = get_max_rss_bytes()
+    return results
+
+
+def get_mask_iou(mask: ndarray, reference: ndarray) -> float:
+    """Return the intersection over union of two boolean masks (1.0 if both are empty)"""
+    union = np.count_nonzero(mask | reference)
+    if union == 0:
+        return 1.0
+    return np.count_nonzero(mask & reference) / union
+
+
+def _unpack_mask(payload_results: dict[str, Any]) -> ndarray:
+    shape = payload_results["mask_shape"]
+    return (
+        np.unpackbits(
+            np.frombuffer(payload_results["mask"], dtype=np.uint8),
+            count=int(np.prod(shape)),
+        )
+        .reshape(shape)
+        .astype(bool)
+    )
+
+
+def add_mask_ious(variants_results: dict[str, dict], reference: str) -> None:
+    """Replace the packed masks of every variant with their IoU against the reference ones"""
+    reference_masks = {
+        name: _unpack_mask(payload_results)
+        for name, payload_results in variants_results[reference]["payloads"].items()
+    }
+    for variant_results in variants_results.values():
+        for name, payload_results in variant_results["payloads"].items():
+            payload_results["iou"] = get_mask_iou(
+                _unpack_mask(payload_results), reference_masks[name]
+            )
+    for variant_results in variants_results.values():
+        for payload_results in variant_results["payloads"].values():
+            del payload_results["mask"]
+
+
+def select_variant(variants_results: dict[str, dict], min_iou: float) -> str | None:
+    """
+    Return the fastest variant (sum of the encoder and decoder p50 of every payload) with all the
+    payload mask IoU greater or equal than min_iou, None if no variant is accurate enough.
+    """
+    accurate = {
+        variant: sum(
+            payload_results["encoder"]["p50"] + payload_results["decoder"]["p50"]
+            for payload_results in variant_results["payloads"].values()
+        )
+        for variant, variant_results in variants_results.items()
+        if all(
+            payload_results["iou"] >= min_iou
+            for payload_results in variant_results["payloads"].values()
+        )
+    }
+    if not accurate:
+        return None
+    return min(accurate, key=accurate.__getitem__)
+
+
+def run_benchmark(
+    variants: list[str],
+    reference: str,
+    names: list[str],
+    iterations: int,
+    warmup: int,
+    min_iou: float,
+    port: int,
+    tiles_folder: Path,
+) -> dict[str, Any]:
+    """Prepare the payloads, run every variant within its own process, return the JSON results"""
+    prepared = prepare_payloads(names, port, tiles_folder)
+    variants_results = {}
+    # spawn: a fresh process for every variant, without the parent memory
+    mp_context = multiprocessing.get_context("spawn")
+    for variant in dict.fromkeys([reference, *variants]):
+        print(f"running {variant}...", file=sys.stderr)
+        with ProcessPoolExecutor(max_workers=1, mp_context=mp_context) as executor:
+            variants_results[variant] = executor.submit(
+                run_variant, variant, prepared, iterations, warmup
+            ).result()
+    add_mask_ious(variants_results, reference)
+    return {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "iterations": iterations,
+        "warmup": warmup,
+        "reference": reference,
+        "min_iou": min_iou,
+        "recommended": select_variant(variants_results, min_iou),
+        "variants": variants_results,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=(__doc__ or "").partition("\n")[0])
+    parser.add_argument(
+        "--variant",
+        action="append",
+        help="variant to benchmark (repeatable), default all the downloaded ones",
+    )
+    parser.add_argument(
+        "--reference", help="variant producing the reference masks, default the biggest"
+    )
+    parser.add_argument(
+        "--payload",
+        action="append",
+        choices=list(PAYLOADS),
+        help="payload to run (repeatable), default all",
+    )
+    parser.add_argument("--iterations", type=int, default=5, help="timed runs")
+    parser.add_argument(
+        "--warmup", type=int, default=1, help="untimed runs before every payload"
+    )
+    parser.add_argument(
+        "--min-iou",
+        type=float,
+        default=0.9,
+        help="min mask IoU against the reference for a variant to be recommended",
+    )
+    parser.add_argument(
+        "--port", type=int, default=8000, help="port of the local tiles server"
+    )
+    parser.add_argument(
+        "--tiles-folder",
+        type=Path,
+        default=TEST_EVENTS_FOLDER,
+        help="folder containing the lambda_handler/{z}/{x}/{y}.png tiles",
+    )
+    parser.add_argument("--output", type=Path, help="save the results to this file")
+    args = parser.parse_args()
+
+    variants = args.variant or get_downloaded_variants()
+    if not variants:
+        print(
+            "no downloaded model variant, see scripts/download_models.py",
+            file=sys.stderr,
+        )
+        sys.exit(1)
+    results = run_benchmark(
+        variants,
+        args.reference or get_default_reference(variants),
+        args.payload or list(PAYLOADS),
+        args.iterations,
+        args.warmup,
+        args.min_iou,
+        args.port,
+        args.tiles_folder,
+    )
+    dumped = json.dumps(results, indent=2)
+    print(dumped)
+    if args.output is not None:
+        args.output.write_text(dumped)
+    if results["recommended"] is None:
+        print(f"no variant with a mask IoU >= {args.min_iou}", file=sys.stderr)
+        sys.exit(1)
+    print(f"recommended MODEL_VARIANT={results['recommended']}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
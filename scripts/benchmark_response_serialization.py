@@ -0,0 +1,100 @@
+"""Compare payload size and server CPU time of the /infer_samgis (v1) and /v2/infer_samgis responses.
+
+The benchmark runs offline on a synthetic prediction mask with many shapes (no model, no tiles),
+measuring only the mask polygonization and the response serialization:
+
+- v1: GeoDataFrame geojson string, json.dumps() of the body, then JSONResponse encoding it again
+- v2: lazily polygonized features, single serialization of the native JSON body to bytes
+"""
+
+import argparse
+import json
+import statistics
+import time
+from typing import Any
+
+import numpy as np
+from affine import Affine
+from samgis_web.io_package.geo_helpers import get_vectorized_raster_as_geojson
+from starlette.responses import JSONResponse, Response
+
+from samgis.io_package.geo_helpers import iter_vectorized_raster_as_geojson_features
+from samgis.utilities.serialization import dumps_bytes
+
+# a 1024x1024 image around the Aeolian islands at zoom 10
+TRANSFORM = Affine(
+    152.87405657041106, 0.0, 1517760.0, 0.0, -152.87405657041106, 4726600.0
+)
+
+
+def get_synthetic_mask(size: int, n_shapes: int, seed: int = 0) -> np.ndarray:
+    """Return a uint8 mask {0, 255} with n_shapes random (possibly overlapping) rectangles"""
+    rng = np.random.default_rng(seed)
+    mask = np.zeros((size, size), dtype=np.uint8)
+    for _ in range(n_shapes):
+        x, y = rng.integers(0, size - 8, 2)
+        w, h = rng.integers(2, 24, 2)
+        mask[y : y + h, x : x + w] = 255
+    return mask
+
+
+def get_v1_response_body(mask: np.ndarray) -> bytes:
+    output = {"n_predictions": 3, **get_vectorized_raster_as_geojson(mask, TRANSFORM)}
+    dumped = json.dumps({"duration_run": 0.0, "output": output})
+    return bytes(JSONResponse(status_code=200, content={"body": dumped}).body)
+
+
+def get_v2_response_body(mask: np.ndarray) -> bytes:
+    features = list(iter_vectorized_raster_as_geojson_features(mask, TRANSFORM))
+    body = {
+        "duration_run": 0.0,
+        "output": {
+            "n_predictions": 3,
+            "geojson": {"type": "FeatureCollection", "features": features},
+            "n_shapes_geojson": len(features),
+        },
+    }
+    return bytes(
+        Response(content=dumps_bytes(body), media_type="application/json").body
+    )
+
+
+def run_benchmark(size: int, n_shapes: int, repeat: int) -> dict:
+    mask = get_synthetic_mask(size, n_shapes)
+    results: dict[str, Any] = {"size": size, "n_shapes": n_shapes, "repeat": repeat}
+    for name, get_response_body in (
+        ("v1", get_v1_response_body),
+        ("v2", get_v2_response_body),
+    ):
+        cpu_times, content = [], b""
+        for _ in range(repeat):
+            time_start = time.process_time()
+            content = get_response_body(mask)
+            cpu_times.append(time.process_time() - time_start)
+        results[name] = {
+            "payload_bytes": len(content),
+            "cpu_seconds_median": statistics.median(cpu_times),
+            "cpu_seconds_min": min(cpu_times),
+        }
+    results["payload_ratio_v2_v1"] = (
+        results["v2"]["payload_bytes"] / results["v1"]["payload_bytes"]
+    )
+    results["cpu_ratio_v2_v1"] = (
+        results["v2"]["cpu_seconds_median"] / results["v1"]["cpu_seconds_median"]
+    )
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=(__doc__ or "").partition("\n")[0])
+    parser.add_argument("--size", type=int, default=1024, help="mask size in pixels")
+    parser.add_argument(
+        "--n-shapes", type=int, default=500, help="number of random shapes"
+    )
+    parser.add_argument("--repeat", type=int, default=5, help="runs for every version")
+    args = parser.parse_args()
+    print(json.dumps(run_benchmark(args.size, args.n_shapes, args.repeat), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -7,7 +7,8 @@ from urllib.error import HTTPError, URLError
 
 
 DEFAULT_TIMEOUT = 1.5
-DEFAULT_SERVER_URL = "http://localhost:7860/health"
+# readiness: model files verified (cached checksum) and model warmed up; use /health/live for liveness
+DEFAULT_SERVER_URL = "http://localhost:7860/health/ready"
 
 logger = logging.Logger("get_health")
 logger.setLevel(logging.INFO)
@@ -1,13 +1,15 @@
-"""CLI entry point to download SAM model weights via the samgis_core registry."""
+"""CLI entry point to download SAM model weights via the samgis_core registry.
+
+The files are downloaded with parallel range requests, resumed after an interruption; the
+verified files are recorded within a manifest, a later run doesn't hash them again.
+"""
 
 import os
 import sys
 
-from samgis_core.prediction_api.model_downloader import download_model
-from samgis_core.prediction_api.model_registry import (
-    is_model_downloaded,
-    verify_download,
-)
+from samgis_core.prediction_api.model_registry import is_model_downloaded
+
+from samgis.prediction_api.model_downloader import download_model, verify_download
 
 
 def main() -> None:
@@ -0,0 +1,560 @@
+"""Open-loop load generator replaying request payloads against a running samgis service.
+
+The requests are sent at scheduled arrival times (constant or Poisson rate, optionally a ramp of
+rate steps) regardless of the responses, by at most --concurrency in-flight requests. When every
+connection is busy a request starts late: its latency is measured from the scheduled time, not from
+the actual send (coordinated omission correction), so a saturated service shows up as a growing
+latency instead of a lower send rate. The summary reports for the whole run and for every rate
+step the corrected latency and the service time percentiles and histogram, the status codes, the
+error and 429 rates, the response cache hits and the server-reported duration_run. Save it with
+--output and pass a previous summary to --compare to fail (exit code 1) on regressions.
+
+The request bodies are the bundled tests/events payloads (--payload, default all) and/or the lines
+of a JSON lines file (--requests: request bodies or lambda events with the body in input.body),
+sent round-robin. To run the service offline on the fixture tiles (git LFS, see
+scripts/benchmark_inference.py) start it with the "serve" sub command:
+
+    python -m scripts.load_generator serve --port 7860
+    python -m scripts.load_generator run --url http://localhost:7860 --rate 2 --duration 60
+    python -m scripts.load_generator run --steps 1:30,2:30,4:30 --arrival poisson --output load.json
+"""
+
+import argparse
+import copy
+import json
+import platform
+import sys
+import threading
+import time
+from collections import Counter
+from collections.abc import Callable
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+from unittest.mock import patch
+
+import numpy as np
+
+from scripts.benchmark_inference import (
+    LOCAL_URL_TILE,
+    PAYLOADS,
+    TEST_EVENTS_FOLDER,
+    load_payloads,
+)
+
+ARRIVALS = ("constant", "poisson")
+DEFAULT_URL = "http://localhost:7860"
+ENDPOINT = "/infer_samgis"
+# upper bounds (milliseconds) of the latency histogram buckets, the last one is unbounded
+HISTOGRAM_BOUNDS_MS = [
+    bound * scale for scale in (1, 10, 100, 1000, 10000) for bound in (1, 2, 5)
+] + [100000]
+LATENCY_PERCENTILES = (50, 90, 99, 99.9)
+# prompt points shift of the --bust-cache requests, far below a pixel even at zoom 20
+BUST_CACHE_DEGREES = 1e-9
+
+
+@dataclass(frozen=True)
+class RateStep:
+    """Requests per second for duration seconds"""
+
+    rate: float
+    duration: float
+
+
+@dataclass
+class RequestResult:
+    """Outcome of a request; the times are in seconds from the start of the run"""
+
+    index: int
+    step: int
+    scheduled: float
+    start: float
+    end: float
+    status: int | None
+    duration_run: float | None = None
+    x_cache: str | None = None
+    error: str | None = None
+
+    @property
+    def latency(self) -> float:
+        """Latency from the scheduled send time, corrected for the coordinated omission"""
+        return self.end - self.scheduled
+
+    @property
+    def service_time(self) -> float:
+        return self.end - self.start
+
+
+def parse_steps(value: str) -> list[RateStep]:
+    """Parse the rate steps ramp, e.g. "1:30,2:30,4:30" (requests per second:seconds)"""
+    steps = []
+    for item in value.split(","):
+        rate, duration = item.split(":")
+        steps.append(RateStep(float(rate), float(duration)))
+    if not steps or any(step.rate <= 0 or step.duration <= 0 for step in steps):
+        raise ValueError(f"rates and durations must be positive: '{value}'")
+    return steps
+
+
+def get_schedule(
+    steps: list[RateStep], arrival: str, seed: int = 0
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Return the scheduled send times of the requests.
+
+    Args:
+        steps: rate steps, run one after the other
+        arrival: "constant" (fixed interval) or "poisson" (exponential random intervals)
+        seed: random seed of the poisson arrivals
+
+    Returns:
+        the send times in seconds from the start of the run and the rate step index of every request
+    """
+    if arrival not in ARRIVALS:
+        raise ValueError(f"arrival must be one of {ARRIVALS}, not '{arrival}'")
+    rng = np.random.default_rng(seed)
+    times, step_indexes = [], []
+    step_start = 0.0
+    for n, step in enumerate(steps):
+        if arrival == "constant":
+            offsets = np.arange(0.0, step.duration, 1.0 / step.rate)
+        else:
+            # enough intervals to cover the step duration with a negligible miss probability
+            n_intervals = int(step.rate * step.duration * 2 + 10)
+            offsets = np.cumsum(rng.exponential(1.0 / step.rate, n_intervals))
+            while offsets[-1] < step.duration:
+                offsets = np.concatenate(
+                    (
+                        offsets,
+                        offsets[-1]
+                        + np.cumsum(rng.exponential(1.0 / step.rate, n_intervals)),
+                    )
+                )
+            offsets = offsets[offsets < step.duration]
+        times.append(step_start + offsets)
+        step_indexes.append(np.full(offsets.size, n))
+        step_start += step.duration
+    return np.concatenate(times), np.concatenate(step_indexes)
+
+
+def load_request_bodies(
+    requests_file: Path | None, payload_names: list[str]
+) -> list[dict]:
+    """
+    Load the request bodies of the bundled payloads and of the JSON lines file.
+
+    Args:
+        requests_file: JSON lines file, every line a request body or a lambda event with the
+            (string) body within input.body
+        payload_names: names of the bundled payloads, see scripts.benchmark_inference.PAYLOADS
+
+    Returns:
+        list of the request bodies
+    """
+    bodies = list(load_payloads(TEST_EVENTS_FOLDER, payload_names).values())
+    if requests_file is not None:
+        with open(requests_file) as src:
+            for line in src:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                body = record.get("input", {}).get("body", record)
+                bodies.append(json.loads(body) if isinstance(body, str) else body)
+    if not bodies:
+        raise ValueError("no request bodies, use --payload or --requests")
+    return bodies
+
+
+def get_request_body(bodies: list[dict], index: int, bust_cache: bool) -> dict:
+    """
+    Return the request body for the request index (round-robin); with bust_cache the prompts are
+    shifted by a negligible, request-specific amount so that every request misses the response
+    cache (the image embeddings cache still hits, as for an interactive session).
+    """
+    body = bodies[index % len(bodies)]
+    if not bust_cache:
+        return body
+    body = copy.deepcopy(body)
+    shift = (index // len(bodies) + 1) * BUST_CACHE_DEGREES
+    for prompt in body["prompt"]:
+        if prompt["type"] == "point":
+            prompt["data"]["lat"] += shift
+        else:
+            prompt["data"]["ne"]["lat"] += shift
+            prompt["data"]["sw"]["lat"] += shift
+    return body
+
+
+def send_request(
+    session: Any, url: str, body: dict, timeout: float
+) -> tuple[int | None, float | None, str | None, str | None]:
+    """
+    Send an inference request.
+
+    Returns:
+        status code, server-reported duration_run, X-Cache header and error message (None when
+        the response is a 200)
+    """
+    import requests
+
+    try:
+        response = session.post(url, json=body, timeout=timeout)
+    except requests.RequestException as e_request:
+        return None, None, None, type(e_request).__name__
+    if response.status_code != 200:
+        return response.status_code, None, None, f"HTTP {response.status_code}"
+    duration_run = None
+    try:
+        duration_run = json.loads(response.json()["body"]).get("duration_run")
+    except (ValueError, KeyError, TypeError):
+        pass
+    return response.status_code, duration_run, response.headers.get("X-Cache"), None
+
+
+def run_load(
+    url: str,
+    bodies: list[dict],
+    schedule: np.ndarray,
+    steps_index: np.ndarray,
+    concurrency: int,
+    timeout: float,
+    bust_cache: bool = False,
+    send: Callable = send_request,
+) -> list[RequestResult]:
+    """
+    Send the requests at their scheduled times with at most concurrency requests in flight.
+
+    Every worker thread (with its own keep-alive session) takes the next request in schedule
+    order and waits for its send time; a request taken when it's already past due is sent at once,
+    the delay is part of its corrected latency.
+
+    Args:
+        url: inference endpoint url
+        bodies: request bodies, sent round-robin
+        schedule: send times in seconds from the start of the run
+        steps_index: rate step index of every request
+        concurrency: max requests in flight
+        timeout: seconds of the requests timeout
+        bust_cache: make every request body unique, see get_request_body()
+        send: function sending a request, see send_request()
+
+    Returns:
+        results of the requests ordered by schedule
+    """
+    import requests
+
+    results: list[RequestResult | None] = [None] * schedule.size
+    next_index = 0
+    lock = threading.Lock()
+    time_origin = time.perf_counter()
+
+    def worker() -> None:
+        nonlocal next_index
+        with requests.Session() as session:
+            while True:
+                with lock:
+                    index = next_index
+                    next_index += 1
+                if index >= schedule.size:
+                    return
+                scheduled = float(schedule[index])
+                body = get_request_body(bodies, index, bust_cache)
+                delay = scheduled - (time.perf_counter() - time_origin)
+                if delay > 0:
+                    time.sleep(delay)
+                start = time.perf_counter() - time_origin
+                status, duration_run, x_cache, error = send(session, url, body, timeout)
+                results[index] = RequestResult(
+                    index=index,
+                    step=int(steps_index[index]),
+                    scheduled=scheduled,
+                    start=start,
+                    end=time.perf_counter() - time_origin,
+                    status=status,
+                    duration_run=duration_run,
+                    x_cache=x_cache,
+                    error=error,
+                )
+
+    threads = [
+        threading.Thread(target=worker, name=f"load-generator-{n}", daemon=True)
+        for n in range(concurrency)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # every scheduled request has its result, unless a worker thread failed
+    return [result for result in results if result is not None]
+
+
+def get_latency_stats(seconds: list[float]) -> dict[str, Any]:
+    """Return count, mean, percentiles and max in milliseconds, with the non-empty histogram buckets"""
+    if not seconds:
+        return {"count": 0}
+    values_ms = np.asarray(seconds, dtype=np.float64) * 1000
+    stats = {
+        "count": int(values_ms.size),
+        "mean_ms": float(values_ms.mean()),
+        **{
+            f"p{str(percentile).replace('.', '_')}_ms": float(
+                np.percentile(values_ms, percentile)
+            )
+            for percentile in LATENCY_PERCENTILES
+        },
+        "max_ms": float(values_ms.max()),
+    }
+    bucket_indexes = np.searchsorted(HISTOGRAM_BOUNDS_MS, values_ms, side="left")
+    counts = np.bincount(bucket_indexes, minlength=len(HISTOGRAM_BOUNDS_MS) + 1)
+    labels = [f"le_{bound:g}ms" for bound in HISTOGRAM_BOUNDS_MS] + ["inf"]
+    stats["histogram"] = {
+        label: int(count) for label, count in zip(labels, counts) if count
+    }
+    return stats
+
+
+def summarize_results(results: list[RequestResult], duration: float) -> dict[str, Any]:
+    """Return the stats of the results sent within duration seconds"""
+    count = len(results)
+    statuses = Counter(
+        "error" if result.status is None else str(result.status) for result in results
+    )
+    n_429 = statuses.get("429", 0)
+    n_errors = sum(1 for result in results if result.error is not None) - n_429
+    completed = [result for result in results if result.status == 200]
+    n_cache_hits = sum(1 for result in completed if result.x_cache == "hit")
+    return {
+        "requests": count,
+        "offered_rps": count / duration if duration > 0 else 0.0,
+        "throughput_rps": len(completed) / duration if duration > 0 else 0.0,
+        "status_counts": dict(sorted(statuses.items())),
+        "error_rate": n_errors / count if count else 0.0,
+        "rate_429": n_429 / count if count else 0.0,
+        "cache_hit_rate": n_cache_hits / len(completed) if completed else 0.0,
+        "latency": get_latency_stats([result.latency for result in completed]),
+        "service_time": get_latency_stats(
+            [result.service_time for result in completed]
+        ),
+        "start_delay": get_latency_stats(
+            [result.start - result.scheduled for result in results]
+        ),
+        "duration_run": get_latency_stats(
+            [
+                result.duration_run
+                for result in completed
+                if result.duration_run is not None
+            ]
+        ),
+    }
+
+
+def summarize(
+    results: list[RequestResult], steps: list[RateStep], config: dict[str, Any]
+) -> dict[str, Any]:
+    """Return the JSON serializable summary of the run, overall and for every rate step"""
+    total_duration = sum(step.duration for step in steps)
+    return {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": config,
+        "overall": summarize_results(results, total_duration),
+        "steps": [
+            {
+                "rate": step.rate,
+                "duration": step.duration,
+                **summarize_results(
+                    [result for result in results if result.step == n], step.duration
+                ),
+            }
+            for n, step in enumerate(steps)
+        ],
+    }
+
+
+def compare_summaries(
+    baseline: dict[str, Any],
+    current: dict[str, Any],
+    max_regression: float,
+    max_error_increase: float,
+) -> list[str]:
+    """
+    Compare the overall corrected latency percentiles and the error and 429 rates of two summaries.
+
+    Args:
+        baseline: summary of the reference run
+        current: summary of the new run
+        max_regression: allowed relative latency percentile increase (e.g. 0.1 for 10%)
+        max_error_increase: allowed absolute error rate and 429 rate increase (e.g. 0.01)
+
+    Returns:
+        list of messages describing the regressions, empty if there is none
+    """
+    regressions = []
+    baseline_overall, current_overall = baseline["overall"], current["overall"]
+    for key, value in current_overall["latency"].items():
+        baseline_value = baseline_overall["latency"].get(key)
+        if not key.startswith("p") or baseline_value is None:
+            continue
+        if value > baseline_value * (1 + max_regression):
+            regressions.append(
+                f"latency {key}: {value:.1f} > baseline {baseline_value:.1f}"
+            )
+    for key in ("error_rate", "rate_429"):
+        if current_overall[key] > baseline_overall[key] + max_error_increase:
+            regressions.append(
+                f"{key}: {current_overall[key]:.4f} > baseline {baseline_overall[key]:.4f}"
+            )
+    return regressions
+
+
+def serve(host: str, port: int, tiles_port: int, tiles_folder: Path) -> None:
+    """Run the service with every tile source replaced by the fixture tiles of a LocalTilesHttpServer"""
+    import uvicorn
+    import xyzservices
+    from samgis_web.utilities.local_tiles_http_server import LocalTilesHttpServer
+    from samgis_web.web import web_helpers
+
+    import app
+
+    local_tile_provider = xyzservices.TileProvider(
+        name="local_tile_provider",
+        url=LOCAL_URL_TILE.format(port=tiles_port),
+        attribution="",
+    )
+    with (
+        patch.object(web_helpers, "get_source_tile", return_value=local_tile_provider),
+        LocalTilesHttpServer.http_server(
+            "localhost", tiles_port, directory=tiles_folder
+        ),
+    ):
+        uvicorn.run(app.app, host=host, port=port)
+
+
+def run(args: argparse.Namespace) -> None:
+    steps = (
+        parse_steps(args.steps) if args.steps else [RateStep(args.rate, args.duration)]
+    )
+    schedule, steps_index = get_schedule(steps, args.arrival, args.seed)
+    bodies = load_request_bodies(args.requests, args.payload or list(PAYLOADS))
+    config = {
+        "url": args.url,
+        "arrival": args.arrival,
+        "steps": [[step.rate, step.duration] for step in steps],
+        "concurrency": args.concurrency,
+        "timeout": args.timeout,
+        "bust_cache": args.bust_cache,
+        "n_bodies": len(bodies),
+        "seed": args.seed,
+    }
+    print(
+        f"sending {schedule.size} requests in {sum(step.duration for step in steps):g}s to {args.url}{ENDPOINT}...",
+        file=sys.stderr,
+    )
+    results = run_load(
+        f"{args.url.rstrip('/')}{ENDPOINT}",
+        bodies,
+        schedule,
+        steps_index,
+        args.concurrency,
+        args.timeout,
+        args.bust_cache,
+    )
+    summary = summarize(results, steps, config)
+    dumped = json.dumps(summary, indent=2)
+    print(dumped)
+    if args.output is not None:
+        args.output.write_text(dumped)
+    if args.compare is not None:
+        baseline = json.loads(args.compare.read_text())
+        regressions = compare_summaries(
+            baseline, summary, args.max_regression, args.max_error_increase
+        )
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=(__doc__ or "").partition("\n")[0])
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    parser_run = subparsers.add_parser(
+        "run", help="send the requests and print the summary"
+    )
+    parser_run.add_argument("--url", default=DEFAULT_URL, help="service base url")
+    parser_run.add_argument(
+        "--payload",
+        action="append",
+        choices=list(PAYLOADS),
+        help="bundled payload (repeatable)",
+    )
+    parser_run.add_argument(
+        "--requests", type=Path, help="JSON lines file of request bodies"
+    )
+    parser_run.add_argument(
+        "--arrival", choices=ARRIVALS, default="constant", help="arrival process"
+    )
+    parser_run.add_argument(
+        "--rate", type=float, default=1.0, help="requests per second"
+    )
+    parser_run.add_argument("--duration", type=float, default=30.0, help="seconds")
+    parser_run.add_argument(
+        "--steps",
+        help='ramp of "rate:seconds" steps (e.g. "1:30,2:30"), overrides --rate/--duration',
+    )
+    parser_run.add_argument(
+        "--concurrency", type=int, default=16, help="max requests in flight"
+    )
+    parser_run.add_argument(
+        "--timeout", type=float, default=60.0, help="request timeout seconds"
+    )
+    parser_run.add_argument(
+        "--bust-cache",
+        action="store_true",
+        help="unique request bodies, no response cache hits",
+    )
+    parser_run.add_argument("--seed", type=int, default=0, help="poisson arrivals seed")
+    parser_run.add_argument("--output", type=Path, help="save the summary to this file")
+    parser_run.add_argument(
+        "--compare", type=Path, help="summary of a previous run to compare with"
+    )
+    parser_run.add_argument(
+        "--max-regression",
+        type=float,
+        default=0.1,
+        help="allowed relative latency percentile increase",
+    )
+    parser_run.add_argument(
+        "--max-error-increase",
+        type=float,
+        default=0.01,
+        help="allowed error and 429 rates increase",
+    )
+
+    parser_serve = subparsers.add_parser(
+        "serve", help="run the service on the fixture tiles"
+    )
+    parser_serve.add_argument("--host", default="localhost", help="service host")
+    parser_serve.add_argument("--port", type=int, default=7860, help="service port")
+    parser_serve.add_argument(
+        "--tiles-port", type=int, default=8000, help="local tiles server port"
+    )
+    parser_serve.add_argument(
+        "--tiles-folder",
+        type=Path,
+        default=TEST_EVENTS_FOLDER,
+        help="folder containing the lambda_handler/{z}/{x}/{y}.png tiles",
+    )
+
+    args = parser.parse_args()
+    if args.command == "serve":
+        serve(args.host, args.port, args.tiles_port, args.tiles_folder)
+    else:
+        run(args)
+
+
+if __name__ == "__main__":
+    main()
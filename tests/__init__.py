@@ -1,3 +1,4 @@
+import os
 from pathlib import Path
 
 
@@ -5,3 +6,5 @@ PROJECT_ROOT_FOLDER = Path(globals().get("__file__", "./_")).absolute().parent.p
 TEST_ROOT_FOLDER = PROJECT_ROOT_FOLDER / "tests"
 TEST_EVENTS_FOLDER = TEST_ROOT_FOLDER / "events"
 LOCAL_URL_TILE = "http://localhost:8000/lambda_handler/{z}/{x}/{y}.png"
+# the tests use the existing static/dist folder, without running the frontend toolchain
+os.environ.setdefault("FRONTEND_BUILD_MODE", "prebuilt")
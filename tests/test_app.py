@@ -15,6 +15,8 @@ from samgis_web.web import web_helpers
 from . import test_client_health
 
 import app
+from samgis.prediction_api import model_downloader
+from samgis.web.response_cache import response_cache
 
 
 infer_samgis = "/infer_samgis"
@@ -100,6 +102,19 @@ def check_body(body: dict, expected_body: dict):
 
 
 class TestFastapiApp(unittest.TestCase):
+    def setUp(self):
+        # the mocked outputs change from test to test with the same request
+        response_cache.clear()
+        app.model_health.invalidate()
+        # the health checks use the mocked verify_download(), never a verified manifest on disk
+        for name, return_value in (
+            ("get_verified_files", set()),
+            ("write_verified_manifest", None),
+        ):
+            patcher = patch.object(model_downloader, name, return_value=return_value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
     @patch.object(model_registry, "verify_download", return_value=[])
     def test_fastapi_handler_health_200(self, _verify_download_mocked):
         response = client.get("/health")
@@ -112,6 +127,41 @@ class TestFastapiApp(unittest.TestCase):
         response = client.get("/health")
         test_client_health.check_for_statuscode(response.status_code, 500, response)
 
+    def test_health_live(self):
+        response = client.get("/health/live")
+        test_client_health.check_for_statuscode(response.status_code, 200, response)
+
+    @patch.object(app, "model_preload", True)
+    @patch.object(model_registry, "verify_download", return_value=[])
+    def test_health_ready(self, verify_download_mocked):
+        # verification pending
+        response = client.get("/health/ready")
+        test_client_health.check_for_statuscode(response.status_code, 503, response)
+        self.assertTrue(response.json()["verification_pending"])
+
+        app.model_health.verify()
+        with patch.object(app.model_health, "warm", False):
+            response = client.get("/health/ready")
+            test_client_health.check_for_statuscode(response.status_code, 503, response)
+        with patch.object(app.model_health, "warm", True):
+            response = client.get("/health/ready")
+            test_client_health.check_for_statuscode(response.status_code, 200, response)
+            body = response.json()
+            self.assertTrue(body["ready"])
+            self.assertTrue(body["verified"])
+            self.assertListEqual(body["failures"], [])
+        # the probes read the cached verification
+        verify_download_mocked.assert_called_once()
+
+    @patch.object(model_registry, "verify_download", return_value=["encoder.onnx"])
+    def test_health_ready_verification_failed(self, _verify_download_mocked):
+        app.model_health.verify()
+
+        with patch.object(app.model_health, "warm", True):
+            response = client.get("/health/ready")
+        test_client_health.check_for_statuscode(response.status_code, 503, response)
+        self.assertListEqual(response.json()["failures"], ["encoder.onnx"])
+
     def test_404(self):
         response = client.get("/404")
         test_client_health.check_for_statuscode(response.status_code, 404, response)
@@ -137,6 +187,19 @@ class TestFastapiApp(unittest.TestCase):
         logging.info(f"response.body_loaded: '{body}'.")
         check_body(body, {"msg": "Error - Unprocessable Entity"})
 
+    @patch.object(app, "samexporter_predict")
+    def test_infer_samgis_mosaic_too_large_422(self, samexporter_predict_mocked):
+        from samgis.io_package.tms2geotiff import MosaicTooLargeError
+
+        samexporter_predict_mocked.side_effect = MosaicTooLargeError("too large")
+
+        response = client.post(infer_samgis, json=event)
+        test_client_health.check_for_statuscode(response.status_code, 422, response)
+        check_body(
+            response.json(),
+            {"msg": "Error - Unprocessable Entity", "detail": "too large"},
+        )
+
     @patch.object(app, "samexporter_predict")
     def test_infer_samgis_500(self, samexporter_predict_mocked):
         samexporter_predict_mocked.side_effect = ValueError("I raise a value error!")
@@ -148,6 +211,454 @@ class TestFastapiApp(unittest.TestCase):
         logging.info(f"response.body_loaded: '{body}'.")
         check_body(body, {"msg": "Error - Internal Server Error"})
 
+    @patch.object(app, "samexporter_predict")
+    def test_infer_samgis_request_options(self, samexporter_predict_mocked):
+        samexporter_predict_mocked.return_value = {
+            "n_predictions": 1,
+            "geojson": "{}",
+            "n_shapes_geojson": 0,
+        }
+        polygonize = {"simplify_tolerance": 1.5, "precision": 6, "min_area": 16}
+
+        response = client.post(
+            infer_samgis, json={**event, "polygonize": polygonize, "windowed": True}
+        )
+        test_client_health.check_for_statuscode(response.status_code, 200, response)
+        options = samexporter_predict_mocked.call_args.kwargs["polygonize"]
+        self.assertDictEqual(options.model_dump(), polygonize)
+        self.assertTrue(samexporter_predict_mocked.call_args.kwargs["windowed"])
+
+        response = client.post(
+            infer_samgis, json={**event, "polygonize": {"precision": 20}}
+        )
+        test_client_health.check_for_statuscode(response.status_code, 422, response)
+
+    @patch.object(app, "samexporter_predict")
+    def test_infer_samgis_model_variant(self, samexporter_predict_mocked):
+        samexporter_predict_mocked.return_value = {
+            "n_predictions": 1,
+            "geojson": "{}",
+            "n_shapes_geojson": 0,
+        }
+
+        response = client.post(infer_samgis, json=event)
+        test_client_health.check_for_statuscode(response.status_code, 200, response)
+        self.assertEqual(
+            samexporter_predict_mocked.call_args.kwargs["model_folder"],
+            app.model_folder,
+        )
+        response = client.post(
+            infer_samgis, json={**event, "model_variant": "sam2.1_hiera_tiny_uint8"}
+        )
+        test_client_health.check_for_statuscode(response.status_code, 200, response)
+        self.assertEqual(
+            samexporter_predict_mocked.call_args.kwargs["model_folder"],
+            model_registry.get_model_dir("sam2.1_hiera_tiny_uint8"),
+        )
+        self.assertEqual(samexporter_predict_mocked.call_count, 2)
+
+        response = client.post(
+            infer_samgis, json={**event, "model_variant": "sam2.1_hiera_huge"}
+        )
+        test_client_health.check_for_statuscode(response.status_code, 422, response)
+
+    @patch.object(app, "samexporter_predict")
+    def test_infer_samgis_429_queue_full(self, samexporter_predict_mocked):
+        from samgis.web.inference_scheduler import InferenceScheduler
+
+        scheduler = InferenceScheduler(max_concurrency=1, max_queue_size=0)
+        with patch.object(app, "inference_scheduler", scheduler), scheduler.slot():
+            response = client.post(infer_samgis, json=event)
+        test_client_health.check_for_statuscode(response.status_code, 429, response)
+        check_body(response.json(), {"msg": "Error - Too Many Requests"})
+        self.assertGreaterEqual(int(response.headers["Retry-After"]), 1)
+        samexporter_predict_mocked.assert_not_called()
+
+    @patch.object(app, "samexporter_predict_batch")
+    def test_infer_samgis_batch_200(self, samexporter_predict_batch_mocked):
+        from copy import deepcopy
+
+        output = {"n_predictions": 3, "geojson": "{}", "n_shapes_geojson": 1}
+        samexporter_predict_batch_mocked.return_value = [output, ValueError("fail")]
+        event_other_prompt = deepcopy(event)
+        event_other_prompt["id"] = "other_prompt"
+        event_other_prompt["prompt"][0]["label"] = 1
+        event_invalid = deepcopy(event)
+        event_invalid["id"] = "invalid"
+        event_invalid["source_type"] = "source_fake"
+
+        response = client.post(
+            "/infer_samgis/batch", json=[event, event_invalid, event_other_prompt]
+        )
+        test_client_health.check_for_statuscode(response.status_code, 200, response)
+        body_loaded = json.loads(response.json()["body"])
+        self.assertEqual(body_loaded["n_groups"], 1)
+        self.assertListEqual(
+            body_loaded["results"],
+            [
+                {"id": "", "status_code": 200, "output": output},
+                {
+                    "id": "invalid",
+                    "status_code": 422,
+                    "msg": "Error - Unprocessable Entity",
+                },
+                {
+                    "id": "other_prompt",
+                    "status_code": 500,
+                    "msg": "Error - Internal Server Error",
+                },
+            ],
+        )
+        # same bbox, zoom and source: a single call with both prompts
+        samexporter_predict_batch_mocked.assert_called_once()
+        prompts = samexporter_predict_batch_mocked.call_args.kwargs["prompts"]
+        self.assertEqual(len(prompts), 2)
+
+    @patch.object(app, "samexporter_predict_batch")
+    def test_infer_samgis_batch_group_errors(self, samexporter_predict_batch_mocked):
+        # a failed tiles download fails only the items of the group...
+        samexporter_predict_batch_mocked.side_effect = ConnectionError("tiles")
+        response = client.post("/infer_samgis/batch", json=[event])
+        test_client_health.check_for_statuscode(response.status_code, 200, response)
+        body_loaded = json.loads(response.json()["body"])
+        self.assertEqual(body_loaded["results"][0]["status_code"], 500)
+
+        # ...a bug fails the whole request
+        samexporter_predict_batch_mocked.side_effect = TypeError("bug")
+        response = client.post("/infer_samgis/batch", json=[event])
+        test_client_health.check_for_statuscode(response.status_code, 500, response)
+        self.assertNotIn(b"results", response.content)
+
+    def test_infer_samgis_batch_too_many_items_422(self):
+        with patch.object(app, "batch_max_items", 1):
+            response = client.post("/infer_samgis/batch", json=[event, event])
+        test_client_health.check_for_statuscode(response.status_code, 422, response)
+
+    @patch.object(app, "samexporter_predict")
+    def test_infer_samgis_timings_200(self, samexporter_predict_mocked):
+        samexporter_predict_mocked.return_value = {"n_predictions": 1}
+
+        response = client.post(f"{infer_samgis}?timings=true", json=event)
+        test_client_health.check_for_statuscode(response.status_code, 200, response)
+        body_loaded = json.loads(response.json()["body"])
+        self.assertIn("queue", body_loaded["timings"])
+
+    @patch.object(app, "samexporter_predict_features")
+    def test_infer_samgis_stream_ndjson_200(self, samexporter_predict_features_mocked):
+        features = [
+            {"id": str(n), "type": "Feature", "properties": {}, "geometry": None}
+            for n in range(3)
+        ]
+        samexporter_predict_features_mocked.return_value = 3, iter(features)
+
+        response = client.post(f"{infer_samgis}?stream=true", json=event)
+        test_client_health.check_for_statuscode(response.status_code, 200, response)
+        self.assertTrue(
+            response.headers["content-type"].startswith("application/x-ndjson")
+        )
+        records = [json.loads(line) for line in response.text.splitlines()]
+        self.assertEqual(len(records), 5)
+        self.assertEqual(records[0]["type"], "header")
+        self.assertEqual(records[0]["n_predictions"], 3)
+        self.assertListEqual(records[1:4], features)
+        self.assertEqual(records[4]["type"], "trailer")
+        self.assertEqual(records[4]["n_shapes_geojson"], 3)
+        self.assertIn("polygonize", records[4]["timings"])
+
+    @patch.object(app, "samexporter_predict_features")
+    def test_infer_samgis_stream_geojson_seq_error(
+        self, samexporter_predict_features_mocked
+    ):
+        def features_generator():
+            yield {"id": "0", "type": "Feature", "properties": {}, "geometry": None}
+            raise ValueError("polygonize error")
+
+        samexporter_predict_features_mocked.return_value = 3, features_generator()
+
+        response = client.post(
+            infer_samgis, json=event, headers={"Accept": "application/geo+json-seq"}
+        )
+        test_client_health.check_for_statuscode(response.status_code, 200, response)
+        records = response.text.split("\x1e")
+        self.assertEqual(records[0], "")
+        records = [json.loads(record) for record in records[1:]]
+        self.assertListEqual(
+            [record["type"] for record in records], ["header", "Feature", "error"]
+        )
+
+    @patch.object(app, "samexporter_predict_features")
+    def test_infer_samgis_stream_500(self, samexporter_predict_features_mocked):
+        samexporter_predict_features_mocked.side_effect = ValueError("encoder error")
+
+        response = client.post(f"{infer_samgis}?stream=true", json=event)
+        test_client_health.check_for_statuscode(response.status_code, 500, response)
+
+    @patch.object(app, "samexporter_predict_features")
+    def test_infer_samgis_v2_200(self, samexporter_predict_features_mocked):
+        features = [
+            {"id": str(n), "type": "Feature", "properties": {}, "geometry": None}
+            for n in range(2)
+        ]
+        samexporter_predict_features_mocked.return_value = 3, iter(features)
+
+        response = client.post("/v2/infer_samgis", json=event)
+        test_client_health.check_for_statuscode(response.status_code, 200, response)
+        body = response.json()
+        self.assertNotIn("timings", body)
+        self.assertDictEqual(
+            body["output"],
+            {
+                "n_predictions": 3,
+                "geojson": {"type": "FeatureCollection", "features": features},
+                "n_shapes_geojson": 2,
+            },
+        )
+
+    @patch.object(app, "samexporter_predict_features")
+    def test_infer_samgis_v2_500(self, samexporter_predict_features_mocked):
+        samexporter_predict_features_mocked.side_effect = ValueError("encoder error")
+
+        response = client.post("/v2/infer_samgis", json=event)
+        test_client_health.check_for_statuscode(response.status_code, 500, response)
+
+    @patch.object(app, "samexporter_predict_features")
+    def test_infer_samgis_v2_etag_304(self, samexporter_predict_features_mocked):
+        samexporter_predict_features_mocked.side_effect = lambda **kwargs: (1, iter([]))
+
+        response = client.post("/v2/infer_samgis", json=event)
+        test_client_health.check_for_statuscode(response.status_code, 200, response)
+        etag = response.headers["etag"]
+        self.assertEqual(response.headers["x-cache"], "miss")
+        self.assertEqual(response.headers["cache-control"], "no-cache")
+
+        # the same request with another id reuses the cached response
+        response = client.post("/v2/infer_samgis", json={**event, "id": "other"})
+        test_client_health.check_for_statuscode(response.status_code, 200, response)
+        self.assertEqual(response.headers["etag"], etag)
+        self.assertEqual(response.headers["x-cache"], "hit")
+
+        self.assertTrue(etag.startswith('W/"'))
+        response = client.post(
+            "/v2/infer_samgis", json=event, headers={"If-None-Match": etag}
+        )
+        test_client_health.check_for_statuscode(response.status_code, 304, response)
+        self.assertEqual(response.content, b"")
+        self.assertEqual(response.headers["etag"], etag)
+        self.assertEqual(samexporter_predict_features_mocked.call_count, 1)
+
+        # timings change the response
+        response = client.post("/v2/infer_samgis?timings=true", json=event)
+        self.assertNotEqual(response.headers["etag"], etag)
+        self.assertEqual(samexporter_predict_features_mocked.call_count, 2)
+
+    @patch.object(app, "samexporter_predict")
+    def test_infer_samgis_etag_304(self, samexporter_predict_mocked):
+        samexporter_predict_mocked.return_value = {"n_predictions": 1}
+
+        response = client.post(infer_samgis, json=event)
+        test_client_health.check_for_statuscode(response.status_code, 200, response)
+        self.assertIn("body", response.json())
+
+        response = client.post(
+            infer_samgis,
+            json=event,
+            headers={"If-None-Match": f'"other", {response.headers["etag"]}'},
+        )
+        test_client_health.check_for_statuscode(response.status_code, 304, response)
+        samexporter_predict_mocked.assert_called_once()
+
+        # a "*" never matches, a matching ETag only while the response is cached: after an
+        # eviction (or a TTL expiration) the response is computed again
+        response = client.post(infer_samgis, json=event, headers={"If-None-Match": "*"})
+        test_client_health.check_for_statuscode(response.status_code, 200, response)
+        self.assertEqual(response.headers["x-cache"], "hit")
+        etag = response.headers["etag"]
+        response_cache.clear()
+        response = client.post(
+            infer_samgis, json=event, headers={"If-None-Match": etag}
+        )
+        test_client_health.check_for_statuscode(response.status_code, 200, response)
+        self.assertEqual(response.headers["etag"], etag)
+        self.assertEqual(response.headers["x-cache"], "miss")
+        self.assertEqual(samexporter_predict_mocked.call_count, 2)
+        response = client.post(infer_samgis, json=event)
+        self.assertEqual(response.headers["x-cache"], "hit")
+        self.assertIn("age", response.headers)
+
+        with patch.object(response_cache, "ttl", 1e-6):
+            response = client.post(
+                infer_samgis, json=event, headers={"If-None-Match": etag}
+            )
+        test_client_health.check_for_statuscode(response.status_code, 200, response)
+        self.assertEqual(samexporter_predict_mocked.call_count, 3)
+
+    @patch.object(app, "samexporter_decode_features")
+    @patch.object(app, "get_embedding")
+    def test_embeddings_create_decode_delete(
+        self, get_embedding_mocked, samexporter_decode_features_mocked
+    ):
+        import numpy as np
+        from affine import Affine
+
+        from samgis.prediction_api.embedding_cache import CachedEmbedding
+        from samgis.prediction_api.sam2_adapter import ImageEmbedding
+        from samgis.web.embedding_sessions import EmbeddingSessionStore
+
+        transform = Affine(152.8, 0.0, 1517760.0, 0.0, -152.8, 4726600.0)
+        get_embedding_mocked.return_value = CachedEmbedding(
+            embedding=ImageEmbedding(
+                features={"image_embed": np.zeros(16, dtype=np.float32)},
+                orig_hw=(600, 1000),
+            ),
+            transform=transform,
+        )
+        features = [{"type": "Feature", "properties": {}, "geometry": None}]
+        samexporter_decode_features_mocked.side_effect = lambda **kwargs: (
+            3,
+            iter(features),
+        )
+        embedding_request = {k: event[k] for k in ("bbox", "zoom", "source_type")}
+
+        with patch.object(app, "embedding_sessions", EmbeddingSessionStore(0, ttl=60)):
+            response = client.post("/embeddings?timings=true", json=embedding_request)
+            test_client_health.check_for_statuscode(response.status_code, 201, response)
+            body = response.json()
+            self.assertDictEqual(
+                body["image"],
+                {
+                    "width": 1000,
+                    "height": 600,
+                    "crs": "EPSG:3857",
+                    "geotransform": list(transform.to_gdal()),
+                },
+            )
+            self.assertEqual(body["model_variant"], app.model_folder.name)
+            self.assertAlmostEqual(body["expires_in"], 60, delta=1)
+            self.assertIn("timings", body)
+            session_id = body["id"]
+            get_embedding_kwargs = get_embedding_mocked.call_args.kwargs
+            self.assertEqual(get_embedding_kwargs["zoom"], 10)
+            self.assertEqual(
+                get_embedding_kwargs["bbox"],
+                response_bodies_post_test["single_point"]["bbox"],
+            )
+
+            # every decode runs only the decoder, with the prompt in image pixels
+            for _ in range(2):
+                response = client.post(
+                    f"/embeddings/{session_id}/decode", json={"prompt": event["prompt"]}
+                )
+                test_client_health.check_for_statuscode(
+                    response.status_code, 200, response
+                )
+                self.assertDictEqual(
+                    response.json()["output"],
+                    {
+                        "n_predictions": 3,
+                        "geojson": {"type": "FeatureCollection", "features": features},
+                        "n_shapes_geojson": 1,
+                    },
+                )
+            get_embedding_mocked.assert_called_once()
+            decode_kwargs = samexporter_decode_features_mocked.call_args.kwargs
+            self.assertListEqual(
+                decode_kwargs["prompt"],
+                response_bodies_post_test["single_point"]["prompt"],
+            )
+            self.assertEqual(decode_kwargs["model_folder"], app.model_folder)
+
+            response = client.delete(f"/embeddings/{session_id}")
+            test_client_health.check_for_statuscode(response.status_code, 204, response)
+            response = client.post(
+                f"/embeddings/{session_id}/decode", json={"prompt": event["prompt"]}
+            )
+            test_client_health.check_for_statuscode(response.status_code, 404, response)
+            self.assertEqual(response.json()["msg"], "Error - Not Found")
+            response = client.delete(f"/embeddings/{session_id}")
+            test_client_health.check_for_statuscode(response.status_code, 404, response)
+
+    @patch.object(app, "samexporter_decode_features")
+    def test_embeddings_decode_429_queue_full(self, samexporter_decode_features_mocked):
+        import numpy as np
+        from affine import Affine
+
+        from samgis.io_package.coordinates_pixel_conversion import LatLngPixelTransform
+        from samgis.prediction_api.embedding_cache import CachedEmbedding
+        from samgis.prediction_api.sam2_adapter import ImageEmbedding
+        from samgis.web.embedding_sessions import EmbeddingSessionStore
+        from samgis.web.inference_scheduler import InferenceScheduler
+
+        store = EmbeddingSessionStore(0, ttl=60)
+        (ne_lat, ne_lng), (sw_lat, sw_lng) = response_bodies_post_test["single_point"][
+            "bbox"
+        ]
+        session = store.create(
+            CachedEmbedding(
+                embedding=ImageEmbedding(
+                    features={"image_embed": np.zeros(16, dtype=np.float32)},
+                    orig_hw=(600, 1000),
+                ),
+                transform=Affine.identity(),
+            ),
+            app.model_folder,
+            LatLngPixelTransform(ne_lat, ne_lng, sw_lat, sw_lng, 10),
+        )
+        scheduler = InferenceScheduler(max_concurrency=1, max_queue_size=0)
+        with (
+            patch.object(app, "embedding_sessions", store),
+            patch.object(app, "inference_scheduler", scheduler),
+            scheduler.slot(),
+        ):
+            response = client.post(
+                f"/embeddings/{session.id}/decode", json={"prompt": event["prompt"]}
+            )
+        test_client_health.check_for_statuscode(response.status_code, 429, response)
+        check_body(response.json(), {"msg": "Error - Too Many Requests"})
+        self.assertGreaterEqual(int(response.headers["Retry-After"]), 1)
+        samexporter_decode_features_mocked.assert_not_called()
+
+    @patch.object(app, "get_embedding")
+    def test_embeddings_501_prefork_workers(self, get_embedding_mocked):
+        embedding_request = {k: event[k] for k in ("bbox", "zoom", "source_type")}
+        with patch.object(app.prefork, "get_worker_count", return_value=2):
+            response = client.post("/embeddings", json=embedding_request)
+        test_client_health.check_for_statuscode(response.status_code, 501, response)
+        self.assertEqual(response.json()["msg"], "Error - Not Implemented")
+        get_embedding_mocked.assert_not_called()
+
+    def test_embeddings_422(self):
+        response = client.post("/embeddings", json={"zoom": 10})
+        test_client_health.check_for_statuscode(response.status_code, 422, response)
+        response = client.post("/embeddings/missing/decode", json={"prompt": []})
+        test_client_health.check_for_statuscode(response.status_code, 422, response)
+
+    def test_metrics(self):
+        response = client.get("/metrics")
+        test_client_health.check_for_statuscode(response.status_code, 200, response)
+        self.assertTrue(response.headers["content-type"].startswith("text/plain"))
+        for metric_name in (
+            "samgis_inference_queue_depth",
+            "samgis_embedding_cache_hits_total",
+            "samgis_response_cache_not_modified_total",
+            "samgis_startup_frontend_seconds",
+            "samgis_model_pool_evictions_total",
+            "samgis_model_pool_bytes",
+            "samgis_embedding_sessions_expired_total",
+            "samgis_embedding_sessions_bytes",
+            "samgis_stage_duration_seconds",
+        ):
+            self.assertIn(f"# TYPE {metric_name} ", response.text)
+
+    def test_infer_samgis_scheduler_stats(self):
+        response = client.get("/infer_samgis/scheduler")
+        test_client_health.check_for_statuscode(response.status_code, 200, response)
+        body = response.json()
+        for key in ("in_flight", "queue_depth", "wait_seconds_avg", "wait_seconds_max"):
+            self.assertIn(key, body)
+        self.assertSetEqual(
+            set(body["coalescing"]), {"in_flight", "leaders", "coalesced"}
+        )
+
     @pytest.mark.integration
     @pytest.mark.skipif(not _models_available(), reason="SAM2 models not downloaded")
     @patch.object(web_helpers, "get_source_tile")
@@ -0,0 +1,141 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+from functools import partial
+from pathlib import Path
+
+from samgis.io_package.artifact_writer import ArtifactWriter, get_artifact_writer
+
+
+def write_text(name: str, content: str, folder: str) -> Path:
+    path = Path(folder) / name
+    path.write_text(content)
+    return path
+
+
+class TestArtifactWriter(unittest.TestCase):
+    def test_write_and_list(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            writer = ArtifactWriter(tmp_dir, queue_size=8)
+            for n in range(5):
+                self.assertTrue(
+                    writer.submit(f"a{n}", partial(write_text, f"a{n}.json", "0" * n))
+                )
+            # a write callable returning more files (e.g. an image and its worldfile)
+            writer.submit(
+                "b",
+                lambda folder: (
+                    write_text("b.png", "png", folder),
+                    write_text("b.pgw", "pgw", folder),
+                ),
+            )
+            writer.submit("failing", partial(write_text, "missing/c.json", "c"))
+            writer.flush()
+
+            total, artifacts = writer.list_artifacts()
+            self.assertEqual(total, 7)
+            self.assertListEqual(
+                [artifact.name for artifact in artifacts],
+                [
+                    "b.pgw",
+                    "b.png",
+                    "a4.json",
+                    "a3.json",
+                    "a2.json",
+                    "a1.json",
+                    "a0.json",
+                ],
+            )
+            total, artifacts = writer.list_artifacts(offset=2, limit=2)
+            self.assertEqual(total, 7)
+            self.assertListEqual(
+                [artifact.name for artifact in artifacts], ["a4.json", "a3.json"]
+            )
+            self.assertListEqual(writer.list_artifacts(offset=7, limit=2)[1], [])
+            stats = writer.stats()
+            self.assertEqual(stats["written"], 6)
+            self.assertEqual(stats["failures"], 1)
+            self.assertEqual(stats["files"], 7)
+            self.assertEqual(stats["bytes"], 16)
+            writer.stop()
+
+            # a new writer indexes the existing files
+            reloaded = ArtifactWriter(tmp_dir, queue_size=8)
+            self.assertEqual(reloaded.list_artifacts()[0], 7)
+            reloaded.stop()
+
+    def test_retention(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            old_path = write_text("old.json", "old", tmp_dir)
+            os.utime(old_path, (1, time.time() - 100))
+            writer = ArtifactWriter(
+                tmp_dir, queue_size=8, max_files=3, max_bytes=10, max_age=60
+            )
+            # the files older than max_age are removed while building the index
+            self.assertFalse(old_path.exists())
+
+            for n in range(4):
+                writer.submit(f"a{n}", partial(write_text, f"a{n}.json", "0"))
+            writer.flush()
+            self.assertListEqual(
+                sorted(os.listdir(tmp_dir)), ["a1.json", "a2.json", "a3.json"]
+            )
+            writer.submit("big", partial(write_text, "big.json", "0" * 9))
+            writer.flush()
+            self.assertListEqual(sorted(os.listdir(tmp_dir)), ["a3.json", "big.json"])
+            self.assertEqual(writer.stats()["removed"], 4)
+            self.assertEqual(writer.stats()["bytes"], 10)
+            writer.stop()
+
+    def test_drop_when_queue_full(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            writer = ArtifactWriter(tmp_dir, queue_size=1)
+            blocked, release = threading.Event(), threading.Event()
+
+            def slow_write(folder: str) -> Path:
+                blocked.set()
+                release.wait(5)
+                return write_text("slow.json", "slow", folder)
+
+            writer.submit("slow", slow_write)
+            blocked.wait(5)
+            self.assertTrue(writer.submit("queued", partial(write_text, "q.json", "q")))
+            self.assertFalse(
+                writer.submit("dropped", partial(write_text, "d.json", "d"))
+            )
+            release.set()
+            writer.flush()
+
+            self.assertListEqual(sorted(os.listdir(tmp_dir)), ["q.json", "slow.json"])
+            self.assertEqual(writer.stats()["dropped"], 1)
+            writer.stop()
+
+    def test_write_bug_keeps_thread_alive(self):
+        def buggy_write(_folder: str) -> Path:
+            raise TypeError("bug")
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            writer = ArtifactWriter(tmp_dir, queue_size=1)
+            writer.submit("buggy", buggy_write)
+            writer.flush()
+            # the writer thread is still running: the next artifact is written
+            self.assertTrue(writer.submit("next", partial(write_text, "n.json", "n")))
+            writer.flush()
+
+            self.assertListEqual(os.listdir(tmp_dir), ["n.json"])
+            stats = writer.stats()
+            self.assertEqual(stats["failures"], 1)
+            self.assertEqual(stats["written"], 1)
+            writer.stop()
+
+    def test_get_artifact_writer(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            writer = get_artifact_writer(tmp_dir)
+            self.assertIs(get_artifact_writer(tmp_dir), writer)
+            writer.stop()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,78 @@
+import json
+import unittest
+from unittest.mock import patch
+
+from scripts import benchmark_inference
+from tests import TEST_EVENTS_FOLDER
+
+
+class TestBenchmarkInference(unittest.TestCase):
+    def test_load_payloads(self):
+        payloads = benchmark_inference.load_payloads(
+            TEST_EVENTS_FOLDER, list(benchmark_inference.PAYLOADS)
+        )
+
+        self.assertListEqual(
+            list(payloads), ["single_point", "multi_prompt", "single_rectangle"]
+        )
+        self.assertEqual(len(payloads["multi_prompt"]["prompt"]), 3)
+        self.assertEqual(payloads["single_rectangle"]["prompt"][0]["type"], "rectangle")
+
+    def test_get_stage_stats(self):
+        stats = benchmark_inference.get_stage_stats([float(n) for n in range(1, 101)])
+
+        self.assertEqual(stats["count"], 100)
+        self.assertAlmostEqual(stats["p50"], 50.5)
+        self.assertAlmostEqual(stats["p95"], 95.05)
+        self.assertEqual(stats["max"], 100.0)
+
+    def test_run_payload(self):
+        import app
+
+        body = {
+            "duration_run": 0.1,
+            "output": {"n_predictions": 1, "n_shapes_geojson": 2},
+            "timings": {"encoder": 0.5, "decoder": 0.1},
+        }
+        payload = benchmark_inference.load_payloads(
+            TEST_EVENTS_FOLDER, ["single_point"]
+        )["single_point"]
+        with patch.object(app, "infer_samgis_fn", return_value=json.dumps(body)):
+            results = benchmark_inference.run_payload(payload, 3, warm_cache=False)
+
+        self.assertEqual(results["iterations"], 3)
+        self.assertEqual(results["n_shapes_geojson"], 2)
+        self.assertGreater(results["throughput_rps"], 0)
+        self.assertSetEqual(set(results["stages"]), {"decoder", "encoder", "total"})
+        self.assertDictEqual(
+            results["stages"]["encoder"],
+            {"count": 3, "p50": 0.5, "p95": 0.5, "max": 0.5},
+        )
+
+    def test_compare_results(self):
+        def get_results(encoder_p95: float) -> dict:
+            return {
+                "payloads": {
+                    "single_point": {
+                        "stages": {
+                            "encoder": {"p95": encoder_p95},
+                            "decoder": {"p95": 0.1},
+                        }
+                    }
+                }
+            }
+
+        baseline = get_results(1.0)
+        self.assertListEqual(
+            benchmark_inference.compare_results(baseline, get_results(1.05), 0.1), []
+        )
+        regressions = benchmark_inference.compare_results(
+            baseline, get_results(1.5), 0.1
+        )
+        self.assertListEqual(
+            regressions, ["single_point/encoder: p95 1.5000s > baseline 1.0000s"]
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,117 @@
+import unittest
+from unittest.mock import patch
+
+import numpy as np
+from samgis_core.prediction_api import model_registry
+
+from scripts import benchmark_model_variants
+
+
+def get_variant_results(mask: np.ndarray, encoder_p50: float) -> dict:
+    return {
+        "sessions_seconds": 0.1,
+        "payloads": {
+            "single_point": {
+                "encoder": {"p50": encoder_p50},
+                "decoder": {"p50": 0.01},
+                "mask_shape": list(mask.shape),
+                "mask": np.packbits(mask).tobytes(),
+            }
+        },
+        "max_rss_bytes": 1024,
+    }
+
+
+class TestBenchmarkModelVariants(unittest.TestCase):
+    def test_get_mask_iou(self):
+        reference = np.zeros((10, 10), dtype=bool)
+        reference[:5] = True
+        mask = np.zeros((10, 10), dtype=bool)
+        mask[:4] = True
+
+        self.assertEqual(
+            benchmark_model_variants.get_mask_iou(reference, reference), 1.0
+        )
+        self.assertAlmostEqual(
+            benchmark_model_variants.get_mask_iou(mask, reference), 0.8
+        )
+        self.assertEqual(
+            benchmark_model_variants.get_mask_iou(~reference, reference), 0.0
+        )
+        empty = np.zeros((10, 10), dtype=bool)
+        self.assertEqual(benchmark_model_variants.get_mask_iou(empty, empty), 1.0)
+
+    def test_add_mask_ious_select_variant(self):
+        reference = np.zeros((7, 9), dtype=bool)
+        reference[:5] = True
+        close = reference.copy()
+        close[4] = False
+        far = np.zeros((7, 9), dtype=bool)
+        far[:1] = True
+        variants_results = {
+            "sam2.1_hiera_large_fp32": get_variant_results(reference, 1.0),
+            "sam2.1_hiera_base_plus_fp32": get_variant_results(close, 0.5),
+            "sam2.1_hiera_tiny_uint8": get_variant_results(far, 0.1),
+        }
+
+        benchmark_model_variants.add_mask_ious(
+            variants_results, "sam2.1_hiera_large_fp32"
+        )
+
+        ious = {
+            variant: results["payloads"]["single_point"]["iou"]
+            for variant, results in variants_results.items()
+        }
+        self.assertEqual(ious["sam2.1_hiera_large_fp32"], 1.0)
+        self.assertAlmostEqual(ious["sam2.1_hiera_base_plus_fp32"], 0.8)
+        self.assertAlmostEqual(ious["sam2.1_hiera_tiny_uint8"], 0.2)
+        self.assertNotIn(
+            "mask",
+            variants_results["sam2.1_hiera_tiny_uint8"]["payloads"]["single_point"],
+        )
+        self.assertEqual(
+            benchmark_model_variants.select_variant(variants_results, 0.75),
+            "sam2.1_hiera_base_plus_fp32",
+        )
+        self.assertEqual(
+            benchmark_model_variants.select_variant(variants_results, 0.1),
+            "sam2.1_hiera_tiny_uint8",
+        )
+        self.assertEqual(
+            benchmark_model_variants.select_variant(variants_results, 0.9),
+            "sam2.1_hiera_large_fp32",
+        )
+        del variants_results["sam2.1_hiera_large_fp32"]
+        self.assertIsNone(
+            benchmark_model_variants.select_variant(variants_results, 0.9)
+        )
+
+    def test_get_downloaded_variants(self):
+        downloaded = {
+            "sam2.1_hiera_large_fp32",
+            "sam2.1_hiera_tiny_uint8",
+            "sam2.1_hiera_small_fp32",
+        }
+        with patch.object(
+            model_registry,
+            "is_model_downloaded",
+            side_effect=lambda variant: variant in downloaded,
+        ):
+            variants = benchmark_model_variants.get_downloaded_variants()
+
+        self.assertListEqual(
+            variants,
+            [
+                "sam2.1_hiera_tiny_uint8",
+                "sam2.1_hiera_small_fp32",
+                "sam2.1_hiera_large_fp32",
+            ],
+        )
+        self.assertEqual(
+            benchmark_model_variants.get_default_reference(variants),
+            "sam2.1_hiera_large_fp32",
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
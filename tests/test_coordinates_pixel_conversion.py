@@ -0,0 +1,114 @@
+import json
+import unittest
+
+import numpy as np
+from samgis_web.io_package.coordinates_pixel_conversion import (
+    _from4326_to3857,
+    _get_point_latlng_to_pixel_coordinates,
+    get_latlng_to_pixel_coordinates,
+)
+from samgis_web.utilities.type_hints import LatLngDict
+from samgis_web.web import web_helpers as samgis_web_helpers
+
+from samgis.io_package.coordinates_pixel_conversion import (
+    LatLngPixelTransform,
+    get_3857_to_4326,
+    get_4326_to_3857,
+    get_latlng_to_world_pixels,
+)
+from samgis.web.web_helpers import get_parsed_bbox_points_with_dictlist_prompt
+from tests import TEST_EVENTS_FOLDER
+
+rng = np.random.default_rng(0)
+lat = rng.uniform(-85, 85, 200)
+lng = rng.uniform(-180, 180, 200)
+
+
+def get_multi_prompt_body(n_prompts: int) -> dict:
+    with open(TEST_EVENTS_FOLDER / "lambda_handler_multi_prompt.json") as src:
+        body = json.loads(json.load(src)["input"]["body"])
+    ne, sw = body["bbox"]["ne"], body["bbox"]["sw"]
+    prompt_list = []
+    for n in range(n_prompts):
+        point_lat, point_lng = (
+            rng.uniform(sw["lat"], ne["lat"], 2),
+            rng.uniform(sw["lng"], ne["lng"], 2),
+        )
+        if n % 3:
+            prompt_list.append(
+                {
+                    "id": n,
+                    "type": "point",
+                    "data": {"lat": point_lat[0], "lng": point_lng[0]},
+                    "label": n % 2,
+                }
+            )
+        else:
+            prompt_list.append(
+                {
+                    "id": n,
+                    "type": "rectangle",
+                    "data": {
+                        "ne": {"lat": point_lat.max(), "lng": point_lng.max()},
+                        "sw": {"lat": point_lat.min(), "lng": point_lng.min()},
+                    },
+                }
+            )
+    body["prompt"] = prompt_list
+    return body
+
+
+class TestCoordinatesPixelConversion(unittest.TestCase):
+    def test_get_latlng_to_world_pixels(self):
+        for zoom in (0, 10, 18):
+            x, y = get_latlng_to_world_pixels(lat, lng, zoom)
+            self.assertEqual(x.dtype, np.int64)
+            expected = [
+                _get_point_latlng_to_pixel_coordinates(LatLngDict(lat=a, lng=b), zoom)
+                for a, b in zip(lat.tolist(), lng.tolist())
+            ]
+            self.assertListEqual(x.tolist(), [point["x"] for point in expected])
+            self.assertListEqual(y.tolist(), [point["y"] for point in expected])
+
+    def test_lat_lng_pixel_transform(self):
+        ne, sw = LatLngDict(lat=46.287, lng=9.475), LatLngDict(lat=46.125, lng=9.124)
+        transform = LatLngPixelTransform(ne.lat, ne.lng, sw.lat, sw.lng, 13)
+        points_lat = rng.uniform(sw.lat, ne.lat, 100)
+        points_lng = rng.uniform(sw.lng, ne.lng, 100)
+        x, y = transform.to_pixels(points_lat, points_lng)
+        for n, (a, b) in enumerate(zip(points_lat.tolist(), points_lng.tolist())):
+            expected = get_latlng_to_pixel_coordinates(
+                ne, sw, LatLngDict(lat=a, lng=b), 13, "point"
+            )
+            self.assertEqual((x[n], y[n]), (expected["x"], expected["y"]))
+
+    def test_get_4326_to_3857_roundtrip(self):
+        x, y = get_4326_to_3857(lat, lng)
+        expected = np.array(
+            [_from4326_to3857(a, b) for a, b in zip(lat.tolist(), lng.tolist())]
+        )
+        np.testing.assert_allclose(x, expected[:, 0])
+        np.testing.assert_allclose(y, expected[:, 1])
+
+        lnglat = get_3857_to_4326(np.column_stack((x, y)))
+        np.testing.assert_allclose(lnglat[:, 0], lng, atol=1e-9)
+        np.testing.assert_allclose(lnglat[:, 1], lat, atol=1e-9)
+        lnglat = get_3857_to_4326(np.column_stack((x, y)), precision=3)
+        np.testing.assert_array_equal(lnglat, np.round(lnglat, 3))
+
+    def test_get_parsed_bbox_points_with_dictlist_prompt(self):
+        for n_prompts in (1, 2, 300):
+            body = get_multi_prompt_body(n_prompts)
+            output = get_parsed_bbox_points_with_dictlist_prompt(json.dumps(body))
+            expected = samgis_web_helpers.get_parsed_bbox_points_with_dictlist_prompt(
+                json.dumps(body)
+            )
+            for key in ("bbox", "prompt", "zoom", "source_name"):
+                self.assertEqual(output[key], expected[key])
+            self.assertEqual(output["source"].name, expected["source"].name)
+            self.assertIsNone(output["model_variant"])
+            self.assertFalse(output["windowed"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,136 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+from affine import Affine
+
+from samgis.prediction_api.embedding_cache import (
+    CachedEmbedding,
+    EmbeddingCache,
+    get_embedding_cache_key,
+)
+from samgis.prediction_api.sam2_adapter import ImageEmbedding
+
+transform = Affine(10.0, 0.0, 1500000.0, 0.0, -10.0, 4700000.0)
+bbox = [
+    [39.036252959636606, 15.040283203125002],
+    [38.302869955150044, 13.634033203125002],
+]
+
+
+def get_cached_embedding(value: float = 1.0, size: int = 8) -> CachedEmbedding:
+    features = {
+        "image_embed": np.full((1, 4, size, size), value, dtype=np.float32),
+        "high_res_feat_0": np.full((1, 2, size, size), value, dtype=np.float32),
+        "high_res_feat_1": np.full((1, 2, size, size), value, dtype=np.float32),
+    }
+    return CachedEmbedding(
+        embedding=ImageEmbedding(features=features, orig_hw=(600, 800)),
+        transform=transform,
+    )
+
+
+class TestEmbeddingCache(unittest.TestCase):
+    def test_get_embedding_cache_key(self):
+        url = "https://tile.openstreetmap.org/{z}/{x}/{y}.png"
+        key = get_embedding_cache_key(url, 10, bbox, "sam2.1_hiera_tiny_uint8")
+
+        self.assertEqual(
+            key, get_embedding_cache_key(url, 10.0, bbox, "sam2.1_hiera_tiny_uint8")
+        )
+        self.assertNotEqual(
+            key, get_embedding_cache_key(url, 11, bbox, "sam2.1_hiera_tiny_uint8")
+        )
+        self.assertNotEqual(
+            key, get_embedding_cache_key(url, 10, bbox, "sam2.1_hiera_small_uint8")
+        )
+
+    def test_get_embedding_cache_key_tile_provider(self):
+        import xyzservices
+
+        url = "http://localhost:8000/{z}/{x}/{y}.png"
+        provider = xyzservices.TileProvider(name="local", url=url, attribution="")
+
+        self.assertEqual(
+            get_embedding_cache_key(provider, 10, bbox, "variant"),
+            get_embedding_cache_key(url, 10, bbox, "variant"),
+        )
+
+    def test_hit_miss_counters(self):
+        cache = EmbeddingCache(max_bytes=10 * 1024**2)
+        entry = get_cached_embedding()
+
+        self.assertIsNone(cache.get("key"))
+        cache.put("key", entry)
+        self.assertIs(cache.get("key"), entry)
+        stats = cache.stats()
+        self.assertEqual(stats["hits"], 1)
+        self.assertEqual(stats["misses"], 1)
+        self.assertEqual(stats["entries"], 1)
+        self.assertEqual(stats["bytes"], entry.nbytes)
+
+    def test_lru_eviction_by_memory_budget(self):
+        entry = get_cached_embedding()
+        cache = EmbeddingCache(max_bytes=2 * entry.nbytes)
+        cache.put("a", get_cached_embedding(1.0))
+        cache.put("b", get_cached_embedding(2.0))
+        # "a" becomes the most recently used entry, "b" is evicted
+        cache.get("a")
+        cache.put("c", get_cached_embedding(3.0))
+
+        self.assertIsNone(cache.get("b"))
+        self.assertIsNotNone(cache.get("a"))
+        self.assertIsNotNone(cache.get("c"))
+        self.assertEqual(cache.stats()["evictions"], 1)
+        self.assertEqual(cache.stats()["bytes"], 2 * entry.nbytes)
+
+    def test_entry_bigger_than_budget_not_kept_in_memory(self):
+        cache = EmbeddingCache(max_bytes=10)
+        cache.put("key", get_cached_embedding())
+
+        self.assertIsNone(cache.get("key"))
+        self.assertEqual(cache.stats()["bytes"], 0)
+
+    def test_disk_tier_survives_restart(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            cache = EmbeddingCache(max_bytes=10 * 1024**2, disk_folder=tmp)
+            cache.put("key", get_cached_embedding(5.0))
+            self.assertTrue((Path(tmp) / "key.npz").is_file())
+
+            restarted_cache = EmbeddingCache(max_bytes=10 * 1024**2, disk_folder=tmp)
+            entry = restarted_cache.get("key")
+
+            self.assertIsNotNone(entry)
+            assert entry is not None
+            self.assertEqual(entry.transform, transform)
+            self.assertEqual(entry.embedding.orig_hw, (600, 800))
+            np.testing.assert_array_equal(
+                entry.embedding.features["image_embed"],
+                get_cached_embedding(5.0).embedding.features["image_embed"],
+            )
+            self.assertEqual(restarted_cache.stats()["disk_hits"], 1)
+            # promoted to the memory tier
+            restarted_cache.get("key")
+            self.assertEqual(restarted_cache.stats()["hits"], 1)
+
+    def test_disk_tier_eviction(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            cache = EmbeddingCache(max_bytes=0, disk_folder=tmp, disk_max_bytes=1)
+            cache.put("a", get_cached_embedding())
+            cache.put("b", get_cached_embedding())
+
+            self.assertEqual(len(list(Path(tmp).glob("*.npz"))), 0)
+
+    def test_disk_tier_unreadable_file(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            (Path(tmp) / "key.npz").write_bytes(b"not a npz file")
+            cache = EmbeddingCache(max_bytes=0, disk_folder=tmp)
+
+            self.assertIsNone(cache.get("key"))
+            self.assertFalse((Path(tmp) / "key.npz").exists())
+            self.assertEqual(cache.stats()["misses"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
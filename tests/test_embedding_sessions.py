@@ -0,0 +1,118 @@
+import time
+import unittest
+from unittest.mock import patch
+
+import numpy as np
+from affine import Affine
+
+from samgis.io_package.coordinates_pixel_conversion import LatLngPixelTransform
+from samgis.prediction_api.embedding_cache import CachedEmbedding
+from samgis.prediction_api.sam2_adapter import ImageEmbedding
+from samgis.web.embedding_sessions import (
+    EmbeddingSessionNotFoundError,
+    EmbeddingSessionStore,
+)
+
+pixel_transform = LatLngPixelTransform(
+    39.036252959636606, 15.040283203125002, 38.302869955150044, 13.634033203125002, 10
+)
+
+
+def get_cached_embedding(nbytes: int) -> CachedEmbedding:
+    embedding = ImageEmbedding(
+        features={"image_embed": np.zeros(nbytes, dtype=np.uint8)}, orig_hw=(4, 4)
+    )
+    return CachedEmbedding(embedding=embedding, transform=Affine.identity())
+
+
+class TestEmbeddingSessionStore(unittest.TestCase):
+    def test_create_get_delete(self):
+        store = EmbeddingSessionStore(max_bytes=100, ttl=60)
+        session = store.create(
+            get_cached_embedding(10), "/tmp/variant", pixel_transform
+        )
+
+        self.assertEqual(len(session.id), 22)
+        self.assertIs(store.get(session.id), session)
+        self.assertEqual(session.model_folder.name, "variant")
+        expires_in = store.expires_in(session)
+        assert expires_in is not None
+        self.assertAlmostEqual(expires_in, 60, delta=1)
+        store.delete(session.id)
+        with self.assertRaises(EmbeddingSessionNotFoundError):
+            store.get(session.id)
+        with self.assertRaises(EmbeddingSessionNotFoundError):
+            store.delete(session.id)
+        stats = store.stats()
+        self.assertEqual(stats["created"], 1)
+        self.assertEqual(stats["hits"], 1)
+        self.assertEqual(stats["deleted"], 1)
+        self.assertEqual(stats["not_found"], 2)
+        self.assertEqual(stats["bytes"], 0)
+
+    def test_ttl_extended_on_use(self):
+        store = EmbeddingSessionStore(max_bytes=100, ttl=60)
+        now = time.time()
+        session = store.create(
+            get_cached_embedding(10), "/tmp/variant", pixel_transform
+        )
+
+        with patch.object(time, "time", return_value=now + 50):
+            store.get(session.id)
+        with patch.object(time, "time", return_value=now + 100):
+            self.assertIs(store.get(session.id), session)
+        with (
+            patch.object(time, "time", return_value=now + 161),
+            self.assertRaises(EmbeddingSessionNotFoundError),
+        ):
+            store.get(session.id)
+        self.assertEqual(store.stats()["expired"], 1)
+        self.assertEqual(store.stats()["entries"], 0)
+
+    def test_expired_removed_on_create(self):
+        store = EmbeddingSessionStore(max_bytes=100, ttl=60)
+        now = time.time()
+        store.create(get_cached_embedding(10), "/tmp/variant", pixel_transform)
+
+        with patch.object(time, "time", return_value=now + 61):
+            store.create(get_cached_embedding(10), "/tmp/variant", pixel_transform)
+        stats = store.stats()
+        self.assertEqual(stats["expired"], 1)
+        self.assertEqual(stats["entries"], 1)
+        self.assertEqual(stats["bytes"], 10)
+
+    def test_lru_eviction(self):
+        store = EmbeddingSessionStore(max_bytes=25, max_entries=3)
+        first = store.create(get_cached_embedding(10), "/tmp/variant", pixel_transform)
+        second = store.create(get_cached_embedding(10), "/tmp/variant", pixel_transform)
+        # the first session becomes the most recently used one, the second gets evicted
+        store.get(first.id)
+        third = store.create(get_cached_embedding(10), "/tmp/variant", pixel_transform)
+
+        with self.assertRaises(EmbeddingSessionNotFoundError):
+            store.get(second.id)
+        self.assertIs(store.get(first.id), first)
+        self.assertIs(store.get(third.id), third)
+        self.assertEqual(store.stats()["evictions"], 1)
+
+        # max_entries
+        store = EmbeddingSessionStore(max_bytes=0, max_entries=2)
+        sessions = [
+            store.create(get_cached_embedding(10), "/tmp/variant", pixel_transform)
+            for _ in range(3)
+        ]
+        with self.assertRaises(EmbeddingSessionNotFoundError):
+            store.get(sessions[0].id)
+        self.assertEqual(store.stats()["entries"], 2)
+
+        # bigger than the whole budget: kept alone
+        store = EmbeddingSessionStore(max_bytes=25)
+        store.create(get_cached_embedding(10), "/tmp/variant", pixel_transform)
+        big = store.create(get_cached_embedding(30), "/tmp/variant", pixel_transform)
+        self.assertIs(store.get(big.id), big)
+        self.assertEqual(store.stats()["entries"], 1)
+        self.assertEqual(store.stats()["bytes"], 30)
+
+
+if __name__ == "__main__":
+    unittest.main()
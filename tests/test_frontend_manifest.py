@@ -0,0 +1,100 @@
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from samgis_web.utilities import frontend_builder
+
+from samgis.web.frontend_manifest import (
+    ensure_frontend,
+    get_frontend_sources_hash,
+    read_build_manifest,
+)
+
+
+def create_frontend_project(project_folder: Path) -> Path:
+    static_folder = project_folder / "static"
+    (static_folder / "src").mkdir(parents=True)
+    (static_folder / "src" / "input.css").write_text("@import 'tailwindcss';")
+    (static_folder / "src" / "main.ts").write_text("console.log('samgis');")
+    (static_folder / "package.json").write_text("{}")
+    dist_folder = static_folder / "dist"
+    dist_folder.mkdir()
+    (dist_folder / "index.html").write_text("<html></html>")
+    (dist_folder / "output.css").write_text("")
+    return dist_folder
+
+
+class TestFrontendManifest(unittest.TestCase):
+    def test_get_frontend_sources_hash(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            create_frontend_project(Path(tmp_dir))
+            static_folder = Path(tmp_dir) / "static"
+            sources_hash = get_frontend_sources_hash(static_folder, "src/input.css")
+
+            # dependencies and build outputs aren't frontend sources
+            (static_folder / "node_modules").mkdir()
+            (static_folder / "node_modules" / "dep.js").write_text("")
+            (static_folder / "dist" / "index.html").write_text("<html>new</html>")
+            self.assertEqual(
+                get_frontend_sources_hash(static_folder, "src/input.css"),
+                sources_hash,
+            )
+            self.assertNotEqual(
+                get_frontend_sources_hash(static_folder, "src/other.css"),
+                sources_hash,
+            )
+            (static_folder / "src" / "main.ts").write_text("console.log('changed');")
+            self.assertNotEqual(
+                get_frontend_sources_hash(static_folder, "src/input.css"),
+                sources_hash,
+            )
+
+    @patch.object(frontend_builder, "build_frontend")
+    def test_ensure_frontend_manifest(self, build_frontend_mocked):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            dist_folder = create_frontend_project(Path(tmp_dir))
+
+            # without a manifest the existing dist folder could be stale
+            self.assertTrue(ensure_frontend(tmp_dir, "src/input.css", dist_folder))
+            build_frontend_mocked.assert_called_once()
+            self.assertTrue(build_frontend_mocked.call_args.kwargs["force_build"])
+            manifest = read_build_manifest(dist_folder)
+            assert manifest is not None
+            self.assertEqual(manifest["input_css_path"], "src/input.css")
+
+            self.assertFalse(ensure_frontend(tmp_dir, "src/input.css", dist_folder))
+            build_frontend_mocked.assert_called_once()
+
+            (Path(tmp_dir) / "static" / "src" / "main.ts").write_text("changed")
+            self.assertTrue(ensure_frontend(tmp_dir, "src/input.css", dist_folder))
+            self.assertEqual(build_frontend_mocked.call_count, 2)
+            rebuilt_manifest = read_build_manifest(dist_folder)
+            assert rebuilt_manifest is not None
+            self.assertNotEqual(
+                rebuilt_manifest["sources_hash"], manifest["sources_hash"]
+            )
+
+            self.assertTrue(
+                ensure_frontend(tmp_dir, "src/input.css", dist_folder, mode="force")
+            )
+            self.assertEqual(build_frontend_mocked.call_count, 3)
+
+    @patch.object(frontend_builder, "build_frontend")
+    def test_ensure_frontend_prebuilt(self, build_frontend_mocked):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            dist_folder = create_frontend_project(Path(tmp_dir))
+
+            self.assertFalse(
+                ensure_frontend(tmp_dir, "src/input.css", dist_folder, mode="prebuilt")
+            )
+            (dist_folder / "output.css").unlink()
+            with self.assertRaises(FileNotFoundError):
+                ensure_frontend(tmp_dir, "src/input.css", dist_folder, mode="prebuilt")
+            with self.assertRaises(ValueError):
+                ensure_frontend(tmp_dir, "src/input.css", dist_folder, mode="never")
+            build_frontend_mocked.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,126 @@
+import json
+import unittest
+
+import numpy as np
+from affine import Affine
+from samgis_web.io_package.geo_helpers import get_vectorized_raster_as_geojson
+
+from samgis.io_package import geo_helpers
+from samgis.io_package.geo_helpers import iter_vectorized_raster_as_geojson_features
+from samgis.utilities.type_hints import PolygonizeOptions
+
+transform = Affine(150.0, 0.0, 1517000.0, 0.0, -150.0, 4720000.0)
+
+
+def get_mask_with_noise() -> np.ndarray:
+    # a jagged disk (one vertex for every pixel step on its border) and an isolated pixel
+    yy, xx = np.mgrid[:128, :128]
+    mask = np.zeros((128, 128), dtype=np.uint8)
+    mask[(yy - 64) ** 2 + (xx - 64) ** 2 < 40**2] = 255
+    mask[5, 5] = 255
+    return mask
+
+
+def count_vertices(features: list[dict]) -> int:
+    return sum(
+        len(ring) for feature in features for ring in feature["geometry"]["coordinates"]
+    )
+
+
+class TestGeoHelpers(unittest.TestCase):
+    def test_iter_vectorized_raster_as_geojson_features(self):
+        mask = np.zeros((64, 64), dtype=np.uint8)
+        mask[10:30, 10:40] = 255
+        mask[40:50, 5:15] = 255
+        features = iter_vectorized_raster_as_geojson_features(mask, transform)
+        self.assertFalse(isinstance(features, list))
+        features = list(features)
+
+        expected = json.loads(
+            str(get_vectorized_raster_as_geojson(mask, transform)["geojson"])
+        )["features"]
+        self.assertEqual(len(features), len(expected))
+        for feature, expected_feature in zip(features, expected):
+            self.assertEqual(feature["id"], expected_feature["id"])
+            self.assertEqual(feature["properties"], expected_feature["properties"])
+            self.assertEqual(
+                feature["geometry"]["type"], expected_feature["geometry"]["type"]
+            )
+            for ring, expected_ring in zip(
+                feature["geometry"]["coordinates"],
+                expected_feature["geometry"]["coordinates"],
+            ):
+                np.testing.assert_allclose(ring, expected_ring, atol=1e-12)
+
+    def test_iter_vectorized_raster_as_geojson_features_options(self):
+        import shapely
+
+        mask = get_mask_with_noise()
+        full = list(iter_vectorized_raster_as_geojson_features(mask, transform))
+        options = PolygonizeOptions(simplify_tolerance=1.5, precision=5, min_area=4)
+        simplified = list(
+            iter_vectorized_raster_as_geojson_features(mask, transform, options)
+        )
+
+        # the isolated pixel (and the hole it makes in the background) is gone
+        self.assertEqual(len(full), 3)
+        self.assertEqual(len(simplified), 2)
+        self.assertListEqual([f["id"] for f in simplified], ["0", "1"])
+        self.assertLess(count_vertices(simplified), count_vertices(full) / 2)
+        for feature in simplified:
+            polygon = shapely.geometry.shape(feature["geometry"])
+            self.assertTrue(polygon.is_valid)
+            for ring in feature["geometry"]["coordinates"]:
+                for lng, lat in ring:
+                    self.assertEqual(lng, round(lng, 5))
+                    self.assertEqual(lat, round(lat, 5))
+        # the disk area changes less than 1%
+        disk, disk_simplified = (
+            shapely.geometry.shape(features[-1]["geometry"])
+            for features in (full, simplified)
+        )
+        self.assertAlmostEqual(disk_simplified.area / disk.area, 1.0, delta=0.01)
+
+    def test_iter_vectorized_raster_as_geojson_features_adjacent_polygons(self):
+        import shapely
+
+        # two overlapping disks within the background: four regions sharing their jagged edges
+        yy, xx = np.mgrid[:64, :64]
+        mask = np.ones((64, 64), dtype=np.uint8)
+        mask[(yy - 32) ** 2 + (xx - 22) ** 2 < 14**2] += 1
+        mask[(yy - 32) ** 2 + (xx - 44) ** 2 < 14**2] += 2
+        options = PolygonizeOptions(simplify_tolerance=1.5)
+        features = list(
+            iter_vectorized_raster_as_geojson_features(mask, transform, options)
+        )
+
+        self.assertEqual(len(features), 4)
+        polygons = [shapely.geometry.shape(f["geometry"]) for f in features]
+        union = shapely.union_all(polygons)
+        # the simplified polygons still tile the mask extent: no gaps, no overlaps
+        assert isinstance(union, shapely.Polygon), union.geom_type
+        self.assertEqual(len(union.interiors), 0)
+        self.assertAlmostEqual(
+            sum(polygon.area for polygon in polygons) / union.area, 1.0, places=9
+        )
+        self.assertAlmostEqual(union.area / union.envelope.area, 1.0, places=9)
+        self.assertLess(
+            count_vertices(features),
+            count_vertices(
+                list(iter_vectorized_raster_as_geojson_features(mask, transform))
+            ),
+        )
+
+    def test_get_vectorized_raster_as_geojson(self):
+        mask = get_mask_with_noise()
+        output = geo_helpers.get_vectorized_raster_as_geojson(mask, transform)
+        expected = get_vectorized_raster_as_geojson(mask, transform)
+
+        self.assertEqual(output["n_shapes_geojson"], expected["n_shapes_geojson"])
+        geojson = json.loads(str(output["geojson"]))
+        self.assertEqual(geojson["type"], "FeatureCollection")
+        self.assertEqual(len(geojson["features"]), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
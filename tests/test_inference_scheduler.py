@@ -0,0 +1,108 @@
+import threading
+import unittest
+
+from samgis.web.inference_scheduler import InferenceRejectedError, InferenceScheduler
+
+
+class TestInferenceScheduler(unittest.TestCase):
+    def test_slot_no_wait(self):
+        scheduler = InferenceScheduler(max_concurrency=2, max_queue_size=1)
+        with scheduler.slot() as wait_seconds:
+            self.assertEqual(wait_seconds, 0.0)
+            self.assertEqual(scheduler.in_flight, 1)
+        stats = scheduler.stats()
+        self.assertEqual(stats["in_flight"], 0)
+        self.assertEqual(stats["completed"], 1)
+
+    def test_queue_full_429(self):
+        scheduler = InferenceScheduler(max_concurrency=1, max_queue_size=0)
+        with (
+            scheduler.slot(),
+            self.assertRaises(InferenceRejectedError) as rejected,
+            scheduler.slot(),
+        ):
+            pass
+        self.assertEqual(rejected.exception.status_code, 429)
+        self.assertGreaterEqual(rejected.exception.retry_after, 1)
+        self.assertEqual(scheduler.stats()["rejected_queue_full"], 1)
+
+    def test_queue_timeout_503(self):
+        scheduler = InferenceScheduler(
+            max_concurrency=1, max_queue_size=1, queue_timeout=0.05
+        )
+        with (
+            scheduler.slot(),
+            self.assertRaises(InferenceRejectedError) as rejected,
+            scheduler.slot(),
+        ):
+            pass
+        self.assertEqual(rejected.exception.status_code, 503)
+        stats = scheduler.stats()
+        self.assertEqual(stats["rejected_timeout"], 1)
+        self.assertEqual(stats["queue_depth"], 0)
+
+    def test_queued_requests_run_in_order(self):
+        scheduler = InferenceScheduler(
+            max_concurrency=1, max_queue_size=3, queue_timeout=5
+        )
+        order = []
+        queued = threading.Event()
+
+        def run(n: int):
+            with scheduler.slot():
+                order.append(n)
+
+        with scheduler.slot():
+            threads = []
+            for n in range(3):
+                thread = threading.Thread(target=run, args=(n,))
+                thread.start()
+                threads.append(thread)
+                # wait for the thread to enter the queue to get a deterministic order
+                while scheduler.queue_depth <= n:
+                    queued.wait(0.01)
+            self.assertEqual(scheduler.stats()["queue_depth"], 3)
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(order, [0, 1, 2])
+        stats = scheduler.stats()
+        self.assertEqual(stats["completed"], 4)
+        self.assertEqual(stats["queue_depth"], 0)
+        self.assertGreater(stats["wait_seconds_max"], 0)
+
+    def test_max_concurrency(self):
+        scheduler = InferenceScheduler(
+            max_concurrency=2, max_queue_size=8, queue_timeout=5
+        )
+        lock = threading.Lock()
+        running = [0]
+        max_running = [0]
+
+        def run():
+            with scheduler.slot():
+                with lock:
+                    running[0] += 1
+                    max_running[0] = max(max_running[0], running[0])
+                threading.Event().wait(0.02)
+                with lock:
+                    running[0] -= 1
+
+        threads = [threading.Thread(target=run) for _ in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(max_running[0], 2)
+        self.assertEqual(scheduler.stats()["completed"], 6)
+
+    def test_invalid_parameters(self):
+        with self.assertRaises(ValueError):
+            InferenceScheduler(max_concurrency=0)
+        with self.assertRaises(ValueError):
+            InferenceScheduler(max_queue_size=-1)
+
+
+if __name__ == "__main__":
+    unittest.main()
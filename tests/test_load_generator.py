@@ -0,0 +1,228 @@
+import json
+import tempfile
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+
+from scripts import load_generator
+from tests import TEST_EVENTS_FOLDER
+
+
+class FakeInferenceServer(ThreadingHTTPServer):
+    def __init__(self, delay: float) -> None:
+        super().__init__(("127.0.0.1", 0), FakeInferenceHandler)
+        self.bodies: list[dict] = []
+        self.lock = threading.Lock()
+        self.delay = delay
+
+
+class FakeInferenceHandler(BaseHTTPRequestHandler):
+    """Answer like /infer_samgis after server.delay seconds, every third request gets a 429"""
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+    def do_POST(self):
+        server = self.server
+        assert isinstance(server, FakeInferenceServer)
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        with server.lock:
+            server.bodies.append(body)
+            n_request = len(server.bodies)
+        time.sleep(server.delay)
+        if n_request % 3 == 0:
+            self.send_response(429)
+            self.send_header("Retry-After", "1")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        content = json.dumps(
+            {"body": json.dumps({"duration_run": 0.25, "output": {}})}
+        ).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("X-Cache", "miss")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+
+class TestLoadGenerator(unittest.TestCase):
+    def test_parse_steps(self):
+        self.assertListEqual(
+            load_generator.parse_steps("1:30,2.5:10"),
+            [load_generator.RateStep(1.0, 30.0), load_generator.RateStep(2.5, 10.0)],
+        )
+        with self.assertRaises(ValueError):
+            load_generator.parse_steps("0:30")
+
+    def test_get_schedule(self):
+        steps = [load_generator.RateStep(2, 5), load_generator.RateStep(4, 5)]
+        schedule, steps_index = load_generator.get_schedule(steps, "constant")
+        np.testing.assert_allclose(
+            schedule, np.concatenate((np.arange(0, 5, 0.5), np.arange(5, 10, 0.25)))
+        )
+        self.assertListEqual(steps_index.tolist(), [0] * 10 + [1] * 20)
+
+        steps = [load_generator.RateStep(50, 20), load_generator.RateStep(100, 20)]
+        schedule, steps_index = load_generator.get_schedule(steps, "poisson", seed=1)
+        self.assertTrue(np.all(np.diff(schedule) >= 0))
+        self.assertLess(schedule.max(), 40)
+        # ~1000 and ~2000 arrivals
+        self.assertAlmostEqual(np.sum(steps_index == 0) / 1000, 1, delta=0.1)
+        self.assertAlmostEqual(np.sum(steps_index == 1) / 2000, 1, delta=0.1)
+        with self.assertRaises(ValueError):
+            load_generator.get_schedule(steps, "burst")
+
+    def test_load_request_bodies(self):
+        with open(TEST_EVENTS_FOLDER / "lambda_handler_single_point.json") as src:
+            event = json.load(src)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            requests_file = Path(tmp_dir) / "requests.jsonl"
+            requests_file.write_text(
+                f"{json.dumps(event)}\n\n{event['input']['body']}\n"
+            )
+            bodies = load_generator.load_request_bodies(requests_file, ["multi_prompt"])
+        self.assertEqual(len(bodies), 3)
+        self.assertEqual(len(bodies[0]["prompt"]), 3)
+        self.assertDictEqual(bodies[1], json.loads(event["input"]["body"]))
+        self.assertDictEqual(bodies[1], bodies[2])
+
+    def test_get_request_body_bust_cache(self):
+        bodies = load_generator.load_request_bodies(
+            None, ["single_point", "single_rectangle"]
+        )
+        self.assertIs(load_generator.get_request_body(bodies, 2, False), bodies[0])
+        point_lats = {
+            load_generator.get_request_body(bodies, index, True)["prompt"][0]["data"][
+                "lat"
+            ]
+            for index in (0, 2, 4)
+        }
+        self.assertEqual(len(point_lats), 3)
+        rectangle = load_generator.get_request_body(bodies, 3, True)["prompt"][0]
+        self.assertNotEqual(rectangle, bodies[1]["prompt"][0])
+        # the loaded bodies don't change
+        self.assertDictEqual(
+            bodies[1],
+            load_generator.load_request_bodies(None, ["single_rectangle"])[0],
+        )
+
+    def test_get_latency_stats(self):
+        stats = load_generator.get_latency_stats([0.001 * n for n in range(1, 101)])
+
+        self.assertEqual(stats["count"], 100)
+        self.assertAlmostEqual(stats["p50_ms"], 50.5)
+        self.assertAlmostEqual(stats["max_ms"], 100.0)
+        self.assertIn("p99_9_ms", stats)
+        self.assertDictEqual(
+            stats["histogram"],
+            {
+                "le_1ms": 1,
+                "le_2ms": 1,
+                "le_5ms": 3,
+                "le_10ms": 5,
+                "le_20ms": 10,
+                "le_50ms": 30,
+                "le_100ms": 50,
+            },
+        )
+        self.assertDictEqual(load_generator.get_latency_stats([]), {"count": 0})
+
+    def test_summarize_results_coordinated_omission(self):
+        # one request per second, the first one stalls the only connection for 5 seconds
+        results = [
+            load_generator.RequestResult(0, 0, 0.0, 0.0, 5.0, 200, 4.9, "miss"),
+            *[
+                load_generator.RequestResult(
+                    n, 0, float(n), 5.0 + (n - 1) * 0.1, 5.0 + n * 0.1, 200
+                )
+                for n in range(1, 5)
+            ],
+            load_generator.RequestResult(5, 0, 5.0, 5.4, 5.5, 429, error="HTTP 429"),
+            load_generator.RequestResult(
+                6, 0, 6.0, 6.0, 6.5, None, error="ConnectTimeout"
+            ),
+        ]
+        summary = load_generator.summarize_results(results, duration=7.0)
+
+        self.assertEqual(summary["requests"], 7)
+        self.assertDictEqual(summary["status_counts"], {"200": 5, "429": 1, "error": 1})
+        self.assertAlmostEqual(summary["rate_429"], 1 / 7)
+        self.assertAlmostEqual(summary["error_rate"], 1 / 7)
+        self.assertAlmostEqual(summary["throughput_rps"], 5 / 7)
+        self.assertAlmostEqual(summary["cache_hit_rate"], 0.0)
+        # the corrected latency counts the wait for the stalled connection, the service time doesn't
+        self.assertAlmostEqual(summary["latency"]["max_ms"], 5000.0)
+        self.assertAlmostEqual(summary["latency"]["p50_ms"], 3200.0)
+        self.assertAlmostEqual(summary["service_time"]["p50_ms"], 100.0)
+        self.assertEqual(summary["duration_run"]["count"], 1)
+
+    def test_run_load(self):
+        server = FakeInferenceServer(delay=0.05)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        url = f"http://127.0.0.1:{server.server_address[1]}"
+
+        steps = load_generator.parse_steps("20:0.5,40:0.5")
+        schedule, steps_index = load_generator.get_schedule(steps, "constant")
+        bodies = load_generator.load_request_bodies(None, ["single_point"])
+        results = load_generator.run_load(
+            f"{url}{load_generator.ENDPOINT}",
+            bodies,
+            schedule,
+            steps_index,
+            concurrency=4,
+            timeout=5,
+            bust_cache=True,
+        )
+        summary = load_generator.summarize(results, steps, {"url": url})
+
+        self.assertEqual(len(server.bodies), 30)
+        self.assertEqual(
+            len({body["prompt"][0]["data"]["lat"] for body in server.bodies}), 30
+        )
+        self.assertEqual(summary["overall"]["requests"], 30)
+        self.assertDictEqual(
+            summary["overall"]["status_counts"], {"200": 20, "429": 10}
+        )
+        self.assertListEqual([step["requests"] for step in summary["steps"]], [10, 20])
+        self.assertEqual(summary["overall"]["duration_run"]["p50_ms"], 250.0)
+        for result in results:
+            self.assertGreaterEqual(result.start, result.scheduled)
+            self.assertGreaterEqual(result.latency, result.service_time)
+        json.dumps(summary)
+
+    def test_compare_summaries(self):
+        def get_summary(p99_ms: float, rate_429: float) -> dict:
+            return {
+                "overall": {
+                    "latency": {"count": 10, "p50_ms": 100.0, "p99_ms": p99_ms},
+                    "error_rate": 0.0,
+                    "rate_429": rate_429,
+                }
+            }
+
+        baseline = get_summary(200.0, 0.0)
+        self.assertListEqual(
+            load_generator.compare_summaries(
+                baseline, get_summary(210.0, 0.005), 0.1, 0.01
+            ),
+            [],
+        )
+        regressions = load_generator.compare_summaries(
+            baseline, get_summary(300.0, 0.1), 0.1, 0.01
+        )
+        self.assertEqual(len(regressions), 2)
+        self.assertTrue(regressions[0].startswith("latency p99_ms"))
+        self.assertTrue(regressions[1].startswith("rate_429"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,97 @@
+import unittest
+from unittest.mock import patch
+
+from samgis.utilities import metrics
+
+
+class TestMetrics(unittest.TestCase):
+    def test_histogram_render(self):
+        histogram = metrics.Histogram(
+            "test_duration_seconds", "Test duration.", "stage", buckets=(0.1, 1.0)
+        )
+        histogram.observe("encoder", 0.05)
+        histogram.observe("encoder", 0.5)
+        histogram.observe("encoder", 2.0)
+
+        self.assertListEqual(
+            histogram.render(),
+            [
+                "# HELP test_duration_seconds Test duration.",
+                "# TYPE test_duration_seconds histogram",
+                'test_duration_seconds_bucket{stage="encoder",le="0.1"} 1',
+                'test_duration_seconds_bucket{stage="encoder",le="1.0"} 2',
+                'test_duration_seconds_bucket{stage="encoder",le="+Inf"} 3',
+                'test_duration_seconds_sum{stage="encoder"} 2.55',
+                'test_duration_seconds_count{stage="encoder"} 3',
+            ],
+        )
+
+    def test_registry_render_collectors(self):
+        registry = metrics.MetricsRegistry()
+        registry.register_collector(
+            lambda: [("test_queue_depth", "gauge", "Queue depth.", 2)]
+        )
+
+        self.assertEqual(
+            registry.render(),
+            "# HELP test_queue_depth Queue depth.\n"
+            "# TYPE test_queue_depth gauge\n"
+            "test_queue_depth 2.0\n",
+        )
+
+    def test_registry_render_labeled_samples(self):
+        registry = metrics.MetricsRegistry()
+        registry.register_collector(
+            lambda: [
+                ('test_rss_bytes{worker="0"}', "gauge", "RSS.", 10),
+                ('test_rss_bytes{worker="1"}', "gauge", "RSS.", 20),
+            ]
+        )
+
+        self.assertEqual(
+            registry.render(),
+            "# HELP test_rss_bytes RSS.\n"
+            "# TYPE test_rss_bytes gauge\n"
+            'test_rss_bytes{worker="0"} 10.0\n'
+            'test_rss_bytes{worker="1"} 20.0\n',
+        )
+
+    def test_collect_timings(self):
+        with metrics.collect_timings() as timings:
+            with metrics.stage_timer("decoder"):
+                pass
+            metrics.record_stage("decoder", 0.5)
+            metrics.record_stage("encoder", 1.0)
+        # outside collect_timings() the stages are only observed by the histogram
+        metrics.record_stage("encoder", 1.0)
+
+        self.assertSetEqual(set(timings), {"decoder", "encoder"})
+        self.assertGreaterEqual(timings["decoder"], 0.5)
+        self.assertEqual(timings["encoder"], 1.0)
+
+    def test_add_timings(self):
+        with (
+            patch.object(metrics.stage_durations, "observe") as observe_mocked,
+            metrics.collect_timings() as timings,
+        ):
+            metrics.record_stage("encoder", 1.0)
+            metrics.add_timings({"encoder": 2.0, "decoder": 0.5})
+        # outside collect_timings() the timings are dropped
+        metrics.add_timings({"encoder": 2.0})
+
+        self.assertDictEqual(timings, {"encoder": 3.0, "decoder": 0.5})
+        # the added timings aren't observed again by the histogram
+        observe_mocked.assert_called_once_with("encoder", 1.0)
+
+    def test_phase_timer(self):
+        with patch.object(metrics.time, "perf_counter", side_effect=[10.0, 10.5, 12.0]):
+            timer = metrics.PhaseTimer()
+            self.assertEqual(timer.mark("env"), 0.5)
+            timer.mark("frontend")
+
+        self.assertDictEqual(timer.phases, {"env": 0.5, "frontend": 1.5})
+        self.assertEqual(timer.total, 2.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
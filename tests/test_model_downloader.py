@@ -0,0 +1,227 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any
+from unittest.mock import patch
+
+from samgis_core.prediction_api import model_registry
+
+from samgis.prediction_api.model_downloader import (
+    download_model,
+    get_verified_files,
+    verify_download,
+)
+from samgis.utilities.constants import MODEL_VERIFIED_MANIFEST
+
+CHUNK_SIZE = 16 * 1024
+
+
+class FixtureFilesServer(ThreadingHTTPServer):
+    def __init__(self, files: dict[str, bytes]) -> None:
+        super().__init__(("127.0.0.1", 0), FixtureFilesHandler)
+        self.files = files
+        self.requests: list[tuple[str, str | None]] = []
+        self.lock = threading.Lock()
+        self.accept_ranges = True
+        self.failing_offsets: set[int] = set()
+
+
+class FixtureFilesHandler(BaseHTTPRequestHandler):
+    """Serve the server fixture files, with optional range requests and failing ranges"""
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+    def do_GET(self):
+        server = self.server
+        assert isinstance(server, FixtureFilesServer)
+        content = server.files.get(self.path.lstrip("/"))
+        if content is None:
+            self.send_error(404)
+            return
+        range_header = self.headers.get("Range")
+        with server.lock:
+            server.requests.append((self.path, range_header))
+        if range_header is None or not server.accept_ranges:
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+            return
+        start, end = map(int, range_header.removeprefix("bytes=").split("-"))
+        if start in server.failing_offsets:
+            self.send_error(500)
+            return
+        end = min(end, len(content) - 1)
+        self.send_response(206)
+        self.send_header("Content-Range", f"bytes {start}-{end}/{len(content)}")
+        self.send_header("Content-Length", str(end - start + 1))
+        self.end_headers()
+        self.wfile.write(content[start : end + 1])
+
+
+class TestModelDownloader(unittest.TestCase):
+    def setUp(self):
+        self.files = {
+            "encoder.onnx": os.urandom(10 * CHUNK_SIZE + 123),
+            "decoder.onnx": os.urandom(3 * CHUNK_SIZE),
+        }
+        self.server = FixtureFilesServer(self.files)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+        base_url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self.model_info = {
+            "files": {filename: filename for filename in self.files},
+            "urls": {filename: f"{base_url}/{filename}" for filename in self.files},
+            "sha256": {
+                filename: hashlib.sha256(content).hexdigest()
+                for filename, content in self.files.items()
+            },
+        }
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.model_dir = Path(tmp_dir.name)
+        patcher = patch.dict(model_registry.MODELS, {"test_variant": self.model_info})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def download(self, **kwargs):
+        return download_model(
+            "test_variant",
+            target_dir=self.model_dir,
+            max_workers=4,
+            chunk_size=CHUNK_SIZE,
+            retries=0,
+            **kwargs,
+        )
+
+    def get_range_requests(self) -> list[tuple[str, str | None]]:
+        # without the "bytes=0-0" probes of the files size
+        return [
+            request for request in self.server.requests if request[1] != "bytes=0-0"
+        ]
+
+    def get_done_chunks(self, filename: str) -> list[int]:
+        state_path = self.model_dir / f"{filename}.part.json"
+        return (
+            json.loads(state_path.read_text())["done"] if state_path.is_file() else []
+        )
+
+    def assert_downloaded(self):
+        for filename, content in self.files.items():
+            self.assertEqual((self.model_dir / filename).read_bytes(), content)
+        self.assertListEqual(
+            sorted(path.name for path in self.model_dir.iterdir()),
+            sorted([*self.files, MODEL_VERIFIED_MANIFEST]),
+        )
+
+    def test_download_model_parallel_ranges(self):
+        progress = []
+        self.assertEqual(
+            self.download(on_progress=lambda pct, msg: progress.append(pct)),
+            self.model_dir,
+        )
+        self.assert_downloaded()
+        # 11 + 3 chunks, every one requested once
+        range_requests = self.get_range_requests()
+        self.assertEqual(len(range_requests), 14)
+        self.assertEqual(len(set(range_requests)), 14)
+        self.assertEqual(progress[-1], 100)
+        self.assertListEqual(progress, sorted(progress))
+
+        manifest = json.loads((self.model_dir / MODEL_VERIFIED_MANIFEST).read_text())
+        self.assertEqual(manifest["variant"], "test_variant")
+        for filename, sha256 in self.model_info["sha256"].items():
+            self.assertEqual(manifest["files"][filename]["sha256"], sha256)
+            self.assertEqual(
+                manifest["files"][filename]["size"], len(self.files[filename])
+            )
+
+    def test_download_model_resume(self):
+        # the 6th chunk of the encoder fails: the other chunks are kept for the next run
+        self.server.failing_offsets = {5 * CHUNK_SIZE}
+        with self.assertRaises(OSError):
+            self.download()
+        self.assertFalse((self.model_dir / "encoder.onnx").exists())
+        self.assertTrue((self.model_dir / "encoder.onnx.part").is_file())
+        done_chunks = self.get_done_chunks("encoder.onnx")
+        self.assertNotIn(5, done_chunks)
+        self.assertIn(0, done_chunks)
+        n_done = len(done_chunks) + len(self.get_done_chunks("decoder.onnx"))
+
+        self.server.failing_offsets = set()
+        self.server.requests.clear()
+        with patch.object(model_registry, "verify_download") as verify_download_mocked:
+            self.download()
+        self.assert_downloaded()
+        # only the missing chunks are downloaded, the resumed ones aren't hashed again at the end
+        range_requests = self.get_range_requests()
+        self.assertIn(
+            ("/encoder.onnx", f"bytes={5 * CHUNK_SIZE}-{6 * CHUNK_SIZE - 1}"),
+            range_requests,
+        )
+        self.assertEqual(len(range_requests), 14 - n_done)
+        verify_download_mocked.assert_not_called()
+
+    def test_download_model_sha256_mismatch(self):
+        self.model_info["sha256"]["encoder.onnx"] = "0" * 64
+        with self.assertRaises(OSError) as context:
+            self.download()
+        self.assertIn("encoder.onnx", str(context.exception))
+        self.assertFalse((self.model_dir / "encoder.onnx").exists())
+        self.assertFalse((self.model_dir / "encoder.onnx.part").exists())
+        self.assertFalse((self.model_dir / "encoder.onnx.part.json").exists())
+        self.assertEqual(
+            (self.model_dir / "decoder.onnx").read_bytes(), self.files["decoder.onnx"]
+        )
+        self.assertSetEqual(
+            get_verified_files("test_variant", self.model_dir), {"decoder.onnx"}
+        )
+
+    def test_download_model_without_range_requests(self):
+        self.server.accept_ranges = False
+        self.download()
+        self.assert_downloaded()
+        self.assertEqual(len(self.server.requests), 4)
+
+    def test_verify_download_manifest(self):
+        self.download()
+        self.assertSetEqual(
+            get_verified_files("test_variant", self.model_dir), set(self.files)
+        )
+        with patch.object(model_registry, "verify_download") as verify_download_mocked:
+            self.assertListEqual(verify_download("test_variant", self.model_dir), [])
+            verify_download_mocked.assert_not_called()
+
+        # changed modification time: hashed again, recorded again when verified
+        mtime = time.time() + 10
+        os.utime(self.model_dir / "encoder.onnx", (mtime, mtime))
+        self.assertSetEqual(
+            get_verified_files("test_variant", self.model_dir), {"decoder.onnx"}
+        )
+        with patch.object(
+            model_registry, "verify_download", return_value=[]
+        ) as verify_download_mocked:
+            self.assertListEqual(verify_download("test_variant", self.model_dir), [])
+            verify_download_mocked.assert_called_once()
+        self.assertSetEqual(
+            get_verified_files("test_variant", self.model_dir), set(self.files)
+        )
+
+        # a different registry checksum invalidates the manifest entry
+        self.model_info["sha256"]["decoder.onnx"] = "0" * 64
+        self.assertListEqual(
+            verify_download("test_variant", self.model_dir), ["decoder.onnx"]
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,72 @@
+import hashlib
+import os
+import tempfile
+import time
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from samgis_core.prediction_api import model_registry
+
+from samgis.web.model_health import ModelHealth
+
+
+def create_model_files(model_dir: Path) -> dict:
+    content = b"onnx model"
+    (model_dir / "encoder.onnx").write_bytes(content)
+    return {"sha256": {"encoder.onnx": hashlib.sha256(content).hexdigest()}}
+
+
+class TestModelHealth(unittest.TestCase):
+    def test_verify_cached_until_files_change(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            model_dir = Path(tmp_dir)
+            model_info = create_model_files(model_dir)
+            with patch.dict(model_registry.MODELS, {"test_variant": model_info}):
+                model_health = ModelHealth("test_variant", model_dir)
+                self.assertFalse(model_health.is_verified())
+                self.assertTrue(model_health.status()["verification_pending"])
+
+                self.assertListEqual(model_health.verify(), [])
+                self.assertListEqual(model_health.verify(), [])
+                self.assertEqual(model_health.verifications, 1)
+                self.assertTrue(model_health.is_verified())
+
+                # same size, different mtime: verified again
+                (model_dir / "encoder.onnx").write_bytes(b"onnx modek")
+                mtime = time.time() + 10
+                os.utime(model_dir / "encoder.onnx", (mtime, mtime))
+                self.assertListEqual(model_health.verify(), ["encoder.onnx"])
+                self.assertEqual(model_health.verifications, 2)
+
+                (model_dir / "encoder.onnx").unlink()
+                self.assertListEqual(model_health.verify(), ["encoder.onnx"])
+                self.assertEqual(model_health.verifications, 3)
+                self.assertFalse(model_health.status()["verified"])
+
+    def test_background_verification(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            model_dir = Path(tmp_dir)
+            model_info = create_model_files(model_dir)
+            with patch.dict(model_registry.MODELS, {"test_variant": model_info}):
+                model_health = ModelHealth("test_variant", model_dir, interval=0.01)
+                model_health.start()
+                try:
+                    time_start = time.time()
+                    while (
+                        not model_health.is_verified() and time.time() - time_start < 5
+                    ):
+                        time.sleep(0.01)
+                    time.sleep(0.05)
+                finally:
+                    model_health.stop()
+
+                self.assertTrue(model_health.is_verified())
+                # the files didn't change, only the first check hashed them
+                self.assertEqual(model_health.verifications, 1)
+                model_health.mark_warm()
+                self.assertTrue(model_health.status()["warm"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,314 @@
+import unittest
+from unittest.mock import MagicMock, patch
+
+import numpy as np
+from affine import Affine
+
+from samgis.prediction_api import predictors
+from samgis.prediction_api.embedding_cache import EmbeddingCache
+from samgis.prediction_api.sam2_adapter import ImageEmbedding
+from samgis.prediction_api.session_pool import SessionPool
+
+bbox = [
+    [39.036252959636606, 15.040283203125002],
+    [38.302869955150044, 13.634033203125002],
+]
+prompt = [{"type": "point", "label": 0, "data": [937, 514]}]
+transform = Affine(10.0, 0.0, 1500000.0, 0.0, -10.0, 4700000.0)
+source = "http://localhost:8000/lambda_handler/{z}/{x}/{y}.png"
+
+
+def get_model_instance_mocked() -> MagicMock:
+    model_instance = MagicMock()
+    model_instance.encode.return_value = ImageEmbedding(
+        features={"image_embed": np.zeros((1, 4, 8, 8), dtype=np.float32)},
+        orig_hw=(4, 4),
+    )
+    masks = np.zeros((3, 4, 4), dtype=np.uint8)
+    masks[1, 1:3, 1:3] = 255
+    model_instance.decode.return_value = masks, np.array([0.1, 0.9, 0.2])
+    return model_instance
+
+
+@patch.object(predictors, "get_vectorized_raster_as_geojson")
+@patch.object(predictors, "download_extent")
+class TestSamexporterPredict(unittest.TestCase):
+    def setUp(self):
+        self.model_instance = get_model_instance_mocked()
+        self.patchers = [
+            patch.object(
+                predictors,
+                "session_pool",
+                SessionPool(max_bytes=0, loader=lambda _: self.model_instance),
+            ),
+            patch.object(
+                predictors, "embedding_cache", EmbeddingCache(max_bytes=1024**2)
+            ),
+        ]
+        for patcher in self.patchers:
+            patcher.start()
+
+    def tearDown(self):
+        for patcher in self.patchers:
+            patcher.stop()
+
+    def test_samexporter_predict_cache_hit_runs_only_decoder(
+        self, download_extent_mocked, vectorize_mocked
+    ):
+        download_extent_mocked.return_value = (
+            np.zeros((4, 4, 3), dtype=np.uint8),
+            transform,
+        )
+        vectorize_mocked.return_value = {"geojson": "{}", "n_shapes_geojson": 1}
+
+        for _ in range(3):
+            output = predictors.samexporter_predict(
+                bbox=bbox,
+                prompt=prompt,
+                zoom=10,
+                source=source,
+                model_name="mobile_sam",
+                model_folder="/tmp/variant",
+            )
+            self.assertDictEqual(
+                output, {"n_predictions": 3, "geojson": "{}", "n_shapes_geojson": 1}
+            )
+
+        download_extent_mocked.assert_called_once()
+        self.model_instance.encode.assert_called_once()
+        self.assertEqual(self.model_instance.decode.call_count, 3)
+        mask, mask_transform = vectorize_mocked.call_args.args
+        np.testing.assert_array_equal(
+            mask, self.model_instance.decode.return_value[0][1]
+        )
+        self.assertEqual(mask_transform, transform)
+        stats = predictors.embedding_cache.stats()
+        self.assertEqual(stats["hits"], 2)
+        self.assertEqual(stats["misses"], 1)
+
+    def test_samexporter_predict_write_tmp_on_disk(
+        self, download_extent_mocked, vectorize_mocked
+    ):
+        import os
+        import tempfile
+
+        from samgis.io_package.artifact_writer import get_artifact_writer
+
+        download_extent_mocked.return_value = (
+            np.zeros((4, 4, 3), dtype=np.uint8),
+            transform,
+        )
+        vectorize_mocked.return_value = {"geojson": "{}", "n_shapes_geojson": 1}
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            with patch.dict(os.environ, {"WRITE_TMP_ON_DISK": tmp_dir}):
+                predictors.samexporter_predict(
+                    bbox=bbox, prompt=prompt, zoom=10, source=source
+                )
+            # the artifacts are written by the background writer, after the response
+            writer = get_artifact_writer(tmp_dir)
+            writer.flush()
+            names = [artifact.name for artifact in writer.list_artifacts()[1]]
+            # image, its worldfile, the best mask and the output geojson, the newest first
+            prefix = os.path.commonprefix(names)
+            self.assertListEqual(
+                [name.removeprefix(prefix) for name in names],
+                ["_geojson.json", "_mask_row.png", "_raw1.png", ".pgw"],
+            )
+            self.assertEqual(writer.stats()["failures"], 0)
+            writer.stop()
+
+    def test_samexporter_predict_cache_miss_on_other_zoom_or_variant(
+        self, download_extent_mocked, vectorize_mocked
+    ):
+        download_extent_mocked.return_value = (
+            np.zeros((4, 4, 3), dtype=np.uint8),
+            transform,
+        )
+        vectorize_mocked.return_value = {"geojson": "{}", "n_shapes_geojson": 1}
+
+        predictors.samexporter_predict(
+            bbox=bbox,
+            prompt=prompt,
+            zoom=10,
+            source=source,
+            model_name="mobile_sam",
+            model_folder="/tmp/variant",
+        )
+        predictors.samexporter_predict(
+            bbox=bbox,
+            prompt=prompt,
+            zoom=11,
+            source=source,
+            model_name="mobile_sam",
+            model_folder="/tmp/variant",
+        )
+        predictors.samexporter_predict(
+            bbox=bbox,
+            prompt=prompt,
+            zoom=10,
+            source=source,
+            model_name="mobile_sam",
+            model_folder="/tmp/variant2",
+        )
+
+        self.assertEqual(download_extent_mocked.call_count, 3)
+        self.assertEqual(self.model_instance.encode.call_count, 3)
+
+    def test_samexporter_predict_batch_encodes_once(
+        self, download_extent_mocked, vectorize_mocked
+    ):
+        download_extent_mocked.return_value = (
+            np.zeros((4, 4, 3), dtype=np.uint8),
+            transform,
+        )
+        vectorize_mocked.return_value = {"geojson": "{}", "n_shapes_geojson": 1}
+        decode_output = self.model_instance.decode.return_value
+        self.model_instance.decode.side_effect = [
+            decode_output,
+            ValueError("wrong prompt"),
+            decode_output,
+        ]
+
+        outputs = predictors.samexporter_predict_batch(
+            bbox=bbox,
+            prompts=[prompt, prompt, prompt],
+            zoom=10,
+            source=source,
+            model_name="mobile_sam",
+            model_folder="/tmp/variant",
+        )
+
+        download_extent_mocked.assert_called_once()
+        self.model_instance.encode.assert_called_once()
+        self.assertEqual(self.model_instance.decode.call_count, 3)
+        self.assertEqual(len(outputs), 3)
+        self.assertEqual(
+            outputs[0], {"n_predictions": 3, "geojson": "{}", "n_shapes_geojson": 1}
+        )
+        self.assertIsInstance(outputs[1], ValueError)
+        self.assertEqual(outputs[2], outputs[0])
+
+    def test_samexporter_predict_features(
+        self, download_extent_mocked, vectorize_mocked
+    ):
+        download_extent_mocked.return_value = (
+            np.zeros((4, 4, 3), dtype=np.uint8),
+            transform,
+        )
+
+        n_predictions, features = predictors.samexporter_predict_features(
+            bbox=bbox,
+            prompt=prompt,
+            zoom=10,
+            source=source,
+            model_name="mobile_sam",
+            model_folder="/tmp/variant",
+        )
+
+        self.assertEqual(n_predictions, 3)
+        self.model_instance.decode.assert_called_once()
+        vectorize_mocked.assert_not_called()
+        features = list(features)
+        # the best mask is a single square within the background
+        self.assertEqual(len(features), 2)
+        self.assertSetEqual(
+            {feature["properties"]["raster_val"] for feature in features},
+            {0.0, 255.0},
+        )
+
+    def test_samexporter_decode_features(
+        self, download_extent_mocked, vectorize_mocked
+    ):
+        download_extent_mocked.return_value = (
+            np.zeros((4, 4, 3), dtype=np.uint8),
+            transform,
+        )
+        cached = predictors.get_embedding(
+            bbox=bbox, zoom=10, source=source, model_folder="/tmp/variant"
+        )
+
+        for _ in range(2):
+            n_predictions, features = predictors.samexporter_decode_features(
+                cached=cached, prompt=prompt, model_folder="/tmp/variant"
+            )
+            self.assertEqual(n_predictions, 3)
+            self.assertEqual(len(list(features)), 2)
+
+        # the embedding is computed once, every prompt runs only the decoder
+        download_extent_mocked.assert_called_once()
+        self.model_instance.encode.assert_called_once()
+        self.assertEqual(self.model_instance.decode.call_count, 2)
+
+    def test_samexporter_predict_batch_windowed(
+        self, download_extent_mocked, vectorize_mocked
+    ):
+        download_extent_mocked.return_value = (
+            np.zeros((1500, 1500, 3), dtype=np.uint8),
+            transform,
+        )
+        vectorize_mocked.return_value = {"geojson": "{}", "n_shapes_geojson": 1}
+        self.model_instance.encode.side_effect = lambda img: ImageEmbedding(
+            features={"image_embed": np.zeros((1, 4, 8, 8), dtype=np.float32)},
+            orig_hw=img.shape[:2],
+        )
+        self.model_instance.decode.side_effect = lambda embedding, _: (
+            np.full((3, *embedding.orig_hw), 255, dtype=np.uint8),
+            np.array([0.1, 0.9, 0.2]),
+        )
+        window_prompt = [{"type": "point", "label": 1, "data": [100, 100]}]
+
+        outputs = predictors.samexporter_predict_batch(
+            bbox=bbox,
+            prompts=[window_prompt, window_prompt],
+            zoom=10,
+            source=source,
+            model_name="mobile_sam",
+            model_folder="/tmp/variant",
+            windowed=True,
+        )
+
+        download_extent_mocked.assert_called_once()
+        # the second prompt reuses the cached embedding of the only window with a prompt
+        self.model_instance.encode.assert_called_once()
+        self.assertTupleEqual(
+            self.model_instance.encode.call_args.args[0].shape, (1024, 1024, 3)
+        )
+        self.assertEqual(self.model_instance.decode.call_count, 2)
+        mask, mask_transform = vectorize_mocked.call_args.args
+        self.assertTupleEqual(mask.shape, (1500, 1500))
+        self.assertEqual(mask_transform, transform)
+        # the window mask covers the window only
+        self.assertEqual(int(mask.sum() // 255), 1024 * 1024)
+        self.assertEqual(
+            outputs[1], {"n_predictions": 3, "geojson": "{}", "n_shapes_geojson": 1}
+        )
+
+
+class TestPreloadModel(unittest.TestCase):
+    def test_preload_model_warm_up(self):
+        model_instance = get_model_instance_mocked()
+        pool = SessionPool(max_bytes=0, loader=predictors._load_model_instance)
+        with (
+            patch.object(predictors, "session_pool", pool),
+            patch.object(
+                predictors, "Sam2EmbeddingPredictor", return_value=model_instance
+            ) as predictor_mocked,
+        ):
+            durations = predictors.preload_model(
+                model_name="mobile_sam", model_folder="/tmp/variant"
+            )
+            self.assertIs(
+                predictors._get_model_instance("mobile_sam", "/tmp/variant"),
+                model_instance,
+            )
+        self.assertEqual(pool.stats()["pinned"], ["variant"])
+
+        predictor_mocked.assert_called_once()
+        model_instance.encode.assert_called_once()
+        model_instance.decode.assert_called_once()
+        self.assertSetEqual(set(durations), {"sessions", "warm_up"})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,211 @@
+import os
+import signal
+import socket
+import time
+import unittest
+from unittest.mock import Mock, patch
+
+from samgis.web import prefork
+
+
+def count_requests_worker(_sock):
+    while True:
+        prefork.record_request()
+        time.sleep(0.01)
+
+
+class TestPrefork(unittest.TestCase):
+    def get_server(self, **kwargs) -> prefork.PreforkServer:
+        server = prefork.PreforkServer(
+            count_requests_worker,
+            host="127.0.0.1",
+            port=0,
+            graceful_timeout=2.0,
+            **kwargs,
+        )
+        server.start()
+        self.addCleanup(server.stop)
+        return server
+
+    def wait_until(self, server: prefork.PreforkServer, condition, timeout=5.0):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            server.poll()
+            if condition():
+                return
+            time.sleep(0.05)
+        self.fail("condition not met within the timeout")
+
+    def test_worker_table(self):
+        table = prefork.WorkerTable(2)
+        table.set(1, "pid", 123)
+        table.add(1, "requests")
+        table.add(1, "requests", 2)
+        table.set(table.parent_slot, "rss", 1024)
+
+        rows = table.snapshot()
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(rows[1]["pid"], 123)
+        self.assertEqual(rows[1]["requests"], 3)
+        self.assertEqual(rows[2]["rss"], 1024)
+        self.assertEqual(rows[0]["requests"], 0)
+
+    def test_get_process_memory(self):
+        memory = prefork.get_process_memory(os.getpid())
+        self.assertSetEqual(set(memory), {"rss", "pss", "shared", "private"})
+        if os.path.isfile(f"/proc/{os.getpid()}/smaps_rollup"):
+            self.assertGreater(memory["rss"], 0)
+            self.assertLessEqual(memory["pss"], memory["rss"])
+        self.assertDictEqual(prefork.get_process_memory(-1), dict.fromkeys(memory, 0))
+
+    def test_record_request_outside_workers(self):
+        self.assertFalse(prefork.is_worker())
+        self.assertEqual(prefork.get_worker_count(), 0)
+        prefork.record_request()
+        self.assertListEqual(prefork.get_worker_samples(), [])
+
+    def test_prefork_server_recycle_max_requests(self):
+        server = self.get_server(workers=2, max_requests=20)
+        first_pids = server.pids
+        self.assertEqual(len(set(first_pids)), 2)
+
+        self.wait_until(
+            server,
+            lambda: all(server.table.get(slot, "recycled") >= 1 for slot in range(2)),
+        )
+        self.assertTrue(set(server.pids).isdisjoint(first_pids))
+        for slot in range(2):
+            self.assertEqual(server.table.get(slot, "restarts"), 0)
+            self.assertEqual(server.table.get(slot, "pid"), server.pids[slot])
+        # the recycled workers exit gracefully and are reaped
+        self.wait_until(server, lambda: not server._retiring)
+
+    def test_prefork_server_restart_crashed_worker(self):
+        server = self.get_server(workers=1)
+        self.wait_until(server, lambda: server.table.get(0, "requests") > 0)
+        crashed_pid = server.pids[0]
+        assert crashed_pid is not None
+        os.kill(crashed_pid, signal.SIGKILL)
+
+        self.wait_until(server, lambda: server.pids[0] not in (None, crashed_pid))
+        self.assertEqual(server.table.get(0, "restarts"), 1)
+        self.assertEqual(server.table.get(0, "recycled"), 0)
+        self.wait_until(server, lambda: server.table.get(0, "requests") > 0)
+
+    def test_prefork_server_replace_exited_worker(self):
+        server = prefork.PreforkServer(
+            lambda _sock: time.sleep(0.2), host="127.0.0.1", port=0, workers=1
+        )
+        server.start()
+        self.addCleanup(server.stop)
+        first_pid = server.pids[0]
+
+        # a clean exit (e.g. a SIGTERM handled by uvicorn) is replaced, but isn't a crash
+        self.wait_until(server, lambda: server.pids[0] not in (None, first_pid))
+        self.assertEqual(server.table.get(0, "restarts"), 0)
+
+    def test_prefork_server_stop(self):
+        server = self.get_server(workers=2)
+        pids = server.pids
+        server.stop()
+
+        self.assertListEqual(server.pids, [None, None])
+        for pid in pids:
+            assert pid is not None
+            with self.assertRaises(ProcessLookupError):
+                os.kill(pid, 0)
+
+    def test_prefork_server_run_sighup(self):
+        server = prefork.PreforkServer(
+            count_requests_worker, host="127.0.0.1", port=0, workers=1
+        )
+        handlers = {}
+
+        def sleep(_seconds):
+            if signal.SIGHUP in handlers:
+                handlers.pop(signal.SIGHUP)(signal.SIGHUP, None)
+                # the handler doesn't fork: the workers are recycled by the run() loop
+                recycle_all_mocked.assert_not_called()
+            else:
+                server._stopping = True
+
+        with (
+            patch.object(prefork.signal, "signal", side_effect=handlers.__setitem__),
+            patch.object(prefork.time, "sleep", side_effect=sleep),
+            patch.object(server, "start"),
+            patch.object(server, "poll"),
+            patch.object(server, "stop"),
+            patch.object(server, "recycle_all") as recycle_all_mocked,
+        ):
+            server.run()
+
+        recycle_all_mocked.assert_called_once_with("SIGHUP")
+
+    def test_run_worker_exit_code(self):
+        def run_worker(worker) -> int:
+            # the forked code, without forking: os._exit() is mocked and returns
+            server = prefork.PreforkServer(worker, host="127.0.0.1", port=0, workers=1)
+            server.socket = Mock(spec=socket.socket)
+            with (
+                patch.object(prefork.signal, "signal"),
+                patch.object(prefork.os, "_exit") as exit_mocked,
+                patch.object(prefork, "_worker_table"),
+                patch.object(prefork, "_worker_slot"),
+                patch.object(prefork, "_worker_pid"),
+            ):
+                try:
+                    server._run_worker(0)
+                except RuntimeError:
+                    pass
+            exit_mocked.assert_called_once()
+            return exit_mocked.call_args.args[0]
+
+        def exit_worker(code):
+            def worker(_sock):
+                raise SystemExit(code)
+
+            return worker
+
+        def failing_worker(_sock):
+            raise RuntimeError("bind failed")
+
+        self.assertEqual(run_worker(lambda _sock: None), 0)
+        # a graceful shutdown isn't a crash, the startup failures keep their code
+        self.assertEqual(run_worker(exit_worker(None)), 0)
+        self.assertEqual(run_worker(exit_worker(0)), 0)
+        self.assertEqual(run_worker(exit_worker(3)), 3)
+        self.assertEqual(run_worker(exit_worker("fatal")), 1)
+        self.assertEqual(run_worker(failing_worker), 1)
+
+    def test_get_worker_samples(self):
+        table = prefork.WorkerTable(2)
+        table.set(0, "pid", 123)
+        table.set(0, "started", time.time() - 10)
+        table.set(0, "requests", 5)
+        table.set(0, "rss", 2048)
+        table.set(table.parent_slot, "pss", 4096)
+        with (
+            patch.object(prefork, "_worker_table", table),
+            patch.object(prefork, "_worker_slot", 0),
+        ):
+            self.assertTrue(prefork.is_worker())
+            self.assertEqual(prefork.get_worker_count(), 2)
+            samples = {
+                name: value for name, _, _, value in prefork.get_worker_samples()
+            }
+
+        self.assertEqual(samples["samgis_prefork_worker_id"], 0)
+        self.assertEqual(samples['samgis_prefork_rss_bytes{worker="0"}'], 2048)
+        self.assertEqual(samples['samgis_prefork_pss_bytes{worker="parent"}'], 4096)
+        self.assertEqual(samples['samgis_prefork_worker_requests_total{worker="0"}'], 5)
+        self.assertAlmostEqual(
+            samples['samgis_prefork_worker_uptime_seconds{worker="0"}'], 10, delta=1
+        )
+        self.assertEqual(samples['samgis_prefork_worker_uptime_seconds{worker="1"}'], 0)
+        self.assertNotIn(
+            'samgis_prefork_worker_requests_total{worker="parent"}', samples
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
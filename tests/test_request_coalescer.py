@@ -0,0 +1,172 @@
+import threading
+import unittest
+from pathlib import Path
+
+from samgis.utilities.metrics import collect_timings, record_stage
+from samgis.utilities.type_hints import PolygonizeOptions
+from samgis.web.inference_scheduler import InferenceRejectedError
+from samgis.web.request_coalescer import RequestCoalescer, _Call, get_request_key
+
+body_request = {
+    "bbox": [[39.036, 15.040], [38.302, 13.634]],
+    "prompt": [{"type": "point", "label": 0, "data": [937, 514]}],
+    "zoom": 10,
+    "source": "http://localhost:8000/lambda_handler/{z}/{x}/{y}.png",
+    "source_name": "local",
+    "polygonize": PolygonizeOptions(),
+    "windowed": False,
+}
+
+
+class TestRequestCoalescer(unittest.TestCase):
+    def test_get_request_key(self):
+        key = get_request_key(body_request, "v1", Path("/tmp/variant"))
+
+        self.assertEqual(
+            key,
+            get_request_key(dict(reversed(body_request.items())), "v1", "/tmp/variant"),
+        )
+        self.assertNotEqual(key, get_request_key(body_request, "v2", "/tmp/variant"))
+        other_polygonize = {
+            **body_request,
+            "polygonize": PolygonizeOptions(precision=6),
+        }
+        self.assertNotEqual(
+            key, get_request_key(other_polygonize, "v1", "/tmp/variant")
+        )
+
+    def test_run_coalesces_concurrent_calls(self):
+        coalescer = RequestCoalescer()
+        started = threading.Event()
+        release = threading.Event()
+        calls = []
+
+        def compute():
+            calls.append(1)
+            started.set()
+            release.wait(5)
+            return {"n_predictions": 3}
+
+        results = []
+        leader = threading.Thread(
+            target=lambda: results.append(coalescer.run("key", compute))
+        )
+        leader.start()
+        started.wait(5)
+        followers = [
+            threading.Thread(
+                target=lambda: results.append(coalescer.run("key", compute))
+            )
+            for _ in range(3)
+        ]
+        for follower in followers:
+            follower.start()
+        while coalescer.stats()["coalesced"] < 3:
+            threading.Event().wait(0.01)
+        release.set()
+        for thread in [leader, *followers]:
+            thread.join(5)
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(len(results), 4)
+        for result in results:
+            self.assertIs(result, results[0])
+        self.assertDictEqual(
+            coalescer.stats(), {"in_flight": 0, "leaders": 1, "coalesced": 3}
+        )
+        # once completed, the same key runs again
+        coalescer.run("key", compute)
+        self.assertEqual(len(calls), 2)
+
+    def test_run_shares_the_exception(self):
+        coalescer = RequestCoalescer()
+        started = threading.Event()
+        release = threading.Event()
+        errors = []
+
+        def compute():
+            started.set()
+            release.wait(5)
+            raise ValueError("failed inference")
+
+        def run():
+            try:
+                coalescer.run("key", compute)
+            except ValueError as e_run:
+                errors.append(e_run)
+
+        threads = [threading.Thread(target=run)]
+        threads[0].start()
+        started.wait(5)
+        threads.append(threading.Thread(target=run))
+        threads[1].start()
+        while coalescer.stats()["coalesced"] < 1:
+            threading.Event().wait(0.01)
+        release.set()
+        for thread in threads:
+            thread.join(5)
+
+        self.assertEqual(len(errors), 2)
+        # the waiter raises its own copy of the leader exception, chained to it
+        leader_error, waiter_error = sorted(
+            errors, key=lambda error: error.__cause__ is not None
+        )
+        self.assertIsNot(waiter_error, leader_error)
+        self.assertIs(waiter_error.__cause__, leader_error)
+        self.assertIsInstance(waiter_error, ValueError)
+        self.assertTupleEqual(waiter_error.args, ("failed inference",))
+        self.assertEqual(coalescer.stats()["in_flight"], 0)
+
+    def test_run_shares_the_exception_attributes(self):
+        coalescer = RequestCoalescer()
+        call = coalescer._calls["key"] = _Call()
+        call.error = InferenceRejectedError("queue full", 429, retry_after=2)
+        call.done.set()
+
+        with self.assertRaises(InferenceRejectedError) as context:
+            coalescer.run("key", lambda: None)
+        self.assertIs(context.exception.__cause__, call.error)
+        self.assertEqual(context.exception.msg, "queue full")
+        self.assertEqual(context.exception.status_code, 429)
+        self.assertEqual(context.exception.retry_after, 2)
+
+    def test_run_shares_the_timings(self):
+        coalescer = RequestCoalescer()
+        started = threading.Event()
+        release = threading.Event()
+        timings = []
+
+        def compute():
+            started.set()
+            release.wait(5)
+            record_stage("encoder", 0.5)
+            return 1
+
+        def run():
+            with collect_timings() as request_timings:
+                coalescer.run("key", compute)
+            timings.append(request_timings)
+
+        threads = [threading.Thread(target=run)]
+        threads[0].start()
+        started.wait(5)
+        threads.append(threading.Thread(target=run))
+        threads[1].start()
+        while coalescer.stats()["coalesced"] < 1:
+            threading.Event().wait(0.01)
+        release.set()
+        for thread in threads:
+            thread.join(5)
+
+        self.assertListEqual(timings, [{"encoder": 0.5}, {"encoder": 0.5}])
+
+    def test_run_disabled(self):
+        coalescer = RequestCoalescer(enabled=False)
+        self.assertEqual(coalescer.run("key", lambda: 1), 1)
+        self.assertDictEqual(
+            coalescer.stats(), {"in_flight": 0, "leaders": 0, "coalesced": 0}
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,94 @@
+import os
+import tempfile
+import time
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from samgis.web.response_cache import CachedResponse, ResponseCache, get_etag
+
+
+def get_cached(cache: ResponseCache, key: str) -> CachedResponse:
+    cached = cache.get(key)
+    assert cached is not None, f"{key} not cached"
+    return cached
+
+
+class TestResponseCache(unittest.TestCase):
+    def test_get_etag(self):
+        etag = get_etag("a" * 64)
+
+        self.assertEqual(etag, f'W/"{"a" * 64}"')
+        self.assertNotEqual(etag, get_etag("b" * 64))
+        # the same key gets the same ETag whatever the response content
+        cache = ResponseCache(max_bytes=100)
+        self.assertEqual(cache.put("a", b'{"duration_run": 1.0}').etag, get_etag("a"))
+        self.assertEqual(cache.put("a", b'{"duration_run": 2.0}').etag, get_etag("a"))
+
+    def test_memory_lru_eviction(self):
+        cache = ResponseCache(max_bytes=20)
+        cache.put("a", b"0123456789")
+        cache.put("b", b"0123456789")
+        # "a" becomes the most recently used one, "b" gets evicted
+        self.assertEqual(get_cached(cache, "a").content, b"0123456789")
+        cache.put("c", b"0123456789")
+
+        self.assertIsNone(cache.get("b"))
+        self.assertIsNotNone(cache.get("c"))
+        # bigger than the whole budget: not cached
+        entry = cache.put("d", b"0" * 21)
+        self.assertEqual(entry.etag, get_etag("d"))
+        self.assertIsNone(cache.get("d"))
+        stats = cache.stats()
+        self.assertEqual(stats["evictions"], 1)
+        self.assertEqual(stats["hits"], 2)
+        self.assertEqual(stats["misses"], 2)
+        self.assertEqual(stats["bytes"], 20)
+
+    def test_ttl(self):
+        cache = ResponseCache(max_bytes=100, ttl=60)
+        cache.put("a", b"content")
+
+        with patch.object(time, "time", return_value=time.time() + 61):
+            self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.stats()["expired"], 1)
+        self.assertEqual(cache.stats()["entries"], 0)
+
+    def test_disk_tier(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            cache = ResponseCache(max_bytes=100, disk_folder=tmp_dir, disk_max_bytes=25)
+            entry = cache.put("a", b"0123456789")
+            cache.put("b", b"0123456789")
+            os.utime(Path(tmp_dir) / "a.json", (1, entry.created - 10))
+
+            # a new process: the responses are reloaded from disk, with the same ETag
+            reloaded = ResponseCache(max_bytes=100, ttl=60, disk_folder=tmp_dir)
+            self.assertEqual(get_cached(reloaded, "a").etag, entry.etag)
+            self.assertEqual(reloaded.stats()["disk_hits"], 1)
+            self.assertEqual(get_cached(reloaded, "a").etag, entry.etag)
+            self.assertEqual(reloaded.stats()["hits"], 1)
+
+            # over the disk budget, the oldest response is removed
+            cache.put("c", b"0123456789")
+            self.assertSetEqual(
+                {path.name for path in Path(tmp_dir).iterdir()}, {"b.json", "c.json"}
+            )
+            os.utime(Path(tmp_dir) / "c.json", (1, 1))
+            self.assertIsNone(reloaded.get("c"))
+            self.assertEqual(reloaded.stats()["expired"], 1)
+
+    def test_is_not_modified(self):
+        cache = ResponseCache(max_bytes=100)
+        entry = cache.put("a", b"content")
+
+        self.assertTrue(cache.is_not_modified(entry.etag, entry.etag))
+        # weak comparison: the strong form of the same opaque tag matches too
+        strong_etag = entry.etag.removeprefix("W/")
+        self.assertTrue(cache.is_not_modified(f'"other", {strong_etag}', entry.etag))
+        self.assertFalse(cache.is_not_modified("*", entry.etag))
+        self.assertFalse(cache.is_not_modified('"other"', entry.etag))
+        self.assertEqual(cache.stats()["not_modified"], 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,39 @@
+import json
+import unittest
+from unittest.mock import patch
+
+import numpy as np
+
+from samgis.utilities import serialization
+
+
+class TestSerialization(unittest.TestCase):
+    def test_dumps_bytes(self):
+        body = {"output": {"geojson": {"type": "FeatureCollection", "features": []}}}
+
+        dumped = serialization.dumps_bytes(body)
+        self.assertIsInstance(dumped, bytes)
+        self.assertDictEqual(json.loads(dumped), body)
+
+        with patch.object(serialization, "orjson", None):
+            dumped_json_module = serialization.dumps_bytes(body)
+        self.assertEqual(dumped_json_module, dumped)
+
+    def test_dumps_bytes_numpy(self):
+        body = {
+            "n_predictions": np.int64(3),
+            "score": np.float32(0.5),
+            "mask": np.array([[0, 1], [1, 0]], dtype=np.uint8),
+        }
+        expected_body = {"n_predictions": 3, "score": 0.5, "mask": [[0, 1], [1, 0]]}
+
+        self.assertDictEqual(json.loads(serialization.dumps_bytes(body)), expected_body)
+        with patch.object(serialization, "orjson", None):
+            dumped_json_module = serialization.dumps_bytes(body)
+            self.assertDictEqual(json.loads(dumped_json_module), expected_body)
+            with self.assertRaises(TypeError):
+                serialization.dumps_bytes({"unknown": object()})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,135 @@
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+import onnxruntime as ort
+import sam2_onnx
+
+from samgis.prediction_api import session_loader
+
+
+def save_optimized_model_mocked(model_path: str, providers, sess_options):
+    Path(sess_options.optimized_model_filepath).write_bytes(
+        b"optimized " + Path(model_path).read_bytes()
+    )
+
+
+class TestSessionLoader(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.model_dir = Path(self.tmp.name) / "sam2.1_hiera_tiny_uint8"
+        self.model_dir.mkdir()
+        for filename in ("encoder.onnx", "decoder.onnx", "metadata.json"):
+            (self.model_dir / filename).write_bytes(filename.encode())
+        self.optimized_model_dir = session_loader.get_optimized_model_dir(
+            self.model_dir
+        )
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_get_optimized_model_dir(self):
+        self.assertEqual(self.optimized_model_dir.parent, self.model_dir.parent)
+        self.assertEqual(
+            self.optimized_model_dir.name,
+            f"sam2.1_hiera_tiny_uint8.ort-{ort.__version__}",
+        )
+
+    @patch.object(sam2_onnx, "Sam2OnnxSession")
+    @patch.object(ort, "InferenceSession", side_effect=save_optimized_model_mocked)
+    def test_create_session_saves_then_loads_optimized_models(
+        self, inference_session_mocked, sam2_onnx_session_mocked
+    ):
+        session_loader.create_session(self.model_dir, self.optimized_model_dir)
+
+        self.assertEqual(inference_session_mocked.call_count, 2)
+        self.assertEqual(
+            (self.optimized_model_dir / "encoder.onnx").read_bytes(),
+            b"optimized encoder.onnx",
+        )
+        kwargs = sam2_onnx_session_mocked.call_args.kwargs
+        self.assertEqual(
+            kwargs["encoder_path"], self.optimized_model_dir / "encoder.onnx"
+        )
+        self.assertEqual(
+            kwargs["decoder_path"], self.optimized_model_dir / "decoder.onnx"
+        )
+        self.assertEqual(kwargs["metadata_path"], self.model_dir / "metadata.json")
+
+        # next start: the optimized models are already there
+        session_loader.create_session(self.model_dir, self.optimized_model_dir)
+        self.assertEqual(inference_session_mocked.call_count, 2)
+        self.assertEqual(sam2_onnx_session_mocked.call_count, 2)
+
+    @patch.object(sam2_onnx, "Sam2OnnxSession")
+    @patch.object(ort, "InferenceSession", side_effect=save_optimized_model_mocked)
+    def test_create_session_stale_optimized_models(
+        self, inference_session_mocked, _sam2_onnx_session_mocked
+    ):
+        session_loader.create_session(self.model_dir, self.optimized_model_dir)
+        # the source encoder is updated after saving the optimized one
+        optimized_mtime = (self.optimized_model_dir / "encoder.onnx").stat().st_mtime
+        os.utime(
+            self.model_dir / "encoder.onnx",
+            (optimized_mtime + 10, optimized_mtime + 10),
+        )
+
+        session_loader.create_session(self.model_dir, self.optimized_model_dir)
+        self.assertEqual(inference_session_mocked.call_count, 4)
+
+    @patch.object(sam2_onnx, "Sam2OnnxSession")
+    @patch.object(ort, "InferenceSession", side_effect=OSError("read-only"))
+    def test_create_session_fallback_on_error(
+        self, _inference_session_mocked, sam2_onnx_session_mocked
+    ):
+        session_loader.create_session(self.model_dir, self.optimized_model_dir)
+
+        sam2_onnx_session_mocked.assert_called_once_with(model_dir=self.model_dir)
+
+    @patch.object(sam2_onnx, "Sam2OnnxSession")
+    @patch.object(ort, "InferenceSession", side_effect=save_optimized_model_mocked)
+    def test_create_session_fallback_on_corrupted_model(
+        self, _inference_session_mocked, sam2_onnx_session_mocked
+    ):
+        from onnxruntime.capi.onnxruntime_pybind11_state import InvalidProtobuf
+
+        sam2_onnx_session_mocked.side_effect = [InvalidProtobuf("truncated"), None]
+        session_loader.create_session(self.model_dir, self.optimized_model_dir)
+
+        sam2_onnx_session_mocked.assert_called_with(model_dir=self.model_dir)
+        self.assertEqual(sam2_onnx_session_mocked.call_count, 2)
+
+    @patch.object(sam2_onnx, "Sam2OnnxSession")
+    @patch.object(ort, "InferenceSession", side_effect=TypeError("bug"))
+    def test_create_session_unexpected_error(
+        self, _inference_session_mocked, sam2_onnx_session_mocked
+    ):
+        with self.assertRaises(TypeError):
+            session_loader.create_session(self.model_dir, self.optimized_model_dir)
+        sam2_onnx_session_mocked.assert_not_called()
+
+    @patch.object(sam2_onnx, "Sam2OnnxSession")
+    @patch.object(ort, "InferenceSession")
+    def test_create_session_without_optimized_models(
+        self, inference_session_mocked, sam2_onnx_session_mocked
+    ):
+        session_loader.create_session(self.model_dir, None)
+
+        inference_session_mocked.assert_not_called()
+        sam2_onnx_session_mocked.assert_called_once_with(model_dir=self.model_dir)
+        self.assertFalse(self.optimized_model_dir.exists())
+
+    def test_get_warm_up_image_and_prompt(self):
+        img = session_loader.get_warm_up_image(64)
+        self.assertEqual(img.shape, (64, 64, 3))
+        self.assertEqual(img.dtype.name, "uint8")
+        self.assertEqual(
+            session_loader.get_warm_up_prompt(64),
+            [{"type": "point", "label": 1, "data": [32, 32]}],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,80 @@
+import logging
+import queue
+import unittest
+from unittest.mock import MagicMock, patch
+
+from samgis.utilities import session_logger
+from samgis.utilities.session_logger import (
+    LazyPayload,
+    NonBlockingQueueHandler,
+    PayloadSampler,
+    log_payload,
+)
+
+
+class TestSessionLogger(unittest.TestCase):
+    def test_lazy_payload(self):
+        self.assertEqual(str(LazyPayload("short", 10)), "short")
+        self.assertEqual(
+            str(LazyPayload("x" * 25, 10)), "xxxxxxxxxx...[truncated, 25 chars]"
+        )
+        self.assertEqual(
+            str(LazyPayload(b'{"a": 1}' * 5, 8)), '{"a": 1}...[truncated, 40 chars]'
+        )
+        # the other objects use a size-limited repr
+        rendered = str(LazyPayload({"prompt": list(range(100_000))}, 200))
+        self.assertLessEqual(len(rendered), 200 + len("...[truncated, 200 chars]"))
+        self.assertTrue(rendered.startswith("{'prompt': [0, 1, 2"))
+
+    def test_payload_sampler(self):
+        sampler = PayloadSampler(
+            default_rate=1.0, rates={"/infer_samgis": 0.25, "/v2/infer_samgis": 0}
+        )
+
+        self.assertListEqual(
+            [sampler.should_log("/infer_samgis") for _ in range(8)],
+            [True, False, False, False, True, False, False, False],
+        )
+        self.assertFalse(sampler.should_log("/v2/infer_samgis"))
+        self.assertTrue(sampler.should_log("/infer_samgis/batch"))
+
+    def test_log_payload(self):
+        logger = MagicMock()
+        payload_str = MagicMock(return_value="payload")
+        payload = MagicMock(__str__=payload_str)
+        logger.isEnabledFor.return_value = False
+
+        log_payload(logger, "/infer_samgis", "body", payload)
+        logger.log.assert_not_called()
+        payload_str.assert_not_called()
+
+        logger.isEnabledFor.return_value = True
+        with patch.object(session_logger, "payload_sampler", PayloadSampler()):
+            log_payload(logger, "/infer_samgis", "body", "x" * 5000, logging.INFO)
+        level, msg, lazy_payload = logger.log.call_args.args
+        self.assertEqual(level, logging.INFO)
+        self.assertEqual(msg, "body:%s.")
+        self.assertIsInstance(lazy_payload, LazyPayload)
+        self.assertEqual(lazy_payload.max_chars, session_logger.payload_max_chars)
+
+    def test_non_blocking_queue_handler(self):
+        log_queue = queue.Queue(maxsize=2)
+        handler = NonBlockingQueueHandler(log_queue)
+        logger = logging.getLogger("test_non_blocking_queue_handler")
+        logger.propagate = False
+        logger.addHandler(handler)
+        try:
+            for n in range(5):
+                logger.warning("message %s", n)
+        finally:
+            logger.removeHandler(handler)
+
+        self.assertEqual(handler.dropped, 3)
+        record = log_queue.get_nowait()
+        # the record isn't formatted within the caller thread
+        self.assertEqual(record.msg, "message %s")
+        self.assertEqual(record.getMessage(), "message 0")
+
+
+if __name__ == "__main__":
+    unittest.main()
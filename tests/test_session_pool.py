@@ -0,0 +1,104 @@
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+from unittest.mock import MagicMock
+
+from samgis.prediction_api.session_pool import SessionPool, get_model_nbytes
+
+
+def create_model_folder(parent_folder: str, variant: str, nbytes: int) -> Path:
+    model_folder = Path(parent_folder) / variant
+    model_folder.mkdir()
+    (model_folder / "encoder.onnx").write_bytes(b"0" * (nbytes // 2))
+    (model_folder / "decoder.onnx").write_bytes(b"0" * (nbytes - nbytes // 2))
+    (model_folder / "metadata.json").write_text("{}")
+    return model_folder
+
+
+class TestSessionPool(unittest.TestCase):
+    def test_get_model_nbytes(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            model_folder = create_model_folder(tmp_dir, "tiny", 101)
+
+            self.assertEqual(get_model_nbytes(model_folder), 101)
+            self.assertEqual(get_model_nbytes(Path(tmp_dir) / "missing"), 0)
+
+    def test_lru_eviction_within_budget(self):
+        loader = MagicMock(side_effect=lambda folder: folder.name)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            tiny = create_model_folder(tmp_dir, "tiny", 100)
+            small = create_model_folder(tmp_dir, "small", 100)
+            large = create_model_folder(tmp_dir, "large", 200)
+            pool = SessionPool(max_bytes=300, loader=loader)
+
+            self.assertEqual(pool.get(tiny), "tiny")
+            self.assertEqual(pool.get(small), "small")
+            self.assertEqual(pool.get(tiny), "tiny")
+            self.assertEqual(loader.call_count, 2)
+            # small is the least recently used one
+            self.assertEqual(pool.get(large), "large")
+            self.assertListEqual(pool.variants(), ["tiny", "large"])
+
+            stats = pool.stats()
+            self.assertEqual(stats["loads"], 3)
+            self.assertEqual(stats["hits"], 1)
+            self.assertEqual(stats["evictions"], 1)
+            self.assertEqual(stats["bytes"], 300)
+            self.assertDictEqual(
+                pool.counters(),
+                {k: v for k, v in stats.items() if k not in ("variants", "pinned")},
+            )
+
+    def test_pinned_never_evicted(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            tiny = create_model_folder(tmp_dir, "tiny", 100)
+            small = create_model_folder(tmp_dir, "small", 100)
+            large = create_model_folder(tmp_dir, "large", 200)
+            pool = SessionPool(
+                max_bytes=250, loader=MagicMock(side_effect=lambda folder: folder.name)
+            )
+
+            pool.get(tiny, pinned=True)
+            pool.get(small)
+            pool.get(large)
+            self.assertListEqual(pool.variants(), ["tiny", "large"])
+            # over budget because of the pinned variant: loaded anyway
+            pool.get(small)
+            self.assertListEqual(pool.variants(), ["tiny", "small"])
+            self.assertEqual(pool.stats()["pinned"], ["tiny"])
+
+    def test_concurrent_get_loads_once(self):
+        def slow_loader(folder: Path) -> str:
+            time.sleep(0.05)
+            return folder.name
+
+        loader = MagicMock(side_effect=slow_loader)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            tiny = create_model_folder(tmp_dir, "tiny", 100)
+            pool = SessionPool(max_bytes=0, loader=loader)
+            results = []
+            threads = [
+                threading.Thread(target=lambda: results.append(pool.get(tiny)))
+                for _ in range(4)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertListEqual(results, ["tiny"] * 4)
+        loader.assert_called_once()
+
+    def test_load_failure(self):
+        pool = SessionPool(max_bytes=0, loader=MagicMock(side_effect=OSError("boom")))
+
+        with self.assertRaises(OSError):
+            pool.get("/tmp/missing_variant")
+        self.assertEqual(pool.stats()["load_failures"], 1)
+        self.assertListEqual(pool.variants(), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,267 @@
+import tempfile
+import time
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+import numpy as np
+import requests
+from samgis_web.io_package import tms2geotiff as samgis_web_tms2geotiff
+from samgis_web.utilities.local_tiles_http_server import LocalTilesHttpServer
+
+from samgis.io_package.tms2geotiff import (
+    MosaicTooLargeError,
+    TileCache,
+    TileFetcher,
+    download_extent,
+)
+from tests import LOCAL_URL_TILE
+
+# bbox (w, s, e, n) covered by the tiles within tests/events/lambda_handler/10
+w, s, e, n = (
+    13.634033203125002,
+    38.302869955150044,
+    15.040283203125002,
+    39.036252959636606,
+)
+# same bbox slightly moved east, still within the same tiles
+w_panned, e_panned = 13.684033203125002, 15.090283203125002
+
+
+class TestTileCache(unittest.TestCase):
+    def test_put_get_content_addressed(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            cache = TileCache(tmp)
+            cache.put("http://localhost/1/0/0.png", b"same content")
+            cache.put("http://localhost/1/0/1.png", b"same content")
+
+            self.assertEqual(
+                cache.get("http://localhost/1/0/0.png", "url"), b"same content"
+            )
+            self.assertEqual(
+                cache.get("http://localhost/1/0/1.png", "url"), b"same content"
+            )
+            self.assertIsNone(cache.get("http://localhost/1/1/1.png", "url"))
+            self.assertEqual(len(list((Path(tmp) / "objects").glob("*/*"))), 1)
+            stats = cache.stats()
+            self.assertEqual(stats["hits"], 2)
+            self.assertEqual(stats["misses"], 1)
+            self.assertEqual(stats["bytes"], len(b"same content"))
+
+    def test_ttl_by_source(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            cache = TileCache(tmp, default_ttl=3600, ttl_by_source={"volatile": 10})
+            cache.put("http://localhost/1/0/0.png", b"content")
+
+            with patch.object(time, "time", return_value=time.time() + 60):
+                self.assertIsNone(cache.get("http://localhost/1/0/0.png", "volatile"))
+                self.assertEqual(
+                    cache.get("http://localhost/1/0/0.png", "stable"), b"content"
+                )
+            self.assertEqual(cache.stats()["expired"], 1)
+
+    def test_size_based_eviction(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            cache = TileCache(tmp, max_bytes=25)
+            for i in range(5):
+                cache.put(f"http://localhost/1/0/{i}.png", f"content {i:02}".encode())
+
+            self.assertLessEqual(cache.stats()["bytes"], 25)
+            self.assertGreater(cache.stats()["evictions"], 0)
+            # the most recent tile is still there
+            self.assertEqual(
+                cache.get("http://localhost/1/0/4.png", "url"), b"content 04"
+            )
+            self.assertIsNone(cache.get("http://localhost/1/0/0.png", "url"))
+
+    def test_corrupted_object(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            cache = TileCache(tmp)
+            cache.put("http://localhost/1/0/0.png", b"content")
+            for object_path in (Path(tmp) / "objects").glob("*/*"):
+                object_path.write_bytes(b"corrupted")
+
+            self.assertIsNone(cache.get("http://localhost/1/0/0.png", "url"))
+
+
+class TestDownloadExtent(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        from PIL import Image
+
+        # synthetic tiles served by the local tiles http server at LOCAL_URL_TILE
+        cls.tiles_folder = tempfile.TemporaryDirectory()
+        rng = np.random.default_rng(0)
+        for x in range(550, 555):
+            for y in range(391, 394):
+                tile_path = (
+                    Path(cls.tiles_folder.name) / "lambda_handler" / "10" / str(x)
+                )
+                tile_path.mkdir(parents=True, exist_ok=True)
+                tile = rng.integers(0, 255, (256, 256, 3), dtype=np.uint8)
+                Image.fromarray(tile).save(tile_path / f"{y}.png")
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tiles_folder.cleanup()
+
+    def test_download_extent_same_output_of_samgis_web(self):
+        fetcher = TileFetcher(max_workers=4)
+        with LocalTilesHttpServer.http_server(
+            "localhost", 8000, directory=self.tiles_folder.name
+        ):
+            img, transform = download_extent(
+                w, s, e, n, zoom=10, source=LOCAL_URL_TILE, fetcher=fetcher
+            )
+            expected_img, expected_transform = samgis_web_tms2geotiff.download_extent(
+                w,
+                s,
+                e,
+                n,
+                zoom=10,
+                source=LOCAL_URL_TILE,
+                n_connections=1,
+                use_cache=False,
+            )
+        fetcher.close()
+
+        np.testing.assert_array_equal(img, expected_img)
+        self.assertEqual(transform, expected_transform)
+
+    def test_download_extent_reuses_cached_tiles(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            cache = TileCache(tmp)
+            fetcher = TileFetcher(max_workers=4, cache=cache)
+            with LocalTilesHttpServer.http_server(
+                "localhost", 8000, directory=self.tiles_folder.name
+            ):
+                img, transform = download_extent(
+                    w, s, e, n, zoom=10, source=LOCAL_URL_TILE, fetcher=fetcher
+                )
+            n_downloaded = cache.stats()["misses"]
+            self.assertEqual(n_downloaded, 15)
+
+            # local tiles server stopped: same and panned viewports are served from the cache
+            img_cached, transform_cached = download_extent(
+                w, s, e, n, zoom=10, source=LOCAL_URL_TILE, fetcher=fetcher
+            )
+            download_extent(
+                w_panned,
+                s,
+                e_panned,
+                n,
+                zoom=10,
+                source=LOCAL_URL_TILE,
+                fetcher=fetcher,
+            )
+            fetcher.close()
+
+            np.testing.assert_array_equal(img, img_cached)
+            self.assertEqual(transform, transform_cached)
+            self.assertEqual(cache.stats()["misses"], n_downloaded)
+            self.assertEqual(cache.stats()["hits"], 30)
+
+    def test_fetch_404(self):
+        fetcher = TileFetcher(max_workers=1, max_retries=2)
+        with (
+            LocalTilesHttpServer.http_server(
+                "localhost", 8000, directory=self.tiles_folder.name
+            ),
+            self.assertRaises(requests.HTTPError),
+        ):
+            fetcher.fetch("http://localhost:8000/lambda_handler/10/0/0.png", "url")
+        fetcher.close()
+
+    def test_fetch_retries_on_connection_error(self):
+        fetcher = TileFetcher(max_workers=1, max_retries=2, wait=0)
+        with (
+            patch.object(
+                requests.Session, "get", side_effect=requests.ConnectionError("reset")
+            ) as get_mocked,
+            self.assertRaises(requests.ConnectionError),
+        ):
+            fetcher.fetch("http://localhost:8000/lambda_handler/10/550/391.png", "url")
+        fetcher.close()
+
+        self.assertEqual(get_mocked.call_count, 3)
+
+    def test_download_extent_same_output_of_crop_raster(self):
+        import mercantile
+        from contextily.tile import _merge_tiles
+        from samgis_web.io_package.coordinates_pixel_conversion import _from4326_to3857
+
+        def get_tile(url: str, _source_name: str) -> np.ndarray:
+            # deterministic RGBA tile for every url
+            seed = int.from_bytes(url.encode()[-16:], "little")
+            return np.random.default_rng(seed).integers(
+                0, 255, (256, 256, 4), dtype=np.uint8
+            )
+
+        fetcher = TileFetcher(max_workers=4)
+        rng = np.random.default_rng(1)
+        with patch.object(fetcher, "fetch", side_effect=get_tile):
+            for _ in range(10):
+                zoom = int(rng.integers(8, 12))
+                lon, lat = rng.uniform(-170, 160), rng.uniform(-60, 60)
+                bbox_w, bbox_s = lon, lat
+                bbox_e = lon + rng.uniform(0.05, 0.8)
+                bbox_n = lat + rng.uniform(0.05, 0.6)
+                img, transform = download_extent(
+                    bbox_w, bbox_s, bbox_e, bbox_n, zoom, LOCAL_URL_TILE, fetcher
+                )
+
+                tiles = list(mercantile.tiles(bbox_w, bbox_s, bbox_e, bbox_n, [zoom]))
+                arrays = [
+                    get_tile(LOCAL_URL_TILE.format(x=t.x, y=t.y, z=t.z), "url")
+                    for t in tiles
+                ]
+                merged, (west, south, east, north) = _merge_tiles(tiles, arrays)
+                left, bottom = mercantile.xy(west, south)
+                right, top = mercantile.xy(east, north)
+                xp0, yp0 = _from4326_to3857(bbox_n, bbox_e)
+                xp1, yp1 = _from4326_to3857(bbox_s, bbox_w)
+                expected_img, expected_transform = samgis_web_tms2geotiff.crop_raster(
+                    yp1, xp1, yp0, xp0, merged, (left, right, bottom, top)
+                )
+                np.testing.assert_array_equal(img, expected_img)
+                self.assertEqual(transform, expected_transform)
+        fetcher.close()
+
+    def test_download_extent_pixels_budget(self):
+        fetcher = TileFetcher(max_workers=1)
+        with (
+            patch.object(fetcher, "fetch") as fetch_mocked,
+            self.assertRaises(MosaicTooLargeError),
+        ):
+            download_extent(w, s, e, n, 10, LOCAL_URL_TILE, fetcher, max_pixels=1000)
+        fetcher.close()
+
+        fetch_mocked.assert_not_called()
+
+    def test_download_extent_memory_mapped(self):
+        fetcher = TileFetcher(max_workers=4)
+        with tempfile.TemporaryDirectory() as tmp:
+            with LocalTilesHttpServer.http_server(
+                "localhost", 8000, directory=self.tiles_folder.name
+            ):
+                img, transform = download_extent(
+                    w, s, e, n, 10, LOCAL_URL_TILE, fetcher, max_pixels=0
+                )
+                img_mmap, transform_mmap = download_extent(
+                    w, s, e, n, 10, LOCAL_URL_TILE, fetcher, mmap_folder=tmp
+                )
+            fetcher.close()
+
+            self.assertIsInstance(img_mmap, np.memmap)
+            # the backing file has no name
+            self.assertListEqual(list(Path(tmp).iterdir()), [])
+        np.testing.assert_array_equal(img_mmap, img)
+        self.assertEqual(transform_mmap, transform)
+
+    def test_tile_fetcher_invalid_max_workers(self):
+        with self.assertRaises(ValueError):
+            TileFetcher(max_workers=0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,98 @@
+import threading
+import unittest
+
+import numpy as np
+
+from samgis.prediction_api.windowed import (
+    get_window_prompt,
+    get_windows,
+    predict_windowed_mask,
+)
+from samgis.utilities.metrics import collect_timings, record_stage
+
+
+class TestWindowed(unittest.TestCase):
+    def test_get_windows(self):
+        windows = get_windows(1000, 2500, window_size=1024, overlap=128)
+
+        self.assertEqual(len(windows), 3)
+        self.assertListEqual([w.cols.start for w in windows], [0, 738, 1476])
+        for window in windows:
+            self.assertEqual(window.rows, slice(0, 1000))
+            self.assertEqual(window.cols.stop - window.cols.start, 1024)
+        # the cores partition the image, with the seams in the middle of the overlaps
+        coverage = np.zeros((1000, 2500), dtype=int)
+        for window in windows:
+            coverage[window.core_rows, window.core_cols] += 1
+            self.assertTrue(window.cols.start <= window.core_cols.start)
+            self.assertTrue(window.core_cols.stop <= window.cols.stop)
+        np.testing.assert_array_equal(coverage, 1)
+        self.assertEqual(windows[0].core_cols, slice(0, 881))
+
+        with self.assertRaises(ValueError):
+            get_windows(1000, 2500, window_size=1024, overlap=1024)
+
+    def test_get_window_prompt(self):
+        window = get_windows(2000, 2000, window_size=1024, overlap=128)[2]
+        self.assertEqual(window.cols, slice(976, 2000))
+        prompt = [
+            {"type": "point", "label": 1, "data": [1500, 100]},
+            {"type": "point", "label": 0, "data": [100, 100]},
+            {"type": "rectangle", "data": [900, 50, 1100, 150]},
+        ]
+
+        self.assertListEqual(
+            get_window_prompt(prompt, window),
+            [
+                {"type": "point", "label": 1, "data": [524, 100]},
+                {"type": "rectangle", "data": [0, 50, 124, 150]},
+            ],
+        )
+        # an exclude point alone doesn't select the window
+        self.assertListEqual(get_window_prompt(prompt[1:2], window), [])
+
+    def test_predict_windowed_mask(self):
+        # a 2x2 grid of windows; the prompt selects an object crossing the vertical seam
+        height, width = 1500, 1500
+        expected = np.zeros((height, width), dtype=np.uint8)
+        expected[100:200, 600:900] = 255
+        encoded = []
+        lock = threading.Lock()
+
+        def encode(window):
+            with lock:
+                encoded.append(window.name)
+            record_stage("encoder", 1.0)
+            return window
+
+        def decode(window, window_prompt):
+            masks = np.zeros((3, *expected[window.rows, window.cols].shape), np.uint8)
+            masks[1] = expected[window.rows, window.cols]
+            return masks, np.array([0.1, 0.9, 0.2])
+
+        prompt = [{"type": "rectangle", "data": [600, 100, 900, 200]}]
+        with collect_timings() as timings:
+            mask, n_predictions = predict_windowed_mask(
+                (height, width), prompt, encode, decode, 1024, 128, max_workers=2
+            )
+
+        np.testing.assert_array_equal(mask, expected)
+        self.assertListEqual(
+            sorted(encoded), ["window_0_0_1024_1024", "window_0_476_1024_1500"]
+        )
+        self.assertEqual(n_predictions, 6)
+        self.assertEqual(timings["encoder"], 2.0)
+
+        with self.assertRaises(ValueError):
+            predict_windowed_mask(
+                (height, width),
+                [{"type": "point", "label": 0, "data": [10, 10]}],
+                encode,
+                decode,
+                1024,
+                128,
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()